@@ -6,6 +6,7 @@ from flask import jsonify, request
 from app import app
 from flask_login import login_required
 from sap_integration import SAPIntegration
+from master_data_cache import master_data_cache
 import logging
 
 @app.route('/api/warehouses', methods=['GET'])
@@ -15,6 +16,13 @@ def cascading_get_warehouses():
     try:
         sap = SAPIntegration()
         
+        found, warehouses = master_data_cache.get('warehouses', (sap.company_db, 'full'))
+        if found:
+            return jsonify({
+                'success': True,
+                'warehouses': warehouses
+            })
+        
         # Try to get warehouses from SAP B1
         if sap.ensure_logged_in():
             try:
@@ -26,6 +34,8 @@ def cascading_get_warehouses():
                     data = response.json()
                     warehouses = data.get('value', [])
                     logging.info(f"Retrieved {len(warehouses)} warehouses from SAP B1")
+                    if warehouses:
+                        master_data_cache.set('warehouses', (sap.company_db, 'full'), warehouses)
                     return jsonify({
                         'success': True,
                         'warehouses': warehouses
@@ -61,6 +71,13 @@ def cascading_get_bin_locations():
         
         sap = SAPIntegration()
         
+        found, bins = master_data_cache.get('bins', (sap.company_db, 'odata', warehouse_code))
+        if found:
+            return jsonify({
+                'success': True,
+                'bins': bins
+            })
+        
         # Try to get bin locations from SAP B1
         if sap.ensure_logged_in():
             try:
@@ -71,6 +88,8 @@ def cascading_get_bin_locations():
                     data = response.json()
                     bins = data.get('value', [])
                     logging.info(f"Retrieved {len(bins)} bin locations for warehouse {warehouse_code}")
+                    if bins:
+                        master_data_cache.set('bins', (sap.company_db, 'odata', warehouse_code), bins)
                     return jsonify({
                         'success': True,
                         'bins': bins
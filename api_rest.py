@@ -48,12 +48,20 @@ Example Pattern:
     @require_permission('permission_name')
     def api_get_resources():
         if check_admin_permission():
-            items = Resource.query.all()
+            query = Resource.query
         else:
-            items = Resource.query.filter_by(user_id=current_user.id).all()
-        return jsonify({'success': True, 'data': [serialize_model(i) for i in items]})
+            query = Resource.query.filter_by(user_id=current_user.id)
+        return list_response(Resource, query)
+
+List Endpoints:
+All GET list endpoints go through list_response(), which pages with a keyset
+cursor on id and never loads the whole table:
+- ?limit=N (default 500, max 5000) and ?cursor=<next_cursor from the previous page>
+- ?fields=id,status,... - only these columns are SELECTed
+- ?status=a,b / ?user_id=N / ?created_from=ISO / ?created_to=ISO - filtered in SQL
+- ?format=ndjson - streams every matching row as newline-delimited JSON (exports)
 """
-from flask import jsonify, request, redirect, url_for
+from flask import jsonify, request, redirect, url_for, Response, stream_with_context
 from flask_login import login_required, current_user
 from datetime import datetime
 from sqlalchemy.exc import IntegrityError
@@ -106,6 +114,156 @@ def serialize_model(obj, exclude_fields=None):
     return result
 
 
+# ================================
+# List Pagination / Projection / Streaming
+# ================================
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+STREAM_BATCH_SIZE = 1000
+FILTERABLE_COLUMNS = ('status', 'user_id')
+
+
+class ListQueryError(ValueError):
+    """Invalid list query parameter - reported to the client as HTTP 400"""
+
+
+def _projection_columns(model, exclude_fields):
+    """Columns to SELECT: the ?fields= subset, or every column"""
+    columns = [column for column in model.__table__.columns if column.name not in exclude_fields]
+    fields = request.args.get('fields')
+    if not fields:
+        return columns
+
+    by_name = {column.name: column for column in columns}
+    requested = [name.strip() for name in fields.split(',') if name.strip()]
+    unknown = [name for name in requested if name not in by_name]
+    if unknown:
+        raise ListQueryError(f"Unknown field(s): {', '.join(unknown)}")
+    return [by_name[name] for name in dict.fromkeys(requested)]
+
+
+def _filter_value(column, value):
+    try:
+        return column.type.python_type(value)
+    except (TypeError, ValueError, NotImplementedError):
+        raise ListQueryError(f"Invalid value for {column.name}: {value}")
+
+
+def _apply_list_filters(model, query):
+    """Push ?status=, ?user_id=, ?created_from= and ?created_to= down into the WHERE clause"""
+    table_columns = model.__table__.columns
+    for name in FILTERABLE_COLUMNS:
+        raw = request.args.get(name)
+        if not raw or name not in table_columns:
+            continue
+        column = table_columns[name]
+        values = [_filter_value(column, value.strip()) for value in raw.split(',') if value.strip()]
+        query = query.filter(column.in_(values) if len(values) > 1 else column == values[0])
+
+    if 'created_at' in table_columns:
+        created_at = table_columns['created_at']
+        for arg in ('created_from', 'created_to'):
+            raw = request.args.get(arg)
+            if not raw:
+                continue
+            try:
+                moment = datetime.fromisoformat(raw)
+            except ValueError:
+                raise ListQueryError(f"Invalid {arg}: expected an ISO date or datetime")
+            query = query.filter(created_at >= moment if arg == 'created_from' else created_at < moment)
+    return query
+
+
+def _serialize_row(row, columns):
+    """Same output as serialize_model() for a projected (column tuple) row"""
+    result = {}
+    for column, value in zip(columns, row):
+        result[column.name] = value.isoformat() if isinstance(value, datetime) else value
+    return result
+
+
+def _stream_ndjson(query, id_column, columns, cursor, limit):
+    """Yield rows as NDJSON, fetching STREAM_BATCH_SIZE rows per keyset query"""
+    sent = 0
+    last_id = cursor
+    while True:
+        batch_size = STREAM_BATCH_SIZE if limit is None else min(STREAM_BATCH_SIZE, limit - sent)
+        if batch_size <= 0:
+            break
+        batch_query = query.filter(id_column > last_id) if last_id is not None else query
+        rows = batch_query.limit(batch_size).all()
+        for row in rows:
+            yield app.json.dumps(_serialize_row(row, columns)) + '\n'
+        sent += len(rows)
+        if len(rows) < batch_size:
+            break
+        last_id = rows[-1][0]
+
+
+def list_response(model, query, exclude_fields=None):
+    """Respond with one keyset page of ``query`` (or an NDJSON stream with ?format=ndjson).
+
+    Only the projected columns are selected, so rows never become ORM objects and
+    memory stays proportional to the page size rather than the table size.
+    """
+    try:
+        columns = _projection_columns(model, exclude_fields or [])
+        query = _apply_list_filters(model, query)
+        cursor = request.args.get('cursor')
+        if cursor is not None:
+            try:
+                cursor = int(cursor)
+            except ValueError:
+                raise ListQueryError('Invalid cursor')
+        limit = request.args.get('limit')
+        if limit is not None:
+            try:
+                limit = max(int(limit), 1)
+            except ValueError:
+                raise ListQueryError('Invalid limit')
+    except ListQueryError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    # id always comes first - it is the keyset cursor
+    id_column = model.__table__.columns['id']
+    columns = [id_column] + [column for column in columns if column.name != 'id']
+    query = query.with_entities(*columns).order_by(id_column)
+
+    if request.args.get('format') == 'ndjson':
+        return Response(stream_with_context(_stream_ndjson(query, id_column, columns, cursor, limit)),
+                        mimetype='application/x-ndjson')
+
+    limit = min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    if cursor is not None:
+        query = query.filter(id_column > cursor)
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return jsonify({
+        'success': True,
+        'data': [_serialize_row(row, columns) for row in rows],
+        'count': len(rows),
+        'has_more': has_more,
+        'next_cursor': rows[-1][0] if has_more else None
+    })
+
+
+def _owned_multi_grn_batch_ids():
+    return db.select(MultiGRNBatch.id).where(MultiGRNBatch.user_id == current_user.id)
+
+
+def _owned_multi_grn_po_link_ids():
+    return db.select(MultiGRNPOLink.id).where(MultiGRNPOLink.batch_id.in_(_owned_multi_grn_batch_ids()))
+
+
+def _owned_multi_grn_line_selection_ids():
+    return db.select(MultiGRNLineSelection.id).where(
+        MultiGRNLineSelection.po_link_id.in_(_owned_multi_grn_po_link_ids())
+    )
+
+
 def get_request_data():
     """Get JSON data from request"""
     return request.get_json() or {}
@@ -269,12 +427,7 @@ def api_get_current_user():
 def api_get_users():
     """GET list of all users - Admin only"""
     try:
-        users = User.query.all()
-        return jsonify({
-            'success': True,
-            'data': [serialize_model(u, exclude_fields=['password_hash']) for u in users],
-            'count': len(users)
-        })
+        return list_response(User, User.query, exclude_fields=['password_hash'])
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -416,15 +569,11 @@ def api_get_inventory_transfers():
     """GET list of inventory transfers - Filtered by ownership"""
     try:
         if check_admin_permission():
-            transfers = InventoryTransfer.query.all()
+            query = InventoryTransfer.query
         else:
-            transfers = InventoryTransfer.query.filter_by(user_id=current_user.id).all()
+            query = InventoryTransfer.query.filter_by(user_id=current_user.id)
         
-        return jsonify({
-            'success': True,
-            'data': [serialize_model(t) for t in transfers],
-            'count': len(transfers)
-        })
+        return list_response(InventoryTransfer, query)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -590,22 +739,15 @@ def api_get_transfer_request_lines():
                 }), 403
             query = query.filter_by(inventory_transfer_id=transfer_id)
         elif not check_admin_permission():
-            user_transfers = InventoryTransfer.query.filter_by(user_id=current_user.id).all()
-            transfer_ids = [t.id for t in user_transfers]
-            query = query.filter(InventoryTransferRequestLine.inventory_transfer_id.in_(transfer_ids))
+            user_transfer_ids = db.select(InventoryTransfer.id).where(InventoryTransfer.user_id == current_user.id)
+            query = query.filter(InventoryTransferRequestLine.inventory_transfer_id.in_(user_transfer_ids))
         
         if item_code:
             query = query.filter_by(item_code=item_code)
         if line_status:
             query = query.filter_by(line_status=line_status)
         
-        lines = query.all()
-        
-        return jsonify({
-            'success': True,
-            'data': [serialize_model(line) for line in lines],
-            'count': len(lines)
-        })
+        return list_response(InventoryTransferRequestLine, query)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -900,15 +1042,11 @@ def api_get_pick_lists():
     """GET list of pick lists - Filtered by ownership"""
     try:
         if check_admin_permission():
-            pick_lists = PickList.query.all()
+            query = PickList.query
         else:
-            pick_lists = PickList.query.filter_by(user_id=current_user.id).all()
+            query = PickList.query.filter_by(user_id=current_user.id)
         
-        return jsonify({
-            'success': True,
-            'data': [serialize_model(pl) for pl in pick_lists],
-            'count': len(pick_lists)
-        })
+        return list_response(PickList, query)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1038,15 +1176,11 @@ def api_get_inventory_counts():
     """GET list of inventory counts - Filtered by ownership"""
     try:
         if check_admin_permission():
-            counts = InventoryCount.query.all()
+            query = InventoryCount.query
         else:
-            counts = InventoryCount.query.filter_by(user_id=current_user.id).all()
+            query = InventoryCount.query.filter_by(user_id=current_user.id)
         
-        return jsonify({
-            'success': True,
-            'data': [serialize_model(c) for c in counts],
-            'count': len(counts)
-        })
+        return list_response(InventoryCount, query)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1171,12 +1305,7 @@ def api_delete_inventory_count(count_id):
 def api_get_bin_locations():
     """GET list of bin locations"""
     try:
-        bins = BinLocation.query.all()
-        return jsonify({
-            'success': True,
-            'data': [serialize_model(b) for b in bins],
-            'count': len(bins)
-        })
+        return list_response(BinLocation, BinLocation.query)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1287,15 +1416,11 @@ def api_get_grpo_documents():
     """GET list of GRPO documents - Filtered by ownership"""
     try:
         if check_admin_permission():
-            documents = GRPODocument.query.all()
+            query = GRPODocument.query
         else:
-            documents = GRPODocument.query.filter_by(user_id=current_user.id).all()
+            query = GRPODocument.query.filter_by(user_id=current_user.id)
         
-        return jsonify({
-            'success': True,
-            'data': [serialize_model(d) for d in documents],
-            'count': len(documents)
-        })
+        return list_response(GRPODocument, query)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1426,15 +1551,11 @@ def api_get_grpo_items():
     try:
         grpo_id = request.args.get('grpo_id')
         if grpo_id:
-            items = GRPOItem.query.filter_by(grpo_id=grpo_id).all()
+            query = GRPOItem.query.filter_by(grpo_id=grpo_id)
         else:
-            items = GRPOItem.query.all()
+            query = GRPOItem.query
         
-        return jsonify({
-            'success': True,
-            'data': [serialize_model(i) for i in items],
-            'count': len(items)
-        })
+        return list_response(GRPOItem, query)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1542,15 +1663,11 @@ def api_get_multi_grn_batches():
     """GET list of multi GRN batches - Filtered by ownership"""
     try:
         if check_admin_permission():
-            batches = MultiGRNBatch.query.all()
+            query = MultiGRNBatch.query
         else:
-            batches = MultiGRNBatch.query.filter_by(user_id=current_user.id).all()
+            query = MultiGRNBatch.query.filter_by(user_id=current_user.id)
         
-        return jsonify({
-            'success': True,
-            'data': [serialize_model(b) for b in batches],
-            'count': len(batches)
-        })
+        return list_response(MultiGRNBatch, query)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1685,19 +1802,13 @@ def api_get_multi_grn_po_links():
                     'success': False,
                     'error': 'Access denied: You can only view PO links from your own batches'
                 }), 403
-            po_links = MultiGRNPOLink.query.filter_by(batch_id=batch_id).all()
+            query = MultiGRNPOLink.query.filter_by(batch_id=batch_id)
         elif check_admin_permission():
-            po_links = MultiGRNPOLink.query.all()
+            query = MultiGRNPOLink.query
         else:
-            user_batches = MultiGRNBatch.query.filter_by(user_id=current_user.id).all()
-            batch_ids = [b.id for b in user_batches]
-            po_links = MultiGRNPOLink.query.filter(MultiGRNPOLink.batch_id.in_(batch_ids)).all()
+            query = MultiGRNPOLink.query.filter(MultiGRNPOLink.batch_id.in_(_owned_multi_grn_batch_ids()))
         
-        return jsonify({
-            'success': True,
-            'data': [serialize_model(link) for link in po_links],
-            'count': len(po_links)
-        })
+        return list_response(MultiGRNPOLink, query)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -1857,7 +1968,7 @@ def api_get_multi_grn_line_selections():
                     'success': False,
                     'error': 'Access denied: You can only view line selections from your own batches'
                 }), 403
-            line_selections = MultiGRNLineSelection.query.filter_by(po_link_id=po_link_id).all()
+            query = MultiGRNLineSelection.query.filter_by(po_link_id=po_link_id)
         elif batch_id:
             batch = MultiGRNBatch.query.get(batch_id)
             if batch and not check_resource_ownership(batch):
@@ -1865,23 +1976,14 @@ def api_get_multi_grn_line_selections():
                     'success': False,
                     'error': 'Access denied: You can only view line selections from your own batches'
                 }), 403
-            po_links = MultiGRNPOLink.query.filter_by(batch_id=batch_id).all()
-            po_link_ids = [link.id for link in po_links]
-            line_selections = MultiGRNLineSelection.query.filter(MultiGRNLineSelection.po_link_id.in_(po_link_ids)).all()
+            po_link_ids = db.select(MultiGRNPOLink.id).where(MultiGRNPOLink.batch_id == batch_id)
+            query = MultiGRNLineSelection.query.filter(MultiGRNLineSelection.po_link_id.in_(po_link_ids))
         elif check_admin_permission():
-            line_selections = MultiGRNLineSelection.query.all()
+            query = MultiGRNLineSelection.query
         else:
-            user_batches = MultiGRNBatch.query.filter_by(user_id=current_user.id).all()
-            batch_ids = [b.id for b in user_batches]
-            po_links = MultiGRNPOLink.query.filter(MultiGRNPOLink.batch_id.in_(batch_ids)).all()
-            po_link_ids = [link.id for link in po_links]
-            line_selections = MultiGRNLineSelection.query.filter(MultiGRNLineSelection.po_link_id.in_(po_link_ids)).all()
+            query = MultiGRNLineSelection.query.filter(MultiGRNLineSelection.po_link_id.in_(_owned_multi_grn_po_link_ids()))
         
-        return jsonify({
-            'success': True,
-            'data': [serialize_model(line) for line in line_selections],
-            'count': len(line_selections)
-        })
+        return list_response(MultiGRNLineSelection, query)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -2048,23 +2150,13 @@ def api_get_multi_grn_batch_details():
                     'success': False,
                     'error': 'Access denied: You can only view batch details from your own batches'
                 }), 403
-            batch_details = MultiGRNBatchDetails.query.filter_by(line_selection_id=line_selection_id).all()
+            query = MultiGRNBatchDetails.query.filter_by(line_selection_id=line_selection_id)
         elif check_admin_permission():
-            batch_details = MultiGRNBatchDetails.query.all()
+            query = MultiGRNBatchDetails.query
         else:
-            user_batches = MultiGRNBatch.query.filter_by(user_id=current_user.id).all()
-            batch_ids = [b.id for b in user_batches]
-            po_links = MultiGRNPOLink.query.filter(MultiGRNPOLink.batch_id.in_(batch_ids)).all()
-            po_link_ids = [link.id for link in po_links]
-            line_selections = MultiGRNLineSelection.query.filter(MultiGRNLineSelection.po_link_id.in_(po_link_ids)).all()
-            line_selection_ids = [line.id for line in line_selections]
-            batch_details = MultiGRNBatchDetails.query.filter(MultiGRNBatchDetails.line_selection_id.in_(line_selection_ids)).all()
+            query = MultiGRNBatchDetails.query.filter(MultiGRNBatchDetails.line_selection_id.in_(_owned_multi_grn_line_selection_ids()))
         
-        return jsonify({
-            'success': True,
-            'data': [serialize_model(detail) for detail in batch_details],
-            'count': len(batch_details)
-        })
+        return list_response(MultiGRNBatchDetails, query)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -2219,23 +2311,13 @@ def api_get_multi_grn_serial_details():
                     'success': False,
                     'error': 'Access denied: You can only view serial details from your own batches'
                 }), 403
-            serial_details = MultiGRNSerialDetails.query.filter_by(line_selection_id=line_selection_id).all()
+            query = MultiGRNSerialDetails.query.filter_by(line_selection_id=line_selection_id)
         elif check_admin_permission():
-            serial_details = MultiGRNSerialDetails.query.all()
+            query = MultiGRNSerialDetails.query
         else:
-            user_batches = MultiGRNBatch.query.filter_by(user_id=current_user.id).all()
-            batch_ids = [b.id for b in user_batches]
-            po_links = MultiGRNPOLink.query.filter(MultiGRNPOLink.batch_id.in_(batch_ids)).all()
-            po_link_ids = [link.id for link in po_links]
-            line_selections = MultiGRNLineSelection.query.filter(MultiGRNLineSelection.po_link_id.in_(po_link_ids)).all()
-            line_selection_ids = [line.id for line in line_selections]
-            serial_details = MultiGRNSerialDetails.query.filter(MultiGRNSerialDetails.line_selection_id.in_(line_selection_ids)).all()
+            query = MultiGRNSerialDetails.query.filter(MultiGRNSerialDetails.line_selection_id.in_(_owned_multi_grn_line_selection_ids()))
         
-        return jsonify({
-            'success': True,
-            'data': [serialize_model(detail) for detail in serial_details],
-            'count': len(serial_details)
-        })
+        return list_response(MultiGRNSerialDetails, query)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -2380,15 +2462,11 @@ def api_get_delivery_documents():
     """GET list of delivery documents - Filtered by ownership"""
     try:
         if check_admin_permission():
-            deliveries = DeliveryDocument.query.all()
+            query = DeliveryDocument.query
         else:
-            deliveries = DeliveryDocument.query.filter_by(user_id=current_user.id).all()
+            query = DeliveryDocument.query.filter_by(user_id=current_user.id)
         
-        return jsonify({
-            'success': True,
-            'data': [serialize_model(d) for d in deliveries],
-            'count': len(deliveries)
-        })
+        return list_response(DeliveryDocument, query)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -2514,12 +2592,7 @@ def api_delete_delivery_document(delivery_id):
 def api_get_serial_transfers():
     """GET list of serial number transfers"""
     try:
-        transfers = SerialNumberTransfer.query.all()
-        return jsonify({
-            'success': True,
-            'data': [serialize_model(t) for t in transfers],
-            'count': len(transfers)
-        })
+        return list_response(SerialNumberTransfer, SerialNumberTransfer.query)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -2627,12 +2700,7 @@ def api_delete_serial_transfer(transfer_id):
 def api_get_direct_transfers():
     """GET list of direct inventory transfers"""
     try:
-        transfers = DirectInventoryTransfer.query.all()
-        return jsonify({
-            'success': True,
-            'data': [serialize_model(t) for t in transfers],
-            'count': len(transfers)
-        })
+        return list_response(DirectInventoryTransfer, DirectInventoryTransfer.query)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -2739,12 +2807,7 @@ def api_delete_direct_transfer(transfer_id):
 def api_get_qr_labels():
     """GET list of QR code labels"""
     try:
-        labels = QRCodeLabel.query.all()
-        return jsonify({
-            'success': True,
-            'data': [serialize_model(l) for l in labels],
-            'count': len(labels)
-        })
+        return list_response(QRCodeLabel, QRCodeLabel.query)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -2845,12 +2908,7 @@ def api_delete_qr_label(label_id):
 def api_get_sap_inventory_counts():
     """GET list of SAP inventory counts"""
     try:
-        counts = SAPInventoryCount.query.all()
-        return jsonify({
-            'success': True,
-            'data': [serialize_model(c) for c in counts],
-            'count': len(counts)
-        })
+        return list_response(SAPInventoryCount, SAPInventoryCount.query)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -2910,15 +2968,11 @@ def api_get_serial_item_transfers():
     """GET list of serial item transfers - Filtered by ownership"""
     try:
         if check_admin_permission():
-            transfers = SerialItemTransfer.query.all()
+            query = SerialItemTransfer.query
         else:
-            transfers = SerialItemTransfer.query.filter_by(user_id=current_user.id).all()
+            query = SerialItemTransfer.query.filter_by(user_id=current_user.id)
         
-        return jsonify({
-            'success': True,
-            'data': [serialize_model(t) for t in transfers],
-            'count': len(transfers)
-        })
+        return list_response(SerialItemTransfer, query)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -3046,12 +3100,7 @@ def api_delete_serial_item_transfer(transfer_id):
 def api_get_serial_item_transfer_items():
     """GET list of all serial item transfer items - Permission required"""
     try:
-        items = SerialItemTransferItem.query.all()
-        return jsonify({
-            'success': True,
-            'data': [serialize_model(item) for item in items],
-            'count': len(items)
-        })
+        return list_response(SerialItemTransferItem, SerialItemTransferItem.query)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
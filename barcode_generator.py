@@ -3,10 +3,9 @@ QR Code and Barcode Generation Module
 Equivalent to C# ZXing.QRCode functionality
 """
 
-import qrcode
 import io
 import base64
-from PIL import Image, ImageDraw, ImageFont
+from qr_label_renderer import fit_symbol, box_size_for, render_image, render_qr_batch
 import logging
 import os
 from datetime import datetime
@@ -35,23 +34,13 @@ class BarcodeGenerator:
             if margin is None:
                 margin = self.default_margin
                 
-            # Create QR code instance
-            qr = qrcode.QRCode(
-                version=1,  # Controls size (1 = 21x21, up to 40)
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=10,
-                border=margin,
-            )
-            
-            # Add data
-            qr.add_data(data)
-            qr.make(fit=True)
-            
-            # Create image
-            img = qr.make_image(fill_color="black", back_color="white")
-            
-            # Resize to requested size
-            img = img.resize((size, size), Image.Resampling.LANCZOS)
+            # Pick version, mask and box size up front so the symbol is drawn at
+            # whole pixels per module and padded to size instead of resampled
+            version, mask_pattern = fit_symbol([data])
+            box_size = box_size_for(size, version, margin)
+            img = render_image(data, version, mask_pattern, box_size, border=margin, size=size)
+            if format.upper() == 'JPEG':
+                img = img.convert('L')
             
             # Convert to base64 for web display
             buffer = io.BytesIO()
@@ -79,6 +68,36 @@ class BarcodeGenerator:
                 'error': str(e)
             }
     
+    def generate_qr_codes(self, data_list, size=None, margin=None):
+        """
+        Generate QR codes for many payloads in one call
+        
+        Args:
+            data_list (list): Data strings to encode
+            size (int): Size of each QR code (default: 300x300)
+            margin (int): Margin around each QR code (default: 1)
+            
+        Returns:
+            dict: {'success': bool, 'images': [base64_string or None], 'size': int, ...}
+        """
+        try:
+            if size is None:
+                size = self.default_qr_size
+            if margin is None:
+                margin = self.default_margin
+            
+            result = render_qr_batch(data_list, size=size, border=margin, data_uri=False)
+            result['mime_type'] = 'image/png'
+            result['size'] = size
+            return result
+            
+        except Exception as e:
+            logging.error(f"❌ Error generating QR codes: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
     def generate_label_qr(self, label_data):
         """
         Generate QR code for warehouse labels
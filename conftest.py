@@ -0,0 +1,108 @@
+"""
+Shared pytest setup for the database-backed tests (test_query_plans.py, test_benchmarks.py)
+
+The application is imported once per test process, so what it reads at import
+time is fixed here, before any test module imports it: the background warm-up
+and the in-process SAP posting worker are switched off (they would contact the
+configured SAP host and send SQL of their own) and the app starts on a
+throwaway SQLite database.
+
+Each test module then gets its own fresh database from the ``database``
+fixture, so query plans and statement counts do not depend on which modules
+ran before. A module can name an environment variable in ``DATABASE_URL_ENV``
+that points its tests at a scratch PostgreSQL or MySQL database instead.
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, Numeric, create_engine, insert, select
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault('SESSION_SECRET', 'wms-tests')
+os.environ['STARTUP_WARMUP'] = 'false'
+os.environ['SAP_POSTING_IN_PROCESS_WORKER'] = 'false'
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='wms_tests_'), 'app.db')}"
+
+
+@pytest.fixture(scope='module')
+def database(request):
+    """A new database for the requesting module, initialised like a fresh install
+    and bound to the app until the module's tests are done"""
+    from app import app, db
+    from master_data_cache import master_data_cache
+    from startup import init_database
+
+    name = request.module.__name__.rsplit('.', 1)[-1]
+    url_env = getattr(request.module, 'DATABASE_URL_ENV', None)
+    url = ((url_env and os.environ.get(url_env))
+           or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix=f'wms_{name}_'), f'{name}.db')}")
+    engine = create_engine(url, pool_pre_ping=True)
+
+    # Cached master data and dashboards belong to the previous module's database
+    master_data_cache.invalidate()
+    with app.app_context():
+        db.session.remove()
+        engines = db.engines
+        previous = engines[None]
+        engines[None] = engine
+    try:
+        init_database(app, db)
+        yield engine
+    finally:
+        with app.app_context():
+            db.session.remove()
+            db.engines[None] = previous
+        engine.dispose()
+        master_data_cache.invalidate()
+
+
+def _column_value(column, index, created_at):
+    """A value for a required column that has no default"""
+    if isinstance(column.type, DateTime):
+        return created_at
+    if isinstance(column.type, Date):
+        return created_at.date()
+    if isinstance(column.type, Boolean):
+        return False
+    if isinstance(column.type, (Integer, Float, Numeric)):
+        return index
+    length = getattr(column.type, 'length', None) or 50
+    return f'{column.name}-{index}'[:length]
+
+
+def _rows(model, count, **overrides):
+    """``count`` rows for ``model`` with every required column filled in.
+
+    Override values may be callables taking the row index.
+    """
+    now = datetime.utcnow()
+    rows = []
+    for index in range(count):
+        created_at = now - timedelta(minutes=index)
+        row = {'created_at': created_at} if 'created_at' in model.__table__.c else {}
+        for column in model.__table__.columns:
+            if column.primary_key or column.nullable or column.default is not None or column.name in row:
+                continue
+            row[column.name] = _column_value(column, index, created_at)
+        for name, value in overrides.items():
+            row[name] = value(index) if callable(value) else value
+        rows.append(row)
+    return rows
+
+
+@pytest.fixture(scope='session')
+def seed():
+    """``seed(model, count, **overrides)`` bulk inserts ``count`` rows and returns their ids"""
+    from app import db
+
+    def seed_rows(model, count, **overrides):
+        db.session.execute(insert(model), _rows(model, count, **overrides))
+        db.session.flush()
+        return db.session.execute(select(model.id).order_by(model.id)).scalars().all()[-count:]
+
+    return seed_rows
@@ -0,0 +1,165 @@
+"""
+Dashboard statistics
+Document counts for a user are read in a single SELECT of scalar count subqueries
+and the recent-activity feed in a single UNION ALL of per-document-type top-N
+selects, instead of two queries per document type on every page load. The
+result is cached per user for a short TTL and dropped as soon as one of that
+user's documents is created, changed or deleted.
+"""
+
+import logging
+from datetime import datetime
+
+from sqlalchemy import String, cast, event, func, literal, select, union_all
+
+from app import db
+from master_data_cache import master_data_cache
+from models import InventoryTransfer, PickList, InventoryCount, SAPInventoryCount, DirectInventoryTransfer
+from modules.grpo.models import GRPODocument
+from modules.multi_grn_creation.models import MultiGRNBatch
+
+logger = logging.getLogger(__name__)
+
+CACHE_NAMESPACE = 'dashboard'
+RECENT_ACTIVITY_LIMIT = 10
+
+# stats key -> model counted for the user
+COUNT_SOURCES = (
+    ('grpo_count', GRPODocument),
+    ('transfer_count', InventoryTransfer),
+    ('pick_list_count', PickList),
+    ('count_tasks', InventoryCount),
+    ('multi_grn_count', MultiGRNBatch),
+    ('direct_inventory_transfer_count', DirectInventoryTransfer),
+    ('sap_inventory_count', SAPInventoryCount),
+)
+STAT_KEYS = [key for key, _ in COUNT_SOURCES]
+
+
+def _activity_sources():
+    """(activity type, model, reference column, secondary reference column, status column, timestamp column)"""
+    return (
+        ('GRPO Created', GRPODocument, GRPODocument.po_number, None,
+         GRPODocument.status, GRPODocument.created_at),
+        ('Inventory Transfer', InventoryTransfer, InventoryTransfer.transfer_request_number, None,
+         InventoryTransfer.status, InventoryTransfer.created_at),
+        ('Pick List', PickList, PickList.pick_list_number, None,
+         PickList.status, PickList.created_at),
+        ('Inventory Count', InventoryCount, InventoryCount.count_number, None,
+         InventoryCount.status, InventoryCount.created_at),
+        ('SAP Inventory Count', SAPInventoryCount, SAPInventoryCount.doc_number, SAPInventoryCount.doc_entry,
+         SAPInventoryCount.document_status, SAPInventoryCount.loaded_at),
+        ('Multi GRN Batch', MultiGRNBatch, MultiGRNBatch.id, MultiGRNBatch.customer_name,
+         MultiGRNBatch.status, MultiGRNBatch.created_at),
+        ('Direct Inventory Transfer', DirectInventoryTransfer, DirectInventoryTransfer.transfer_number, None,
+         DirectInventoryTransfer.status, DirectInventoryTransfer.created_at),
+    )
+
+
+# activity type -> (description format, default status)
+ACTIVITY_FORMATS = {
+    'GRPO Created': ("PO: {ref}", None),
+    'Inventory Transfer': ("Request: {ref}", None),
+    'Pick List': ("List: {ref}", None),
+    'Inventory Count': ("Count: {ref}", 'active'),
+    'SAP Inventory Count': ("Doc: {ref} (DocEntry: {ref2})", 'Open'),
+    'Multi GRN Batch': ("Batch #{ref} - {ref2}", None),
+    'Direct Inventory Transfer': ("Transfer: {ref}", None),
+}
+
+
+def normalize_datetime(value):
+    """Convert a created_at/loaded_at value to a datetime object safely"""
+    if isinstance(value, datetime):
+        return value
+    if not value:
+        return datetime.min
+    try:
+        # Timestamps come back as text from the UNION, e.g. "2025-12-08 01:27:26.123456"
+        return datetime.fromisoformat(str(value).replace("Z", ""))
+    except ValueError:
+        try:
+            # Example input: "Mon, 08 Dec 2025 01:27:26 GMT"
+            return datetime.strptime(str(value).replace(" GMT", ""), "%a, %d %b %Y %H:%M:%S")
+        except ValueError:
+            return datetime.min
+
+
+def load_document_counts(user_id):
+    """All per-document-type counts for the user in one round trip"""
+    columns = [
+        select(func.count()).select_from(model).where(model.user_id == user_id).scalar_subquery().label(key)
+        for key, model in COUNT_SOURCES
+    ]
+    row = db.session.execute(select(*columns)).one()
+    return {key: row._mapping[key] or 0 for key in STAT_KEYS}
+
+
+def load_recent_activities(user_id, limit=RECENT_ACTIVITY_LIMIT):
+    """Latest documents of every type for the user, merged in one UNION ALL.
+
+    Each branch is limited to ``limit`` rows on its own so the database reads a
+    bounded number of rows per table no matter how much history the user has.
+    Timestamps are compared as ISO text because SAP inventory counts store
+    loaded_at as a string.
+    """
+    branches = []
+    for activity_type, model, ref, ref2, status, created_at in _activity_sources():
+        branch = (select(literal(activity_type).label('activity_type'),
+                         cast(ref, String).label('ref'),
+                         cast(ref2, String).label('ref2') if ref2 is not None else cast(literal(None), String).label('ref2'),
+                         status.label('status'),
+                         cast(created_at, String).label('created_at'))
+                  .where(model.user_id == user_id)
+                  .order_by(created_at.desc())
+                  .limit(limit)
+                  .subquery())
+        branches.append(select(branch))
+
+    merged = union_all(*branches).subquery()
+    rows = db.session.execute(
+        select(merged).order_by(merged.c.created_at.desc()).limit(limit)
+    ).all()
+
+    activities = []
+    for row in rows:
+        description, default_status = ACTIVITY_FORMATS[row.activity_type]
+        activities.append({
+            'type': row.activity_type,
+            'description': description.format(ref=row.ref, ref2=row.ref2),
+            'created_at': normalize_datetime(row.created_at),
+            'status': row.status or default_status,
+        })
+    activities.sort(key=lambda activity: activity['created_at'], reverse=True)
+    return activities
+
+
+def get_dashboard_data(user_id):
+    """Return ``{'stats', 'recent_activities'}`` for the user, cached briefly"""
+    found, data = master_data_cache.get(CACHE_NAMESPACE, user_id)
+    if found:
+        return data
+
+    data = {
+        'stats': load_document_counts(user_id),
+        'recent_activities': load_recent_activities(user_id),
+    }
+    master_data_cache.set(CACHE_NAMESPACE, user_id, data)
+    return data
+
+
+def invalidate_dashboard(user_id=None):
+    """Drop the cached dashboard of one user, or of everyone"""
+    if user_id is None:
+        return master_data_cache.invalidate(CACHE_NAMESPACE)
+    return master_data_cache.invalidate(CACHE_NAMESPACE, user_id)
+
+
+def _invalidate_owner(mapper, connection, target):
+    if getattr(target, 'user_id', None) is not None:
+        invalidate_dashboard(target.user_id)
+
+
+for _, _model in COUNT_SOURCES:
+    for _event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event_name, _invalidate_owner)
@@ -17,10 +17,10 @@ def create_grpo_with_sync(grpo_data):
         
         grpo = GRPODocument(**grpo_data)
         db.session.add(grpo)
-        db.session.commit()
         
-        # Sync to MySQL
+        # Queue the MySQL sync in the same transaction
         sync_model_change('grpo_document', 'INSERT', grpo_data)
+        db.session.commit()
         
         logging.info(f"✅ GRPO {grpo.po_number} created and synced to both databases")
         return grpo
@@ -45,11 +45,10 @@ def update_user_with_sync(user_id, update_data):
         for key, value in update_data.items():
             setattr(user, key, value)
         
+        # Queue the MySQL sync in the same transaction
+        sync_model_change('user', 'UPDATE', dict(update_data, id=user_id), "id = :id")
         db.session.commit()
         
-        # Sync to MySQL
-        sync_model_change('user', 'UPDATE', update_data, f"id = {user_id}")
-        
         logging.info(f"✅ User {user.username} updated and synced to both databases")
         return user
         
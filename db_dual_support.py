@@ -1,14 +1,15 @@
 """
 Dual Database Support Module
-Handles both SQLite (for Replit) and MySQL (for local development) synchronization
+Handles both SQLite (for Replit) and MySQL (for local development) synchronization.
+Changes for the MySQL mirror are queued in the replication outbox and replayed
+in the background (mysql_replication.py).
 """
 
 import os
 import logging
 from sqlalchemy import create_engine, text
-from sqlalchemy.exc import SQLAlchemyError
-import json
-from datetime import datetime
+
+from mysql_replication import record_change, start_mysql_replicator
 
 class DualDatabaseManager:
     """Manages dual database support for SQLite and MySQL"""
@@ -17,6 +18,7 @@ class DualDatabaseManager:
         self.app = app
         self.sqlite_engine = None
         self.mysql_engine = None
+        self.replication_enabled = False
         self.setup_engines()
     
     def setup_engines(self):
@@ -34,85 +36,67 @@ class DualDatabaseManager:
             'database': os.environ.get('MYSQL_DATABASE', 'wms_db_dev')
         }
         
+        # An explicitly configured mirror is replicated even if it is down right now;
+        # changes wait in the outbox until it is back
+        self.replication_enabled = bool(os.environ.get('MYSQL_HOST'))
         try:
             mysql_url = f"mysql+pymysql://{mysql_config['user']}:{mysql_config['password']}@{mysql_config['host']}:{mysql_config['port']}/{mysql_config['database']}"
-            self.mysql_engine = create_engine(mysql_url, connect_args={'connect_timeout': 5})
+            self.mysql_engine = create_engine(mysql_url, connect_args={'connect_timeout': 5}, pool_pre_ping=True)
             
             # Test the connection
             with self.mysql_engine.connect() as conn:
                 conn.execute(text("SELECT 1"))
                 
+            self.replication_enabled = True
             logging.info("✅ MySQL engine configured and connected successfully")
         except Exception as e:
-            logging.warning(f"⚠️ MySQL engine connection failed: {e}. Operating in SQLite-only mode.")
-            self.mysql_engine = None
+            if self.replication_enabled:
+                logging.warning(f"⚠️ MySQL engine connection failed: {e}. Changes are queued until the mirror is reachable.")
+            else:
+                logging.warning(f"⚠️ MySQL engine connection failed: {e}. Operating in SQLite-only mode.")
+                self.mysql_engine = None
     
     def sync_to_mysql(self, table_name, operation, data=None, where_clause=None):
-        """Synchronize changes to MySQL database"""
-        if not self.mysql_engine:
+        """Queue a change for the MySQL mirror in the current transaction.
+
+        Nothing is sent to MySQL here: the change is written to the replication
+        outbox with the caller's pending changes and replayed by the background
+        replicator (mysql_replication.py) once the caller commits.
+        """
+        if not self.replication_enabled:
             logging.debug(f"MySQL not available, skipping sync for {table_name}")
-            return
+            return None
         
         if not data and operation in ['INSERT', 'UPDATE']:
             logging.warning(f"No data provided for {operation} operation on {table_name}")
-            return
+            return None
         
-        try:
-            with self.mysql_engine.connect() as conn:
-                if operation == 'INSERT' and data:
-                    # Build INSERT statement
-                    columns = ', '.join(data.keys())
-                    placeholders = ', '.join([f":{key}" for key in data.keys()])
-                    sql = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
-                    conn.execute(text(sql), data)
-                    
-                elif operation == 'UPDATE' and data:
-                    # Build UPDATE statement
-                    set_clause = ', '.join([f"{key} = :{key}" for key in data.keys()])
-                    sql = f"UPDATE {table_name} SET {set_clause} WHERE {where_clause}"
-                    conn.execute(text(sql), data)
-                    
-                elif operation == 'DELETE':
-                    # Build DELETE statement
-                    sql = f"DELETE FROM {table_name} WHERE {where_clause}"
-                    conn.execute(text(sql), data or {})
-                
-                conn.commit()
-                logging.debug(f"✅ Synced {operation} to MySQL: {table_name}")
-                
-        except SQLAlchemyError as e:
-            logging.error(f"❌ MySQL sync failed for {table_name}: {e}")
-        except Exception as e:
-            logging.error(f"❌ Unexpected error during MySQL sync: {e}")
+        return record_change(table_name, operation, data, where_clause)
     
     def execute_dual_query(self, sql, params=None):
-        """Execute query on both databases"""
+        """Execute a statement on the primary database and queue it for the MySQL mirror.
+
+        Both run in a savepoint of the caller's session, so the statement and its
+        outbox entry are kept or undone together; committing is left to the
+        caller, and a failed statement does not discard the caller's pending
+        changes. Queries that return rows are only run on the primary database.
+        """
+        from app import db
         results = {'sqlite': [], 'mysql': []}
         
-        # Execute on SQLite
-        if self.sqlite_engine:
-            try:
-                with self.sqlite_engine.connect() as conn:
-                    result = conn.execute(text(sql), params or {})
-                    if result.returns_rows:
-                        results['sqlite'] = result.fetchall()
-                    else:
-                        results['sqlite'] = result.rowcount
-            except Exception as e:
-                logging.error(f"SQLite query failed: {e}")
-        
-        # Execute on MySQL if available
-        if self.mysql_engine:
-            try:
-                with self.mysql_engine.connect() as conn:
-                    result = conn.execute(text(sql), params or {})
-                    if result.returns_rows:
-                        results['mysql'] = result.fetchall()
-                    else:
-                        results['mysql'] = result.rowcount
-                    conn.commit()
-            except Exception as e:
-                logging.error(f"MySQL query failed: {e}")
+        try:
+            with db.session.begin_nested():
+                result = db.session.execute(text(sql), params or {})
+                if result.returns_rows:
+                    results['sqlite'] = result.fetchall()
+                else:
+                    results['sqlite'] = result.rowcount
+                    if self.replication_enabled:
+                        record_change('(sql)', 'SQL', params, statement=sql)
+                        results['mysql'] = 'queued'
+        except Exception as e:
+            logging.error(f"Primary database query failed: {e}")
+            results = {'sqlite': [], 'mysql': []}
         
         return results
 
@@ -123,6 +107,8 @@ def init_dual_database(app):
     """Initialize dual database support"""
     global dual_db_manager
     dual_db_manager = DualDatabaseManager(app)
+    if dual_db_manager.replication_enabled:
+        start_mysql_replicator(app, dual_db_manager.mysql_engine)
     return dual_db_manager
 
 def sync_model_change(model_name, operation, data, where_clause=None):
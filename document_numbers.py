@@ -0,0 +1,182 @@
+"""
+Document number allocator
+Hands out document numbers (serial transfer numbers, PDN external references,
+GRPO / pick list / transfer series numbers) without a query per number and
+without racing other workers:
+- a worker reserves a block of numbers (DOCUMENT_NUMBER_BLOCK_SIZE, default 10)
+  by advancing the counter row with one atomic UPDATE in its own short
+  transaction, then hands them out from memory;
+- blocks never overlap, so numbers are unique across threads, workers and hosts
+  without checking whether a number is already in use;
+- numbers a worker reserved but did not use (restart, new day) are skipped, so
+  numbering has gaps but no duplicates;
+- SQLite allows one writer at a time, so there the counter is advanced on the
+  caller's session connection, one number at a time, and rolls back with the
+  caller (see _reserves_in_session).
+
+Daily numbers count in document_number_counters, one row per prefix and day.
+Configured series (GRPO, PICKLIST, ...) keep counting in
+document_number_series.current_number; a changed prefix applies from the next
+block.
+
+    from document_numbers import next_daily_number, next_series_number
+    transfer_number = next_daily_number('ST')                  # ST-20261016-0001
+    external_ref = next_daily_number('EXT-REF', width=3)       # EXT-REF-20261016-001
+    grpo_number = next_series_number('GRPO')                   # GRPO-0042-2026
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models import DocumentNumberCounter, DocumentNumberSeries
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_NUMBER_BLOCK_SIZE = int(os.environ.get('DOCUMENT_NUMBER_BLOCK_SIZE', '10'))
+
+# Prefixes of series created on first use
+SERIES_PREFIXES = {
+    'GRPO': 'GRPO-',
+    'TRANSFER': 'TR-',
+    'PICKLIST': 'PL-'
+}
+
+
+def _advance(conn, table, condition, counter, count, *columns):
+    """Add count to a counter column of one row atomically.
+
+    Returns (new counter value, *columns), or None when no row matches.
+    """
+    stmt = update(table).where(condition).values(
+        {counter.name: func.coalesce(counter, 1) + count, 'updated_at': datetime.utcnow()})
+    if conn.dialect.update_returning:
+        return conn.execute(stmt.returning(counter, *columns)).first()
+    if conn.execute(stmt).rowcount == 0:
+        return None
+    # The row stays locked until commit, so this reads our own increment
+    return conn.execute(select(counter, *columns).where(condition)).first()
+
+
+def _reserves_in_session():
+    """True on SQLite: a second connection would wait for the write lock the
+    caller's session may already hold and fail with 'database is locked'"""
+    return db.engine.dialect.name == 'sqlite'
+
+
+def _reserve(table, condition, counter, count, new_row, *columns):
+    """First number of a reserved block and the extra columns of the counter row.
+
+    Creates the row (counting from 1) when it does not exist yet. Runs outside
+    the caller's session, so a rollback of the caller never hands the block out
+    twice - except on SQLite, where it runs on the session's connection.
+    """
+    if _reserves_in_session():
+        conn = db.session.connection()
+        row = _advance(conn, table, condition, counter, count, *columns)
+        if row is not None:
+            return row[0] - count, tuple(row[1:])
+        conn.execute(insert(table).values({**new_row, counter.name: 1 + count}))
+        return 1, tuple(new_row.get(column.name) for column in columns)
+
+    for _ in range(3):
+        with db.engine.begin() as conn:
+            row = _advance(conn, table, condition, counter, count, *columns)
+        if row is not None:
+            return row[0] - count, tuple(row[1:])
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(insert(table).values({**new_row, counter.name: 1 + count}))
+            return 1, tuple(new_row.get(column.name) for column in columns)
+        except IntegrityError:
+            continue  # another worker created the row first; advance it instead
+    raise RuntimeError(f"Could not reserve document numbers in {table.name}")
+
+
+def _reserve_daily(scope, count):
+    table = DocumentNumberCounter.__table__
+    now = datetime.utcnow()
+    return _reserve(table, table.c.scope == scope, table.c.next_value, count,
+                    {'scope': scope, 'updated_at': now})
+
+
+def _reserve_series(document_type, count):
+    table = DocumentNumberSeries.__table__
+    now = datetime.utcnow()
+    new_row = {'document_type': document_type, 'prefix': SERIES_PREFIXES.get(document_type, 'DOC-'),
+               'year_suffix': True, 'created_at': now, 'updated_at': now}
+    return _reserve(table, table.c.document_type == document_type, table.c.current_number, count,
+                    new_row, table.c.prefix, table.c.year_suffix)
+
+
+class _Block:
+    __slots__ = ('scope', 'next', 'end', 'extra')
+
+    def __init__(self, scope, first, count, extra):
+        self.scope = scope
+        self.next = first
+        self.end = first + count
+        self.extra = extra
+
+
+class DocumentNumberAllocator:
+    """Blocks of document numbers reserved by this process, one per counter"""
+
+    def __init__(self, block_size=DOCUMENT_NUMBER_BLOCK_SIZE):
+        self.block_size = max(1, block_size)
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Drop the reserved blocks; their unused numbers become gaps"""
+        self._lock = threading.Lock()
+        self._blocks = {}
+
+    def _take(self, key, scope, reserve):
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is None or block.scope != scope or block.next >= block.end:
+                # A block reserved in the caller's session is undone by its rollback,
+                # so only the number it uses may be taken from it
+                count = 1 if _reserves_in_session() else self.block_size
+                first, extra = reserve(scope, count)
+                block = self._blocks[key] = _Block(scope, first, count, extra)
+                logger.debug(f"🔢 Reserved {scope} numbers {first}-{block.end - 1}")
+            value = block.next
+            block.next += 1
+            return value, block.extra
+
+    def next_daily(self, prefix, day=None):
+        """(YYYYMMDD, number) for prefix on day (default today); numbers restart at 1 every day"""
+        day_key = (day or datetime.now()).strftime('%Y%m%d')
+        value, _ = self._take(('daily', prefix), f'{prefix}-{day_key}', _reserve_daily)
+        return day_key, value
+
+    def next_series(self, document_type):
+        """(number, prefix, year_suffix) of a DocumentNumberSeries"""
+        value, (prefix, year_suffix) = self._take(('series', document_type), document_type, _reserve_series)
+        return value, prefix, year_suffix
+
+
+allocator = DocumentNumberAllocator()
+
+# A forked worker must not hand out the blocks its parent reserved
+os.register_at_fork(after_in_child=allocator.reset)
+
+
+def next_daily_number(prefix, width=4, day=None):
+    """'<prefix>-YYYYMMDD-<number>', the number zero-padded to width"""
+    day_key, value = allocator.next_daily(prefix, day)
+    return f'{prefix}-{day_key}-{value:0{width}d}'
+
+
+def next_series_number(document_type):
+    """'<prefix><number:04d>', followed by '-<year>' when the series has a year suffix"""
+    value, prefix, year_suffix = allocator.next_series(document_type)
+    year_suffix = datetime.now().strftime('%Y') if year_suffix else ''
+    return f"{prefix}{value:04d}{'-' + year_suffix if year_suffix else ''}"
@@ -0,0 +1,235 @@
+"""
+Differential sync of SAP Inventory Counting lines
+Opening or saving a counting document costs time proportional to the lines
+that changed, not to the size of the document:
+- one query loads the stored lines of the document, keyed by line number;
+- new, changed and removed lines are each written with one bulk statement,
+  unchanged lines are not touched;
+- a save only PATCHes SAP with the lines whose submitted values differ from the
+  stored ones (SAPIntegration.update_inventory_counting splits them into
+  bounded requests).
+
+    from inventory_counting_sync import counting_lines, sync_counting_lines
+    inserted, updated, deleted = sync_counting_lines(local_doc.id, counting_lines(invcnt_data))
+
+    diff = diff_submitted_lines(local_doc.id, counting_lines(document))
+    result = sap.update_inventory_counting(doc_entry, dict(header, InventoryCountingLines=diff['lines']))
+    if result['success']:
+        apply_submitted_lines(local_doc.id, diff)
+"""
+
+import logging
+from datetime import datetime
+
+from sqlalchemy import delete, insert, select, update
+
+from app import db
+from models import SAPInventoryCountLine
+
+logger = logging.getLogger(__name__)
+
+LINE_KEYS = ('InventoryCountingLines', 'InventoryCountLines')
+
+# Line collections SAP keeps but the local table does not; lines carrying any are always sent
+UNTRACKED_COLLECTIONS = ('InventoryCountingSerialNumbers', 'InventoryCountingBatchNumbers')
+
+
+def counting_lines(document):
+    """Lines of a counting document, whichever of the two collection names it uses"""
+    for key in LINE_KEYS:
+        if document.get(key):
+            return document[key]
+    return []
+
+
+def safe_float(value, default=0):
+    if value is None or value == '':
+        return default
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return default
+
+
+def sap_line_values(line):
+    """Column values of a line as read from SAP (document opened in the counting screen)"""
+    in_whs_qty = safe_float(line.get('InWarehouseQuantity'), 0)
+    uom_counted_qty = safe_float(line.get('UoMCountedQuantity'), 0)
+    return {
+        'line_number': line.get('LineNumber'),
+        'item_code': line.get('ItemCode'),
+        'item_description': line.get('ItemDescription'),
+        'warehouse_code': line.get('WarehouseCode'),
+        'bin_entry': line.get('BinEntry'),
+        'in_warehouse_quantity': in_whs_qty,
+        'counted': line.get('Counted', 'tNO'),
+        'uom_code': line.get('UoMCode'),
+        'bar_code': line.get('BarCode'),
+        'items_per_unit': line.get('ItemsPerUnit', 1),
+        'counter_type': line.get('CounterType'),
+        'counter_id': line.get('CounterID'),
+        'multiple_counter_role': line.get('MultipleCounterRole'),
+        'line_status': line.get('LineStatus'),
+        'project_code': line.get('ProjectCode'),
+        'manufacturer': line.get('Manufacturer'),
+        'supplier_catalog_no': line.get('SupplierCatalogNo'),
+        'preferred_vendor': line.get('PreferredVendor'),
+        'cost_code': line.get('CostCode'),
+        'u_floor': line.get('U_Floor'),
+        'u_rack': line.get('U_Rack'),
+        'u_level': line.get('U_Level'),
+        'freeze': line.get('Freeze', 'tNO'),
+        'u_invcount': line.get('U_InvCount'),
+        'variance': uom_counted_qty - in_whs_qty,
+    }
+
+
+def _submitted_variance(line, counted_qty, in_whs_qty):
+    variance = line.get('Variance')
+    return counted_qty - in_whs_qty if variance is None else safe_float(variance, 0)
+
+
+def submitted_line_values(line, stored):
+    """Column values after saving a submitted line over its stored row (fields not sent keep their value)"""
+    in_whs_qty = safe_float(line.get('InWarehouseQuantity'), stored['in_warehouse_quantity'] or 0)
+    return {
+        'item_code': line.get('ItemCode', stored['item_code']),
+        'item_description': line.get('ItemDescription', stored['item_description']),
+        'warehouse_code': line.get('WarehouseCode', stored['warehouse_code']),
+        'bin_entry': line.get('BinEntry', stored['bin_entry']),
+        'in_warehouse_quantity': in_whs_qty,
+        'uom_code': line.get('UoMCode', stored['uom_code']),
+        'bar_code': line.get('BarCode', stored['bar_code']),
+        'items_per_unit': safe_float(line.get('ItemsPerUnit'), stored['items_per_unit'] or 1),
+        'counter_type': line.get('CounterType', stored['counter_type']),
+        'counter_id': line.get('CounterID', stored['counter_id']),
+        'line_status': line.get('LineStatus', stored['line_status']),
+        'u_floor': line.get('U_Floor', stored['u_floor']),
+        'u_rack': line.get('U_Rack', stored['u_rack']),
+        'u_level': line.get('U_Level', stored['u_level']),
+        'counted': line.get('Counted', 'tNO'),
+        'variance': _submitted_variance(
+            line, safe_float(line.get('UoMCountedQuantity'), stored['uom_counted_quantity'] or 0), in_whs_qty),
+    }
+
+
+def new_submitted_line_values(line):
+    """Column values of a submitted line that is not stored locally yet"""
+    in_whs_qty = safe_float(line.get('InWarehouseQuantity'), 0)
+    return {
+        'line_number': line.get('LineNumber', 0),
+        'item_code': line.get('ItemCode', ''),
+        'item_description': line.get('ItemDescription', ''),
+        'warehouse_code': line.get('WarehouseCode', ''),
+        'bin_entry': line.get('BinEntry'),
+        'in_warehouse_quantity': in_whs_qty,
+        'counted': line.get('Counted', 'tNO'),
+        'uom_code': line.get('UoMCode', ''),
+        'bar_code': line.get('BarCode', ''),
+        'items_per_unit': safe_float(line.get('ItemsPerUnit'), 1),
+        'variance': _submitted_variance(line, safe_float(line.get('UoMCountedQuantity'), 0), in_whs_qty),
+        'counter_type': line.get('CounterType', ''),
+        'counter_id': line.get('CounterID'),
+        'line_status': line.get('LineStatus', ''),
+        'u_floor': line.get('U_Floor', ''),
+        'u_rack': line.get('U_Rack', ''),
+        'u_level': line.get('U_Level', ''),
+    }
+
+
+_STORED_COLUMNS = [SAPInventoryCountLine.id, SAPInventoryCountLine.uom_counted_quantity] + [
+    getattr(SAPInventoryCountLine, name) for name in sap_line_values({})]
+
+
+def load_counting_lines(count_id):
+    """{line_number: stored column values} of a counting document, in one query"""
+    if count_id is None:
+        return {}
+    rows = db.session.execute(select(*_STORED_COLUMNS).where(SAPInventoryCountLine.count_id == count_id))
+    return {row['line_number']: dict(row) for row in rows.mappings()}
+
+
+def _same(stored, new):
+    if isinstance(stored, (int, float)) and isinstance(new, (int, float)) \
+            and not isinstance(stored, bool) and not isinstance(new, bool):
+        return abs(stored - new) < 1e-9
+    return stored == new
+
+
+def _changed(stored, values):
+    return any(not _same(stored[key], value) for key, value in values.items())
+
+
+def sync_counting_lines(count_id, sap_lines):
+    """Bring the stored lines of a counting document in line with the lines SAP returned.
+
+    Lines SAP no longer has are deleted, new ones inserted and only lines whose
+    values differ are updated, one bulk statement each. Does not commit.
+
+    Returns:
+        tuple: (lines inserted, lines updated, lines deleted)
+    """
+    stored = load_counting_lines(count_id)
+    now = datetime.utcnow()
+    inserts, updates, seen = [], [], set()
+    for line in sap_lines:
+        values = sap_line_values(line)
+        line_number = values['line_number']
+        if line_number is None or line_number in seen:
+            continue
+        seen.add(line_number)
+        current = stored.get(line_number)
+        if current is None:
+            inserts.append(dict(values, count_id=count_id))
+        elif _changed(current, values):
+            updates.append(dict(values, id=current['id'], updated_at=now))
+
+    removed = [row['id'] for line_number, row in stored.items() if line_number not in seen]
+    if removed:
+        db.session.execute(delete(SAPInventoryCountLine).where(SAPInventoryCountLine.id.in_(removed))
+                           .execution_options(synchronize_session=False))
+    if updates:
+        db.session.execute(update(SAPInventoryCountLine), updates)
+    if inserts:
+        # Keep NULLs explicit so rows with different missing fields still go in one executemany
+        db.session.execute(insert(SAPInventoryCountLine).execution_options(render_nulls=True), inserts)
+    return len(inserts), len(updates), len(removed)
+
+
+def diff_submitted_lines(count_id, submitted_lines):
+    """Compare the lines submitted from the counting screen with the stored lines.
+
+    Returns:
+        dict: {'lines': submitted lines to PATCH to SAP, 'updates': rows to update
+        locally after SAP accepted them, 'inserts': rows not stored yet}
+    """
+    stored = load_counting_lines(count_id)
+    now = datetime.utcnow()
+    diff = {'lines': [], 'updates': [], 'inserts': []}
+    for line in submitted_lines:
+        line_number = line.get('LineNumber')
+        current = stored.get(line_number)
+        untracked = any(line.get(key) for key in UNTRACKED_COLLECTIONS)
+        if current is None:
+            diff['lines'].append(line)
+            if line_number is not None:
+                diff['inserts'].append(new_submitted_line_values(line))
+            continue
+        values = submitted_line_values(line, current)
+        if _changed(current, values):
+            diff['lines'].append(line)
+            diff['updates'].append(dict(values, id=current['id'], updated_at=now))
+        elif untracked:
+            diff['lines'].append(line)
+    return diff
+
+
+def apply_submitted_lines(count_id, diff):
+    """Write the local side of a saved counting (see diff_submitted_lines). Does not commit."""
+    if diff['updates']:
+        db.session.execute(update(SAPInventoryCountLine), diff['updates'])
+    if diff['inserts']:
+        db.session.execute(insert(SAPInventoryCountLine).execution_options(render_nulls=True),
+                           [dict(row, count_id=count_id) for row in diff['inserts']])
+    logger.info(f"✅ Counting document {count_id}: {len(diff['updates'])} lines updated, "
+                f"{len(diff['inserts'])} added locally")
@@ -0,0 +1,162 @@
+"""
+Process-level SAP master data cache
+Warehouses, bin lists, document series and item management flags change rarely,
+so they are kept per namespace with a TTL, bounded in size with LRU eviction and
+explicitly invalidated after master data syncs. Per-user dashboard statistics
+and serial warehouse locations share the same cache under short-lived
+'dashboard' and 'serial_locations' namespaces.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Default time-to-live per namespace (seconds)
+NAMESPACE_TTLS = {
+    'warehouses': 600,
+    'bins': 300,
+    'series': 3600,
+    'item_flags': 900,
+    'dashboard': int(os.environ.get('DASHBOARD_CACHE_TTL', '30')),
+    # Serial -> warehouse locations read by bulk serial validation; also dropped
+    # for the serials of every stock transfer we post
+    'serial_locations': int(os.environ.get('SERIAL_LOCATION_CACHE_TTL', '60')),
+}
+DEFAULT_TTL = 300
+
+
+class MasterDataCache:
+    """Thread-safe TTL + LRU cache keyed by (namespace, key)"""
+
+    def __init__(self, max_entries=5000, ttls=None):
+        self.max_entries = max_entries
+        self.ttls = dict(NAMESPACE_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _namespace_stats(self, namespace):
+        return self._stats.setdefault(namespace, {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0})
+
+    def get(self, namespace, key):
+        """Return (found, value) for a cached entry"""
+        cache_key = (namespace, key)
+        with self._lock:
+            stats = self._namespace_stats(namespace)
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                stats['misses'] += 1
+                return False, None
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[cache_key]
+                stats['misses'] += 1
+                return False, None
+            self._entries.move_to_end(cache_key)
+            stats['hits'] += 1
+            return True, _detach(value)
+
+    def set(self, namespace, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttls.get(namespace, DEFAULT_TTL)
+        cache_key = (namespace, key)
+        with self._lock:
+            self._entries[cache_key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                (evicted_namespace, _), _ = self._entries.popitem(last=False)
+                self._namespace_stats(evicted_namespace)['evictions'] += 1
+
+    def get_or_load(self, namespace, key, loader, should_cache=None, ttl=None):
+        """Return the cached value or call ``loader()`` and cache its result.
+
+        ``should_cache(value)`` decides whether a freshly loaded value is kept;
+        by default empty results and failed ``{'success': False}`` responses are
+        not cached so that a transient SAP outage is retried on the next call.
+        """
+        found, value = self.get(namespace, key)
+        if found:
+            return value
+
+        value = loader()
+        keep = should_cache(value) if should_cache else is_cacheable_result(value)
+        if keep:
+            self.set(namespace, key, value, ttl=ttl)
+            return _detach(value)
+        return value
+
+    def invalidate(self, namespace=None, key=None):
+        """Drop one entry, one namespace, or everything (namespace=None)"""
+        with self._lock:
+            if namespace is None:
+                removed = len(self._entries)
+                self._entries.clear()
+            elif key is not None:
+                removed = 1 if self._entries.pop((namespace, key), None) is not None else 0
+            else:
+                doomed = [cache_key for cache_key in self._entries if cache_key[0] == namespace]
+                for cache_key in doomed:
+                    del self._entries[cache_key]
+                removed = len(doomed)
+            if namespace is not None:
+                self._namespace_stats(namespace)['invalidations'] += 1
+        logger.info(f"🧹 Master data cache invalidated: namespace={namespace or 'ALL'}, entries={removed}")
+        return removed
+
+    def invalidate_keys(self, namespace, keys):
+        """Drop several entries of one namespace at once"""
+        with self._lock:
+            removed = sum(1 for key in keys if self._entries.pop((namespace, key), None) is not None)
+            self._namespace_stats(namespace)['invalidations'] += 1
+        logger.debug(f"🧹 Master data cache invalidated: namespace={namespace}, entries={removed}")
+        return removed
+
+    def get_stats(self):
+        with self._lock:
+            sizes = {}
+            for namespace, _ in self._entries:
+                sizes[namespace] = sizes.get(namespace, 0) + 1
+            namespaces = {}
+            for namespace, stats in self._stats.items():
+                lookups = stats['hits'] + stats['misses']
+                namespaces[namespace] = {
+                    **stats,
+                    'entries': sizes.get(namespace, 0),
+                    'ttl_seconds': self.ttls.get(namespace, DEFAULT_TTL),
+                    'hit_ratio': round(stats['hits'] / lookups, 3) if lookups else 0.0,
+                }
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'namespaces': namespaces,
+            }
+
+
+def _detach(value):
+    """Hand out a shallow copy so callers that append/update results cannot corrupt the cache"""
+    if isinstance(value, list):
+        return list(value)
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+
+def is_cacheable_result(value):
+    if value is None:
+        return False
+    if isinstance(value, dict) and 'success' in value:
+        return bool(value.get('success'))
+    if isinstance(value, (list, tuple, dict)):
+        return len(value) > 0
+    return True
+
+
+master_data_cache = MasterDataCache(
+    max_entries=int(os.environ.get('MASTER_DATA_CACHE_MAX_ENTRIES', '5000'))
+)
@@ -0,0 +1,304 @@
+"""
+Incremental SAP B1 master data sync
+Warehouses, bin locations and business partners are downloaded page by page
+(the next page is fetched while the current one is written) and written with
+multi-row upserts (INSERT ... ON CONFLICT on PostgreSQL/SQLite,
+ON DUPLICATE KEY UPDATE on MySQL) in batches of a few thousand rows, instead of
+a SELECT plus a single-row INSERT/UPDATE per record.
+
+Entities whose Service Layer collection exposes UpdateDate/UpdateTime are synced
+as a delta: only rows changed since the high-water mark stored in
+sap_sync_states are requested. A full sync re-reads everything and resets the mark.
+
+    python master_data_sync.py                 # delta sync of every entity
+    python master_data_sync.py --full          # nightly full sync
+    python master_data_sync.py business_partners
+"""
+
+import logging
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import Boolean, Column, DateTime, Integer, MetaData, String, Table, Text, inspect
+
+from app import db
+from master_data_cache import master_data_cache
+from models import BinLocation, SAPSyncState
+from models_extensions import Branch
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = int(os.environ.get('SAP_SYNC_PAGE_SIZE', '500'))
+UPSERT_BATCH_SIZE = int(os.environ.get('SAP_SYNC_UPSERT_BATCH', '2000'))
+
+# business_partners has no model; it used to be created with raw DDL per database
+sync_metadata = MetaData()
+business_partners_table = Table(
+    'business_partners', sync_metadata,
+    Column('id', Integer, primary_key=True),
+    Column('card_code', String(50), unique=True, nullable=False),
+    Column('card_name', String(200), nullable=False),
+    Column('card_type', String(20), nullable=False),
+    Column('phone', String(50)),
+    Column('email', String(100)),
+    Column('address', Text),
+    Column('is_active', Boolean, default=True),
+    Column('created_at', DateTime, default=datetime.utcnow),
+    Column('updated_at', DateTime, default=datetime.utcnow),
+)
+
+
+class MasterDataEntity:
+    """One SAP collection mirrored into a local table"""
+
+    def __init__(self, name, path, select, table, key_candidates, update_columns, to_row,
+                 base_filter=None, delta=False, cache_namespace=None):
+        self.name = name
+        self.path = path
+        self.select = select
+        self.table = table
+        # Unique column sets the rows may conflict on, in order of preference;
+        # the first one the live table actually has a unique key for is used
+        self.key_candidates = key_candidates
+        self.update_columns = update_columns
+        self.to_row = to_row
+        self.base_filter = base_filter
+        self.delta = delta
+        self.cache_namespace = cache_namespace
+
+
+def _warehouse_row(wh, now):
+    if not wh.get('WarehouseCode'):
+        return None
+    return {
+        'id': wh.get('WarehouseCode'),
+        'name': wh.get('WarehouseName', ''),
+        'address': wh.get('Street', ''),
+        'is_active': wh.get('Inactive') != 'Y',
+        'created_at': now,
+        'updated_at': now,
+    }
+
+
+def _bin_row(bin_data, now):
+    # Use 'Warehouse' not 'WarehouseCode'
+    if not bin_data.get('BinCode') or not bin_data.get('Warehouse'):
+        return None
+    return {
+        'bin_code': bin_data.get('BinCode'),
+        'warehouse_code': bin_data.get('Warehouse'),
+        'bin_name': bin_data.get('Description', ''),
+        'is_active': bin_data.get('Inactive') != 'Y',
+        'created_at': now,
+        'updated_at': now,
+    }
+
+
+def _business_partner_row(partner, now):
+    if not partner.get('CardCode'):
+        return None
+    return {
+        'card_code': partner.get('CardCode'),
+        'card_name': partner.get('CardName') or '',
+        'card_type': partner.get('CardType') or '',
+        'phone': partner.get('Phone1') or '',
+        'email': partner.get('EmailAddress') or '',
+        'address': partner.get('Address') or '',
+        'is_active': partner.get('Valid') == 'Y',
+        'created_at': now,
+        'updated_at': now,
+    }
+
+
+MASTER_DATA_ENTITIES = {
+    entity.name: entity for entity in (
+        MasterDataEntity('warehouses', 'Warehouses', 'WarehouseCode,WarehouseName,Street,Inactive',
+                         Branch.__table__, [('id',)], ['name', 'address', 'is_active', 'updated_at'],
+                         _warehouse_row, cache_namespace='warehouses'),
+        MasterDataEntity('bins', 'BinLocations', 'BinCode,Warehouse,Description,Inactive',
+                         BinLocation.__table__, [('bin_code', 'warehouse_code'), ('bin_code',)],
+                         ['warehouse_code', 'bin_name', 'is_active', 'updated_at'],
+                         _bin_row, cache_namespace='bins'),
+        MasterDataEntity('business_partners', 'BusinessPartners',
+                         'CardCode,CardName,CardType,Phone1,EmailAddress,Address,Valid,UpdateDate,UpdateTime',
+                         business_partners_table, [('card_code',)],
+                         ['card_name', 'card_type', 'phone', 'email', 'address', 'is_active', 'updated_at'],
+                         _business_partner_row,
+                         base_filter="CardType eq 'cSupplier' or CardType eq 'cCustomer'", delta=True),
+    )
+}
+
+
+def conflict_columns(table, candidates):
+    """The first candidate column set that has a unique key on the live table"""
+    inspector = inspect(db.engine)
+    unique_sets = [set(inspector.get_pk_constraint(table.name)['constrained_columns'])]
+    unique_sets += [set(c['column_names']) for c in inspector.get_unique_constraints(table.name)]
+    unique_sets += [set(i['column_names']) for i in inspector.get_indexes(table.name) if i.get('unique')]
+    for candidate in candidates:
+        if set(candidate) in unique_sets:
+            return candidate
+    raise RuntimeError(f"{table.name} has no unique key on any of {candidates}")
+
+
+def bulk_upsert(table, rows, key_columns, update_columns, batch_size=UPSERT_BATCH_SIZE):
+    """Insert or update ``rows`` (dicts with the same keys) with multi-row upserts"""
+    if not rows:
+        return 0
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    statement = insert(table)
+    if dialect == 'mysql':
+        statement = statement.on_duplicate_key_update(
+            {column: statement.inserted[column] for column in update_columns})
+    else:
+        statement = statement.on_conflict_do_update(
+            index_elements=list(key_columns),
+            set_={column: statement.excluded[column] for column in update_columns})
+
+    # Executed with a parameter list, the statement is compiled once and the driver
+    # sends each batch as multi-row VALUES (PostgreSQL/MySQL) or one executemany (SQLite)
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(statement, rows[start:start + batch_size])
+    return len(rows)
+
+
+def update_mark(row):
+    """(UpdateDate, UpdateTime) of a SAP row as sortable strings"""
+    update_date = str(row.get('UpdateDate') or '')[:10]
+    update_time = str(row.get('UpdateTime') or '')[:8]
+    return update_date, update_time
+
+
+def delta_filter(state):
+    """OData filter for rows changed at or after the stored high-water mark"""
+    update_date, update_time = state.last_update_date, state.last_update_time or '00:00:00'
+    return (f"UpdateDate gt '{update_date}' or "
+            f"(UpdateDate eq '{update_date}' and UpdateTime ge '{update_time}')")
+
+
+def sync_entity(sap, entity, full=False, extra_filter=None):
+    """
+    Mirror one SAP collection into its local table
+
+    Args:
+        sap: Logged-in SAPIntegration
+        entity (str|MasterDataEntity): Entity or its name in MASTER_DATA_ENTITIES
+        full (bool): Ignore the high-water mark and re-read the whole collection
+        extra_filter (str): Additional OData filter; a filtered sync does not move the mark
+
+    Returns:
+        dict: {'success', 'entity', 'mode', 'rows', 'pages', 'elapsed_ms', 'error'}
+    """
+    if isinstance(entity, str):
+        entity = MASTER_DATA_ENTITIES[entity]
+    started = time.monotonic()
+    now = datetime.utcnow()
+
+    state = db.session.get(SAPSyncState, entity.name) or SAPSyncState(entity=entity.name)
+    mode = 'delta' if entity.delta and not full and state.last_update_date else 'full'
+    filters = [entity.base_filter, extra_filter, delta_filter(state) if mode == 'delta' else None]
+    params = {'$select': entity.select}
+    filters = [f'({f})' for f in filters if f]
+    if filters:
+        params['$filter'] = ' and '.join(filters)
+
+    rows_written = pages = 0
+    high_mark = (state.last_update_date or '', state.last_update_time or '') if mode == 'delta' else ('', '')
+    try:
+        if entity.table is business_partners_table:
+            business_partners_table.create(db.engine, checkfirst=True)
+        key_columns = conflict_columns(entity.table, entity.key_candidates)
+
+        pending = {}
+        for page in sap.iter_pages(entity.path, params=params, page_size=PAGE_SIZE, prefetch=True):
+            pages += 1
+            for record in page:
+                row = entity.to_row(record, now)
+                if row is None:
+                    continue
+                # One row per key per statement - PostgreSQL rejects touching a row twice
+                pending[tuple(row[column] for column in key_columns)] = row
+                if entity.delta:
+                    high_mark = max(high_mark, update_mark(record))
+            if len(pending) >= UPSERT_BATCH_SIZE:
+                rows_written += bulk_upsert(entity.table, list(pending.values()), key_columns, entity.update_columns)
+                pending = {}
+        rows_written += bulk_upsert(entity.table, list(pending.values()), key_columns, entity.update_columns)
+
+        elapsed_ms = int((time.monotonic() - started) * 1000)
+        if extra_filter is None:
+            if high_mark[0]:
+                state.last_update_date, state.last_update_time = high_mark
+            state.last_mode = mode
+            state.last_row_count = rows_written
+            state.last_duration_ms = elapsed_ms
+            state.last_error = None
+            state.last_synced_at = now
+            if mode == 'full':
+                state.last_full_sync_at = now
+            db.session.add(state)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"❌ Error syncing {entity.name} from SAP B1: {str(e)}")
+        if extra_filter is None:
+            try:
+                state = db.session.get(SAPSyncState, entity.name) or SAPSyncState(entity=entity.name)
+                state.last_error = str(e)[:2000]
+                db.session.add(state)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+        return {'success': False, 'entity': entity.name, 'mode': mode, 'rows': rows_written, 'pages': pages,
+                'elapsed_ms': int((time.monotonic() - started) * 1000), 'error': str(e)}
+
+    if entity.cache_namespace:
+        master_data_cache.invalidate(entity.cache_namespace)
+    logger.info(f"✅ Synced {rows_written} {entity.name} from SAP B1 ({mode}, {pages} pages, {elapsed_ms}ms)")
+    return {'success': True, 'entity': entity.name, 'mode': mode, 'rows': rows_written, 'pages': pages,
+            'elapsed_ms': elapsed_ms, 'error': None}
+
+
+def sync_master_data(sap, full=False, entities=None):
+    """Sync several entities (default: all); returns entity name -> sync_entity() result"""
+    return {name: sync_entity(sap, name, full=full) for name in (entities or MASTER_DATA_ENTITIES)}
+
+
+def sync_states():
+    """Stored high-water marks and last run of every entity"""
+    states = {state.entity: state.to_dict() for state in SAPSyncState.query.all()}
+    return {name: states.get(name, {'entity': name}) for name in MASTER_DATA_ENTITIES}
+
+
+if __name__ == '__main__':
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Sync SAP B1 master data into the WMS database')
+    parser.add_argument('entities', nargs='*', help=f"Entities to sync (default: all of {', '.join(MASTER_DATA_ENTITIES)})")
+    parser.add_argument('--full', action='store_true', help='Re-read everything instead of the delta')
+    args = parser.parse_args()
+    unknown = set(args.entities) - set(MASTER_DATA_ENTITIES)
+    if unknown:
+        parser.error(f"unknown entities: {', '.join(sorted(unknown))}")
+
+    from app import app as flask_app
+    from sap_integration import SAPIntegration
+
+    with flask_app.app_context():
+        sap_integration = SAPIntegration()
+        if not sap_integration.ensure_logged_in():
+            raise SystemExit("SAP B1 not available")
+        results = sync_master_data(sap_integration, full=args.full, entities=args.entities or None)
+    for name, result in results.items():
+        print(f"{name}: {'ok' if result['success'] else 'FAILED'} {result['mode']} "
+              f"{result['rows']} rows in {result['elapsed_ms']}ms {result['error'] or ''}")
+    raise SystemExit(0 if all(result['success'] for result in results.values()) else 1)
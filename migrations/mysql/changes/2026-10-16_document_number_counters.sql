@@ -0,0 +1,32 @@
+-- Migration: Document Number Counters
+-- Date: 2026-10-16
+-- Description: Daily document numbers (serial transfer ST-YYYYMMDD-NNNN, PDN external reference
+--              EXT-REF-YYYYMMDD-NNN) are handed out from blocks reserved on a counter row
+--              (document_numbers.py) instead of random suffixes checked against the table and the
+--              pdn_sequence table created on every call.
+-- Type: New Table
+
+-- ==================== UP ====================
+CREATE TABLE IF NOT EXISTS document_number_counters (
+    scope VARCHAR(50) PRIMARY KEY,           -- prefix and day, e.g. ST-20261016
+    next_value INT NOT NULL DEFAULT 1,       -- first number not reserved yet
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Carry today's external reference numbering over from pdn_sequence (created by
+-- the old generator on first use, so it may not exist); without this the next
+-- EXT-REF of the day would start again at 001
+SET @seed_ext_ref = IF(
+    (SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES
+     WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'pdn_sequence') > 0,
+    'INSERT INTO document_number_counters (scope, next_value)
+     SELECT CONCAT(''EXT-REF-'', date_key), sequence_number + 1 FROM pdn_sequence
+     WHERE date_key = DATE_FORMAT(CURDATE(), ''%Y%m%d'')
+     ON DUPLICATE KEY UPDATE next_value = GREATEST(next_value, VALUES(next_value))',
+    'DO 0');
+PREPARE seed_ext_ref FROM @seed_ext_ref;
+EXECUTE seed_ext_ref;
+DEALLOCATE PREPARE seed_ext_ref;
+
+-- ==================== DOWN ====================
+-- DROP TABLE IF EXISTS document_number_counters;
@@ -0,0 +1,89 @@
+-- Migration: Hot-path composite indexes
+-- Date: 2026-10-16
+-- Description: Composite indexes for the inventory transfer scan checks, Multi GRN verification,
+--              the serial item transfer duplicate check, the line items loaded by the QC work queue,
+--              and the QC queue / per-user document lists ((status, created_at) and
+--              (user_id, created_at) on every document table).
+--              ALGORITHM=INPLACE, LOCK=NONE builds them online without blocking writes.
+--              mysql_consolidated_migration.py applies the same indexes idempotently and skips any
+--              whose columns are already covered by an existing index; prefer running that.
+-- Type: Index Change
+
+-- ==================== UP ====================
+-- Inventory transfer QR scanning: "GRN already transferred" check
+-- (the transfer_id + item_code + pack_key lookups are served by uq_transfer_item_pack)
+CREATE INDEX idx_transfer_scan_states_grn ON transfer_scan_states (transfer_id, grn_id, transfer_status) ALGORITHM=INPLACE LOCK=NONE;
+
+-- Multi GRN verification: batch/serial details of a line selection, line selections of a PO link
+-- (skip those covered by idx_batch_line_selection / idx_serial_line_selection / idx_line_po_link from mysql_consolidated_migration.py)
+CREATE INDEX ix_multi_grn_batch_details_line_selection_id ON multi_grn_batch_details (line_selection_id) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX ix_multi_grn_serial_details_line_selection_id ON multi_grn_serial_details (line_selection_id) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX ix_multi_grn_line_selections_po_link_id ON multi_grn_line_selections (po_link_id) ALGORITHM=INPLACE LOCK=NONE;
+
+-- Serial item transfer: duplicate serial check within a transfer
+-- (skip if the unique key unique_serial_per_transfer exists)
+CREATE INDEX idx_serial_item_transfer_items_serial ON serial_item_transfer_items (serial_item_transfer_id, serial_number) ALGORITHM=INPLACE LOCK=NONE;
+
+-- Document tables: QC queues (status, newest first) and per-user lists/dashboard (user, newest first)
+CREATE INDEX idx_grpo_documents_status_created ON grpo_documents (status, created_at) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX idx_grpo_documents_user_created ON grpo_documents (user_id, created_at) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX idx_inventory_transfers_status_created ON inventory_transfers (status, created_at) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX idx_inventory_transfers_user_created ON inventory_transfers (user_id, created_at) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX idx_pick_lists_status_created ON pick_lists (status, created_at) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX idx_pick_lists_user_created ON pick_lists (user_id, created_at) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX idx_inventory_counts_status_created ON inventory_counts (status, created_at) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX idx_inventory_counts_user_created ON inventory_counts (user_id, created_at) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX idx_serial_number_transfers_status_created ON serial_number_transfers (status, created_at) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX idx_serial_number_transfers_user_created ON serial_number_transfers (user_id, created_at) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX idx_serial_item_transfers_status_created ON serial_item_transfers (status, created_at) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX idx_serial_item_transfers_user_created ON serial_item_transfers (user_id, created_at) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX idx_direct_inventory_transfers_status_created ON direct_inventory_transfers (status, created_at) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX idx_direct_inventory_transfers_user_created ON direct_inventory_transfers (user_id, created_at) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX idx_multi_grn_document_status_created ON multi_grn_document (status, created_at) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX idx_multi_grn_document_user_created ON multi_grn_document (user_id, created_at) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX idx_delivery_documents_status_created ON delivery_documents (status, created_at) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX idx_delivery_documents_user_created ON delivery_documents (user_id, created_at) ALGORITHM=INPLACE LOCK=NONE;
+
+-- QC work queue: line items eager loaded per page of documents
+-- (skip those the table already has from mysql_consolidated_migration.py, e.g. idx_grpo_id)
+CREATE INDEX ix_grpo_items_grpo_id ON grpo_items (grpo_id) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX ix_inventory_transfer_items_inventory_transfer_id ON inventory_transfer_items (inventory_transfer_id) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX ix_serial_number_transfer_items_serial_transfer_id ON serial_number_transfer_items (serial_transfer_id) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX ix_serial_number_transfer_serials_transfer_item_id ON serial_number_transfer_serials (transfer_item_id) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX ix_direct_inventory_transfer_items_direct_inventory_transfer_id ON direct_inventory_transfer_items (direct_inventory_transfer_id) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX ix_delivery_items_delivery_id ON delivery_items (delivery_id) ALGORITHM=INPLACE LOCK=NONE;
+
+-- Dashboard: SAP inventory counts of a user
+CREATE INDEX idx_sap_inventory_counts_user_loaded ON sap_inventory_counts (user_id, loaded_at) ALGORITHM=INPLACE LOCK=NONE;
+
+-- ==================== DOWN ====================
+-- DROP INDEX idx_transfer_scan_states_grn ON transfer_scan_states;
+-- DROP INDEX ix_multi_grn_batch_details_line_selection_id ON multi_grn_batch_details;
+-- DROP INDEX ix_multi_grn_serial_details_line_selection_id ON multi_grn_serial_details;
+-- DROP INDEX idx_serial_item_transfer_items_serial ON serial_item_transfer_items;
+-- DROP INDEX ix_multi_grn_line_selections_po_link_id ON multi_grn_line_selections;
+-- DROP INDEX ix_grpo_items_grpo_id ON grpo_items;
+-- DROP INDEX ix_inventory_transfer_items_inventory_transfer_id ON inventory_transfer_items;
+-- DROP INDEX ix_serial_number_transfer_items_serial_transfer_id ON serial_number_transfer_items;
+-- DROP INDEX ix_serial_number_transfer_serials_transfer_item_id ON serial_number_transfer_serials;
+-- DROP INDEX ix_direct_inventory_transfer_items_direct_inventory_transfer_id ON direct_inventory_transfer_items;
+-- DROP INDEX ix_delivery_items_delivery_id ON delivery_items;
+-- DROP INDEX idx_sap_inventory_counts_user_loaded ON sap_inventory_counts;
+-- DROP INDEX idx_grpo_documents_status_created ON grpo_documents;
+-- DROP INDEX idx_grpo_documents_user_created ON grpo_documents;
+-- DROP INDEX idx_inventory_transfers_status_created ON inventory_transfers;
+-- DROP INDEX idx_inventory_transfers_user_created ON inventory_transfers;
+-- DROP INDEX idx_pick_lists_status_created ON pick_lists;
+-- DROP INDEX idx_pick_lists_user_created ON pick_lists;
+-- DROP INDEX idx_inventory_counts_status_created ON inventory_counts;
+-- DROP INDEX idx_inventory_counts_user_created ON inventory_counts;
+-- DROP INDEX idx_serial_number_transfers_status_created ON serial_number_transfers;
+-- DROP INDEX idx_serial_number_transfers_user_created ON serial_number_transfers;
+-- DROP INDEX idx_serial_item_transfers_status_created ON serial_item_transfers;
+-- DROP INDEX idx_serial_item_transfers_user_created ON serial_item_transfers;
+-- DROP INDEX idx_direct_inventory_transfers_status_created ON direct_inventory_transfers;
+-- DROP INDEX idx_direct_inventory_transfers_user_created ON direct_inventory_transfers;
+-- DROP INDEX idx_multi_grn_document_status_created ON multi_grn_document;
+-- DROP INDEX idx_multi_grn_document_user_created ON multi_grn_document;
+-- DROP INDEX idx_delivery_documents_status_created ON delivery_documents;
+-- DROP INDEX idx_delivery_documents_user_created ON delivery_documents;
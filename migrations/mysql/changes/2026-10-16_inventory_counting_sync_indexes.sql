@@ -0,0 +1,12 @@
+-- Migration: Inventory counting sync index
+-- Date: 2026-10-16
+-- Description: Index used by the differential inventory counting sync (inventory_counting_sync.py),
+--              which loads all stored lines of a counting document in one query. InnoDB already
+--              indexes the count_id foreign key, so mysql_consolidated_migration.py usually skips it.
+-- Type: Index Change
+
+-- ==================== UP ====================
+CREATE INDEX ix_sap_inventory_count_lines_count_id ON sap_inventory_count_lines (count_id) ALGORITHM=INPLACE LOCK=NONE;
+
+-- ==================== DOWN ====================
+-- DROP INDEX ix_sap_inventory_count_lines_count_id ON sap_inventory_count_lines;
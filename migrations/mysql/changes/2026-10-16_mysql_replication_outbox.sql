@@ -0,0 +1,36 @@
+-- Migration: MySQL Mirror Replication Outbox
+-- Date: 2026-10-16
+-- Description: Changes for the MySQL mirror are written to an outbox in the same transaction as
+--              the change itself and replayed in batches by a background replicator
+--              (mysql_replication.py) instead of being sent to MySQL on the request path.
+-- Type: New Table
+
+-- ==================== UP ====================
+CREATE TABLE IF NOT EXISTS mysql_replication_outbox (
+    id INT AUTO_INCREMENT PRIMARY KEY,       -- replay order
+    table_name VARCHAR(100) NOT NULL,
+    operation VARCHAR(10) NOT NULL,          -- INSERT, UPDATE, DELETE, SQL
+    statement TEXT,                          -- raw statement of SQL events
+    where_clause TEXT,                       -- UPDATE / DELETE condition
+    payload TEXT,                            -- JSON statement parameters
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',  -- pending, failed
+    attempts INT NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_mysql_replication_outbox_status (status, id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE TABLE IF NOT EXISTS mysql_replication_state (
+    name VARCHAR(50) PRIMARY KEY,            -- mysql_mirror
+    locked_by VARCHAR(100),                  -- host:pid of the replicator holding the lease
+    lease_until DATETIME,
+    next_attempt_at DATETIME,                -- backoff after a failed batch
+    last_replicated_id INT,
+    last_replicated_at DATETIME,
+    last_error TEXT,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ==================== DOWN ====================
+-- DROP TABLE IF EXISTS mysql_replication_state;
+-- DROP TABLE IF EXISTS mysql_replication_outbox;
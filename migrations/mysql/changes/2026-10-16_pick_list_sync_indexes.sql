@@ -0,0 +1,20 @@
+-- Migration: Pick list sync indexes
+-- Date: 2026-10-16
+-- Description: Indexes used by the set-based pick list sync (pick_list_sync.py): local pick lists by
+--              SAP AbsoluteEntry, lines / bin allocations of many pick lists, and sales order lines of
+--              many orders. InnoDB already indexes foreign key columns, so on MySQL usually only
+--              ix_pick_lists_absolute_entry is new (idx_absolute_entry from mysql_consolidated_migration.py
+--              covers it as well). mysql_consolidated_migration.py skips indexes that are already covered.
+-- Type: Index Change
+
+-- ==================== UP ====================
+CREATE INDEX ix_pick_lists_absolute_entry ON pick_lists (absolute_entry) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX ix_pick_list_lines_pick_list_id ON pick_list_lines (pick_list_id) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX ix_pick_list_bin_allocations_pick_list_line_id ON pick_list_bin_allocations (pick_list_line_id) ALGORITHM=INPLACE LOCK=NONE;
+CREATE INDEX ix_sales_order_lines_sales_order_id ON sales_order_lines (sales_order_id) ALGORITHM=INPLACE LOCK=NONE;
+
+-- ==================== DOWN ====================
+-- DROP INDEX ix_pick_lists_absolute_entry ON pick_lists;
+-- DROP INDEX ix_pick_list_lines_pick_list_id ON pick_list_lines;
+-- DROP INDEX ix_pick_list_bin_allocations_pick_list_line_id ON pick_list_bin_allocations;
+-- DROP INDEX ix_sales_order_lines_sales_order_id ON sales_order_lines;
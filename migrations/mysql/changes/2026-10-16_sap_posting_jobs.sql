@@ -0,0 +1,33 @@
+-- Migration: SAP Posting Queue
+-- Date: 2026-10-16
+-- Description: Durable queue of SAP B1 postings created by QC approvals. Approval endpoints
+--              insert a job and return immediately; background workers (sap_posting_queue.py)
+--              post the document with bounded concurrency and exponential backoff.
+-- Type: New Table
+
+-- ==================== UP ====================
+CREATE TABLE IF NOT EXISTS sap_posting_jobs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    job_type VARCHAR(50) NOT NULL,           -- multi_grn_batch, grpo, inventory_transfer, serial_item_transfer, direct_inventory_transfer
+    document_id INT NOT NULL,                -- id of the local document for job_type
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',  -- queued, running, succeeded, failed
+    attempts INT NOT NULL DEFAULT 0,
+    max_attempts INT NOT NULL DEFAULT 5,
+    next_attempt_at DATETIME NOT NULL,
+    locked_by VARCHAR(100),                  -- host:pid of the worker holding the job
+    locked_at DATETIME,
+    sap_doc_entry INT,
+    sap_doc_num VARCHAR(50),
+    sap_reference VARCHAR(100),              -- NumAtCard / JournalMemo sent to SAP, used to detect an earlier posting before a retry
+    last_error TEXT,
+    created_by INT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    completed_at DATETIME,
+    FOREIGN KEY (created_by) REFERENCES users(id),
+    INDEX idx_sap_posting_jobs_due (status, next_attempt_at),
+    INDEX idx_sap_posting_jobs_document (job_type, document_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ==================== DOWN ====================
+-- DROP TABLE IF EXISTS sap_posting_jobs;
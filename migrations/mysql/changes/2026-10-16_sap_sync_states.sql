@@ -0,0 +1,23 @@
+-- Migration: SAP Master Data Sync State
+-- Date: 2026-10-16
+-- Description: High-water mark of the incremental SAP B1 master data sync (master_data_sync.py).
+--              One row per entity (warehouses, bins, business_partners). Delta syncs only request
+--              rows whose UpdateDate/UpdateTime is at or after the stored mark.
+-- Type: New Table
+
+-- ==================== UP ====================
+CREATE TABLE IF NOT EXISTS sap_sync_states (
+    entity VARCHAR(50) PRIMARY KEY,          -- warehouses, bins, business_partners
+    last_update_date VARCHAR(10),            -- highest SAP UpdateDate synced (YYYY-MM-DD)
+    last_update_time VARCHAR(8),             -- UpdateTime on that date (HH:MM:SS)
+    last_mode VARCHAR(10),                   -- full, delta
+    last_row_count INT DEFAULT 0,
+    last_duration_ms INT DEFAULT 0,
+    last_error TEXT,
+    last_synced_at DATETIME,
+    last_full_sync_at DATETIME,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- ==================== DOWN ====================
+-- DROP TABLE IF EXISTS sap_sync_states;
@@ -0,0 +1,79 @@
+-- Composite indexes for the scan, verification and document list hot paths
+-- New databases get these from the model __table_args__ via db.create_all();
+-- db.create_all() does not add indexes to tables that already exist, so run this once on existing databases
+-- Date: 2026-10-16
+-- Related to: Hot-path index pack (test_query_plans.py checks the query plans)
+-- Database: PostgreSQL
+--
+-- CREATE INDEX CONCURRENTLY does not lock the tables against writes but cannot run inside a
+-- transaction block, so run this file with autocommit on, e.g.  psql "$DATABASE_URL" -f <this file>
+
+-- Inventory transfer QR scanning: "GRN already transferred" check
+-- (the transfer_id + item_code + pack_key lookups are served by uq_transfer_item_pack)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_transfer_scan_states_grn
+    ON transfer_scan_states (transfer_id, grn_id, transfer_status);
+
+-- Multi GRN verification: batch/serial details of a line selection, line selections of a PO link
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_multi_grn_batch_details_line_selection_id
+    ON multi_grn_batch_details (line_selection_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_multi_grn_serial_details_line_selection_id
+    ON multi_grn_serial_details (line_selection_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_multi_grn_line_selections_po_link_id
+    ON multi_grn_line_selections (po_link_id);
+
+-- Serial item transfer: duplicate serial check within a transfer
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_serial_item_transfer_items_serial
+    ON serial_item_transfer_items (serial_item_transfer_id, serial_number);
+
+-- Document tables: QC queues (status, newest first) and per-user lists/dashboard (user, newest first)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_grpo_documents_status_created ON grpo_documents (status, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_grpo_documents_user_created ON grpo_documents (user_id, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_transfers_status_created ON inventory_transfers (status, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_transfers_user_created ON inventory_transfers (user_id, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pick_lists_status_created ON pick_lists (status, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pick_lists_user_created ON pick_lists (user_id, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_counts_status_created ON inventory_counts (status, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_counts_user_created ON inventory_counts (user_id, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_serial_number_transfers_status_created ON serial_number_transfers (status, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_serial_number_transfers_user_created ON serial_number_transfers (user_id, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_serial_item_transfers_status_created ON serial_item_transfers (status, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_serial_item_transfers_user_created ON serial_item_transfers (user_id, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_direct_inventory_transfers_status_created ON direct_inventory_transfers (status, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_direct_inventory_transfers_user_created ON direct_inventory_transfers (user_id, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_multi_grn_document_status_created ON multi_grn_document (status, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_multi_grn_document_user_created ON multi_grn_document (user_id, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_delivery_documents_status_created ON delivery_documents (status, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_delivery_documents_user_created ON delivery_documents (user_id, created_at);
+
+-- QC work queue: line items eager loaded per page of documents
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_grpo_items_grpo_id ON grpo_items (grpo_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_inventory_transfer_items_inventory_transfer_id ON inventory_transfer_items (inventory_transfer_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_serial_number_transfer_items_serial_transfer_id ON serial_number_transfer_items (serial_transfer_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_serial_number_transfer_serials_transfer_item_id ON serial_number_transfer_serials (transfer_item_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_direct_inventory_transfer_items_direct_inventory_transfer_id ON direct_inventory_transfer_items (direct_inventory_transfer_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_delivery_items_delivery_id ON delivery_items (delivery_id);
+
+-- Dashboard: SAP inventory counts of a user
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sap_inventory_counts_user_loaded ON sap_inventory_counts (user_id, loaded_at);
+
+-- Refresh planner statistics so the new indexes are considered straight away
+ANALYZE transfer_scan_states;
+ANALYZE multi_grn_batch_details;
+ANALYZE multi_grn_serial_details;
+ANALYZE serial_item_transfer_items;
+ANALYZE multi_grn_line_selections;
+
+-- Verify the indexes
+SELECT tablename, indexname, indexdef
+FROM pg_indexes
+WHERE indexname LIKE 'idx\_%\_status_created'
+   OR indexname LIKE 'idx\_%\_user_created'
+   OR indexname IN ('idx_transfer_scan_states_grn', 'idx_serial_item_transfer_items_serial',
+                    'ix_multi_grn_batch_details_line_selection_id', 'ix_multi_grn_serial_details_line_selection_id',
+                    'ix_multi_grn_line_selections_po_link_id', 'ix_grpo_items_grpo_id',
+                    'ix_inventory_transfer_items_inventory_transfer_id',
+                    'ix_serial_number_transfer_items_serial_transfer_id',
+                    'ix_serial_number_transfer_serials_transfer_item_id',
+                    'ix_direct_inventory_transfer_items_direct_inventory_transfer_id',
+                    'ix_delivery_items_delivery_id', 'idx_sap_inventory_counts_user_loaded')
+ORDER BY tablename, indexname;
@@ -0,0 +1,14 @@
+-- Index for the differential inventory counting sync (inventory_counting_sync.py)
+-- New databases get it from the models (index=True) via db.create_all();
+-- db.create_all() does not add indexes to tables that already exist, so run this once on existing databases
+-- Date: 2026-10-16
+-- Related to: Differential inventory counting open / save
+-- Database: PostgreSQL
+--
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block, so run this file with
+-- autocommit on, e.g.  psql "$DATABASE_URL" -f <this file>
+
+-- All stored lines of one counting document (one query per open or save)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_sap_inventory_count_lines_count_id ON sap_inventory_count_lines (count_id);
+
+ANALYZE sap_inventory_count_lines;
@@ -0,0 +1,25 @@
+-- Indexes for the set-based pick list sync (pick_list_sync.py)
+-- New databases get these from the models (index=True) via db.create_all();
+-- db.create_all() does not add indexes to tables that already exist, so run this once on existing databases
+-- Date: 2026-10-16
+-- Related to: Set-based pick list sync and import from SAP
+-- Database: PostgreSQL
+--
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block, so run this file with
+-- autocommit on, e.g.  psql "$DATABASE_URL" -f <this file>
+
+-- Local pick lists of the returned AbsoluteEntry values (one IN query)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_pick_lists_absolute_entry ON pick_lists (absolute_entry);
+
+-- Replacing the lines and bin allocations of many pick lists at once
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_pick_list_lines_pick_list_id ON pick_list_lines (pick_list_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_pick_list_bin_allocations_pick_list_line_id
+    ON pick_list_bin_allocations (pick_list_line_id);
+
+-- Sales order lines referenced by pick list lines (one join query)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_sales_order_lines_sales_order_id ON sales_order_lines (sales_order_id);
+
+ANALYZE pick_lists;
+ANALYZE pick_list_lines;
+ANALYZE pick_list_bin_allocations;
+ANALYZE sales_order_lines;
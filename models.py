@@ -137,6 +137,10 @@ class User(UserMixin, db.Model):
 
 class InventoryTransfer(db.Model):
     __tablename__ = 'inventory_transfers'
+    __table_args__ = (
+        db.Index('idx_inventory_transfers_status_created', 'status', 'created_at'),
+        db.Index('idx_inventory_transfers_user_created', 'user_id', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     transfer_request_number = db.Column(db.String(20), nullable=False)
@@ -181,7 +185,8 @@ class InventoryTransferItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     inventory_transfer_id = db.Column(db.Integer,
                                    db.ForeignKey('inventory_transfers.id'),
-                                   nullable=False)
+                                   nullable=False,
+                                   index=True)
     item_code = db.Column(db.String(50), nullable=False)
     item_name = db.Column(db.String(200), nullable=False)
     quantity = db.Column(db.Float, nullable=False)
@@ -287,17 +292,23 @@ class TransferScanState(db.Model):
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # uq_transfer_item_pack also serves the (transfer_id, item_code[, pack_key]) scan lookups
     __table_args__ = (
         db.UniqueConstraint('transfer_id', 'item_code', 'pack_key', name='uq_transfer_item_pack'),
+        db.Index('idx_transfer_scan_states_grn', 'transfer_id', 'grn_id', 'transfer_status'),
     )
 
 
 class PickList(db.Model):
     __tablename__ = 'pick_lists'
+    __table_args__ = (
+        db.Index('idx_pick_lists_status_created', 'status', 'created_at'),
+        db.Index('idx_pick_lists_user_created', 'user_id', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     # SAP B1 fields
-    absolute_entry = db.Column(db.Integer, nullable=True)  # From SAP B1 Absoluteentry
+    absolute_entry = db.Column(db.Integer, nullable=True, index=True)  # From SAP B1 Absoluteentry
     name = db.Column(db.String(50), nullable=False)  # From SAP B1 Name field
     owner_code = db.Column(db.Integer, nullable=True)  # From SAP B1 OwnerCode
     owner_name = db.Column(db.String(100), nullable=True)  # From SAP B1 OwnerName
@@ -359,7 +370,7 @@ class PickListLine(db.Model):
     __tablename__ = 'pick_list_lines'
 
     id = db.Column(db.Integer, primary_key=True)
-    pick_list_id = db.Column(db.Integer, db.ForeignKey('pick_lists.id'), nullable=False)
+    pick_list_id = db.Column(db.Integer, db.ForeignKey('pick_lists.id'), nullable=False, index=True)
     
     # SAP B1 PickListsLines fields
     absolute_entry = db.Column(db.Integer, nullable=True)  # From SAP B1 AbsoluteEntry
@@ -390,7 +401,7 @@ class PickListBinAllocation(db.Model):
     __tablename__ = 'pick_list_bin_allocations'
 
     id = db.Column(db.Integer, primary_key=True)
-    pick_list_line_id = db.Column(db.Integer, db.ForeignKey('pick_list_lines.id'), nullable=False)
+    pick_list_line_id = db.Column(db.Integer, db.ForeignKey('pick_list_lines.id'), nullable=False, index=True)
     
     # SAP B1 DocumentLinesBinAllocations fields
     bin_abs_entry = db.Column(db.Integer, nullable=True)  # From SAP B1 BinAbsEntry
@@ -412,6 +423,10 @@ class PickListBinAllocation(db.Model):
 
 class InventoryCount(db.Model):
     __tablename__ = 'inventory_counts'
+    __table_args__ = (
+        db.Index('idx_inventory_counts_status_created', 'status', 'created_at'),
+        db.Index('idx_inventory_counts_user_created', 'user_id', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     count_number = db.Column(db.String(20), nullable=False)
@@ -454,6 +469,9 @@ class InventoryCountItem(db.Model):
 class SAPInventoryCount(db.Model):
     """SAP B1 Inventory Counting Documents - Local storage for tracking"""
     __tablename__ = 'sap_inventory_counts'
+    __table_args__ = (
+        db.Index('idx_sap_inventory_counts_user_loaded', 'user_id', 'loaded_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     doc_entry = db.Column(db.Integer, nullable=False, unique=True, index=True)
@@ -488,7 +506,7 @@ class SAPInventoryCountLine(db.Model):
     __tablename__ = 'sap_inventory_count_lines'
 
     id = db.Column(db.Integer, primary_key=True)
-    count_id = db.Column(db.Integer, db.ForeignKey('sap_inventory_counts.id'), nullable=False)
+    count_id = db.Column(db.Integer, db.ForeignKey('sap_inventory_counts.id'), nullable=False, index=True)
     line_number = db.Column(db.Integer, nullable=False)
     item_code = db.Column(db.String(50), nullable=False, index=True)
     item_description = db.Column(db.String(200), nullable=True)
@@ -711,7 +729,7 @@ class SalesOrderLine(db.Model):
     __tablename__ = 'sales_order_lines'
 
     id = db.Column(db.Integer, primary_key=True)
-    sales_order_id = db.Column(db.Integer, db.ForeignKey('sales_orders.id'), nullable=False)
+    sales_order_id = db.Column(db.Integer, db.ForeignKey('sales_orders.id'), nullable=False, index=True)
     
     # SAP B1 Sales Order Line fields
     line_num = db.Column(db.Integer, nullable=False)  # From SAP B1 LineNum
@@ -750,33 +768,18 @@ class DocumentNumberSeries(db.Model):
 
     @classmethod
     def get_next_number(cls, document_type):
-        """Generate next document number for given document type"""
-        series = cls.query.filter_by(document_type=document_type).first()
-        
-        if not series:
-            # Create default series if not exists
-            prefixes = {
-                'GRPO': 'GRPO-',
-                'TRANSFER': 'TR-',
-                'PICKLIST': 'PL-'
-            }
-            series = cls(
-                document_type=document_type,
-                prefix=prefixes.get(document_type, 'DOC-'),
-                current_number=1
-            )
-            db.session.add(series)
-        
-        # Generate document number
-        year_suffix = datetime.now().strftime('%Y') if series.year_suffix else ''
-        doc_number = f"{series.prefix}{series.current_number:04d}{'-' + year_suffix if year_suffix else ''}"
-        
-        # Increment counter
-        series.current_number += 1
-        series.updated_at = datetime.utcnow()
-        db.session.commit()
-        
-        return doc_number
+        """Generate next document number for given document type (see document_numbers.py)"""
+        from document_numbers import next_series_number
+        return next_series_number(document_type)
+
+
+class DocumentNumberCounter(db.Model):
+    """Counter of a daily document number (one row per prefix and day, e.g. ST-20261016)"""
+    __tablename__ = 'document_number_counters'
+
+    scope = db.Column(db.String(50), primary_key=True)
+    next_value = db.Column(db.Integer, nullable=False, default=1)  # first number not reserved yet
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 # ================================
 # Serial Number Transfer Models
@@ -785,6 +788,10 @@ class DocumentNumberSeries(db.Model):
 class SerialNumberTransfer(db.Model):
     """Serial Number-wise Stock Transfer Document Header"""
     __tablename__ = 'serial_number_transfers'
+    __table_args__ = (
+        db.Index('idx_serial_number_transfers_status_created', 'status', 'created_at'),
+        db.Index('idx_serial_number_transfers_user_created', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     transfer_number = db.Column(db.String(50), nullable=False, unique=True)
@@ -811,7 +818,7 @@ class SerialNumberTransferItem(db.Model):
     __tablename__ = 'serial_number_transfer_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    serial_transfer_id = db.Column(db.Integer, db.ForeignKey('serial_number_transfers.id'), nullable=False)
+    serial_transfer_id = db.Column(db.Integer, db.ForeignKey('serial_number_transfers.id'), nullable=False, index=True)
     item_code = db.Column(db.String(50), nullable=False)
     item_name = db.Column(db.String(200))
     quantity = db.Column(db.Integer, nullable=False)  # Expected quantity for this item
@@ -830,7 +837,7 @@ class SerialNumberTransferSerial(db.Model):
     __tablename__ = 'serial_number_transfer_serials'
     
     id = db.Column(db.Integer, primary_key=True)
-    transfer_item_id = db.Column(db.Integer, db.ForeignKey('serial_number_transfer_items.id'), nullable=False)
+    transfer_item_id = db.Column(db.Integer, db.ForeignKey('serial_number_transfer_items.id'), nullable=False, index=True)
     serial_number = db.Column(db.String(100), nullable=False)
     internal_serial_number = db.Column(db.String(100), nullable=False)  # From SAP SerialNumberDetails
     system_serial_number = db.Column(db.Integer)  # SystemNumber from SAP
@@ -853,6 +860,10 @@ class SerialNumberTransferSerial(db.Model):
 class SerialItemTransfer(db.Model):
     """Serial Item Transfer Document Header - New module for serial-driven transfers"""
     __tablename__ = 'serial_item_transfers'
+    __table_args__ = (
+        db.Index('idx_serial_item_transfers_status_created', 'status', 'created_at'),
+        db.Index('idx_serial_item_transfers_user_created', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     transfer_number = db.Column(db.String(50), nullable=False, unique=True)
@@ -896,6 +907,9 @@ class SerialItemTransferItem(db.Model):
     
     # Note: Allowing duplicate serial numbers for user review and manual deletion
     # __table_args__ = (db.UniqueConstraint('serial_item_transfer_id', 'serial_number', name='unique_serial_per_transfer'),)
+    __table_args__ = (
+        db.Index('idx_serial_item_transfer_items_serial', 'serial_item_transfer_id', 'serial_number'),
+    )
 
 # ================================
 # Direct Inventory Transfer Models (New Module)
@@ -904,6 +918,10 @@ class SerialItemTransferItem(db.Model):
 class DirectInventoryTransfer(db.Model):
     """Direct Inventory Transfer Document Header - Barcode-driven transfers with automatic serial/batch detection"""
     __tablename__ = 'direct_inventory_transfers'
+    __table_args__ = (
+        db.Index('idx_direct_inventory_transfers_status_created', 'status', 'created_at'),
+        db.Index('idx_direct_inventory_transfers_user_created', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     transfer_number = db.Column(db.String(50), nullable=False, unique=True)
@@ -933,7 +951,7 @@ class DirectInventoryTransferItem(db.Model):
     __tablename__ = 'direct_inventory_transfer_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    direct_inventory_transfer_id = db.Column(db.Integer, db.ForeignKey('direct_inventory_transfers.id'), nullable=False)
+    direct_inventory_transfer_id = db.Column(db.Integer, db.ForeignKey('direct_inventory_transfers.id'), nullable=False, index=True)
     item_code = db.Column(db.String(50), nullable=False)
     item_description = db.Column(db.String(200))
     barcode = db.Column(db.String(100))
@@ -953,5 +971,126 @@ class DirectInventoryTransferItem(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
+# ================================
+# SAP Posting Queue
+# ================================
+
+class SAPPostingJob(db.Model):
+    """Queued SAP B1 posting of an approved document - processed by sap_posting_queue workers"""
+    __tablename__ = 'sap_posting_jobs'
+    __table_args__ = (
+        db.Index('idx_sap_posting_jobs_due', 'status', 'next_attempt_at'),
+        db.Index('idx_sap_posting_jobs_document', 'job_type', 'document_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False)  # multi_grn_batch, grpo, inventory_transfer, serial_item_transfer, direct_inventory_transfer
+    document_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    sap_doc_entry = db.Column(db.Integer)
+    sap_doc_num = db.Column(db.String(50))
+    sap_reference = db.Column(db.String(100))  # NumAtCard / JournalMemo sent to SAP, checked before a retry re-posts
+    last_error = db.Column(db.Text)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'job_type': self.job_type,
+            'document_id': self.document_id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'sap_doc_entry': self.sap_doc_entry,
+            'sap_doc_num': self.sap_doc_num,
+            'sap_reference': self.sap_reference,
+            'error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+        }
+
+
+
+class SAPSyncState(db.Model):
+    """High-water mark of the incremental SAP B1 master data sync, one row per entity (master_data_sync.py)"""
+    __tablename__ = 'sap_sync_states'
+
+    entity = db.Column(db.String(50), primary_key=True)  # warehouses, bins, business_partners
+    last_update_date = db.Column(db.String(10))  # Highest SAP UpdateDate synced (YYYY-MM-DD)
+    last_update_time = db.Column(db.String(8))  # UpdateTime on that date (HH:MM:SS)
+    last_mode = db.Column(db.String(10))  # full, delta
+    last_row_count = db.Column(db.Integer, default=0)
+    last_duration_ms = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.Text)
+    last_synced_at = db.Column(db.DateTime)
+    last_full_sync_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'entity': self.entity,
+            'last_update_date': self.last_update_date,
+            'last_update_time': self.last_update_time,
+            'last_mode': self.last_mode,
+            'last_row_count': self.last_row_count,
+            'last_duration_ms': self.last_duration_ms,
+            'last_error': self.last_error,
+            'last_synced_at': self.last_synced_at.isoformat() if self.last_synced_at else None,
+            'last_full_sync_at': self.last_full_sync_at.isoformat() if self.last_full_sync_at else None,
+        }
+
+
+class MySQLReplicationEvent(db.Model):
+    """Change waiting to be replayed on the MySQL mirror - written in the same transaction as the change (mysql_replication.py)"""
+    __tablename__ = 'mysql_replication_outbox'
+    __table_args__ = (
+        db.Index('idx_mysql_replication_outbox_status', 'status', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)  # Replay order
+    table_name = db.Column(db.String(100), nullable=False)
+    operation = db.Column(db.String(10), nullable=False)  # INSERT, UPDATE, DELETE, SQL
+    statement = db.Column(db.Text)  # Raw statement of SQL events
+    where_clause = db.Column(db.Text)  # UPDATE / DELETE condition, may reference :parameters
+    payload = db.Column(db.Text)  # JSON statement parameters
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class MySQLReplicationState(db.Model):
+    """Replication lease and progress of the MySQL mirror, one row (mysql_replication.py)"""
+    __tablename__ = 'mysql_replication_state'
+
+    name = db.Column(db.String(50), primary_key=True)  # mysql_mirror
+    locked_by = db.Column(db.String(100))  # host:pid of the replicator holding the lease
+    lease_until = db.Column(db.DateTime)
+    next_attempt_at = db.Column(db.DateTime)  # Backoff after a failed batch
+    last_replicated_id = db.Column(db.Integer)
+    last_replicated_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'locked_by': self.locked_by,
+            'lease_until': self.lease_until.isoformat() if self.lease_until else None,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_replicated_id': self.last_replicated_id,
+            'last_replicated_at': self.last_replicated_at.isoformat() if self.last_replicated_at else None,
+            'last_error': self.last_error,
+        }
+
 # Import delivery module models
 from modules.sales_delivery.models import DeliveryDocument, DeliveryItem
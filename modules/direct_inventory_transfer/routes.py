@@ -8,6 +8,8 @@ from pathlib import Path
 from app import db
 from models import DirectInventoryTransfer, DirectInventoryTransferItem, DocumentNumberSeries
 from sap_integration import SAPIntegration
+from sap_posting_queue import (enqueue_posting_job, find_earlier_posting, job_response,
+                               posting_handler, set_job_reference)
 
 # Use absolute path for template_folder to support PyInstaller .exe builds
 direct_inventory_transfer_bp = Blueprint('direct_inventory_transfer', __name__, 
@@ -457,7 +459,7 @@ def submit_transfer(transfer_id):
 @direct_inventory_transfer_bp.route('/<int:transfer_id>/approve', methods=['POST'])
 @login_required
 def approve_transfer(transfer_id):
-    """Approve Direct Inventory Transfer and post to SAP B1"""
+    """Approve Direct Inventory Transfer and queue it for posting to SAP B1"""
     try:
         transfer = DirectInventoryTransfer.query.get_or_404(transfer_id)
 
@@ -478,30 +480,10 @@ def approve_transfer(transfer_id):
         for item in transfer.items:
             item.qc_status = 'approved'
 
-        sap = SAPIntegration()
-        if not sap.ensure_logged_in():
-            db.session.rollback()
-            return jsonify({'success': False, 'error': 'SAP B1 authentication failed'}), 500
+        job = enqueue_posting_job('direct_inventory_transfer', transfer.id, created_by=current_user.id)
 
-        sap_result = sap.post_direct_inventory_transfer_to_sap(transfer)
-
-        if not sap_result.get('success'):
-            db.session.rollback()
-            sap_error = sap_result.get('error', 'Unknown SAP error')
-            logging.error(f"❌ SAP B1 posting failed: {sap_error}")
-            return jsonify({'success': False, 'error': f'SAP B1 posting failed: {sap_error}'}), 500
-
-        transfer.sap_document_number = sap_result.get('document_number')
-        transfer.status = 'posted'
-        
-        db.session.commit()
-
-        logging.info(f"✅ Direct Inventory Transfer {transfer_id} approved and posted to SAP B1 as {transfer.sap_document_number}")
-        return jsonify({
-            'success': True,
-            'message': f'Transfer approved and posted to SAP B1 as {transfer.sap_document_number}',
-            'sap_document_number': transfer.sap_document_number
-        })
+        logging.info(f"✅ Direct Inventory Transfer {transfer_id} approved, SAP posting job {job.id} queued")
+        return jsonify(job_response(job, 'Transfer approved. Posting to SAP B1 has been queued.')), 202
 
     except Exception as e:
         logging.error(f"Error approving transfer: {str(e)}")
@@ -509,6 +491,51 @@ def approve_transfer(transfer_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def _reopen_transfer_after_posting_failure(job, error):
+    """Approval only stands once SAP accepts the transfer - send it back to QC"""
+    transfer = DirectInventoryTransfer.query.get(job.document_id)
+    if transfer is None or transfer.status == 'posted':
+        return
+    transfer.status = 'submitted'
+    transfer.updated_at = datetime.utcnow()
+    for item in transfer.items:
+        item.qc_status = 'pending'
+
+
+@posting_handler('direct_inventory_transfer', on_failure=_reopen_transfer_after_posting_failure)
+def post_transfer_job(job):
+    """Post an approved Direct Inventory Transfer to SAP B1 (posting queue worker)"""
+    transfer = DirectInventoryTransfer.query.get(job.document_id)
+    if transfer is None:
+        return {'success': False, 'error': f'Direct inventory transfer {job.document_id} not found', 'retryable': False}
+
+    if transfer.status == 'posted' and transfer.sap_document_number:
+        return {'success': True, 'doc_num': transfer.sap_document_number}
+
+    sap = SAPIntegration()
+    if not sap.ensure_logged_in():
+        return {'success': False, 'error': 'SAP B1 authentication failed'}
+
+    journal_memo = set_job_reference(job, f'WMS-DIT-{transfer.id}')
+    earlier = find_earlier_posting(job, sap, 'StockTransfers', 'JournalMemo')
+    if earlier:
+        sap_result = {'success': True, 'document_number': earlier['doc_num'], 'document_entry': earlier['doc_entry']}
+    else:
+        sap_result = sap.post_direct_inventory_transfer_to_sap(transfer, journal_memo=journal_memo)
+
+    if not sap_result.get('success'):
+        sap_error = sap_result.get('error', 'Unknown SAP error')
+        logging.error(f"❌ SAP B1 posting failed: {sap_error}")
+        return {'success': False, 'error': f'SAP B1 posting failed: {sap_error}'}
+
+    transfer.sap_document_number = sap_result.get('document_number')
+    transfer.status = 'posted'
+    db.session.commit()
+
+    logging.info(f"✅ Direct Inventory Transfer {transfer.id} posted to SAP B1 as {transfer.sap_document_number}")
+    return {'success': True, 'doc_entry': sap_result.get('document_entry'), 'doc_num': transfer.sap_document_number}
+
+
 @direct_inventory_transfer_bp.route('/<int:transfer_id>/reject', methods=['POST'])
 @login_required
 def reject_transfer(transfer_id):
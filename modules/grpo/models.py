@@ -9,6 +9,10 @@ from sqlalchemy.orm import relationship
 class GRPODocument(db.Model):
     """Main GRPO document header"""
     __tablename__ = 'grpo_documents'
+    __table_args__ = (
+        db.Index('idx_grpo_documents_status_created', 'status', 'created_at'),
+        db.Index('idx_grpo_documents_user_created', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     po_number = db.Column(db.String(50), nullable=False)
@@ -37,7 +41,7 @@ class GRPOItem(db.Model):
     __tablename__ = 'grpo_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    grpo_id = db.Column(db.Integer, db.ForeignKey('grpo_documents.id'), nullable=False)
+    grpo_id = db.Column(db.Integer, db.ForeignKey('grpo_documents.id'), nullable=False, index=True)
     item_code = db.Column(db.String(50), nullable=False)
     item_name = db.Column(db.String(200))
     quantity = db.Column(db.Numeric(15, 3), nullable=False)
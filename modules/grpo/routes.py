@@ -8,6 +8,8 @@ from app import db
 from modules.grpo.models import GRPODocument, GRPOItem, GRPOSerialNumber, GRPOBatchNumber, GRPONonManagedItem
 from models import User
 from sap_integration import SAPIntegration
+from sap_posting_queue import (enqueue_posting_job, find_earlier_posting, job_response,
+                               posting_handler, set_job_reference)
 import logging
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
@@ -202,7 +204,7 @@ def submit(grpo_id):
 @grpo_bp.route('/<int:grpo_id>/approve', methods=['POST'])
 @login_required
 def approve(grpo_id):
-    """QC approve GRPO and post to SAP B1"""
+    """QC approve GRPO and queue it for posting to SAP B1"""
     try:
         grpo = GRPODocument.query.get_or_404(grpo_id)
         
@@ -230,47 +232,49 @@ def approve(grpo_id):
         grpo.qc_approved_at = datetime.utcnow()
         grpo.qc_notes = qc_notes
         
-        # Initialize SAP integration and post to SAP B1
-        from sap_integration import SAPIntegration
-        sap = SAPIntegration()
-        
-        # Log the posting attempt
-        logging.info(f"🚀 Attempting to post GRPO {grpo_id} to SAP B1...")
-        logging.info(f"GRPO Items: {len(grpo.items)} items, QC Approved: {len([i for i in grpo.items if i.qc_status == 'approved'])}")
-        
-        # Post GRPO to SAP B1 as Purchase Delivery Note
-        sap_result = sap.post_grpo_to_sap(grpo)
+        # Post to SAP B1 as Purchase Delivery Note in the background
+        job = enqueue_posting_job('grpo', grpo.id, created_by=current_user.id)
         
-        # Log the result
-        logging.info(f"📡 SAP B1 posting result: {sap_result}")
-        
-        if sap_result.get('success'):
-            grpo.sap_document_number = sap_result.get('sap_document_number')
-            grpo.status = 'posted'
-            db.session.commit()
-            
-            logging.info(f"✅ GRPO {grpo_id} QC approved and posted to SAP B1 as {grpo.sap_document_number}")
-            return jsonify({
-                'success': True,
-                'message': f'GRPO approved and posted to SAP B1 as {grpo.sap_document_number}',
-                'sap_document_number': grpo.sap_document_number
-            })
-        else:
-            # If SAP posting fails, still mark as QC approved but not posted
-            db.session.commit()
-            error_msg = sap_result.get('error', 'Unknown SAP error')
-            
-            logging.warning(f"⚠️ GRPO {grpo_id} QC approved but SAP posting failed: {error_msg}")
-            return jsonify({
-                'success': False,
-                'error': f'GRPO approved but SAP posting failed: {error_msg}',
-                'status': 'qc_approved'
-            })
+        logging.info(f"✅ GRPO {grpo_id} QC approved, SAP posting job {job.id} queued")
+        return jsonify(job_response(job, 'GRPO approved. Posting to SAP B1 has been queued.')), 202
         
     except Exception as e:
         logging.error(f"Error approving GRPO: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+
+@posting_handler('grpo')
+def post_grpo_job(job):
+    """Post a QC approved GRPO to SAP B1 as Purchase Delivery Note (posting queue worker)"""
+    grpo = GRPODocument.query.get(job.document_id)
+    if grpo is None:
+        return {'success': False, 'error': f'GRPO {job.document_id} not found', 'retryable': False}
+    
+    if grpo.status == 'posted' and grpo.sap_document_number:
+        return {'success': True, 'doc_num': grpo.sap_document_number}
+    
+    logging.info(f"🚀 Posting GRPO {grpo.id} to SAP B1 ({len(grpo.items)} items)...")
+    sap = SAPIntegration()
+    # Keep the EXT-REF number of the first attempt so a retry can find that delivery note
+    external_ref = set_job_reference(job, job.sap_reference or sap.generate_external_reference_number(grpo))
+    earlier = find_earlier_posting(job, sap, 'PurchaseDeliveryNotes', 'NumAtCard')
+    if earlier:
+        sap_result = {'success': True, 'sap_document_number': str(earlier['doc_num'])}
+    else:
+        sap_result = sap.post_grpo_to_sap(grpo, external_ref=external_ref)
+    logging.info(f"📡 SAP B1 posting result: {sap_result}")
+    
+    if sap_result.get('success'):
+        grpo.sap_document_number = sap_result.get('sap_document_number')
+        grpo.status = 'posted'
+        db.session.commit()
+        logging.info(f"✅ GRPO {grpo.id} posted to SAP B1 as {grpo.sap_document_number}")
+        return {'success': True, 'doc_num': grpo.sap_document_number}
+    
+    # GRPO stays QC approved so the posting can be retried
+    return {'success': False, 'error': sap_result.get('error', 'Unknown SAP error')}
+
+
 @grpo_bp.route('/<int:grpo_id>/reject', methods=['POST'])
 @login_required
 def reject(grpo_id):
@@ -6,16 +6,18 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from app import db
 from models import InventoryTransfer, InventoryTransferItem, InventoryTransferRequestLine, User, SerialNumberTransfer, SerialNumberTransferItem, SerialNumberTransferSerial, TransferScanState
-from sqlalchemy import or_
+from sqlalchemy import insert, or_, select
+from sqlalchemy.exc import IntegrityError
 import logging
-import random
 import re
-import string
 import json
 from datetime import datetime
 from pathlib import Path
 
+from document_numbers import next_daily_number
 from sap_integration import SAPIntegration
+from sap_posting_queue import (enqueue_posting_job, find_earlier_posting, job_response,
+                               posting_handler, set_job_reference)
 
 # Use absolute path for template_folder to support PyInstaller .exe builds
 transfer_bp = Blueprint('inventory_transfer', __name__, 
@@ -24,16 +26,8 @@ transfer_bp = Blueprint('inventory_transfer', __name__,
 
 def generate_transfer_number():
     """Generate unique transfer number for serial transfers"""
-    while True:
-        # Generate format: ST-YYYYMMDD-XXXX (e.g., ST-20250822-A1B2)
-        date_part = datetime.now().strftime('%Y%m%d')
-        random_part = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
-        transfer_number = f'ST-{date_part}-{random_part}'
-        
-        # Check if it already exists
-        existing = SerialNumberTransfer.query.filter_by(transfer_number=transfer_number).first()
-        if not existing:
-            return transfer_number
+    # Format: ST-YYYYMMDD-NNNN (e.g., ST-20250822-0001)
+    return next_daily_number('ST')
 
 @transfer_bp.route('/')
 @login_required
@@ -454,7 +448,7 @@ def submit(transfer_id):
 @transfer_bp.route('/<int:transfer_id>/qc_approve', methods=['POST'])
 @login_required
 def qc_approve(transfer_id):
-    """QC approve transfer and post to SAP B1"""
+    """QC approve transfer and queue it for posting to SAP B1"""
     try:
         transfer = InventoryTransfer.query.get_or_404(transfer_id)
         
@@ -479,41 +473,64 @@ def qc_approve(transfer_id):
         transfer.qc_approved_at = datetime.utcnow()
         transfer.qc_notes = qc_notes
         
-        # Post to SAP B1 as Stock Transfer - MUST succeed for approval
-        from sap_integration import SAPIntegration
-        sap = SAPIntegration()
-        
-        logging.info(f"🚀 Posting Inventory Transfer {transfer_id} to SAP B1...")
-        sap_result = sap.post_inventory_transfer_to_sap(transfer)
-        
-        if not sap_result.get('success'):
-            # Rollback approval if SAP posting fails
-            db.session.rollback()
-            sap_error = sap_result.get('error', 'Unknown SAP error')
-            logging.error(f"❌ SAP B1 posting failed: {sap_error}")
-            return jsonify({'success': False, 'error': f'SAP B1 posting failed: {sap_error}'}), 500
-        
-        # SAP posting succeeded - update with document number
-        transfer.sap_document_number = sap_result.get('document_number')
-        transfer.status = 'posted'
-        logging.info(f"✅ Successfully posted to SAP B1: {transfer.sap_document_number}")
-        
-        db.session.commit()
+        # Post to SAP B1 as Stock Transfer in the background - MUST succeed for approval
+        job = enqueue_posting_job('inventory_transfer', transfer.id, created_by=current_user.id)
         
-        # Log status change
-        log_status_change(transfer_id, old_status, 'posted', current_user.id, f'Transfer QC approved and posted to SAP B1 as {transfer.sap_document_number}')
+        log_status_change(transfer_id, old_status, 'qc_approved', current_user.id, f'Transfer QC approved, SAP posting job {job.id} queued')
         
-        logging.info(f"✅ Inventory Transfer {transfer_id} QC approved and posted to SAP B1")
-        return jsonify({
-            'success': True,
-            'message': f'Transfer QC approved and posted to SAP B1 as {transfer.sap_document_number}',
-            'sap_document_number': transfer.sap_document_number
-        })
+        logging.info(f"✅ Inventory Transfer {transfer_id} QC approved, SAP posting job {job.id} queued")
+        return jsonify(job_response(job, 'Transfer QC approved. Posting to SAP B1 has been queued.')), 202
         
     except Exception as e:
         logging.error(f"Error approving transfer: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+
+def _reopen_transfer_after_posting_failure(job, error):
+    """Approval only stands once SAP accepts the transfer - send it back to QC"""
+    transfer = InventoryTransfer.query.get(job.document_id)
+    if transfer is None or transfer.status == 'posted':
+        return
+    log_status_change(transfer.id, transfer.status, 'submitted', job.created_by, f'SAP B1 posting failed: {error}')
+    transfer.status = 'submitted'
+    for item in transfer.items:
+        item.qc_status = 'pending'
+
+
+@posting_handler('inventory_transfer', on_failure=_reopen_transfer_after_posting_failure)
+def post_transfer_job(job):
+    """Post a QC approved inventory transfer to SAP B1 as Stock Transfer (posting queue worker)"""
+    transfer = InventoryTransfer.query.get(job.document_id)
+    if transfer is None:
+        return {'success': False, 'error': f'Inventory transfer {job.document_id} not found', 'retryable': False}
+    
+    if transfer.status == 'posted' and transfer.sap_document_number:
+        return {'success': True, 'doc_num': transfer.sap_document_number}
+    
+    logging.info(f"🚀 Posting Inventory Transfer {transfer.id} to SAP B1...")
+    sap = SAPIntegration()
+    journal_memo = set_job_reference(job, f'WMS-IT-{transfer.id}')
+    earlier = find_earlier_posting(job, sap, 'StockTransfers', 'JournalMemo')
+    if earlier:
+        sap_result = {'success': True, 'document_number': earlier['doc_num'], 'doc_entry': earlier['doc_entry']}
+    else:
+        sap_result = sap.post_inventory_transfer_to_sap(transfer, journal_memo=journal_memo)
+    
+    if not sap_result.get('success'):
+        sap_error = sap_result.get('error', 'Unknown SAP error')
+        logging.error(f"❌ SAP B1 posting failed: {sap_error}")
+        return {'success': False, 'error': f'SAP B1 posting failed: {sap_error}'}
+    
+    old_status = transfer.status
+    transfer.sap_document_number = sap_result.get('document_number')
+    transfer.status = 'posted'
+    db.session.commit()
+    
+    log_status_change(transfer.id, old_status, 'posted', job.created_by, f'Transfer posted to SAP B1 as {transfer.sap_document_number}')
+    logging.info(f"✅ Successfully posted to SAP B1: {transfer.sap_document_number}")
+    return {'success': True, 'doc_entry': sap_result.get('doc_entry'), 'doc_num': transfer.sap_document_number}
+
+
 @transfer_bp.route('/<int:transfer_id>/qc_reject', methods=['POST'])
 @login_required
 def qc_reject(transfer_id):
@@ -947,255 +964,27 @@ def serial_add_item(transfer_id):
         db.session.add(transfer_item)
         db.session.flush()  # Get the ID
         
-        # **ULTRA-ADVANCED BATCH PROCESSING FOR 1500+ SERIAL NUMBERS - ENTERPRISE LEVEL**
-        # Multi-stage processing with AI-like intelligent batching and enterprise error recovery
-        validated_count = 0
-        failed_count = 0
-        
-        # ENTERPRISE-GRADE DYNAMIC BATCH SIZING with AI-like optimization
-        if len(serial_numbers) <= 50:
-            batch_size = 10  # Small batches for precision
-        elif len(serial_numbers) <= 200:
-            batch_size = 25  # Medium batches
-        elif len(serial_numbers) <= 500:
-            batch_size = 50  # Standard batches
-        elif len(serial_numbers) <= 1000:
-            batch_size = 75  # Large batches
-        elif len(serial_numbers) <= 1500:
-            batch_size = 100  # Very large batches
-        elif len(serial_numbers) <= 2000:
-            batch_size = 125  # Ultra-large batches
-        else:  # 2000+ serial numbers - MEGA PROCESSING
-            batch_size = 150  # Maximum efficiency batches
-        
-        total_batches = (len(serial_numbers) + batch_size - 1) // batch_size
-        
-        # ADVANCED PERFORMANCE METRICS
-        processing_mode = 'ENTERPRISE' if len(serial_numbers) > 1500 else 'HIGH-VOLUME' if len(serial_numbers) > 1000 else 'STANDARD'
-        
-        logging.info(f"🚀 ULTRA-ADVANCED PROCESSING: {len(serial_numbers)} serial numbers")
-        logging.info(f"📊 Processing Mode: {processing_mode} | Batches: {total_batches} x {batch_size}")
-        logging.info(f"⚡ Memory Optimization: {'AGGRESSIVE' if len(serial_numbers) > 1500 else 'STANDARD'}")
-        
-        # ENTERPRISE-LEVEL MEMORY PRE-ALLOCATION
-        if len(serial_numbers) > 1500:
-            logging.info(f"🧠 Preparing enterprise-level memory management for {len(serial_numbers)} items...")
-            # Pre-allocate memory structures for optimal performance
-            db.session.expunge_all()  # Clear session cache before heavy processing
-        
-        # **DUPLICATE DETECTION LOGIC** - Track serial numbers to mark duplicates
+        # **DUPLICATE DETECTION LOGIC** - Every occurrence of a serial repeated in this
+        # submission is saved as 'Duplication' (the item is new, so nothing is stored for it yet)
         serial_number_count = {}
         for sn in serial_numbers:
             serial_number_count[sn] = serial_number_count.get(sn, 0) + 1
         
-        for batch_index in range(total_batches):
-            start_index = batch_index * batch_size
-            end_index = min(start_index + batch_size, len(serial_numbers))
-            batch = serial_numbers[start_index:end_index]
-            
-            logging.info(f"Processing batch {batch_index + 1}/{total_batches} ({len(batch)} serials)")
-            
-            for serial_number in batch:
-                try:
-                    # **DUPLICATE DETECTION** - Check if this serial number appears multiple times
-                    is_duplicate = serial_number_count[serial_number] > 1
-                    
-                    # **EXISTING DUPLICATE CHECK** - Check if already exists in database
-                    existing_serial = SerialNumberTransferSerial.query.filter_by(
-                        transfer_item_id=transfer_item.id,
-                        serial_number=serial_number
-                    ).first()
-                    
-                    if existing_serial:
-                        is_duplicate = True
-                    
-                    if is_duplicate:
-                        # Mark as duplicate with red status
-                        serial_record = SerialNumberTransferSerial()
-                        serial_record.transfer_item_id = transfer_item.id
-                        serial_record.serial_number = serial_number
-                        serial_record.internal_serial_number = serial_number
-                        serial_record.is_validated = False
-                        serial_record.validation_error = 'Duplication'
-                        failed_count += 1
-                        logging.warning(f"⚠️ Duplicate serial number {serial_number} marked as invalid")
-                    else:
-                        # **ONE-BY-ONE SAP VALIDATION** to prevent timeouts for 1000+ items
-                        validation_result = validate_series_with_warehouse_sap(serial_number, item_code, transfer.from_warehouse)
-                        
-                        serial_record = SerialNumberTransferSerial()
-                        serial_record.transfer_item_id = transfer_item.id
-                        serial_record.serial_number = serial_number
-                        serial_record.internal_serial_number = validation_result.get('SerialNumber') or validation_result.get('DistNumber', serial_number)
-                        serial_record.system_serial_number = validation_result.get('SystemNumber')
-                        serial_record.is_validated = validation_result.get('valid', False)
-                        serial_record.validation_error = validation_result.get('error') or validation_result.get('warning')
-                        
-                        if validation_result.get('valid'):
-                            validated_count += 1
-                        else:
-                            failed_count += 1
-                    
-                    db.session.add(serial_record)
-                    
-                    # **SAP TIMEOUT PREVENTION** for large datasets
-                    if len(serial_numbers) >= 1000:
-                        current_item = (batch_index * batch_size) + batch.index(serial_number) + 1
-                        if current_item % 50 == 0:  # Every 50 items
-                            import time
-                            time.sleep(0.05)  # 50ms delay to prevent SAP overload
-                            logging.debug(f"🕰️ SAP timeout prevention: Processed {current_item}/{len(serial_numbers)} items")
-                    
-                except Exception as e:
-                    # Note: Duplicate database errors should no longer occur since unique constraint removed
-                    # if "Duplicate entry" in str(e) or "unique_serial_per_item" in str(e):
-                    #     logging.warning(f"⚠️ Duplicate serial number {serial_number} detected via database error, skipping")
-                    #     continue
-                        
-                    logging.error(f"Error validating serial number {serial_number}: {str(e)}")
-                    
-                    # Add as unvalidated with error message
-                    serial_record = SerialNumberTransferSerial()
-                    serial_record.transfer_item_id = transfer_item.id
-                    serial_record.serial_number = serial_number
-                    serial_record.internal_serial_number = serial_number
-                    serial_record.is_validated = False
-                    serial_record.validation_error = str(e)
-                    db.session.add(serial_record)
-            
-            # ULTRA-ADVANCED BATCH PROCESSING WITH AI-LIKE ERROR RECOVERY AND PERFORMANCE OPTIMIZATION
-            try:
-                db.session.flush()  # Flush instead of commit to maintain transaction
-                
-                # ENTERPRISE-LEVEL PERFORMANCE METRICS AND REPORTING
-                progress_percent = ((batch_index + 1) / total_batches) * 100
-                current_batch_size = len(batch)
-                batch_success_count = len([s for s in batch if len(s.strip()) > 0]) 
-                batch_success_rate = (batch_success_count / current_batch_size) * 100 if current_batch_size > 0 else 0
-                overall_success_rate = (validated_count / ((batch_index * batch_size) + len(batch))) * 100 if ((batch_index * batch_size) + len(batch)) > 0 else 0
-                
-                # ADVANCED PROGRESS REPORTING WITH ENTERPRISE METRICS
-                logging.info(f"✅ BATCH {batch_index + 1}/{total_batches} ({progress_percent:.1f}%) | ✓{validated_count}/{len(serial_numbers)} | Batch: {batch_success_rate:.1f}% | Overall: {overall_success_rate:.1f}%")
-                
-                # ULTRA-INTELLIGENT COMMIT STRATEGY FOR ENTERPRISE DATASETS
-                if len(serial_numbers) <= 500:
-                    commit_frequency = 10  # Standard frequency
-                elif len(serial_numbers) <= 1000:
-                    commit_frequency = 8   # More frequent for medium datasets
-                elif len(serial_numbers) <= 1500:
-                    commit_frequency = 5   # High frequency for large datasets
-                else:  # 1500+ items - ENTERPRISE MODE
-                    commit_frequency = 3   # Ultra-frequent commits for massive datasets
-                
-                if (batch_index + 1) % commit_frequency == 0:
-                    db.session.commit()
-                    logging.info(f"🔄 ENTERPRISE CHECKPOINT: Batch {batch_index + 1} | Progress: {progress_percent:.1f}% | Validated: {validated_count}")
-                    
-                # AGGRESSIVE MEMORY OPTIMIZATION FOR ENTERPRISE PROCESSING
-                memory_clear_frequency = 15 if len(serial_numbers) > 1500 else 25
-                if (batch_index + 1) % memory_clear_frequency == 0:
-                    db.session.expunge_all()
-                    logging.info(f"🧠 ENTERPRISE MEMORY OPTIMIZATION: Cache cleared at batch {batch_index + 1}")
-                    
-                # PERFORMANCE MONITORING FOR ULTRA-LARGE DATASETS
-                if len(serial_numbers) > 1500 and (batch_index + 1) % 5 == 0:
-                    logging.info(f"📊 PERFORMANCE MONITOR: {validated_count} validated, {progress_percent:.1f}% complete, processing at {batch_size} items/batch")
-                    
-            except Exception as e:
-                logging.error(f"❌ ENTERPRISE ERROR in batch {batch_index + 1}: {str(e)}")
-                failed_count += len(batch)
-                
-                # ULTRA-ADVANCED ERROR RECOVERY WITH INTELLIGENT RETRY SYSTEM
-                try:
-                    db.session.rollback()
-                    
-                    # INTELLIGENT SUB-BATCH SIZING based on error type and dataset size
-                    if len(serial_numbers) > 1500:
-                        sub_batch_size = max(3, len(batch) // 8)  # Very small sub-batches for enterprise datasets
-                    elif len(serial_numbers) > 1000:
-                        sub_batch_size = max(5, len(batch) // 6)  # Small sub-batches for large datasets
-                    else:
-                        sub_batch_size = max(5, len(batch) // 4)  # Standard sub-batches
-                        
-                    logging.info(f"🔄 ENTERPRISE RECOVERY: Retrying batch {batch_index + 1} with {sub_batch_size}-item sub-batches")
-                    
-                    # MULTI-LEVEL RECOVERY PROCESSING
-                    for sub_start in range(0, len(batch), sub_batch_size):
-                        sub_batch = batch[sub_start:sub_start + sub_batch_size]
-                        try:
-                            # Process sub-batch with individual error handling
-                            for serial_number in sub_batch:
-                                try:
-                                    # **DUPLICATE DETECTION IN RECOVERY** - Mark duplicates as invalid
-                                    is_duplicate = serial_number_count[serial_number] > 1
-                                    existing_serial = SerialNumberTransferSerial.query.filter_by(
-                                        transfer_item_id=transfer_item.id,
-                                        serial_number=serial_number
-                                    ).first()
-                                    
-                                    if existing_serial:
-                                        is_duplicate = True
-                                    
-                                    if is_duplicate:
-                                        # Mark as duplicate with red status
-                                        serial_record = SerialNumberTransferSerial()
-                                        serial_record.transfer_item_id = transfer_item.id
-                                        serial_record.serial_number = serial_number
-                                        serial_record.internal_serial_number = serial_number
-                                        serial_record.is_validated = False
-                                        serial_record.validation_error = 'Duplication'
-                                    else:
-                                        validation_result = validate_series_with_warehouse_sap(serial_number, item_code, transfer.from_warehouse)
-                                        serial_record = SerialNumberTransferSerial()
-                                        serial_record.transfer_item_id = transfer_item.id
-                                        serial_record.serial_number = serial_number
-                                        serial_record.internal_serial_number = validation_result.get('SerialNumber') or validation_result.get('DistNumber', serial_number)
-                                        serial_record.system_serial_number = validation_result.get('SystemNumber')
-                                        serial_record.is_validated = validation_result.get('valid', False)
-                                        serial_record.validation_error = validation_result.get('error') or validation_result.get('warning')
-                                        
-                                        if validation_result.get('valid'):
-                                            validated_count += 1
-                                    db.session.add(serial_record)
-                                except Exception as individual_error:
-                                    # Check if it's a duplicate error that we should skip
-                                    if "Duplicate entry" in str(individual_error) or "unique_serial_per_item" in str(individual_error):
-                                        logging.warning(f"⚠️ Duplicate serial number {serial_number} detected via database error, skipping")
-                                        continue
-                                        
-                                    # GRACEFUL DEGRADATION - Add as unvalidated but continue processing
-                                    logging.warning(f"⚠️ Individual item error for {serial_number}: {str(individual_error)}")
-                                    
-                                    # Check for duplicates before adding even in error recovery
-                                    existing_serial = SerialNumberTransferSerial.query.filter_by(
-                                        transfer_item_id=transfer_item.id,
-                                        serial_number=serial_number
-                                    ).first()
-                                    
-                                    if not existing_serial:
-                                        serial_record = SerialNumberTransferSerial(
-                                            transfer_item_id=transfer_item.id,
-                                            serial_number=serial_number,
-                                            internal_serial_number=serial_number,
-                                            is_validated=False,
-                                            validation_error=f"Recovery processing error: {str(individual_error)}"
-                                        )
-                                        db.session.add(serial_record)
-                            
-                            # Flush sub-batch
-                            db.session.flush()
-                            
-                        except Exception as sub_batch_error:
-                            logging.error(f"❌ Sub-batch error: {str(sub_batch_error)}")
-                            # Continue with next sub-batch instead of failing entirely
-                            continue
-                            
-                    logging.info(f"✅ ENTERPRISE RECOVERY COMPLETE: Batch {batch_index + 1} processed with recovery")
-                    
-                except Exception as recovery_error:
-                    logging.error(f"❌ ENTERPRISE RECOVERY FAILED for batch {batch_index + 1}: {str(recovery_error)}")
-                    # Log the failure but continue with next batch to maintain system stability
-                    continue
+        # Validate the remaining serials against SAP in bulk, a few calls instead of one per serial
+        sap_validations = validate_batch_series_with_warehouse_sap(
+            [sn for sn, count in serial_number_count.items() if count == 1], item_code, transfer.from_warehouse)
+        
+        serial_rows = []
+        validated_count = 0
+        for serial_number in serial_numbers:
+            if serial_number_count[serial_number] > 1:
+                serial_rows.append(_duplicate_serial_row(transfer_item.id, serial_number))
+                continue
+            validation_result = batch_series_validation_result(sap_validations, serial_number, item_code, transfer.from_warehouse)
+            serial_rows.append(_serial_row(transfer_item.id, serial_number, validation_result))
+            if validation_result.get('valid'):
+                validated_count += 1
+        duplicate_count = sum(count for count in serial_number_count.values() if count > 1)
         
         # **QUANTITY VALIDATION - Prevent excess valid serials, allow insufficient for manual addition**
         if validated_count > expected_quantity:
@@ -1212,29 +1001,13 @@ def serial_add_item(transfer_id):
                 'excess_count': extra
             }), 400
         
-        # FINAL COMMIT WITH COMPREHENSIVE REPORTING
-        try:
-            db.session.commit()
-            
-            # Calculate final statistics
-            total_processed = validated_count + failed_count
-            success_rate = (validated_count / len(serial_numbers)) * 100 if serial_numbers else 0
-            processing_time = "batch_processing_complete"
-            
-            logging.info(f"🎉 PROCESSING COMPLETE for Item {item_code}")
-            logging.info(f"📊 FINAL STATISTICS:")
-            logging.info(f"   Total Serial Numbers: {len(serial_numbers)}")
-            logging.info(f"   Successfully Validated: {validated_count}")
-            logging.info(f"   Failed/Unvalidated: {len(serial_numbers) - validated_count}")
-            logging.info(f"   Expected Quantity: {expected_quantity}")
-            logging.info(f"   Quantity Match: {'✅ YES' if validated_count == expected_quantity else '❌ NO'}")
-            logging.info(f"   Success Rate: {success_rate:.1f}%")
-            logging.info(f"   Batches Processed: {total_batches}")
-            
-        except Exception as final_error:
-            logging.error(f"❌ Final commit failed: {str(final_error)}")
-            db.session.rollback()
-            raise
+        # One executemany INSERT for all serial rows, committed with the item. render_nulls
+        # keeps rows with and without a validation_error in the same statement
+        db.session.execute(insert(SerialNumberTransferSerial).execution_options(render_nulls=True), serial_rows)
+        db.session.commit()
+        
+        logging.info(f"🎉 Item {item_code} added to serial transfer {transfer_id}: {len(serial_numbers)} serials, "
+                     f"{validated_count} validated, {duplicate_count} duplicates, expected {expected_quantity}")
         
         # **SUCCESS - SERIAL NUMBERS SAVED FOR MANUAL MANAGEMENT**
         invalid_count = len(serial_numbers) - validated_count
@@ -1547,16 +1320,15 @@ def serial_add_more_serials(item_id):
         if not serial_numbers:
             return jsonify({'success': False, 'error': 'No valid serial numbers found'}), 400
         
-        # Check for duplicates within this item
-        existing_serials = {s.serial_number for s in item.serial_numbers}
-        new_serials = []
-        duplicate_serials = []
-        
-        for serial in serial_numbers:
-            if serial in existing_serials:
-                duplicate_serials.append(serial)
-            else:
-                new_serials.append(serial)
+        # Serials repeated in the submission are added once; one query finds the ones
+        # this item already has
+        serial_numbers = list(dict.fromkeys(serial_numbers))
+        existing_serials = set(db.session.scalars(
+            select(SerialNumberTransferSerial.serial_number)
+            .where(SerialNumberTransferSerial.transfer_item_id == item.id,
+                   SerialNumberTransferSerial.serial_number.in_(serial_numbers))))
+        duplicate_serials = [serial for serial in serial_numbers if serial in existing_serials]
+        new_serials = [serial for serial in serial_numbers if serial not in existing_serials]
         
         if duplicate_serials:
             return jsonify({
@@ -1567,28 +1339,21 @@ def serial_add_more_serials(item_id):
         if not new_serials:
             return jsonify({'success': False, 'error': 'No new serial numbers to add'}), 400
         
-        # Validate against SAP B1 and add serials
+        # Validate against SAP B1 in bulk and add serials with one executemany INSERT
+        sap_validations = validate_batch_series_with_warehouse_sap(new_serials, item.item_code, transfer.from_warehouse)
+        serial_rows = []
         validated_count = 0
         for serial_number in new_serials:
-            validation_result = validate_series_with_warehouse_sap(serial_number, item.item_code, transfer.from_warehouse)
-            
-            serial_record = SerialNumberTransferSerial()
-            serial_record.transfer_item_id = item.id
-            serial_record.serial_number = serial_number
-            serial_record.internal_serial_number = validation_result.get('SerialNumber') or validation_result.get('DistNumber', serial_number)
-            serial_record.system_serial_number = validation_result.get('SystemNumber')
-            serial_record.is_validated = validation_result.get('valid', False)
-            serial_record.validation_error = validation_result.get('error') or validation_result.get('warning')
-            
+            validation_result = batch_series_validation_result(sap_validations, serial_number, item.item_code, transfer.from_warehouse)
+            serial_rows.append(_serial_row(item.id, serial_number, validation_result))
             if validation_result.get('valid'):
                 validated_count += 1
-            
-            db.session.add(serial_record)
         
+        db.session.execute(insert(SerialNumberTransferSerial).execution_options(render_nulls=True), serial_rows)
         db.session.commit()
         
         # Check total valid serials vs expected quantity
-        total_valid = len([s for s in item.serial_numbers if s.is_validated])
+        total_valid = SerialNumberTransferSerial.query.filter_by(transfer_item_id=item.id, is_validated=True).count()
         invalid_count = len(new_serials) - validated_count
         
         if total_valid == expected_quantity:
@@ -1682,6 +1447,21 @@ def serial_edit_serial_number(serial_id):
         logging.error(f"Error editing serial number: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _serial_row(transfer_item_id, serial_number, validation_result):
+    """serial_number_transfer_serials row for a serial and its SAP validation result"""
+    return {
+        'transfer_item_id': transfer_item_id,
+        'serial_number': serial_number,
+        'internal_serial_number': validation_result.get('SerialNumber') or validation_result.get('DistNumber', serial_number),
+        'system_serial_number': validation_result.get('SystemNumber'),
+        'is_validated': bool(validation_result.get('valid', False)),
+        'validation_error': validation_result.get('error') or validation_result.get('warning'),
+    }
+
+def _duplicate_serial_row(transfer_item_id, serial_number):
+    """serial_number_transfer_serials row for a serial submitted more than once (shown in red for review)"""
+    return _serial_row(transfer_item_id, serial_number, {'valid': False, 'error': 'Duplication'})
+
 def validate_series_with_warehouse_sap(serial_number, item_code, warehouse_code):
     """Validate series against SAP B1 API with warehouse availability check"""
     try:
@@ -1722,11 +1502,22 @@ def validate_series_with_warehouse_sap(serial_number, item_code, warehouse_code)
             'error': f'Validation error: {str(e)}'
         }
 
+# Batch results that say nothing about the serial itself - the lookup call failed
+BATCH_VALIDATION_ERRORS = ('batch_api_error', 'batch_exception', 'batch_unavailable', 'batch_unsupported')
+
+def batch_series_validation_result(sap_validations, serial_number, item_code, warehouse_code):
+    """Result of one serial from a batch validation, validated on its own when the batch call failed"""
+    validation_result = sap_validations.get(serial_number)
+    if not validation_result or validation_result.get('validation_type') in BATCH_VALIDATION_ERRORS:
+        return validate_series_with_warehouse_sap(serial_number, item_code, warehouse_code)
+    return validation_result
+
 def validate_batch_series_with_warehouse_sap(serial_numbers, item_code, warehouse_code):
     """Batch validate multiple series against SAP B1 API for optimal performance
     
-    This function processes large batches of serial numbers in chunks to avoid API timeouts
-    and significantly improve performance when processing 1000+ serial numbers.
+    Serials are looked up in chunks with the registered Batch_Series_Validation SQL
+    query (chunks run in parallel, recent locations come from a short-lived cache),
+    so 500 serials cost about ten SAP calls instead of 500.
     
     Args:
         serial_numbers: List of serial numbers to validate
@@ -1746,13 +1537,7 @@ def validate_batch_series_with_warehouse_sap(serial_numbers, item_code, warehous
         
         logging.info(f"🚀 Starting batch validation for {len(serial_numbers)} serial numbers")
         
-        # Use the new batch validation method with optimized chunk size
-        batch_results = sap.validate_batch_series_with_warehouse(
-            serial_numbers, 
-            item_code, 
-            warehouse_code, 
-            batch_size=100  # Process in chunks of 100 for optimal performance
-        )
+        batch_results = sap.validate_batch_series_with_warehouse(serial_numbers, item_code, warehouse_code)
         
         # Transform results to match expected format
         formatted_results = {}
@@ -2361,6 +2146,44 @@ def api_get_item_warehouses():
 #         import traceback
 #         logging.error(traceback.format_exc())
 #         return jsonify({'success': False, 'error': str(e)}), 500
+def parse_qr_label(qr_data):
+    """Fields of a Multi GRN pack label QR (JSON string or already decoded dict).
+
+    Raises json.JSONDecodeError for text that is not JSON and ValueError for a
+    non-numeric qty.
+    """
+    parsed_json = qr_data if isinstance(qr_data, dict) else json.loads(qr_data)
+    if not isinstance(parsed_json, dict):
+        raise ValueError('QR JSON is not an object')
+    return {
+        'id': parsed_json.get('id'),
+        'po': parsed_json.get('po'),
+        'item_code': parsed_json.get('item'),
+        'batch_number': parsed_json.get('batch'),
+        'qty': float(parsed_json.get('qty', 0)),
+        'pack': parsed_json.get('pack', '1 of 1'),
+        'grn_date': parsed_json.get('grn_date'),
+        'exp_date': parsed_json.get('exp_date'),
+        'bin_location': parsed_json.get('bin', ''),
+    }
+
+
+def scan_pack_data(scan):
+    """JSON shape of one scanned pack (TransferScanState row or insert dict)"""
+    get = scan.get if isinstance(scan, dict) else lambda key: getattr(scan, key)
+    return {
+        'pack_key': get('pack_key'),
+        'pack_label': get('pack_label'),
+        'batch_number': get('batch_number'),
+        'qty': get('qty'),
+        'grn_id': get('grn_id'),
+        'grn_date': get('grn_date'),
+        'exp_date': get('exp_date'),
+        'po': get('po'),
+        'bin_location': get('bin_location') or ''
+    }
+
+
 @transfer_bp.route('/api/scan-qr-label', methods=['POST'])
 @login_required
 def api_scan_qr_label():
@@ -2393,25 +2216,9 @@ def api_scan_qr_label():
 
         logging.info(f"📷 Scanning QR label for transfer {transfer_id}: {qr_data}")
 
-        parsed_data = {}
-
         # ==== STEP 1: Parse JSON QR ====
         try:
-            if isinstance(qr_data, dict):
-                parsed_json = qr_data
-            else:
-                parsed_json = json.loads(qr_data)
-            print ("parsed_json---->",parsed_json)
-            parsed_data['id'] = parsed_json.get('id')
-            parsed_data['po'] = parsed_json.get('po')
-            parsed_data['item_code'] = parsed_json.get('item')
-            parsed_data['batch_number'] = parsed_json.get('batch')
-            parsed_data['qty'] = float(parsed_json.get('qty', 0))
-            parsed_data['pack'] = parsed_json.get('pack', '1 of 1')
-            parsed_data['grn_date'] = parsed_json.get('grn_date')
-            parsed_data['exp_date'] = parsed_json.get('exp_date')
-            parsed_data['bin_location'] = parsed_json.get('bin', '')
-
+            parsed_data = parse_qr_label(qr_data)
             logging.info(f"✅ Parsed QR JSON: {parsed_data}")
 
         except json.JSONDecodeError:
@@ -2530,17 +2337,7 @@ def api_scan_qr_label():
         remaining_qty = max(0, new_scan.requested_qty - total_scanned_qty)
         is_complete = total_scanned_qty >= new_scan.requested_qty
 
-        scanned_packs_data = [{
-            'pack_key': scan.pack_key,
-            'pack_label': scan.pack_label,
-            'batch_number': scan.batch_number,
-            'qty': scan.qty,
-            'grn_id': scan.grn_id,
-            'grn_date': scan.grn_date,
-            'exp_date': scan.exp_date,
-            'po': scan.po,
-            'bin_location': scan.bin_location or ''
-        } for scan in all_scans]
+        scanned_packs_data = [scan_pack_data(scan) for scan in all_scans]
 
         return jsonify({
             'success': True,
@@ -2559,6 +2356,183 @@ def api_scan_qr_label():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+MAX_SCAN_BATCH = 500
+
+
+def _evaluate_scan_batch(transfer_id, labels, requested_qty, requested_qtys, target_item_code):
+    """Check a batch of QR labels against each other and the stored scan state.
+
+    Loads the relevant TransferScanState rows with one query and applies the
+    same rules as api_scan_qr_label pack by pack, in scan order. Returns
+    (per-label results, rows to insert, per-item totals).
+    """
+    parsed = []
+    for qr_data in labels:
+        try:
+            parsed.append(parse_qr_label(qr_data))
+        except (ValueError, TypeError):
+            parsed.append(None)
+
+    item_codes = {p['item_code'] for p in parsed if p and p['item_code']}
+    grn_ids = {p['id'] for p in parsed if p and p['id']}
+    existing = TransferScanState.query.filter(
+        TransferScanState.transfer_id == transfer_id,
+        or_(TransferScanState.item_code.in_(item_codes),
+            (TransferScanState.grn_id.in_(grn_ids)) & (TransferScanState.transfer_status == 'verified'))
+    ).all() if item_codes or grn_ids else []
+
+    verified_grns = {scan.grn_id for scan in existing if scan.transfer_status == 'verified'}
+    # uq_transfer_item_pack allows one row per pack whatever its status
+    scanned_keys = {(scan.item_code, scan.pack_key) for scan in existing}
+    items = {}
+    for scan in existing:
+        if scan.item_code in item_codes:
+            item = items.setdefault(scan.item_code, {'requested_qty': scan.requested_qty, 'total_scanned_qty': 0, 'pack_count': 0})
+            item['total_scanned_qty'] += scan.qty
+            item['pack_count'] += 1
+
+    results = []
+    rows = []
+    for index, data in enumerate(parsed):
+        if data is None:
+            results.append({'index': index, 'success': False, 'error': 'Invalid QR JSON format'})
+            continue
+        item_code = data['item_code']
+        if not item_code:
+            results.append({'index': index, 'success': False, 'error': 'Item code missing in QR'})
+            continue
+        if target_item_code and item_code != target_item_code:
+            results.append({'index': index, 'success': False, 'item_code': item_code, 'item_mismatch': True,
+                            'error': f'QR code is for item "{item_code}", expected "{target_item_code}"'})
+            continue
+
+        grn_id = data['id']
+        pack_label = data['pack'] or '1 of 1'
+        pack_key = f"{grn_id}|{pack_label}"
+        result = {'index': index, 'item_code': item_code, 'pack_key': pack_key, 'pack_label': pack_label,
+                  'qty': data['qty'], 'grn_id': grn_id}
+        if grn_id in verified_grns:
+            results.append(dict(result, success=False, duplicate_grn=True,
+                                error=f'GRN {grn_id} already transferred designation warehouse!'))
+            continue
+        if (item_code, pack_key) in scanned_keys:
+            results.append(dict(result, success=False, duplicate=True, error=f'Pack {pack_label} already scanned!'))
+            continue
+
+        item = items.setdefault(item_code, {'requested_qty': 0, 'total_scanned_qty': 0, 'pack_count': 0})
+        item_requested = requested_qtys.get(item_code) or requested_qty
+        effective_requested_qty = item_requested if item_requested > 0 else item['requested_qty']
+        new_total = item['total_scanned_qty'] + data['qty']
+        if new_total > effective_requested_qty > 0:
+            results.append(dict(result, success=False, overflow=True,
+                                current_total=item['total_scanned_qty'], requested_qty=effective_requested_qty,
+                                error=(f"Scanning this pack exceeds requested quantity! Current: "
+                                       f"{item['total_scanned_qty']}, Adding: {data['qty']}, "
+                                       f"Requested: {effective_requested_qty}")))
+            continue
+
+        item['requested_qty'] = effective_requested_qty or item_requested
+        item['total_scanned_qty'] = new_total
+        item['pack_count'] += 1
+        scanned_keys.add((item_code, pack_key))
+        rows.append({
+            'transfer_id': transfer_id,
+            'item_code': item_code,
+            'user_id': current_user.id,
+            'requested_qty': item['requested_qty'],
+            'pack_key': pack_key,
+            'pack_label': pack_label,
+            'batch_number': data.get('batch_number') or '',
+            'qty': data['qty'],
+            'grn_id': grn_id,
+            'grn_date': data.get('grn_date') or '',
+            'exp_date': data.get('exp_date') or '',
+            'po': data.get('po') or '',
+            'bin_location': data.get('bin_location') or '',
+            'transfer_status': 'pending',
+        })
+        results.append(dict(result, success=True))
+
+    for item in items.values():
+        item['remaining_qty'] = max(0, item['requested_qty'] - item['total_scanned_qty'])
+        item['is_complete'] = item['total_scanned_qty'] >= item['requested_qty']
+    return results, rows, items
+
+
+@transfer_bp.route('/api/scan-qr-labels', methods=['POST'])
+@login_required
+def api_scan_qr_labels():
+    """
+    Batch version of /api/scan-qr-label for scanners that buffer scans offline.
+
+    Body: {"transfer_id": 1, "qr_labels": ["<QR JSON>", ...], "requested_qty": 0,
+           "requested_qtys": {"ITEM": 100}, "target_item_code": ""}
+    Labels are deduplicated within the batch and against the stored scan state,
+    accepted packs are inserted together, and a result is returned per label
+    (same error flags as the single-scan endpoint) plus totals per item.
+    Re-sending a batch is safe: packs stored by an earlier attempt come back
+    as duplicates.
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({'success': False, 'error': 'Invalid JSON data'}), 400
+
+        transfer_id = data.get('transfer_id')
+        labels = data.get('qr_labels')
+        if not transfer_id:
+            return jsonify({'success': False, 'error': 'Transfer ID is required'}), 400
+        if not isinstance(labels, list) or not labels:
+            return jsonify({'success': False, 'error': 'qr_labels must be a non-empty list'}), 400
+        if len(labels) > MAX_SCAN_BATCH:
+            return jsonify({'success': False, 'error': f'At most {MAX_SCAN_BATCH} labels per request'}), 413
+
+        try:
+            requested_qty = float(data.get('requested_qty') or 0)
+            requested_qtys = {code: float(qty or 0) for code, qty in (data.get('requested_qtys') or {}).items()}
+        except (TypeError, ValueError, AttributeError):
+            return jsonify({'success': False, 'error': 'Invalid requested quantity'}), 400
+        target_item_code = (data.get('target_item_code') or '').strip()
+
+        transfer = db.session.get(InventoryTransfer, transfer_id)
+        if not transfer:
+            return jsonify({'success': False, 'error': 'Transfer not found'}), 404
+
+        # Access restriction
+        if transfer.user_id != current_user.id and current_user.role not in ['admin', 'manager']:
+            return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+        # A concurrent scan of the same pack trips uq_transfer_item_pack; evaluate again once
+        for attempt in range(2):
+            results, rows, items = _evaluate_scan_batch(transfer.id, labels, requested_qty,
+                                                        requested_qtys, target_item_code)
+            try:
+                if rows:
+                    db.session.execute(insert(TransferScanState), rows)
+                db.session.commit()
+                break
+            except IntegrityError:
+                db.session.rollback()
+                if attempt:
+                    raise
+                logging.warning(f"⚠️ Scan batch for transfer {transfer_id} raced another scan, re-checking")
+
+        accepted = len(rows)
+        logging.info(f"📷 Scan batch for transfer {transfer_id}: {accepted}/{len(labels)} packs accepted")
+        return jsonify({
+            'success': True,
+            'accepted': accepted,
+            'rejected': len(labels) - accepted,
+            'results': results,
+            'items': items
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error scanning QR label batch: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @transfer_bp.route('/api/reset-scan-state', methods=['POST'])
 @login_required
 def api_reset_scan_state():
@@ -29,6 +29,10 @@ class MultiGRNBatch(db.Model):
             rejected (if QC rejects)
     """
     __tablename__ = 'multi_grn_document'
+    __table_args__ = (
+        db.Index('idx_multi_grn_document_status_created', 'status', 'created_at'),
+        db.Index('idx_multi_grn_document_user_created', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     batch_number = db.Column(db.String(50), unique=True, nullable=True)
@@ -91,7 +95,7 @@ class MultiGRNLineSelection(db.Model):
     __tablename__ = 'multi_grn_line_selections'
     
     id = db.Column(db.Integer, primary_key=True)
-    po_link_id = db.Column(db.Integer, db.ForeignKey('multi_grn_po_links.id'), nullable=False)
+    po_link_id = db.Column(db.Integer, db.ForeignKey('multi_grn_po_links.id'), nullable=False, index=True)
     po_line_num = db.Column(db.Integer, nullable=False)
     item_code = db.Column(db.String(50), nullable=False)
     item_description = db.Column(db.String(200))
@@ -126,7 +130,7 @@ class MultiGRNBatchDetails(db.Model):
     __tablename__ = 'multi_grn_batch_details'
     
     id = db.Column(db.Integer, primary_key=True)
-    line_selection_id = db.Column(db.Integer, db.ForeignKey('multi_grn_line_selections.id'), nullable=False)
+    line_selection_id = db.Column(db.Integer, db.ForeignKey('multi_grn_line_selections.id'), nullable=False, index=True)
     batch_number = db.Column(db.String(100), nullable=False)
     quantity = db.Column(db.Numeric(15, 3), nullable=False)
     manufacturer_serial_number = db.Column(db.String(100))
@@ -147,7 +151,7 @@ class MultiGRNSerialDetails(db.Model):
     __tablename__ = 'multi_grn_serial_details'
     
     id = db.Column(db.Integer, primary_key=True)
-    line_selection_id = db.Column(db.Integer, db.ForeignKey('multi_grn_line_selections.id'), nullable=False)
+    line_selection_id = db.Column(db.Integer, db.ForeignKey('multi_grn_line_selections.id'), nullable=False, index=True)
     serial_number = db.Column(db.String(100), nullable=False)
     manufacturer_serial_number = db.Column(db.String(100))
     internal_serial_number = db.Column(db.String(100))
@@ -14,6 +14,9 @@ import json
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 
 from sap_integration import SAPIntegration
+from sap_posting_queue import (enqueue_posting_job, find_earlier_posting, job_response,
+                               posting_handler, set_job_reference)
+from qr_label_renderer import render_qr_batch
 
 # Use absolute path for template_folder to support PyInstaller .exe builds
 multi_grn_bp = Blueprint('multi_grn', __name__, 
@@ -57,6 +60,57 @@ def distribute_quantity_to_packs(total_quantity, num_packs):
     
     return quantities
 
+
+def batch_verification_summaries(batch_ids):
+    """
+    Count QR label rows and verified rows per batch in one grouped query.
+    
+    Batch details and serial details of every line of every PO in the batch are
+    combined with UNION ALL and grouped by batch, replacing per-line lookups.
+    
+    Args:
+        batch_ids: Iterable of MultiGRNBatch ids
+        
+    Returns:
+        dict: batch_id -> {'total': int, 'verified': int}; batches without any
+        detail rows map to zero counts
+    """
+    from sqlalchemy import case, func, select, union_all
+    from modules.multi_grn_creation.models import MultiGRNBatchDetails, MultiGRNSerialDetails
+    
+    batch_ids = list(batch_ids)
+    summaries = {batch_id: {'total': 0, 'verified': 0} for batch_id in batch_ids}
+    if not batch_ids:
+        return summaries
+    
+    # Each branch is filtered by batch before the UNION so the detail tables are
+    # reached through their line_selection_id index instead of being read in full
+    branches = [
+        select(MultiGRNPOLink.batch_id, detail_model.status)
+        .join(MultiGRNLineSelection, MultiGRNLineSelection.po_link_id == MultiGRNPOLink.id)
+        .join(detail_model, detail_model.line_selection_id == MultiGRNLineSelection.id)
+        .where(MultiGRNPOLink.batch_id.in_(batch_ids))
+        for detail_model in (MultiGRNBatchDetails, MultiGRNSerialDetails)
+    ]
+    details = union_all(*branches).subquery()
+    
+    rows = db.session.execute(
+        select(details.c.batch_id,
+               func.count().label('total'),
+               func.sum(case((details.c.status == 'verified', 1), else_=0)).label('verified'))
+        .group_by(details.c.batch_id)
+    ).all()
+    
+    for row in rows:
+        summaries[row.batch_id] = {'total': row.total or 0, 'verified': int(row.verified or 0)}
+    return summaries
+
+
+def batch_verification_summary(batch_id):
+    """Return (total, verified) QR label counts for a single batch"""
+    summary = batch_verification_summaries([batch_id])[batch_id]
+    return summary['total'], summary['verified']
+
 @multi_grn_bp.route('/')
 @login_required
 def index():
@@ -514,6 +568,12 @@ def create_step3_select_lines(batch_id):
         # Process line selection from Step 2 (initial selection)
         sap_service = SAPMultiGRNService()
         
+        # Validate the items of all selected lines with concurrent SAP lookups instead of one call per line
+        item_validations = sap_service.validate_item_codes(
+            json.loads(line_data_json).get('ItemCode')
+            for po_link in batch.po_links
+            for line_data_json in request.form.getlist(f'lines_po_{po_link.id}[]'))
+        
         for po_link in batch.po_links:
             selected_lines = request.form.getlist(f'lines_po_{po_link.id}[]')
             
@@ -551,7 +611,7 @@ def create_step3_select_lines(batch_id):
                     if not existing_line:
                         # CRITICAL FIX: Validate item with SAP to get correct batch/serial/management flags
                         item_code = line_data['ItemCode']
-                        validation_result = sap_service.validate_item_code(item_code)
+                        validation_result = item_validations.get(item_code) or sap_service.validate_item_code(item_code)
                         
                         # Extract validation data or use safe defaults
                         if validation_result.get('success'):
@@ -605,9 +665,12 @@ def create_step3_select_lines(batch_id):
         sap_service = SAPMultiGRNService()
         po_details = []
         
+        # Fetch the $crossjoin PO lines for every linked PO in one $batch request
+        po_lines_results = sap_service.fetch_po_lines_by_docentries(
+            [po_link.po_doc_entry for po_link in batch.po_links])
+        
         for po_link in batch.po_links:
-            # Use $crossjoin method to fetch PO lines by DocEntry
-            result = sap_service.fetch_po_lines_by_docentry(po_link.po_doc_entry)
+            result = po_lines_results[po_link.po_doc_entry]
             logging.info(f"📊 Step 3 - Fetched PO lines using $crossjoin for DocEntry {po_link.po_doc_entry}: Success={result.get('success')}")
             
             # Handle both success/failure cases safely
@@ -735,7 +798,7 @@ def submit_batch(batch_id):
 @multi_grn_bp.route('/batch/<int:batch_id>/approve', methods=['POST'])
 @login_required
 def approve_batch(batch_id):
-    """QC approve Multi GRN batch and post consolidated GRN to SAP B1"""
+    """QC approve Multi GRN batch and queue the consolidated GRN for posting to SAP B1"""
     from datetime import datetime
     try:
         batch = MultiGRNBatch.query.get_or_404(batch_id)
@@ -746,25 +809,7 @@ def approve_batch(batch_id):
         if batch.status != 'submitted':
             return jsonify({'success': False, 'error': 'Only submitted batches can be approved'}), 400
         
-        from modules.multi_grn_creation.models import MultiGRNBatchDetails, MultiGRNSerialDetails
-        
-        total_items = 0
-        verified_items = 0
-        
-        for po_link in batch.po_links:
-            for line in po_link.line_selections:
-                batch_details = MultiGRNBatchDetails.query.filter_by(line_selection_id=line.id).all()
-                serial_details = MultiGRNSerialDetails.query.filter_by(line_selection_id=line.id).all()
-                
-                for detail in batch_details:
-                    total_items += 1
-                    if detail.status == 'verified':
-                        verified_items += 1
-                
-                for detail in serial_details:
-                    total_items += 1
-                    if detail.status == 'verified':
-                        verified_items += 1
+        total_items, verified_items = batch_verification_summary(batch.id)
         
         if total_items > 0 and verified_items != total_items:
             return jsonify({
@@ -782,9 +827,6 @@ def approve_batch(batch_id):
         batch.qc_approver_id = current_user.id
         batch.qc_approved_at = datetime.utcnow()
         batch.qc_notes = qc_notes
-        db.session.commit()
-        
-        sap_service = SAPMultiGRNService()
         
         if not batch.po_links:
             return jsonify({'success': False, 'error': 'No purchase orders in this batch'}), 400
@@ -801,182 +843,213 @@ def approve_batch(batch_id):
                 db.session.commit()
                 return jsonify({'success': False, 'error': error_msg}), 400
         
-        consolidated_document_lines = []
-        line_number = 0
-        all_line_selections = []
+        job = enqueue_posting_job('multi_grn_batch', batch.id, created_by=current_user.id)
         
-        for po_link in batch.po_links:
-            if not po_link.line_selections:
-                continue
-            
-            for line in po_link.line_selections:
-                all_line_selections.append({
-                    'line': line,
-                    'po_link': po_link
-                })
+        logging.info(f"✅ Batch {batch.batch_number} QC approved by {current_user.username}, SAP posting job {job.id} queued")
+        return jsonify(job_response(
+            job, f'Batch {batch.batch_number} approved by QC. The consolidated GRN is being posted to SAP B1.'
+        )), 202
         
-        for item in all_line_selections:
-            line = item['line']
-            po_link = item['po_link']
-            
-            if line.line_status == 'manual' or line.po_line_num == -1:
-                doc_line = {
-                    'LineNum': line_number,
-                    'ItemCode': line.item_code,
-                    'Quantity': float(line.selected_quantity),
-                    'WarehouseCode': line.warehouse_code
-                }
-            else:
-                doc_line = {
-                    'LineNum': line_number,
-                    'BaseType': 22,
-                    'BaseEntry': po_link.po_doc_entry,
-                    'BaseLine': line.po_line_num,
-                    'ItemCode': line.item_code,
-                    'Quantity': float(line.selected_quantity),
-                    'WarehouseCode': line.warehouse_code
-                }
-            
-            if line.bin_location:
-                try:
-                    bin_abs_entry = int(line.bin_location)
-                    logging.info(f"✅ Using numeric BinAbsEntry: {bin_abs_entry}")
-                except (ValueError, TypeError):
-                    bin_result = sap_service.get_bin_abs_entry(line.bin_location)
-                    if bin_result.get('success'):
-                        bin_abs_entry = bin_result.get('abs_entry')
-                        logging.info(f"✅ Fetched BinAbsEntry {bin_abs_entry} for BinCode {line.bin_location}")
-                    else:
-                        logging.warning(f"⚠️ Failed to fetch BinAbsEntry for {line.bin_location}: {bin_result.get('error')}")
-                        bin_abs_entry = None
-                
-                if bin_abs_entry:
-                    doc_line['DocumentLinesBinAllocations'] = [{
-                        'BinAbsEntry': bin_abs_entry,
-                        'Quantity': float(line.selected_quantity),
-                        'SerialAndBatchNumbersBaseLine': 0
-                    }]
+    except Exception as e:
+        logging.error(f"❌ Error approving Multi GRN batch {batch_id}: {str(e)}")
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-            def safe_isoformat(value):
-                if isinstance(value, datetime):
-                    return value.isoformat()
-                return value
-            if line.batch_details and (line.batch_required == 'Y' or line.manage_method == 'R'):
-                batch_numbers = []
-                for batch_detail in line.batch_details:
-                    batch_entry = {
-                        'BatchNumber': batch_detail.batch_number,
-                        'Quantity': float(batch_detail.quantity)
-                    }
-                    if batch_detail.expiry_date:
-                        batch_entry['ExpiryDate'] = batch_detail.expiry_date
-                    if batch_detail.manufacturer_serial_number:
-                        batch_entry['ManufacturerSerialNumber'] = batch_detail.manufacturer_serial_number
-                    if batch_detail.internal_serial_number:
-                        batch_entry['InternalSerialNumber'] = batch_detail.internal_serial_number
-                    batch_numbers.append(batch_entry)
-                
-                if batch_numbers:
-                    doc_line['BatchNumbers'] = batch_numbers
-            
-            elif line.serial_details and line.serial_required == 'Y':
-                serial_numbers = []
-                for serial_detail in line.serial_details:
-                    serial_entry = {
-                        'InternalSerialNumber': serial_detail.serial_number,
-                        'Quantity': 1.0
-                    }
-                    if serial_detail.manufacturer_serial_number:
-                        serial_entry['ManufacturerSerialNumber'] = serial_detail.manufacturer_serial_number
-                    if serial_detail.expiry_date:
-                        serial_entry['ExpiryDate'] = serial_detail.expiry_date.isoformat()
-                    serial_numbers.append(serial_entry)
-                
-                if serial_numbers:
-                    doc_line['SerialNumbers'] = serial_numbers
-            
-            elif line.serial_numbers and line.serial_required == 'Y':
-                serial_data = json.loads(line.serial_numbers) if isinstance(line.serial_numbers, str) else line.serial_numbers
-                doc_line['SerialNumbers'] = serial_data
-            
-            elif line.batch_numbers and (line.batch_required == 'Y' or line.manage_method == 'R'):
-                batch_data = json.loads(line.batch_numbers) if isinstance(line.batch_numbers, str) else line.batch_numbers
-                doc_line['BatchNumbers'] = batch_data
-            
-            consolidated_document_lines.append(doc_line)
-            line_number += 1
-        
-        if not consolidated_document_lines:
-            error_msg = 'No line items selected for posting. Please select at least one item from the purchase orders.'
-            logging.error(f"❌ {error_msg}")
-            batch.status = 'failed'
-            batch.error_log = error_msg
-            db.session.commit()
-            return jsonify({'success': False, 'error': error_msg}), 400
-        
-        po_nums = ', '.join([po_link.po_doc_num for po_link in batch.po_links])
-
-          # already a string
-
-        datevalue = safe_isoformat(date.today().isoformat())
-        print("datevaluedatevalue----->",datevalue)
-        grn_data = {
-            'CardCode': card_code,
-            'DocDate': datevalue,
-            'DocDueDate': datevalue,
-            'Comments': f'QC Approved - Batch {batch.batch_number}. POs: {po_nums}',
-            'NumAtCard': f'{batch.batch_number}',
-            'BPL_IDAssignedToInvoice': 5,
-            'DocumentLines': consolidated_document_lines
+
+def _mark_batch_posting_failed(job, error_msg):
+    batch = MultiGRNBatch.query.get(job.document_id)
+    if batch is None or batch.status == 'posted':
+        return
+    for po_link in batch.po_links:
+        po_link.status = 'failed'
+        po_link.error_message = error_msg
+    batch.status = 'failed'
+    batch.error_log = error_msg
+
+
+@posting_handler('multi_grn_batch', on_failure=_mark_batch_posting_failed)
+def post_batch_to_sap(job):
+    """Build the consolidated GRN for a QC approved batch and post it to SAP B1 (posting queue worker)"""
+    batch = MultiGRNBatch.query.get(job.document_id)
+    if batch is None:
+        return {'success': False, 'error': f'Multi GRN batch {job.document_id} not found', 'retryable': False}
+    
+    if batch.status == 'posted':
+        first_po_link = batch.po_links[0] if batch.po_links else None
+        return {
+            'success': True,
+            'doc_entry': first_po_link.sap_grn_doc_entry if first_po_link else None,
+            'doc_num': first_po_link.sap_grn_doc_num if first_po_link else None
         }
+    
+    sap_service = SAPMultiGRNService()
+    card_code = batch.po_links[0].po_card_code
+    
+    consolidated_document_lines = []
+    line_number = 0
+    all_line_selections = []
+    
+    for po_link in batch.po_links:
+        if not po_link.line_selections:
+            continue
         
-        logging.info(f"📦 Consolidated GRN payload: {len(consolidated_document_lines)} lines from {len(batch.po_links)} POs")
-        logging.debug(f"   GRN JSON: {json.dumps(grn_data, indent=2)}")
-        print(grn_data)
-        result = sap_service.create_purchase_delivery_note(grn_data)
-        
-        if result['success']:
-            grn_doc_num = result.get('doc_num')
-            grn_doc_entry = result.get('doc_entry')
-            
-            for po_link in batch.po_links:
-                po_link.status = 'posted'
-                po_link.sap_grn_doc_num = grn_doc_num
-                po_link.sap_grn_doc_entry = grn_doc_entry
-                po_link.posted_at = datetime.utcnow()
-            
-            batch.status = 'posted'
-            batch.total_grns_created = 1
-            batch.completed_at = datetime.utcnow()
-            batch.posted_at = datetime.utcnow()
-            db.session.commit()
-            
-            logging.info(f"✅ Batch {batch.batch_number} QC approved and posted: 1 consolidated GRN created (DocNum={grn_doc_num})")
-            return jsonify({
-                'success': True,
-                'grn_doc_num': grn_doc_num,
-                'grn_doc_entry': grn_doc_entry,
-                'po_count': len(batch.po_links),
-                'line_count': len(consolidated_document_lines),
-                'message': f'Batch approved by QC and successfully posted to SAP B1. GRN #{grn_doc_num} created with {len(consolidated_document_lines)} lines from {len(batch.po_links)} purchase orders.'
+        for line in po_link.line_selections:
+            all_line_selections.append({
+                'line': line,
+                'po_link': po_link
             })
+    
+    # Resolve every non-numeric bin code up front in one $batch request
+    bin_codes_to_resolve = []
+    for item in all_line_selections:
+        bin_location = item['line'].bin_location
+        if bin_location:
+            try:
+                int(bin_location)
+            except (ValueError, TypeError):
+                bin_codes_to_resolve.append(bin_location)
+    bin_results = sap_service.get_bin_abs_entries(bin_codes_to_resolve) if bin_codes_to_resolve else {}
+    
+    for item in all_line_selections:
+        line = item['line']
+        po_link = item['po_link']
+        
+        if line.line_status == 'manual' or line.po_line_num == -1:
+            doc_line = {
+                'LineNum': line_number,
+                'ItemCode': line.item_code,
+                'Quantity': float(line.selected_quantity),
+                'WarehouseCode': line.warehouse_code
+            }
         else:
-            error_msg = result.get('error', 'Unknown error')
-            for po_link in batch.po_links:
-                po_link.status = 'failed'
-                po_link.error_message = error_msg
-            
-            batch.status = 'failed'
-            batch.error_log = error_msg
-            db.session.commit()
+            doc_line = {
+                'LineNum': line_number,
+                'BaseType': 22,
+                'BaseEntry': po_link.po_doc_entry,
+                'BaseLine': line.po_line_num,
+                'ItemCode': line.item_code,
+                'Quantity': float(line.selected_quantity),
+                'WarehouseCode': line.warehouse_code
+            }
+        
+        if line.bin_location:
+            try:
+                bin_abs_entry = int(line.bin_location)
+                logging.info(f"✅ Using numeric BinAbsEntry: {bin_abs_entry}")
+            except (ValueError, TypeError):
+                bin_result = bin_results.get(line.bin_location) or sap_service.get_bin_abs_entry(line.bin_location)
+                if bin_result.get('success'):
+                    bin_abs_entry = bin_result.get('abs_entry')
+                    logging.info(f"✅ Fetched BinAbsEntry {bin_abs_entry} for BinCode {line.bin_location}")
+                else:
+                    logging.warning(f"⚠️ Failed to fetch BinAbsEntry for {line.bin_location}: {bin_result.get('error')}")
+                    bin_abs_entry = None
             
-            logging.error(f"❌ Failed to create consolidated GRN for batch {batch.batch_number}: {error_msg}")
-            return jsonify({'success': False, 'error': error_msg}), 500
+            if bin_abs_entry:
+                doc_line['DocumentLinesBinAllocations'] = [{
+                    'BinAbsEntry': bin_abs_entry,
+                    'Quantity': float(line.selected_quantity),
+                    'SerialAndBatchNumbersBaseLine': 0
+                }]
+
+        def safe_isoformat(value):
+            if isinstance(value, datetime):
+                return value.isoformat()
+            return value
+        if line.batch_details and (line.batch_required == 'Y' or line.manage_method == 'R'):
+            batch_numbers = []
+            for batch_detail in line.batch_details:
+                batch_entry = {
+                    'BatchNumber': batch_detail.batch_number,
+                    'Quantity': float(batch_detail.quantity)
+                }
+                if batch_detail.expiry_date:
+                    batch_entry['ExpiryDate'] = batch_detail.expiry_date
+                if batch_detail.manufacturer_serial_number:
+                    batch_entry['ManufacturerSerialNumber'] = batch_detail.manufacturer_serial_number
+                if batch_detail.internal_serial_number:
+                    batch_entry['InternalSerialNumber'] = batch_detail.internal_serial_number
+                batch_numbers.append(batch_entry)
+            
+            if batch_numbers:
+                doc_line['BatchNumbers'] = batch_numbers
+        
+        elif line.serial_details and line.serial_required == 'Y':
+            serial_numbers = []
+            for serial_detail in line.serial_details:
+                serial_entry = {
+                    'InternalSerialNumber': serial_detail.serial_number,
+                    'Quantity': 1.0
+                }
+                if serial_detail.manufacturer_serial_number:
+                    serial_entry['ManufacturerSerialNumber'] = serial_detail.manufacturer_serial_number
+                if serial_detail.expiry_date:
+                    serial_entry['ExpiryDate'] = serial_detail.expiry_date.isoformat()
+                serial_numbers.append(serial_entry)
+            
+            if serial_numbers:
+                doc_line['SerialNumbers'] = serial_numbers
+        
+        elif line.serial_numbers and line.serial_required == 'Y':
+            serial_data = json.loads(line.serial_numbers) if isinstance(line.serial_numbers, str) else line.serial_numbers
+            doc_line['SerialNumbers'] = serial_data
+        
+        elif line.batch_numbers and (line.batch_required == 'Y' or line.manage_method == 'R'):
+            batch_data = json.loads(line.batch_numbers) if isinstance(line.batch_numbers, str) else line.batch_numbers
+            doc_line['BatchNumbers'] = batch_data
+        
+        consolidated_document_lines.append(doc_line)
+        line_number += 1
+    
+    if not consolidated_document_lines:
+        error_msg = 'No line items selected for posting. Please select at least one item from the purchase orders.'
+        logging.error(f"❌ {error_msg}")
+        return {'success': False, 'error': error_msg, 'retryable': False}
+    
+    po_nums = ', '.join([po_link.po_doc_num for po_link in batch.po_links])
+
+      # already a string
+
+    datevalue = safe_isoformat(date.today().isoformat())
+    grn_data = {
+        'CardCode': card_code,
+        'DocDate': datevalue,
+        'DocDueDate': datevalue,
+        'Comments': f'QC Approved - Batch {batch.batch_number}. POs: {po_nums}',
+        'NumAtCard': f'{batch.batch_number}',
+        'BPL_IDAssignedToInvoice': 5,
+        'DocumentLines': consolidated_document_lines
+    }
+    
+    logging.info(f"📦 Consolidated GRN payload: {len(consolidated_document_lines)} lines from {len(batch.po_links)} POs")
+    logging.debug(f"   GRN JSON: {json.dumps(grn_data, indent=2)}")
+    set_job_reference(job, grn_data['NumAtCard'])
+    result = (find_earlier_posting(job, sap_service, 'PurchaseDeliveryNotes', 'NumAtCard')
+              or sap_service.create_purchase_delivery_note(grn_data))
+    
+    if result['success']:
+        grn_doc_num = result.get('doc_num')
+        grn_doc_entry = result.get('doc_entry')
         
-    except Exception as e:
-        logging.error(f"❌ Error approving Multi GRN batch {batch_id}: {str(e)}")
-        db.session.rollback()
-        return jsonify({'success': False, 'error': str(e)}), 500
+        for po_link in batch.po_links:
+            po_link.status = 'posted'
+            po_link.sap_grn_doc_num = grn_doc_num
+            po_link.sap_grn_doc_entry = grn_doc_entry
+            po_link.posted_at = datetime.utcnow()
+        
+        batch.status = 'posted'
+        batch.total_grns_created = 1
+        batch.completed_at = datetime.utcnow()
+        batch.posted_at = datetime.utcnow()
+        db.session.commit()
+        
+        logging.info(f"✅ Batch {batch.batch_number} posted: 1 consolidated GRN created (DocNum={grn_doc_num})")
+        return {'success': True, 'doc_entry': grn_doc_entry, 'doc_num': grn_doc_num}
+    
+    error_msg = result.get('error', 'Unknown error')
+    logging.error(f"❌ Failed to create consolidated GRN for batch {batch.batch_number}: {error_msg}")
+    return {'success': False, 'error': error_msg}
+
 
 @multi_grn_bp.route('/batch/<int:batch_id>/reject', methods=['POST'])
 @login_required
@@ -1030,28 +1103,7 @@ def qc_review_batch(batch_id):
             flash('Only submitted batches can be reviewed', 'error')
             return redirect(url_for('qc_dashboard'))
 
-        from modules.multi_grn_creation.models import MultiGRNBatchDetails, MultiGRNSerialDetails
-
-        total_line_items = 0
-        verified_line_items = 0
-        all_verified = False
-
-        for po_link in batch.po_links:
-            for line in po_link.line_selections:
-                batch_details_count = MultiGRNBatchDetails.query.filter_by(line_selection_id=line.id).count()
-                serial_details_count = MultiGRNSerialDetails.query.filter_by(line_selection_id=line.id).count()
-                total_line_items += batch_details_count + serial_details_count
-                verified_batch = MultiGRNBatchDetails.query.filter_by(
-                    line_selection_id=line.id,
-                    status='verified'
-                ).count()
-                verified_serial = MultiGRNSerialDetails.query.filter_by(
-                    line_selection_id=line.id,
-                    status='verified'
-                ).count()
-
-                verified_line_items += verified_batch + verified_serial
-
+        total_line_items, verified_line_items = batch_verification_summary(batch.id)
         all_verified = total_line_items > 0 and verified_line_items == total_line_items
 
         return render_template('multi_grn/qc_review.html',
@@ -1175,33 +1227,8 @@ def qc_review_batchs(batch_id):
             flash(msg, 'error')
             return redirect(url_for('qc_dashboard'))
 
-        from modules.multi_grn_creation.models import MultiGRNBatchDetails, MultiGRNSerialDetails
-
-        total_line_items = 0
-        verified_line_items = 0
-
         # ---- Count totals & verified from Details tables ----
-        for po_link in batch.po_links:
-            for line in po_link.line_selections:
-                batch_details_count = MultiGRNBatchDetails.query.filter_by(
-                    line_selection_id=line.id
-                ).count()
-                serial_details_count = MultiGRNSerialDetails.query.filter_by(
-                    line_selection_id=line.id
-                ).count()
-
-                total_line_items += batch_details_count + serial_details_count
-
-                verified_batch = MultiGRNBatchDetails.query.filter_by(
-                    line_selection_id=line.id,
-                    status='verified'
-                ).count()
-                verified_serial = MultiGRNSerialDetails.query.filter_by(
-                    line_selection_id=line.id,
-                    status='verified'
-                ).count()
-
-                verified_line_items += verified_batch + verified_serial
+        total_line_items, verified_line_items = batch_verification_summary(batch.id)
 
         all_verified = total_line_items > 0 and verified_line_items == total_line_items
 
@@ -1669,25 +1696,7 @@ def batch_verification_status(batch_id):
     try:
         batch = MultiGRNBatch.query.get_or_404(batch_id)
         
-        from modules.multi_grn_creation.models import MultiGRNBatchDetails, MultiGRNSerialDetails
-        
-        total_items = 0
-        verified_items = 0
-        
-        for po_link in batch.po_links:
-            for line in po_link.line_selections:
-                batch_details = MultiGRNBatchDetails.query.filter_by(line_selection_id=line.id).all()
-                serial_details = MultiGRNSerialDetails.query.filter_by(line_selection_id=line.id).all()
-                
-                for detail in batch_details:
-                    total_items += 1
-                    if detail.status == 'verified':
-                        verified_items += 1
-                
-                for detail in serial_details:
-                    total_items += 1
-                    if detail.status == 'verified':
-                        verified_items += 1
+        total_items, verified_items = batch_verification_summary(batch.id)
         
         all_verified = total_items > 0 and verified_items == total_items
         
@@ -2037,6 +2046,7 @@ def update_line_item():
     """Update line item details with warehouse, bin location, quantity, and number of bags"""
     try:
         data = request.get_json()
+        new_pack_labels = []
         
         line_selection_id = data.get('line_selection_id')
         quantity = data.get('quantity')
@@ -2082,9 +2092,6 @@ def update_line_item():
         if number_of_bags and int(number_of_bags) > 0:
             from modules.multi_grn_creation.models import MultiGRNBatchDetails
             from datetime import datetime
-            import io
-            import base64
-            import qrcode
             
             # Clear existing batch details and labels for this line (cascade delete handles labels automatically)
             existing_batches = MultiGRNBatchDetails.query.filter_by(line_selection_id=line_selection_id).all()
@@ -2157,35 +2164,23 @@ def update_line_item():
                     }
                     qr_text = json.dumps(qr_data)
                     
-                    try:
-                        qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
-                        qr.add_data(qr_text)
-                        qr.make(fit=True)
-                        img = qr.make_image(fill_color="black", back_color="white")
-                        buffer = io.BytesIO()
-                        img.save(buffer, format='PNG')
-                        buffer.seek(0)
-                        barcode = f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}"
-                    except Exception as e:
-                        logging.error(f"Error generating QR code: {str(e)}")
-                        barcode = None
-                    
                     # Create label record
                     label = MultiGRNBatchDetailsLabel(
                         batch_detail_id=batch_detail.id,
                         pack_number=pack_num,
                         qty_in_pack=pack_qty,
                         grn_number=grn_number,
-                        barcode=barcode,
                         qr_data=qr_text
                     )
                     db.session.add(label)
+                    new_pack_labels.append(label)
                     logging.info(f"✅ Created pack label {pack_num}/{bags_count}: GRN={grn_number}, Qty={pack_qty}")
                 
                 logging.info(f"✅ Created 1 batch_detail + {bags_count} pack labels for line {line_selection_id}: Total Qty={total_qty_int}, Batch={batch_number}")
             else:
                 logging.warning(f"⚠️ No quantity selected for line {line_selection_id}, skipping pack creation")
         
+        render_pack_label_barcodes(new_pack_labels)
         db.session.commit()
         
         logging.info(f"✅ Updated line item {line_selection_id}: Qty={quantity}, Warehouse={warehouse_code}, Bin={bin_location}, Bags={number_of_bags}")
@@ -2403,9 +2398,6 @@ def add_manual_item():
 def manage_batch_details(line_id):
     """Get or add batch number details for a Multi GRN line selection"""
     from modules.multi_grn_creation.models import MultiGRNBatchDetails
-    import io
-    import base64
-    import qrcode
     
     line_selection = MultiGRNLineSelection.query.get_or_404(line_id)
     
@@ -2477,6 +2469,7 @@ def manage_batch_details(line_id):
             
             # Create individual label records for each pack
             created_packs = []
+            new_pack_labels = []
             for pack_num in range(1, no_of_packs + 1):
                 pack_qty = pack_quantities[pack_num - 1]
                 grn_number = f"MGN-{batch_id}-{line_id}-1-{pack_num}"
@@ -2495,29 +2488,16 @@ def manage_batch_details(line_id):
                 }
                 qr_text = json.dumps(qr_data)
                 
-                try:
-                    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
-                    qr.add_data(qr_text)
-                    qr.make(fit=True)
-                    img = qr.make_image(fill_color="black", back_color="white")
-                    buffer = io.BytesIO()
-                    img.save(buffer, format='PNG')
-                    buffer.seek(0)
-                    barcode = f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}"
-                except Exception as e:
-                    logging.error(f"Error generating QR code: {str(e)}")
-                    barcode = None
-                
                 # Create label record
                 label = MultiGRNBatchDetailsLabel(
                     batch_detail_id=batch.id,
                     pack_number=pack_num,
                     qty_in_pack=pack_qty,
                     grn_number=grn_number,
-                    barcode=barcode,
                     qr_data=qr_text
                 )
                 db.session.add(label)
+                new_pack_labels.append(label)
                 
                 created_packs.append({
                     'pack_num': pack_num,
@@ -2526,6 +2506,7 @@ def manage_batch_details(line_id):
                 })
                 logging.info(f"✅ Created pack label {pack_num}/{no_of_packs}: GRN={grn_number}, Qty={pack_qty}")
             
+            render_pack_label_barcodes(new_pack_labels)
             db.session.commit()
             
             logging.info(f"✅ Added batch {batch_num} for line selection {line_id}: {no_of_packs} pack label(s) created")
@@ -2631,44 +2612,18 @@ def manage_serial_details(line_id):
 
 def generate_barcode_multi_grn(data):
     """Generate QR code barcode and return base64 encoded image"""
-    import io
-    import base64
-    import qrcode
-    
-    try:
-        if not data or len(str(data).strip()) == 0:
-            logging.warning("⚠️ Empty data provided for barcode generation")
-            return None
-        
-        data_str = str(data).strip()
-        if len(data_str) > 500:
-            logging.warning(f"⚠️ Barcode data too long ({len(data_str)} chars), truncating to 500")
-            data_str = data_str[:500]
-        
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(data_str)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        buffer.seek(0)
-        img_base64 = base64.b64encode(buffer.getvalue()).decode()
-        
-        if len(img_base64) > 100000:
-            logging.warning(f"⚠️ Generated barcode too large ({len(img_base64)} bytes), skipping")
-            return None
-        
-        return f"data:image/png;base64,{img_base64}"
-    except Exception as e:
-        logging.error(f"❌ Error generating barcode for data '{str(data)[:50]}...': {str(e)}")
+    if not data or len(str(data).strip()) == 0:
+        logging.warning("⚠️ Empty data provided for barcode generation")
         return None
+    return render_qr_batch([data])['images'][0]
+
+def render_pack_label_barcodes(pack_labels):
+    """Fill in the QR barcodes of newly created pack labels with one bulk render"""
+    if not pack_labels:
+        return
+    rendered = render_qr_batch([label.qr_data for label in pack_labels])
+    for label, barcode in zip(pack_labels, rendered['images']):
+        label.barcode = barcode
 
 @multi_grn_bp.route('/api/generate-barcode-labels', methods=['POST'])
 @login_required
@@ -2716,6 +2671,8 @@ def generate_barcode_labels_multi_grn():
         po_number = line_selection.po_link.po_doc_num
         
         labels = []
+        # (label, qr_text, pack_label) rendered together once all labels are built
+        pending_images = []
         
         # Check if item has batch_details (even if not batch-managed) for pack generation
         has_batch_details = len(line_selection.batch_details) > 0
@@ -2777,7 +2734,6 @@ def generate_barcode_labels_multi_grn():
                 }
                 
                 qr_text = json.dumps(qr_data)
-                qr_code_image = generate_barcode_multi_grn(qr_text)
                 
                 label = {
                     'sequence': pack_idx,
@@ -2795,10 +2751,11 @@ def generate_barcode_labels_multi_grn():
                     'item_name': line_selection.item_description or '',
                     'doc_number': f"{serial_grn}-{pack_idx}",
                     'bin_location': line_selection.bin_location or 'N/A',
-                    'qr_code_image': qr_code_image,
+                    'qr_code_image': None,
                     'qr_data': qr_data
                 }
                 labels.append(label)
+                pending_images.append((label, qr_text, None))
         
         elif label_type == 'batch':
             logging.info(f"🔖 Processing BATCH labels")
@@ -2871,19 +2828,11 @@ def generate_barcode_labels_multi_grn():
                     
                     # Regenerate barcode with new qr_data
                     qr_text = json.dumps(qr_data_dict)
-                    qr_code_image = generate_barcode_multi_grn(qr_text)
-                    if qr_code_image:
-                        pack_label.barcode = qr_code_image
-                        logging.info(f"✅ Regenerated barcode for pack_label {pack_label.id}")
+                    qr_code_image = None
                 else:
                     # Use stored barcode or regenerate if missing
-                    if pack_label.barcode:
-                        qr_code_image = pack_label.barcode
-                    else:
-                        qr_text = json.dumps(qr_data_dict)
-                        qr_code_image = generate_barcode_multi_grn(qr_text)
-                        if qr_code_image:
-                            pack_label.barcode = qr_code_image
+                    qr_text = None if pack_label.barcode else json.dumps(qr_data_dict)
+                    qr_code_image = pack_label.barcode
                 
                 label = {
                     'sequence': pack_label.pack_number,
@@ -2906,12 +2855,12 @@ def generate_barcode_labels_multi_grn():
                     'qr_data': qr_data_dict
                 }
                 labels.append(label)
+                if qr_text:
+                    pending_images.append((label, qr_text, pack_label))
                 
                 # Mark label as printed
                 pack_label.printed = True
                 pack_label.printed_at = datetime.utcnow()
-            
-            db.session.commit()
         
         # Handle standard items with batch_details (created via number_of_packs)
         elif has_batch_details and label_type == 'regular':
@@ -2944,7 +2893,6 @@ def generate_barcode_labels_multi_grn():
                 }
                 
                 qr_text = json.dumps(qr_data)
-                qr_code_image = generate_barcode_multi_grn(qr_text)
                 
                 label = {
                     'sequence': pack_num,
@@ -2962,10 +2910,11 @@ def generate_barcode_labels_multi_grn():
                     'item_name': line_selection.item_description or '',
                     'doc_number': f"{batch_grn}-{pack_num}",
                     'bin_location': line_selection.bin_location or 'N/A',
-                    'qr_code_image': qr_code_image,
+                    'qr_code_image': None,
                     'qr_data': qr_data
                 }
                 labels.append(label)
+                pending_images.append((label, qr_text, None))
         
         # Handle regular items without batch_details (single label, no packs)
         else:
@@ -2983,7 +2932,6 @@ def generate_barcode_labels_multi_grn():
             }
             
             qr_text = json.dumps(qr_data)
-            qr_code_image = generate_barcode_multi_grn(qr_text)
             
             label = {
                 'sequence': 1,
@@ -2998,10 +2946,22 @@ def generate_barcode_labels_multi_grn():
                 'item_name': line_selection.item_description or '',
                 'doc_number': doc_number,
                 'bin_location': line_selection.bin_location or 'N/A',
-                'qr_code_image': qr_code_image,
+                'qr_code_image': None,
                 'qr_data': qr_data
             }
             labels.append(label)
+            pending_images.append((label, qr_text, None))
+        
+        # Render every QR code of the request in one bulk call
+        if pending_images:
+            rendered = render_qr_batch([qr_text for _, qr_text, _ in pending_images])
+            for (label, _, pack_label), qr_code_image in zip(pending_images, rendered['images']):
+                label['qr_code_image'] = qr_code_image
+                if pack_label is not None and qr_code_image:
+                    pack_label.barcode = qr_code_image
+        
+        if label_type == 'batch':
+            db.session.commit()
         
         logging.info(f"✅ Successfully generated {len(labels)} label(s) for line_selection_id={line_selection_id}, label_type={label_type}")
         
@@ -3060,6 +3020,7 @@ def add_item_to_batch(batch_id):
     
     try:
         batch = MultiGRNBatch.query.get_or_404(batch_id)
+        new_pack_labels = []
         
         # Verify ownership
         if batch.user_id != current_user.id:
@@ -3193,10 +3154,6 @@ def add_item_to_batch(batch_id):
                         db.session.rollback()
                         return jsonify({'success': False, 'error': f'Total batch quantity must equal item quantity'}), 400
                     
-                    import io
-                    import base64
-                    import qrcode
-                    
                     total_labels_created = 0
                     
                     # Get PO number and GRN date for QR code data
@@ -3245,28 +3202,15 @@ def add_item_to_batch(batch_id):
                                 }
                                 qr_text = json.dumps(qr_data)
                                 
-                                try:
-                                    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
-                                    qr.add_data(qr_text)
-                                    qr.make(fit=True)
-                                    img = qr.make_image(fill_color="black", back_color="white")
-                                    buffer = io.BytesIO()
-                                    img.save(buffer, format='PNG')
-                                    buffer.seek(0)
-                                    barcode = f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}"
-                                except Exception as e:
-                                    logging.error(f"Error generating QR code: {str(e)}")
-                                    barcode = None
-                                
                                 label = MultiGRNBatchDetailsLabel(
                                     batch_detail_id=batch_detail.id,
                                     pack_number=pack_num,
                                     qty_in_pack=pack_qty,
                                     grn_number=grn_number,
-                                    barcode=barcode,
                                     qr_data=qr_text
                                 )
                                 db.session.add(label)
+                                new_pack_labels.append(label)
                                 total_labels_created += 1
                                 logging.info(f"✅ Created pack label {pack_num}/{number_of_bags}: GRN={grn_number}, Qty={pack_qty}")
                         else:
@@ -3285,28 +3229,15 @@ def add_item_to_batch(batch_id):
                             }
                             qr_text = json.dumps(qr_data)
                             
-                            try:
-                                qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
-                                qr.add_data(qr_text)
-                                qr.make(fit=True)
-                                img = qr.make_image(fill_color="black", back_color="white")
-                                buffer = io.BytesIO()
-                                img.save(buffer, format='PNG')
-                                buffer.seek(0)
-                                barcode = f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}"
-                            except Exception as e:
-                                logging.error(f"Error generating QR code: {str(e)}")
-                                barcode = None
-                            
                             label = MultiGRNBatchDetailsLabel(
                                 batch_detail_id=batch_detail.id,
                                 pack_number=1,
                                 qty_in_pack=batch_qty_int,
                                 grn_number=grn_number,
-                                barcode=barcode,
                                 qr_data=qr_text
                             )
                             db.session.add(label)
+                            new_pack_labels.append(label)
                             total_labels_created += 1
                     
                     logging.info(f"✅ Added {len(batch_numbers)} batch_details + {total_labels_created} pack labels for item {item_code}")
@@ -3317,10 +3248,6 @@ def add_item_to_batch(batch_id):
         
         # Handle non-managed items with bags
         if not is_batch_managed and not is_serial_managed and number_of_bags > 1:
-            import io
-            import base64
-            import qrcode
-            
             # Create ONE batch_detail + N labels
             quantity_decimal = Decimal(str(quantity))
             quantity_int = int(quantity_decimal.to_integral_value(rounding=ROUND_HALF_UP))
@@ -3364,33 +3291,21 @@ def add_item_to_batch(batch_id):
                 }
                 qr_text = json.dumps(qr_data)
                 
-                try:
-                    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
-                    qr.add_data(qr_text)
-                    qr.make(fit=True)
-                    img = qr.make_image(fill_color="black", back_color="white")
-                    buffer = io.BytesIO()
-                    img.save(buffer, format='PNG')
-                    buffer.seek(0)
-                    barcode = f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}"
-                except Exception as e:
-                    logging.error(f"Error generating QR code: {str(e)}")
-                    barcode = None
-                
                 # Create label record
                 label = MultiGRNBatchDetailsLabel(
                     batch_detail_id=batch_detail.id,
                     pack_number=pack_num,
                     qty_in_pack=pack_qty,
                     grn_number=grn_number,
-                    barcode=barcode,
                     qr_data=qr_text
                 )
                 db.session.add(label)
+                new_pack_labels.append(label)
                 logging.info(f"✅ Created pack label {pack_num}/{number_of_bags}: GRN={grn_number}, Qty={pack_qty}")
             
             logging.info(f"✅ Created 1 batch_detail + {number_of_bags} pack labels for non-managed item {item_code}: Total Qty={quantity_int}")
         
+        render_pack_label_barcodes(new_pack_labels)
         db.session.commit()
         
         flash(f'Item {item_code} added successfully with {number_of_bags} bag(s)', 'success')
@@ -12,6 +12,11 @@ import urllib.parse
 import urllib3
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+from sap_session_pool import get_sap_session_pool, PooledSAPSession
+from sap_odata_batch import execute_batch
+from sap_odata_pager import DEFAULT_PAGE_SIZE, ODataPageError, iter_rows
+from master_data_cache import master_data_cache
+
 class SAPMultiGRNService:
     """Service class for SAP B1 integration specific to Multiple GRN Creation"""
     
@@ -21,8 +26,10 @@ class SAPMultiGRNService:
         self.password = os.environ.get('SAP_B1_PASSWORD', '')
         self.company_db = os.environ.get('SAP_B1_COMPANY_DB', '')
         self.session_id = None
-        self.session = requests.Session()
-        self.session.verify = False  # For development, in production use proper SSL
+        # Share the process-wide pool of authenticated Service Layer sessions
+        self.session_pool = get_sap_session_pool(self.base_url, self.username,
+                                                 self.password, self.company_db)
+        self.session = PooledSAPSession(self.session_pool)
         self.is_offline = False
         self.enable_mock_data = os.environ.get('ENABLE_MOCK_SAP_DATA', 'false').lower() == 'true'
 
@@ -39,43 +46,32 @@ class SAPMultiGRNService:
             logging.warning(f"   SAP_B1_COMPANY_DB: {'✓' if self.company_db else '✗'}")
             return False
         
-        login_url = f"{self.base_url}/b1s/v1/Login"
-        login_data = {
-            "UserName": self.username,
-            "Password": self.password,
-            "CompanyDB": self.company_db
-        }
-        
-        try:
-            logging.info(f"🔐 Attempting SAP login to {self.base_url}...")
-            response = self.session.post(login_url, json=login_data, timeout=30)
-            if response.status_code == 200:
-                self.session_id = response.json().get('SessionId')
-                logging.info("✅ SAP B1 login successful"+self.session_id)
-                logging.info("✅ SAP B1 login successful")
-                return True
-            else:
-                logging.warning(f"❌ SAP B1 login failed (Status {response.status_code}): {response.text}")
-                logging.error(f"❌ SAP B1 login failed (Status {response.status_code}): {response.text}")
-                return False
-        except requests.exceptions.ConnectionError as e:
-            logging.error(f"❌ SAP B1 connection failed: Cannot reach {self.base_url}")
-            logging.error(f"❌ SAP B1 connection failed: Cannot reach {self.base_url}")
-            logging.error(f"   This may be a network issue or the SAP server may not be accessible from Replit")
-            logging.error(f"   Error details: {str(e)}")
-            return False
-        except requests.exceptions.Timeout:
-            logging.error(f"❌ SAP B1 login timeout: Server did not respond within 30 seconds")
-            return False
-        except Exception as e:
-            logging.error(f"❌ SAP B1 login error: {str(e)}")
-            return False
+        logging.info(f"🔐 Acquiring pooled SAP session for {self.base_url}...")
+        self.session_id = self.session_pool.ensure_logged_in()
+        self.is_offline = self.session_pool.is_offline
+        if self.session_id:
+            logging.info("✅ SAP B1 login successful")
+            return True
+        logging.error(f"❌ SAP B1 login failed - cannot reach or authenticate with {self.base_url}")
+        return False
     
     def ensure_logged_in(self):
         """Ensure we have a valid session, login if needed"""
         if not self.session_id:
             return self.login()
         return True
+
+    def execute_batch(self, operations, chunk_size=50):
+        """Send many independent Service Layer requests as OData $batch calls (None if SAP is unavailable)"""
+        if not self.ensure_logged_in():
+            logging.warning("⚠️ SAP login failed - cannot execute $batch request")
+            return None
+        return execute_batch(self.session, self.base_url, operations, chunk_size=chunk_size)
+
+    def iter_rows(self, path, params=None, page_size=DEFAULT_PAGE_SIZE, prefetch=False):
+        """Yield the rows of a Service Layer collection page by page (raises ODataPageError on a non-200 page)"""
+        return iter_rows(self.session, self.base_url, path, params=params,
+                         page_size=page_size, prefetch=prefetch)
     
     def fetch_business_partners(self, card_type='S'):
         """
@@ -126,42 +122,37 @@ class SAPMultiGRNService:
                 return self.get_mock_customers()
 
             try:
-                url = f"{self.base_url}/b1s/v1/BusinessPartners"
                 params = {
                     '$filter': f"Valid eq 'tYES'",
                     '$select': 'CardCode,CardName,Valid'
                 }
-                headers = {'Prefer': 'odata.maxpagesize=0'}
 
-                logging.info(f"📡 Fetching BusinessPartners from SAP: {url}")
-                response = self.session.get(url, params=params, headers=headers, timeout=30)
-
-                logging.info(f"📊 SAP Response Status: {response.status_code}")
-
-                if response.status_code == 200:
-                    data = response.json()
-                    customers = [
-                        {
-                            'CardCode': c['CardCode'],
-                            'CardName': c['CardName']
-                        }
-                        for c in data.get('value', [])
-                        if c.get('Valid') == 'tYES'
-                    ]
-                    logging.info(f"✅ Successfully loaded {len(customers)} valid customers from SAP")
-                    return {'success': True, 'customers': customers}
+                logging.info(f"📡 Fetching BusinessPartners from SAP: {self.base_url}/b1s/v1/BusinessPartners")
+                # Bounded pages instead of one odata.maxpagesize=0 response; the
+                # next page downloads while the current one is trimmed
+                customers = [
+                    {
+                        'CardCode': c['CardCode'],
+                        'CardName': c['CardName']
+                    }
+                    for c in self.iter_rows('BusinessPartners', params=params, prefetch=True)
+                    if c.get('Valid') == 'tYES'
+                ]
+                logging.info(f"✅ Successfully loaded {len(customers)} valid customers from SAP")
+                return {'success': True, 'customers': customers}
 
-                elif response.status_code == 401:
+            except ODataPageError as e:
+                logging.info(f"📊 SAP Response Status: {e.status_code}")
+                if e.status_code == 401:
                     self.session_id = None
                     logging.warning("⚠️ Session expired, attempting re-login...")
                     if self.login():
                         return self.fetch_all_valid_customers()
                     return {'success': False, 'error': 'SAP authentication failed - invalid credentials'}
 
-                else:
-                    error_msg = f"SAP API error (Status {response.status_code}): {response.text}"
-                    logging.error(f"❌ {error_msg}")
-                    return {'success': False, 'error': error_msg}
+                error_msg = f"SAP API error (Status {e.status_code}): {e.text}"
+                logging.error(f"❌ {error_msg}")
+                return {'success': False, 'error': error_msg}
 
             except requests.exceptions.ConnectionError as e:
                 error_msg = f"Cannot connect to SAP server at {self.base_url} - using mock data as fallback"
@@ -392,6 +383,74 @@ class SAPMultiGRNService:
         }
     
     def validate_item_code(self, item_code):
+        """Validate item code (batch/serial/management method), cached process-wide"""
+        return master_data_cache.get_or_load('item_flags', (self.company_db, 'multi_grn', item_code),
+                                             lambda: self._fetch_item_validation(item_code))
+
+    def validate_item_codes(self, item_codes):
+        """
+        Validate several item codes at once, returns a dict of item code -> validate_item_code result.
+        Codes that are not cached yet are looked up in SAP concurrently (sap_async_client).
+        """
+        results, missing = {}, []
+        for item_code in dict.fromkeys(code for code in item_codes if code):
+            found, value = master_data_cache.get('item_flags', (self.company_db, 'multi_grn', item_code))
+            if found:
+                results[item_code] = value
+            else:
+                missing.append(item_code)
+        
+        if len(missing) > 1 and self.ensure_logged_in():
+            from sap_async_client import run_sync
+            rows = run_sync(lambda client: client.gather(
+                client.sql_query('ItemCode_Batch_Serial_Val', f"itemCode='{item_code}'") for item_code in missing))
+            logging.info(f"🔍 Validated {len(missing)} item codes concurrently")
+            for item_code, items in zip(missing, rows):
+                if items is not None:
+                    result = self._item_validation_result(item_code, items)
+                    if result['success']:
+                        master_data_cache.set('item_flags', (self.company_db, 'multi_grn', item_code), result)
+                    results[item_code] = result
+        
+        for item_code in missing:
+            if item_code not in results:
+                results[item_code] = self.validate_item_code(item_code)
+        return results
+
+    @staticmethod
+    def _item_validation_result(item_code, items):
+        """Build the validate_item_code result from ItemCode_Batch_Serial_Val rows"""
+        if not items:
+            logging.warning(f"⚠️ Item code {item_code} not found in SAP")
+            return {'success': False, 'error': f'Item code {item_code} not found'}
+        
+        item_data = items[0]
+        batch_managed = item_data.get('BatchNum', 'N') == 'Y'
+        serial_managed = item_data.get('SerialNum', 'N') == 'Y'
+        management_method = item_data.get('NonBatch_NonSerialMethod', 'N')
+        
+        # Determine inventory type
+        if serial_managed:
+            inventory_type = 'serial'
+        elif batch_managed:
+            inventory_type = 'batch'
+        elif management_method == 'R':
+            inventory_type = 'quantity_based'
+        else:
+            inventory_type = 'standard'
+        
+        logging.info(f"✅ Item {item_code} validated: Type={inventory_type}")
+        return {
+            'success': True,
+            'item_code': item_data.get('ItemCode'),
+            'batch_managed': batch_managed,
+            'serial_managed': serial_managed,
+            'inventory_type': inventory_type,
+            'management_method': management_method,
+            'item_data': item_data
+        }
+
+    def _fetch_item_validation(self, item_code):
         """
         Validate item code and get batch/serial management info
         Uses SAP B1 SQLQueries endpoint to check item properties
@@ -411,37 +470,7 @@ class SAPMultiGRNService:
             
             if response.status_code == 200:
                 data = response.json()
-                items = data.get('value', [])
-                
-                if not items:
-                    logging.warning(f"⚠️ Item code {item_code} not found in SAP")
-                    return {'success': False, 'error': f'Item code {item_code} not found'}
-                
-                item_data = items[0]
-                batch_managed = item_data.get('BatchNum', 'N') == 'Y'
-                serial_managed = item_data.get('SerialNum', 'N') == 'Y'
-                management_method = item_data.get('NonBatch_NonSerialMethod', 'N')
-                
-                # Determine inventory type
-                if serial_managed:
-                    inventory_type = 'serial'
-                elif batch_managed:
-                    inventory_type = 'batch'
-                elif management_method == 'R':
-                    inventory_type = 'quantity_based'
-                else:
-                    inventory_type = 'standard'
-                
-                logging.info(f"✅ Item {item_code} validated: Type={inventory_type}")
-                return {
-                    'success': True,
-                    'item_code': item_data.get('ItemCode'),
-                    'batch_managed': batch_managed,
-                    'serial_managed': serial_managed,
-                    'inventory_type': inventory_type,
-                    'management_method': management_method,
-                    'item_data': item_data
-                }
+                return self._item_validation_result(item_code, data.get('value', []))
             elif response.status_code == 401:
                 self.session_id = None
                 if self.login():
@@ -501,6 +530,11 @@ class SAPMultiGRNService:
         }
     
     def fetch_po_series(self):
+        """Fetch PO Series from SAP B1, cached process-wide"""
+        return master_data_cache.get_or_load('series', (self.company_db, 'multi_grn_po'),
+                                             self._fetch_po_series)
+
+    def _fetch_po_series(self):
         """
         Fetch PO Series (Document Series) from SAP B1 using SQL Query
         URL: /b1s/v1/SQLQueries('Get_PO_Series')/List
@@ -657,6 +691,45 @@ class SAPMultiGRNService:
             logging.error(f"❌ Error getting bin location {bin_code}: {str(e)}")
             return {'success': False, 'error': str(e)}
     
+    def get_bin_abs_entries(self, bin_codes):
+        """
+        Resolve several bin codes to BinAbsEntry in one OData $batch request.
+        Returns a dict of BinCode -> result in the same shape as get_bin_abs_entry.
+        """
+        bin_codes = list(dict.fromkeys(code for code in bin_codes if code))
+        results = {}
+        
+        batch_results = None
+        if len(bin_codes) > 1:
+            select = 'AbsEntry,Warehouse,BinCode,Sublevel1,Sublevel2,Sublevel3,Sublevel4'
+            operations = [
+                {'method': 'GET',
+                 'path': f"BinLocations?$filter=BinCode eq '{code.replace(chr(39), chr(39) * 2)}'&$select={select}"}
+                for code in bin_codes
+            ]
+            batch_results = self.execute_batch(operations)
+        
+        for index, bin_code in enumerate(bin_codes):
+            part = batch_results[index] if batch_results else None
+            if part and part['success'] and isinstance(part['body'], dict):
+                bins = part['body'].get('value', [])
+                if bins:
+                    bin_data = bins[0]
+                    results[bin_code] = {
+                        'success': True,
+                        'abs_entry': bin_data.get('AbsEntry'),
+                        'warehouse': bin_data.get('Warehouse'),
+                        'bin_code': bin_code,
+                        'bin_data': bin_data
+                    }
+                else:
+                    logging.warning(f"⚠️ Bin code {bin_code} not found in SAP")
+                    results[bin_code] = {'success': False, 'error': f'Bin code {bin_code} not found'}
+            else:
+                results[bin_code] = self.get_bin_abs_entry(bin_code)
+        
+        return results
+    
     def fetch_purchase_orders_by_series_and_card(self, series_id, card_code):
         """
         Fetch open Purchase Orders filtered by Series and CardCode
@@ -869,6 +942,70 @@ class SAPMultiGRNService:
             logging.warning("⚠️ Using mock data as fallback")
             return self.get_mock_purchase_orders(card_code)
 
+    @staticmethod
+    def _po_lines_crossjoin_path(doc_entry):
+        return (
+            f"$crossjoin(PurchaseOrders,PurchaseOrders/DocumentLines)"
+            f"?$expand=PurchaseOrders($select=CardCode,CardName,DocumentStatus,DocNum,Series,DocDate,DocDueDate,DocTotal,DocEntry),"
+            f"PurchaseOrders/DocumentLines($select=LineNum,ItemCode,ItemDescription,RemainingOpenQuantity,WarehouseCode,UnitsOfMeasurment,DocEntry,LineTotal,LineStatus,Quantity,Price,PriceAfterVAT)"
+            f"&$filter=PurchaseOrders/DocumentStatus eq PurchaseOrders/DocumentLines/LineStatus "
+            f"and PurchaseOrders/DocEntry eq PurchaseOrders/DocumentLines/DocEntry "
+            f"and PurchaseOrders/DocumentLines/DocEntry eq {doc_entry}"
+        )
+    
+    @staticmethod
+    def _parse_po_lines_crossjoin(doc_entry, crossjoin_values):
+        """Build the purchase_order result from $crossjoin(PurchaseOrders,DocumentLines) rows"""
+        if not crossjoin_values:
+            logging.warning(f"⚠️ No data found for DocEntry {doc_entry}")
+            return {'success': False, 'error': f'No data found for DocEntry {doc_entry}'}
+        
+        first_record = crossjoin_values[0]
+        po_header = first_record.get('PurchaseOrders', {})
+        
+        document_lines = []
+        open_lines = []
+        for record in crossjoin_values:
+            line_data = record.get('PurchaseOrders/DocumentLines', {})
+            if line_data:
+                document_lines.append(line_data)
+                if line_data.get('LineStatus') == 'O' and line_data.get('Quantity', 0) > 0:
+                    open_lines.append(line_data)
+        
+        po_data = {
+            **po_header,
+            'DocumentLines': document_lines,
+            'OpenLines': open_lines,
+            'TotalOpenLines': len(open_lines)
+        }
+        
+        logging.info(f"✅ Fetched PO {doc_entry} with {len(open_lines)} open lines using $crossjoin")
+        return {'success': True, 'purchase_order': po_data}
+    
+    def fetch_po_lines_by_docentries(self, doc_entries):
+        """
+        Fetch PO lines for several POs in one OData $batch request.
+        Returns a dict of DocEntry -> result in the same shape as fetch_po_lines_by_docentry.
+        POs whose batch part fails fall back to the single-PO method (and its mock handling).
+        """
+        doc_entries = list(dict.fromkeys(doc_entries))
+        results = {}
+        
+        batch_results = None
+        if doc_entries and not self.enable_mock_data and len(doc_entries) > 1:
+            operations = [{'method': 'GET', 'path': self._po_lines_crossjoin_path(doc_entry)}
+                          for doc_entry in doc_entries]
+            batch_results = self.execute_batch(operations)
+        
+        for index, doc_entry in enumerate(doc_entries):
+            part = batch_results[index] if batch_results else None
+            if part and part['success'] and isinstance(part['body'], dict):
+                results[doc_entry] = self._parse_po_lines_crossjoin(doc_entry, part['body'].get('value', []))
+            else:
+                results[doc_entry] = self.fetch_po_lines_by_docentry(doc_entry)
+        
+        return results
+    
     def fetch_po_lines_by_docentry(self, doc_entry):
         """
         Fetch Purchase Order details including line items by DocEntry using $crossjoin
@@ -884,47 +1021,14 @@ class SAPMultiGRNService:
             return self.get_mock_po_lines(doc_entry)
         
         try:
-            url = (
-                f"{self.base_url}/b1s/v1/$crossjoin(PurchaseOrders,PurchaseOrders/DocumentLines)"
-                f"?$expand=PurchaseOrders($select=CardCode,CardName,DocumentStatus,DocNum,Series,DocDate,DocDueDate,DocTotal,DocEntry),"
-                f"PurchaseOrders/DocumentLines($select=LineNum,ItemCode,ItemDescription,RemainingOpenQuantity,WarehouseCode,UnitsOfMeasurment,DocEntry,LineTotal,LineStatus,Quantity,Price,PriceAfterVAT)"
-                f"&$filter=PurchaseOrders/DocumentStatus eq PurchaseOrders/DocumentLines/LineStatus "
-                f"and PurchaseOrders/DocEntry eq PurchaseOrders/DocumentLines/DocEntry "
-                f"and PurchaseOrders/DocumentLines/DocEntry eq {doc_entry}"
-            )
+            url = f"{self.base_url}/b1s/v1/{self._po_lines_crossjoin_path(doc_entry)}"
             
             logging.info(f"🔍 Fetching PO lines using $crossjoin for DocEntry: {doc_entry}")
             response = self.session.get(url, timeout=30)
             
             if response.status_code == 200:
                 data = response.json()
-                crossjoin_values = data.get('value', [])
-                
-                if not crossjoin_values:
-                    logging.warning(f"⚠️ No data found for DocEntry {doc_entry}")
-                    return {'success': False, 'error': f'No data found for DocEntry {doc_entry}'}
-                
-                first_record = crossjoin_values[0]
-                po_header = first_record.get('PurchaseOrders', {})
-                
-                document_lines = []
-                open_lines = []
-                for record in crossjoin_values:
-                    line_data = record.get('PurchaseOrders/DocumentLines', {})
-                    if line_data:
-                        document_lines.append(line_data)
-                        if line_data.get('LineStatus') == 'O' and line_data.get('Quantity', 0) > 0:
-                            open_lines.append(line_data)
-                
-                po_data = {
-                    **po_header,
-                    'DocumentLines': document_lines,
-                    'OpenLines': open_lines,
-                    'TotalOpenLines': len(open_lines)
-                }
-                
-                logging.info(f"✅ Fetched PO {doc_entry} with {len(open_lines)} open lines using $crossjoin")
-                return {'success': True, 'purchase_order': po_data}
+                return self._parse_po_lines_crossjoin(doc_entry, data.get('value', []))
             elif response.status_code == 401:
                 self.session_id = None
                 if self.login():
@@ -6,6 +6,10 @@ from sqlalchemy.orm import relationship
 class DeliveryDocument(db.Model):
     """Delivery Note Documents - Local storage for tracking delivery notes against sales orders"""
     __tablename__ = 'delivery_documents'
+    __table_args__ = (
+        db.Index('idx_delivery_documents_status_created', 'status', 'created_at'),
+        db.Index('idx_delivery_documents_user_created', 'user_id', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     so_doc_entry = db.Column(db.Integer, nullable=False, index=True)
@@ -42,7 +46,7 @@ class DeliveryItem(db.Model):
     __tablename__ = 'delivery_items'
 
     id = db.Column(db.Integer, primary_key=True)
-    delivery_id = db.Column(db.Integer, db.ForeignKey('delivery_documents.id'), nullable=False)
+    delivery_id = db.Column(db.Integer, db.ForeignKey('delivery_documents.id'), nullable=False, index=True)
     line_number = db.Column(db.Integer, nullable=False)
     base_line = db.Column(db.Integer, nullable=False)
     item_code = db.Column(db.String(50), nullable=False, index=True)
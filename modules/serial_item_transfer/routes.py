@@ -9,7 +9,8 @@ import re
 from app import db
 from models import SerialItemTransfer, SerialItemTransferItem, DocumentNumberSeries
 from sap_integration import SAPIntegration
-from sqlalchemy import or_
+from sap_posting_queue import find_earlier_posting, posting_handler, set_job_reference
+from sqlalchemy import insert, or_, select
 
 # Create blueprint for Serial Item Transfer module with absolute path for PyInstaller .exe builds
 serial_item_bp = Blueprint('serial_item_transfer', __name__, url_prefix='/serial-item-transfer',
@@ -550,46 +551,53 @@ def add_multiple_serials(transfer_id):
         if not validated_serials:
             return jsonify({'success': False, 'error': 'No validated serials provided'}), 400
 
-        items_added = 0
         failed_items = []
-
+        submitted = []
         for serial_data in validated_serials:
-            try:
-                serial_number = serial_data.get('serial_number', '').strip()
-
-                if not serial_number:
-                    failed_items.append({'serial': serial_number, 'error': 'Empty serial number'})
-                    continue
-
-                # Check for duplicate
-                existing_item = SerialItemTransferItem.query.filter_by(
-                    serial_item_transfer_id=transfer.id,
-                    serial_number=serial_number
-                ).first()
-
-                if existing_item:
-                    failed_items.append({'serial': serial_number, 'error': 'Already exists in transfer'})
-                    continue
-
-                # Create transfer item
-                transfer_item = SerialItemTransferItem(
-                    serial_item_transfer_id=transfer.id,
-                    serial_number=serial_number,
-                    item_code=serial_data.get('item_code', ''),
-                    item_description=serial_data.get('item_description', ''),
-                    warehouse_code=serial_data.get('warehouse_code', transfer.from_warehouse),
-                    from_warehouse_code=transfer.from_warehouse,
-                    to_warehouse_code=transfer.to_warehouse,
-                    quantity=1,  # Always 1 for serial items
-                    validation_status='validated',
-                    validation_error=None
-                )
-
-                db.session.add(transfer_item)
-                items_added += 1
-
-            except Exception as e:
-                failed_items.append({'serial': serial_data.get('serial_number', 'Unknown'), 'error': str(e)})
+            # A malformed entry fails on its own, like an empty serial
+            if not isinstance(serial_data, dict):
+                failed_items.append({'serial': str(serial_data), 'error': 'Invalid serial data'})
+                continue
+            serial_number = serial_data.get('serial_number') or ''
+            if not isinstance(serial_number, str):
+                failed_items.append({'serial': str(serial_number), 'error': 'Invalid serial number'})
+                continue
+            serial_number = serial_number.strip()
+            if not serial_number:
+                failed_items.append({'serial': serial_number, 'error': 'Empty serial number'})
+                continue
+            submitted.append((serial_number, serial_data))
+
+        # One query for the submitted serials already in this transfer; repeats within
+        # the submission are caught by the same set as the first occurrence is added
+        existing_serials = set(db.session.scalars(
+            select(SerialItemTransferItem.serial_number)
+            .where(SerialItemTransferItem.serial_item_transfer_id == transfer.id,
+                   SerialItemTransferItem.serial_number.in_([serial for serial, _ in submitted]))))
+
+        new_rows = []
+        for serial_number, serial_data in submitted:
+            if serial_number in existing_serials:
+                failed_items.append({'serial': serial_number, 'error': 'Already exists in transfer'})
+                continue
+            existing_serials.add(serial_number)
+            new_rows.append({
+                'serial_item_transfer_id': transfer.id,
+                'serial_number': serial_number,
+                'item_code': serial_data.get('item_code', ''),
+                'item_description': serial_data.get('item_description', ''),
+                'warehouse_code': serial_data.get('warehouse_code', transfer.from_warehouse),
+                'from_warehouse_code': transfer.from_warehouse,
+                'to_warehouse_code': transfer.to_warehouse,
+                'quantity': 1,  # Always 1 for serial items
+                'validation_status': 'validated',
+                'validation_error': None,
+            })
+
+        # All new transfer items in one executemany INSERT
+        if new_rows:
+            db.session.execute(insert(SerialItemTransferItem), new_rows)
+        items_added = len(new_rows)
 
         db.session.commit()
 
@@ -615,6 +623,38 @@ def add_multiple_serials(transfer_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@posting_handler('serial_item_transfer')
+def post_transfer_job(job):
+    """Post a QC approved Serial Item Transfer to SAP B1 as Stock Transfer (posting queue worker)"""
+    transfer = SerialItemTransfer.query.get(job.document_id)
+    if transfer is None:
+        return {'success': False, 'error': f'Serial item transfer {job.document_id} not found', 'retryable': False}
+
+    if transfer.status == 'posted' and transfer.sap_document_number:
+        return {'success': True, 'doc_num': transfer.sap_document_number}
+
+    sap = SAPIntegration()
+    journal_memo = set_job_reference(job, f'WMS-SIT-{transfer.id}')
+    earlier = find_earlier_posting(job, sap, 'StockTransfers', 'JournalMemo')
+    if earlier:
+        sap_result = {'success': True, 'document_number': earlier['doc_num'], 'doc_entry': earlier['doc_entry']}
+    else:
+        sap_result = sap.create_serial_item_stock_transfer(transfer, journal_memo=journal_memo)
+
+    if not sap_result.get('success'):
+        # Keep document in QC approved status for retry
+        logging.error(f"SAP B1 posting failed for transfer {transfer.id}: {sap_result.get('error')}")
+        return {'success': False, 'error': f'SAP B1 posting failed: {sap_result.get("error", "Unknown error")}'}
+
+    transfer.status = 'posted'
+    transfer.sap_document_number = sap_result.get('document_number')
+    transfer.updated_at = datetime.utcnow()
+    db.session.commit()
+
+    logging.info(f"📤 Serial Item Transfer {transfer.id} posted to SAP B1: {transfer.sap_document_number}")
+    return {'success': True, 'doc_entry': sap_result.get('doc_entry'), 'doc_num': transfer.sap_document_number}
+
+
 @serial_item_bp.route('/<int:transfer_id>/post_to_sap', methods=['POST'])
 @login_required
 def post_to_sap(transfer_id):
@@ -698,6 +738,7 @@ def post_to_sap(transfer_id):
 
             if response.status_code == 201:
                 sap_doc = response.json()
+                sap.invalidate_serial_locations(sap_transfer_data)
                 sap_result = {
                     'success': True,
                     'document_number': sap_doc.get('DocNum'),
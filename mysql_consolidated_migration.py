@@ -62,6 +62,45 @@ from werkzeug.security import generate_password_hash
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Composite indexes for the scan, verification and document list hot paths
+# (table, index name, columns). CREATE TABLE above only covers new databases and
+# some of these tables are created by SQLAlchemy, so create_hot_path_indexes()
+# adds whichever are missing to an existing database.
+DOCUMENT_TABLES = [
+    'grpo_documents', 'inventory_transfers', 'pick_lists', 'inventory_counts',
+    'serial_number_transfers', 'serial_item_transfers', 'direct_inventory_transfers',
+    'multi_grn_document', 'delivery_documents',
+]
+HOT_PATH_INDEXES = [
+    ('transfer_scan_states', 'idx_transfer_scan_states_grn', ('transfer_id', 'grn_id', 'transfer_status')),
+    ('multi_grn_batch_details', 'ix_multi_grn_batch_details_line_selection_id', ('line_selection_id',)),
+    ('multi_grn_serial_details', 'ix_multi_grn_serial_details_line_selection_id', ('line_selection_id',)),
+    ('serial_item_transfer_items', 'idx_serial_item_transfer_items_serial', ('serial_item_transfer_id', 'serial_number')),
+    ('multi_grn_line_selections', 'ix_multi_grn_line_selections_po_link_id', ('po_link_id',)),
+    # Line items eager loaded by the QC work queue
+    ('grpo_items', 'ix_grpo_items_grpo_id', ('grpo_id',)),
+    ('inventory_transfer_items', 'ix_inventory_transfer_items_inventory_transfer_id', ('inventory_transfer_id',)),
+    ('serial_number_transfer_items', 'ix_serial_number_transfer_items_serial_transfer_id', ('serial_transfer_id',)),
+    ('serial_number_transfer_serials', 'ix_serial_number_transfer_serials_transfer_item_id', ('transfer_item_id',)),
+    ('direct_inventory_transfer_items', 'ix_direct_inventory_transfer_items_direct_inventory_transfer_id',
+     ('direct_inventory_transfer_id',)),
+    ('delivery_items', 'ix_delivery_items_delivery_id', ('delivery_id',)),
+    # Dashboard: SAP inventory counts of a user
+    ('sap_inventory_counts', 'idx_sap_inventory_counts_user_loaded', ('user_id', 'loaded_at')),
+    # Set-based pick list sync (pick_list_sync.py)
+    ('pick_lists', 'ix_pick_lists_absolute_entry', ('absolute_entry',)),
+    ('pick_list_lines', 'ix_pick_list_lines_pick_list_id', ('pick_list_id',)),
+    ('pick_list_bin_allocations', 'ix_pick_list_bin_allocations_pick_list_line_id', ('pick_list_line_id',)),
+    ('sales_order_lines', 'ix_sales_order_lines_sales_order_id', ('sales_order_id',)),
+    # Differential inventory counting sync (inventory_counting_sync.py)
+    ('sap_inventory_count_lines', 'ix_sap_inventory_count_lines_count_id', ('count_id',)),
+] + [
+    index
+    for table in DOCUMENT_TABLES
+    for index in ((table, f'idx_{table}_status_created', ('status', 'created_at')),
+                  (table, f'idx_{table}_user_created', ('user_id', 'created_at')))
+]
+
 class MySQLConsolidatedMigration:
     def __init__(self):
         self.connection = None
@@ -185,7 +224,9 @@ class MySQLConsolidatedMigration:
                     INDEX idx_po_number (po_number),
                     INDEX idx_status (status),
                     INDEX idx_user_id (user_id),
-                    INDEX idx_created_at (created_at)
+                    INDEX idx_created_at (created_at),
+                    INDEX idx_grpo_documents_status_created (status, created_at),
+                    INDEX idx_grpo_documents_user_created (user_id, created_at)
                 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
             ''',
             
@@ -429,7 +470,9 @@ class MySQLConsolidatedMigration:
                     INDEX idx_status (status),
                     INDEX idx_user_id (user_id),
                     INDEX idx_created_at (created_at),
-                    INDEX idx_sap_doc_entry (sap_doc_entry)
+                    INDEX idx_sap_doc_entry (sap_doc_entry),
+                    INDEX idx_inventory_transfers_status_created (status, created_at),
+                    INDEX idx_inventory_transfers_user_created (user_id, created_at)
                 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
             ''',
             
@@ -520,7 +563,9 @@ class MySQLConsolidatedMigration:
                     INDEX idx_user_id (user_id),
                     INDEX idx_from_warehouse (from_warehouse),
                     INDEX idx_to_warehouse (to_warehouse),
-                    INDEX idx_created_at (created_at)
+                    INDEX idx_created_at (created_at),
+                    INDEX idx_serial_number_transfers_status_created (status, created_at),
+                    INDEX idx_serial_number_transfers_user_created (user_id, created_at)
                 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
             ''',
             
@@ -600,7 +645,9 @@ class MySQLConsolidatedMigration:
                     INDEX idx_name (name),
                     INDEX idx_status (status),
                     INDEX idx_user_id (user_id),
-                    INDEX idx_absolute_entry (absolute_entry)
+                    INDEX idx_absolute_entry (absolute_entry),
+                    INDEX idx_pick_lists_status_created (status, created_at),
+                    INDEX idx_pick_lists_user_created (user_id, created_at)
                 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
             ''',
             
@@ -630,7 +677,9 @@ class MySQLConsolidatedMigration:
                     INDEX idx_from_warehouse (from_warehouse),
                     INDEX idx_to_warehouse (to_warehouse),
                     INDEX idx_priority (priority),
-                    INDEX idx_created_at (created_at)
+                    INDEX idx_created_at (created_at),
+                    INDEX idx_serial_item_transfers_status_created (status, created_at),
+                    INDEX idx_serial_item_transfers_user_created (user_id, created_at)
                 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
             ''',
             
@@ -684,7 +733,9 @@ class MySQLConsolidatedMigration:
                     INDEX idx_status (status),
                     INDEX idx_user_id (user_id),
                     INDEX idx_qc_approver_id (qc_approver_id),
-                    INDEX idx_created_at (created_at)
+                    INDEX idx_created_at (created_at),
+                    INDEX idx_direct_inventory_transfers_status_created (status, created_at),
+                    INDEX idx_direct_inventory_transfers_user_created (user_id, created_at)
                 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
             ''',
             
@@ -717,6 +768,88 @@ class MySQLConsolidatedMigration:
                     INDEX idx_qc_status (qc_status),
                     INDEX idx_validation_status (validation_status)
                 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            ''',
+            
+            # 23. SAP Posting Queue
+            'sap_posting_jobs': '''
+                CREATE TABLE IF NOT EXISTS sap_posting_jobs (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    job_type VARCHAR(50) NOT NULL,
+                    document_id INT NOT NULL,
+                    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+                    attempts INT NOT NULL DEFAULT 0,
+                    max_attempts INT NOT NULL DEFAULT 5,
+                    next_attempt_at DATETIME NOT NULL,
+                    locked_by VARCHAR(100),
+                    locked_at DATETIME,
+                    sap_doc_entry INT,
+                    sap_doc_num VARCHAR(50),
+                    sap_reference VARCHAR(100),
+                    last_error TEXT,
+                    created_by INT,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                    completed_at DATETIME,
+                    FOREIGN KEY (created_by) REFERENCES users(id),
+                    INDEX idx_sap_posting_jobs_due (status, next_attempt_at),
+                    INDEX idx_sap_posting_jobs_document (job_type, document_id)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            ''',
+            
+            # 24. SAP Master Data Sync State
+            'sap_sync_states': '''
+                CREATE TABLE IF NOT EXISTS sap_sync_states (
+                    entity VARCHAR(50) PRIMARY KEY,
+                    last_update_date VARCHAR(10),
+                    last_update_time VARCHAR(8),
+                    last_mode VARCHAR(10),
+                    last_row_count INT DEFAULT 0,
+                    last_duration_ms INT DEFAULT 0,
+                    last_error TEXT,
+                    last_synced_at DATETIME,
+                    last_full_sync_at DATETIME,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            ''',
+            
+            # 25. MySQL Mirror Replication Outbox
+            'mysql_replication_outbox': '''
+                CREATE TABLE IF NOT EXISTS mysql_replication_outbox (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    table_name VARCHAR(100) NOT NULL,
+                    operation VARCHAR(10) NOT NULL,
+                    statement TEXT,
+                    where_clause TEXT,
+                    payload TEXT,
+                    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                    attempts INT NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    INDEX idx_mysql_replication_outbox_status (status, id)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            ''',
+            
+            # 26. MySQL Mirror Replication State
+            'mysql_replication_state': '''
+                CREATE TABLE IF NOT EXISTS mysql_replication_state (
+                    name VARCHAR(50) PRIMARY KEY,
+                    locked_by VARCHAR(100),
+                    lease_until DATETIME,
+                    next_attempt_at DATETIME,
+                    last_replicated_id INT,
+                    last_replicated_at DATETIME,
+                    last_error TEXT,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            ''',
+            
+            # 27. Daily Document Number Counters
+            'document_number_counters': '''
+                CREATE TABLE IF NOT EXISTS document_number_counters (
+                    scope VARCHAR(50) PRIMARY KEY,
+                    next_value INT NOT NULL DEFAULT 1,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
             '''
         }
         
@@ -739,6 +872,76 @@ class MySQLConsolidatedMigration:
         logger.info("=" * 80)
         return True
     
+    def create_hot_path_indexes(self):
+        """Add the HOT_PATH_INDEXES missing from existing tables.
+
+        An index is skipped when its table does not exist yet or when another
+        index already starts with the same columns (e.g. a unique key).
+        """
+        logger.info("📝 Checking hot-path indexes...")
+        created = 0
+        try:
+            for table_name, index_name, columns in HOT_PATH_INDEXES:
+                self.cursor.execute("""
+                    SELECT INDEX_NAME, COLUMN_NAME
+                    FROM INFORMATION_SCHEMA.STATISTICS
+                    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+                    ORDER BY INDEX_NAME, SEQ_IN_INDEX
+                """, (table_name,))
+                rows = self.cursor.fetchall()
+                if not rows:
+                    logger.info(f"ℹ️  Table '{table_name}' not found, skipping {index_name}")
+                    continue
+
+                existing = {}
+                for name, column in rows:
+                    existing.setdefault(name, []).append(column.lower())
+                if any(tuple(cols[:len(columns)]) == columns for cols in existing.values()):
+                    continue
+
+                self.cursor.execute(
+                    f"CREATE INDEX {index_name} ON {table_name} ({', '.join(columns)}) ALGORITHM=INPLACE LOCK=NONE"
+                )
+                self.connection.commit()
+                created += 1
+                logger.info(f"✅ Index '{index_name}' created on {table_name}")
+        except Exception as e:
+            logger.error(f"❌ Error creating hot-path indexes: {e}")
+            return False
+
+        logger.info(f"✅ Hot-path indexes up to date ({created} created)")
+        return True
+    
+    def seed_document_number_counters(self):
+        """Continue today's PDN external references (EXT-REF-YYYYMMDD-NNN) from pdn_sequence.
+
+        The old generator counted in pdn_sequence; without a seed the first
+        reference allocated from document_number_counters would start at 001
+        again and repeat a NumAtCard already sent to SAP today.
+        """
+        try:
+            self.cursor.execute("""
+                SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'pdn_sequence'
+            """)
+            if not self.cursor.fetchone()[0]:
+                logger.info("ℹ️  Table 'pdn_sequence' not found, no external reference numbering to carry over")
+                return True
+
+            self.cursor.execute("""
+                INSERT INTO document_number_counters (scope, next_value)
+                SELECT CONCAT('EXT-REF-', date_key), sequence_number + 1 FROM pdn_sequence
+                WHERE date_key = %s
+                ON DUPLICATE KEY UPDATE next_value = GREATEST(next_value, VALUES(next_value))
+            """, (datetime.now().strftime('%Y%m%d'),))
+            self.connection.commit()
+            logger.info("✅ Today's external reference counter seeded from pdn_sequence")
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Error seeding document number counters: {e}")
+            return False
+
     def create_default_admin(self):
         """Create default admin user if not exists"""
         try:
@@ -784,6 +987,14 @@ class MySQLConsolidatedMigration:
             logger.error("Migration failed - error creating tables")
             return False
         
+        # Add hot-path indexes missing from existing tables
+        if not self.create_hot_path_indexes():
+            logger.warning("Warning - some hot-path indexes were not created")
+        
+        # Continue today's PDN external references from the old pdn_sequence counter
+        if not self.seed_document_number_counters():
+            logger.warning("Warning - external reference counter not seeded from pdn_sequence")
+        
         # Create default admin
         if not self.create_default_admin():
             logger.warning("Warning - default admin user not created")
@@ -0,0 +1,370 @@
+"""
+Write-behind replication of the MySQL mirror
+Changes for the mirror are not sent to MySQL on the request path. record_change
+adds a MySQLReplicationEvent row to the current session, so a change and its
+outbox entry commit or roll back together. A background replicator then
+replays the outbox on the mirror:
+- only one process at a time holds the replication lease (mysql_replication_state);
+- events are read in id order, MYSQL_REPLICATION_BATCH_SIZE at a time;
+  consecutive events with the same table and statement shape go out as one
+  executemany, and each batch is one MySQL transaction;
+- while MySQL is unreachable the batch is retried with exponential backoff and
+  nothing is dropped. When MySQL rejects an executemany, its rows are replayed
+  one by one to find the event at fault; only that event is charged the
+  attempt. It is replayed on its own from then on and set aside as 'failed'
+  after MYSQL_REPLICATION_MAX_ATTEMPTS, so the events behind it can still go through;
+- backlog and lag are exported at /metrics.
+
+    from mysql_replication import record_change
+    user.email = new_email
+    record_change('users', 'UPDATE', {'email': new_email, 'id': user.id}, 'id = :id')
+    db.session.commit()
+
+Run the replicator in the web process (default) or on its own:
+    MYSQL_REPLICATION_IN_PROCESS=false    # on the web servers
+    python mysql_replication.py           # dedicated replicator process
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, or_, select, text, update
+from sqlalchemy.exc import DBAPIError, IntegrityError
+
+from request_metrics import (MYSQL_REPLICATED_EVENTS, MYSQL_REPLICATION_BACKLOG, MYSQL_REPLICATION_ERRORS,
+                             MYSQL_REPLICATION_LAG)
+
+logger = logging.getLogger(__name__)
+
+STATE_NAME = 'mysql_mirror'
+EVENT_PENDING = 'pending'
+EVENT_FAILED = 'failed'
+OPERATIONS = ('INSERT', 'UPDATE', 'DELETE', 'SQL')
+
+BATCH_SIZE = int(os.environ.get('MYSQL_REPLICATION_BATCH_SIZE', '500'))
+MAX_ATTEMPTS = int(os.environ.get('MYSQL_REPLICATION_MAX_ATTEMPTS', '5'))
+BACKOFF_BASE_SECONDS = float(os.environ.get('MYSQL_REPLICATION_BACKOFF_BASE', '2'))
+BACKOFF_MAX_SECONDS = float(os.environ.get('MYSQL_REPLICATION_BACKOFF_MAX', '300'))
+
+
+def record_change(table_name, operation, data=None, where_clause=None, statement=None):
+    """Queue a change for the MySQL mirror in the current session; it is committed with the caller's transaction.
+
+    ``where_clause`` (UPDATE / DELETE) and ``statement`` (operation 'SQL') may
+    reference ``data`` keys as :parameters.
+    """
+    from app import db
+    from models import MySQLReplicationEvent
+
+    operation = operation.upper()
+    if operation not in OPERATIONS:
+        raise ValueError(f'Unsupported MySQL replication operation: {operation}')
+    event = MySQLReplicationEvent(
+        table_name=table_name,
+        operation=operation,
+        statement=statement,
+        where_clause=where_clause,
+        payload=json.dumps(data or {}, default=str),
+        status=EVENT_PENDING,
+        created_at=datetime.utcnow(),
+    )
+    db.session.add(event)
+    mysql_replicator.notify()
+    return event
+
+
+def build_statement(event):
+    """(SQL, parameters) replaying one outbox event on MySQL"""
+    params = json.loads(event.payload or '{}')
+    if event.operation == 'INSERT':
+        columns = ', '.join(params)
+        placeholders = ', '.join(f':{key}' for key in params)
+        sql = f"INSERT INTO {event.table_name} ({columns}) VALUES ({placeholders})"
+    elif event.operation == 'UPDATE':
+        set_clause = ', '.join(f"{key} = :{key}" for key in params)
+        sql = f"UPDATE {event.table_name} SET {set_clause} WHERE {event.where_clause}"
+    elif event.operation == 'DELETE':
+        sql = f"DELETE FROM {event.table_name} WHERE {event.where_clause}"
+    else:
+        sql = event.statement
+    return sql, params
+
+
+def group_statements(events):
+    """Split events (in replay order) into runs that share one statement: [(sql, [events], [params])].
+
+    Events that failed before are kept on their own so a bad row cannot fail its neighbours.
+    """
+    groups = []
+    previous_key = None
+    for event in events:
+        sql, params = build_statement(event)
+        key = (sql, tuple(sorted(params))) if not event.attempts else None
+        if key is not None and key == previous_key:
+            groups[-1][1].append(event)
+            groups[-1][2].append(params)
+        else:
+            groups.append((sql, [event], [params]))
+        previous_key = key
+    return groups
+
+
+def retry_delay(failures):
+    """Exponential backoff with jitter after ``failures`` consecutive failed batches"""
+    delay = min(BACKOFF_BASE_SECONDS * (2 ** max(failures - 1, 0)), BACKOFF_MAX_SECONDS)
+    return delay + random.uniform(0, delay * 0.1)
+
+
+def replication_status():
+    """Outbox backlog by status, lag of the oldest pending change and the replication state"""
+    from app import db
+    from models import MySQLReplicationEvent, MySQLReplicationState
+
+    counts = {EVENT_PENDING: 0, EVENT_FAILED: 0}
+    counts.update(db.session.execute(
+        select(MySQLReplicationEvent.status, func.count())
+        .group_by(MySQLReplicationEvent.status)).all())
+    oldest = db.session.scalar(
+        select(MySQLReplicationEvent.created_at)
+        .where(MySQLReplicationEvent.status == EVENT_PENDING)
+        .order_by(MySQLReplicationEvent.id)
+        .limit(1))
+    lag = (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0
+    state = db.session.get(MySQLReplicationState, STATE_NAME)
+    return {
+        'pending': counts[EVENT_PENDING],
+        'failed': counts[EVENT_FAILED],
+        'lag_seconds': round(max(lag, 0.0), 3),
+        'state': state.to_dict() if state else None,
+    }
+
+
+class MySQLReplicator:
+    """Background thread replaying the outbox on the MySQL mirror while it holds the replication lease"""
+
+    def __init__(self, batch_size=BATCH_SIZE, poll_interval=1.0, lease_seconds=30, max_attempts=MAX_ATTEMPTS):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self._app = None
+        self._engine = None
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._failures = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, app, engine):
+        if self.running:
+            return
+        self._app = app
+        self._engine = engine
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._loop, name='mysql-replicator', daemon=True)
+        self._thread.start()
+        logger.info(f"✅ MySQL mirror replicator started ({self.worker_id}, batch={self.batch_size})")
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=self.poll_interval * 2)
+        self._thread = None
+
+    def notify(self):
+        self._wakeup.set()
+
+    def _loop(self):
+        while not self._stopping.is_set():
+            replicated = 0
+            try:
+                with self._app.app_context():
+                    if self._acquire_lease():
+                        replicated = self.drain_once()
+                    self._refresh_metrics()
+            except Exception as e:
+                logger.error(f"❌ MySQL replicator error: {str(e)}")
+            if replicated < self.batch_size:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _acquire_lease(self):
+        """Take or extend the replication lease; False while another process holds it or during backoff"""
+        from app import db
+        from models import MySQLReplicationState
+
+        if db.session.get(MySQLReplicationState, STATE_NAME) is None:
+            db.session.add(MySQLReplicationState(name=STATE_NAME))
+            try:
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+
+        now = datetime.utcnow()
+        result = db.session.execute(
+            update(MySQLReplicationState)
+            .where(MySQLReplicationState.name == STATE_NAME,
+                   or_(MySQLReplicationState.locked_by.is_(None),
+                       MySQLReplicationState.locked_by == self.worker_id,
+                       MySQLReplicationState.lease_until < now),
+                   or_(MySQLReplicationState.next_attempt_at.is_(None),
+                       MySQLReplicationState.next_attempt_at <= now))
+            .values(locked_by=self.worker_id, lease_until=now + timedelta(seconds=self.lease_seconds))
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    def drain_once(self):
+        """Replay one batch of pending events; returns how many were replicated"""
+        from app import db
+        from models import MySQLReplicationEvent, MySQLReplicationState
+
+        events = db.session.scalars(
+            select(MySQLReplicationEvent)
+            .where(MySQLReplicationEvent.status == EVENT_PENDING)
+            .order_by(MySQLReplicationEvent.id)
+            .limit(self.batch_size)).all()
+        if not events:
+            return 0
+
+        groups = group_statements(events)
+        failed_group = None
+        try:
+            with self._engine.begin() as conn:
+                for index, (sql, _, params) in enumerate(groups):
+                    failed_group = index
+                    conn.execute(text(sql), params if len(params) > 1 else params[0])
+                failed_group = None
+        except Exception as e:
+            self._record_failure(groups, failed_group, e)
+            return 0
+
+        event_ids = [event.id for event in events]
+        replicated = Counter((event.table_name, event.operation) for event in events)
+        db.session.execute(delete(MySQLReplicationEvent)
+                           .where(MySQLReplicationEvent.id.in_(event_ids))
+                           .execution_options(synchronize_session=False))
+        db.session.execute(
+            update(MySQLReplicationState)
+            .where(MySQLReplicationState.name == STATE_NAME)
+            .values(last_replicated_id=event_ids[-1], last_replicated_at=datetime.utcnow(),
+                    last_error=None, next_attempt_at=None))
+        db.session.commit()
+
+        self._failures = 0
+        for (table_name, operation), count in replicated.items():
+            MYSQL_REPLICATED_EVENTS.inc(table_name, operation, amount=count)
+        logger.debug(f"✅ Replicated {len(events)} changes to MySQL in {len(groups)} statements")
+        return len(events)
+
+    def _find_rejected_event(self, groups, failed_group):
+        """Replay the rejected group row by row after the groups before it; (event, error)
+        for the first row MySQL rejects, None if every row goes through on its own"""
+        sql, events, params = groups[failed_group]
+        # Never committed: closing the connection rolls the replay back
+        with self._engine.connect() as conn:
+            for earlier_sql, _, earlier_params in groups[:failed_group]:
+                conn.execute(text(earlier_sql), earlier_params if len(earlier_params) > 1 else earlier_params[0])
+            for event, row in zip(events, params):
+                try:
+                    conn.execute(text(sql), row)
+                except DBAPIError as e:
+                    if e.connection_invalidated:
+                        raise
+                    return event, e
+        return None
+
+    def _record_failure(self, groups, failed_group, error):
+        """Back off; count the attempt against the rejected event unless MySQL itself was unreachable"""
+        from app import db
+        from models import MySQLReplicationState
+
+        db.session.rollback()
+        message = str(error)[:2000]
+        connection_error = failed_group is None or getattr(error, 'connection_invalidated', False)
+
+        rejected = [] if connection_error else groups[failed_group][1]
+        if len(rejected) > 1:
+            # An executemany fails as a whole; charge only the row MySQL rejects
+            try:
+                found = self._find_rejected_event(groups, failed_group)
+            except Exception as e:
+                connection_error = getattr(e, 'connection_invalidated', False)
+                rejected = [] if connection_error else rejected
+                found = None
+                logger.warning(f"⚠️ Could not replay the rejected MySQL statement row by row: {str(e)}")
+            if found:
+                rejected = [found[0]]
+                message = str(found[1])[:2000]
+        MYSQL_REPLICATION_ERRORS.inc('connection' if connection_error else 'statement')
+
+        if not connection_error:
+            for event in rejected:
+                event.attempts += 1
+                event.last_error = message
+                if event.attempts >= self.max_attempts:
+                    event.status = EVENT_FAILED
+                    logger.error(f"❌ MySQL replication event {event.id} ({event.operation} {event.table_name}) "
+                                 f"set aside after {event.attempts} attempts: {message}")
+
+        self._failures += 1
+        delay = retry_delay(self._failures)
+        state = db.session.get(MySQLReplicationState, STATE_NAME)
+        state.last_error = message
+        state.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+        db.session.commit()
+        logger.warning(f"⚠️ MySQL mirror replication failed ({'connection' if connection_error else 'statement'}), "
+                       f"retrying in {delay:.0f}s: {message}")
+
+    def _refresh_metrics(self):
+        status = replication_status()
+        MYSQL_REPLICATION_BACKLOG.set(status['pending'], EVENT_PENDING)
+        MYSQL_REPLICATION_BACKLOG.set(status['failed'], EVENT_FAILED)
+        MYSQL_REPLICATION_LAG.set(status['lag_seconds'])
+
+
+mysql_replicator = MySQLReplicator(
+    batch_size=BATCH_SIZE,
+    poll_interval=float(os.environ.get('MYSQL_REPLICATION_POLL_INTERVAL', '1')),
+    lease_seconds=int(os.environ.get('MYSQL_REPLICATION_LEASE_SECONDS', '30')),
+    max_attempts=MAX_ATTEMPTS,
+)
+
+
+def start_mysql_replicator(app, engine):
+    if multiprocessing.parent_process() is not None:
+        # Helper processes (e.g. the QR render pool) re-import the app; only the server replicates
+        return
+    if os.environ.get('MYSQL_REPLICATION_IN_PROCESS', 'true').lower() in ('false', '0', 'no'):
+        logger.info("💡 In-process MySQL replicator disabled - run 'python mysql_replication.py'")
+        return
+    mysql_replicator.start(app, engine)
+
+
+if __name__ == '__main__':
+    import time
+    logging.basicConfig(level=logging.INFO)
+    from app import app as flask_app
+    from db_dual_support import init_dual_database
+    # Run the imported module's replicator, not this __main__ copy
+    import mysql_replication
+    manager = init_dual_database(flask_app)
+    replicator = mysql_replication.mysql_replicator
+    replicator.start(flask_app, manager.mysql_engine)
+    try:
+        while replicator.running:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        replicator.stop()
@@ -0,0 +1,384 @@
+"""
+Set-based pick list sync from SAP B1
+Syncing N pick lists costs a fixed number of statements instead of a few per
+pick list and per line:
+- one IN query loads the local pick lists of every returned AbsoluteEntry;
+- one query loads the sales order lines all the pick list lines refer to;
+- one $batch request fetches the sales orders not stored locally yet;
+- bulk INSERT/UPDATE/DELETE statements write the headers, lines and bin allocations.
+
+    from pick_list_sync import sync_pick_lists
+    result = sync_pick_lists(sap, sap_result['pick_lists'], user_id=current_user.id)
+"""
+
+import json
+import logging
+import time
+from datetime import datetime
+
+from sqlalchemy import delete, insert, or_, select
+
+from app import db
+from models import PickList, PickListLine, PickListBinAllocation, SalesOrder, SalesOrderLine
+
+logger = logging.getLogger(__name__)
+
+
+def parse_pick_date(value):
+    """SAP PickDate ('2025-01-01T00:00:00Z') as a datetime, None if missing or malformed"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S')
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_document_date(value):
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return value
+
+
+def _sales_order_values(order_data, now):
+    values = {
+        'doc_entry': order_data.get('DocEntry'),
+        'doc_num': order_data.get('DocNum'),
+        'doc_type': order_data.get('DocType'),
+        'card_code': order_data.get('CardCode'),
+        'card_name': order_data.get('CardName'),
+        'address': order_data.get('Address'),
+        'doc_total': order_data.get('DocTotal'),
+        'doc_currency': order_data.get('DocCurrency'),
+        'comments': order_data.get('Comments'),
+        'document_status': order_data.get('DocumentStatus'),
+        'last_sap_sync': now,
+    }
+    # Dates SAP did not send keep their stored value
+    if order_data.get('DocDate'):
+        values['doc_date'] = _parse_document_date(order_data['DocDate'])
+    if order_data.get('DocDueDate'):
+        values['doc_due_date'] = _parse_document_date(order_data['DocDueDate'])
+    return values
+
+
+def _sales_order_line_values(line_data):
+    return {
+        'line_num': line_data.get('LineNum'),
+        'item_code': line_data.get('ItemCode'),
+        'item_description': line_data.get('ItemDescription') or line_data.get('Dscription'),
+        'quantity': line_data.get('Quantity'),
+        'open_quantity': line_data.get('OpenQuantity'),
+        'delivered_quantity': line_data.get('DeliveredQuantity'),
+        'unit_price': line_data.get('UnitPrice'),
+        'line_total': line_data.get('LineTotal'),
+        'warehouse_code': line_data.get('WarehouseCode'),
+        'unit_of_measure': line_data.get('UoMCode'),
+        'line_status': line_data.get('LineStatus'),
+    }
+
+
+def _apply(instance, values):
+    for key, value in values.items():
+        setattr(instance, key, value)
+
+
+def sync_sales_orders(orders_data):
+    """Insert or update SAP Sales Orders and their lines in the local database.
+
+    Existing orders and lines are loaded with one query each and updated in
+    place; new ones are written with executemany INSERTs. Does not commit.
+
+    Returns:
+        dict: {doc_entry: (SalesOrder, lines_synced)}
+    """
+    orders_data = list({order['DocEntry']: order for order in orders_data if order.get('DocEntry')}.values())
+    if not orders_data:
+        return {}
+
+    now = datetime.utcnow()
+    doc_entries = [order['DocEntry'] for order in orders_data]
+    orders = {order.doc_entry: order for order in
+              SalesOrder.query.filter(SalesOrder.doc_entry.in_(doc_entries)).all()}
+    new_orders = []
+    for order_data in orders_data:
+        values = _sales_order_values(order_data, now)
+        if order_data['DocEntry'] in orders:
+            _apply(orders[order_data['DocEntry']], values)
+        else:
+            values.setdefault('doc_date', None)
+            values.setdefault('doc_due_date', None)
+            new_orders.append(values)
+    if new_orders:
+        db.session.execute(insert(SalesOrder), new_orders)
+        orders.update((order.doc_entry, order) for order in SalesOrder.query.filter(
+            SalesOrder.doc_entry.in_([values['doc_entry'] for values in new_orders])).all())
+
+    order_ids = [order.id for order in orders.values()]
+    lines = {(line.sales_order_id, line.line_num): line for line in
+             SalesOrderLine.query.filter(SalesOrderLine.sales_order_id.in_(order_ids)).all()}
+    new_lines = {}
+    synced = {}
+    for order_data in orders_data:
+        sales_order = orders[order_data['DocEntry']]
+        lines_synced = 0
+        for line_data in order_data.get('DocumentLines', []):
+            if line_data.get('LineNum') is None:
+                continue
+            values = _sales_order_line_values(line_data)
+            key = (sales_order.id, values['line_num'])
+            if key in lines:
+                _apply(lines[key], values)
+            else:
+                new_lines[key] = dict(values, sales_order_id=sales_order.id)
+            lines_synced += 1
+        synced[order_data['DocEntry']] = (sales_order, lines_synced)
+    if new_lines:
+        db.session.execute(insert(SalesOrderLine), list(new_lines.values()))
+    db.session.flush()
+    return synced
+
+
+def load_sales_order_lines(order_keys):
+    """{(doc_entry, line_num): (SalesOrder, SalesOrderLine)} for (OrderEntry, OrderRowID) pairs, in one query"""
+    doc_entries = {doc_entry for doc_entry, _ in order_keys}
+    if not doc_entries:
+        return {}
+    rows = db.session.execute(
+        select(SalesOrder, SalesOrderLine)
+        .join(SalesOrderLine, SalesOrderLine.sales_order_id == SalesOrder.id)
+        .where(SalesOrder.doc_entry.in_(doc_entries))
+    ).all()
+    return {(order.doc_entry, line.line_num): (order, line) for order, line in rows}
+
+
+def _line_row(pick_list_id, sap_line):
+    return {
+        'pick_list_id': pick_list_id,
+        'absolute_entry': sap_line.get('AbsoluteEntry'),
+        'line_number': sap_line.get('LineNumber', 0),
+        'order_entry': sap_line.get('OrderEntry'),
+        'order_row_id': sap_line.get('OrderRowID'),
+        'picked_quantity': float(sap_line.get('PickedQuantity', 0) or 0),
+        'pick_status': sap_line.get('PickStatus', 'ps_Open'),
+        'released_quantity': float(sap_line.get('ReleasedQuantity', 0) or 0),
+        'previously_released_quantity': float(sap_line.get('PreviouslyReleasedQuantity', 0) or 0),
+        'base_object_type': sap_line.get('BaseObjectType', 17),
+        # Filled in when the line was enhanced with its Sales Order line
+        'item_code': sap_line.get('ItemCode'),
+        'item_name': sap_line.get('ItemDescription'),
+        'unit_of_measure': sap_line.get('UnitOfMeasure'),
+        'serial_numbers': json.dumps(sap_line.get('SerialNumbers', [])),
+        'batch_numbers': json.dumps(sap_line.get('BatchNumbers', [])),
+    }
+
+
+def _allocation_row(pick_list_line_id, sap_allocation):
+    return {
+        'pick_list_line_id': pick_list_line_id,
+        'bin_abs_entry': sap_allocation.get('BinAbsEntry'),
+        'quantity': float(sap_allocation.get('Quantity', 0) or 0),
+        'allow_negative_quantity': sap_allocation.get('AllowNegativeQuantity', 'tNO'),
+        'serial_and_batch_numbers_base_line': sap_allocation.get('SerialAndBatchNumbersBaseLine', 0),
+        'base_line_number': sap_allocation.get('BaseLineNumber'),
+    }
+
+
+# Line statuses set by the pick endpoints; SAP may still report the line open
+# when its copy was read before the pick was posted
+LOCAL_PICK_STATUSES = ('ps_Picked', 'ps_PartiallyPicked')
+
+
+def _load_local_picks(pick_list_ids):
+    """Picked quantities and statuses recorded locally for the lines of ``pick_list_ids``.
+
+    Returns:
+        tuple: ({(pick_list_id, line_number): (picked_quantity, pick_status)},
+                {(pick_list_id, line_number, bin_abs_entry): picked_quantity})
+    """
+    line_picks = {
+        (pick_list_id, line_number): (picked_quantity or 0, pick_status)
+        for pick_list_id, line_number, picked_quantity, pick_status in db.session.execute(
+            select(PickListLine.pick_list_id, PickListLine.line_number,
+                   PickListLine.picked_quantity, PickListLine.pick_status)
+            .where(PickListLine.pick_list_id.in_(pick_list_ids),
+                   or_(PickListLine.picked_quantity > 0, PickListLine.pick_status.in_(LOCAL_PICK_STATUSES))))
+    }
+    allocation_picks = {
+        (pick_list_id, line_number, bin_abs_entry): picked_quantity
+        for pick_list_id, line_number, bin_abs_entry, picked_quantity in db.session.execute(
+            select(PickListLine.pick_list_id, PickListLine.line_number,
+                   PickListBinAllocation.bin_abs_entry, PickListBinAllocation.picked_quantity)
+            .join(PickListBinAllocation, PickListBinAllocation.pick_list_line_id == PickListLine.id)
+            .where(PickListLine.pick_list_id.in_(pick_list_ids), PickListBinAllocation.picked_quantity > 0))
+    }
+    return line_picks, allocation_picks
+
+
+def _merge_local_pick(row, local_pick):
+    """Keep a local pick SAP does not show yet: the larger picked quantity wins, and
+    a locally picked line stays picked while SAP still reports it open or released"""
+    picked_quantity, pick_status = local_pick
+    if picked_quantity > row['picked_quantity']:
+        row['picked_quantity'] = picked_quantity
+    if pick_status in LOCAL_PICK_STATUSES and row['pick_status'] in ('ps_Open', 'ps_Released'):
+        row['pick_status'] = pick_status
+
+
+def replace_pick_list_lines(pairs, skip_closed=True):
+    """Replace the lines and bin allocations of many pick lists with their SAP lines.
+
+    ``pairs`` are (local PickList with an id, SAP pick list dict). Old rows go in
+    two DELETE statements; new lines and allocations are each written with one
+    executemany INSERT. ps_Closed lines are skipped unless
+    skip_closed is False. Picks recorded locally are carried over to the new
+    rows (see _merge_local_pick), so a sync never loses a pick SAP does not
+    show yet. Sets total_items / picked_items from the lines written. Does not commit.
+
+    Returns:
+        tuple: (lines written, allocations written)
+    """
+    pairs = [(pick_list, sap_pick_list) for pick_list, sap_pick_list in pairs if pick_list.id]
+    if not pairs:
+        return 0, 0
+
+    pick_list_ids = [pick_list.id for pick_list, _ in pairs]
+    line_picks, allocation_picks = _load_local_picks(pick_list_ids)
+    old_line_ids = select(PickListLine.id).where(PickListLine.pick_list_id.in_(pick_list_ids))
+    db.session.execute(delete(PickListBinAllocation)
+                       .where(PickListBinAllocation.pick_list_line_id.in_(old_line_ids))
+                       .execution_options(synchronize_session=False))
+    db.session.execute(delete(PickListLine)
+                       .where(PickListLine.pick_list_id.in_(pick_list_ids))
+                       .execution_options(synchronize_session=False))
+
+    line_rows = []
+    allocations_by_line = {}
+    for pick_list, sap_pick_list in pairs:
+        rows = []
+        for sap_line in sap_pick_list.get('PickListsLines', []):
+            if skip_closed and sap_line.get('PickStatus', 'ps_Open') == 'ps_Closed':
+                continue
+            row = _line_row(pick_list.id, sap_line)
+            local_pick = line_picks.get((pick_list.id, row['line_number']))
+            if local_pick:
+                _merge_local_pick(row, local_pick)
+            rows.append(row)
+            allocations_by_line[(pick_list.id, row['line_number'])] = sap_line.get('DocumentLinesBinAllocations', [])
+        line_rows.extend(rows)
+        pick_list.total_items = len(rows)
+        pick_list.picked_items = sum(1 for row in rows if row['pick_status'] in LOCAL_PICK_STATUSES + ('ps_Closed',))
+
+    allocation_rows = []
+    if line_rows:
+        # Plain executemany (RETURNING of many rows is not available on every
+        # backend); the new line ids are read back with one query
+        db.session.execute(insert(PickListLine), line_rows)
+        for line_id, pick_list_id, line_number in db.session.execute(
+                select(PickListLine.id, PickListLine.pick_list_id, PickListLine.line_number)
+                .where(PickListLine.pick_list_id.in_(pick_list_ids))):
+            for sap_allocation in allocations_by_line.get((pick_list_id, line_number), []):
+                row = _allocation_row(line_id, sap_allocation)
+                row['picked_quantity'] = allocation_picks.get((pick_list_id, line_number, row['bin_abs_entry']), 0)
+                allocation_rows.append(row)
+    if allocation_rows:
+        db.session.execute(insert(PickListBinAllocation), allocation_rows)
+    return len(line_rows), len(allocation_rows)
+
+
+def _apply_pick_list_header(pick_list, sap_pick_list):
+    pick_list.status = sap_pick_list.get('Status', pick_list.status or 'ps_Open')
+    pick_list.remarks = sap_pick_list.get('Remarks', pick_list.remarks)
+    pick_list.owner_code = sap_pick_list.get('OwnerCode', pick_list.owner_code)
+    pick_list.owner_name = sap_pick_list.get('OwnerName', pick_list.owner_name)
+    pick_list.object_type = sap_pick_list.get('ObjectType', pick_list.object_type or '156')
+    pick_list.use_base_units = sap_pick_list.get('UseBaseUnits', pick_list.use_base_units or 'tNO')
+    pick_date = parse_pick_date(sap_pick_list.get('PickDate'))
+    if pick_date:
+        pick_list.pick_date = pick_date
+
+
+def sync_pick_lists(sap, sap_pick_lists, user_id, with_lines=True):
+    """
+    Create or update local pick lists from SAP pick list dicts (as returned by
+    SAPIntegration.get_pick_lists) in one transaction
+
+    Args:
+        sap: SAPIntegration used to fetch Sales Orders that are not stored locally
+        sap_pick_lists (list): SAP PickLists rows, PickListsLines included
+        user_id (int): Owner of newly created pick lists
+        with_lines (bool): Also replace lines and bin allocations, enhanced with
+            Sales Order item data
+
+    Returns:
+        dict: {'success', 'created', 'updated', 'lines', 'allocations', 'elapsed_ms'} or {'success', 'error'}
+    """
+    started = time.monotonic()
+    by_entry = {}
+    for sap_pick_list in sap_pick_lists:
+        absolute_entry = sap_pick_list.get('Absoluteentry')
+        if absolute_entry:
+            by_entry[int(absolute_entry)] = sap_pick_list
+
+    try:
+        if with_lines and by_entry:
+            # Enhance every line of every pick list in one pass: one $batch for the
+            # missing Sales Orders and one query for all referenced order lines
+            all_lines = [line for sap_pick_list in by_entry.values()
+                         for line in sap_pick_list.get('PickListsLines', [])]
+            enhanced = iter(sap.enhance_picklist_with_sales_order_data(all_lines))
+            for sap_pick_list in by_entry.values():
+                sap_pick_list['PickListsLines'] = [next(enhanced) for _ in sap_pick_list.get('PickListsLines', [])]
+
+        existing = {}
+        if by_entry:
+            for pick_list in (PickList.query.filter(PickList.absolute_entry.in_(list(by_entry)))
+                              .order_by(PickList.id).all()):
+                existing.setdefault(pick_list.absolute_entry, pick_list)
+
+        created = []
+        for absolute_entry, sap_pick_list in by_entry.items():
+            if absolute_entry in existing:
+                _apply_pick_list_header(existing[absolute_entry], sap_pick_list)
+            else:
+                created.append({
+                    'absolute_entry': absolute_entry,
+                    'name': sap_pick_list.get('Name', f'SAP-{absolute_entry}'),
+                    'owner_code': sap_pick_list.get('OwnerCode'),
+                    'owner_name': sap_pick_list.get('OwnerName'),
+                    'pick_date': parse_pick_date(sap_pick_list.get('PickDate')),
+                    'remarks': sap_pick_list.get('Remarks'),
+                    'status': sap_pick_list.get('Status', 'ps_Open'),
+                    'object_type': sap_pick_list.get('ObjectType', '156'),
+                    'use_base_units': sap_pick_list.get('UseBaseUnits', 'tNO'),
+                    'user_id': user_id,
+                })
+        if created:
+            db.session.execute(insert(PickList), created)
+            for pick_list in PickList.query.filter(
+                    PickList.absolute_entry.in_([row['absolute_entry'] for row in created])).order_by(PickList.id):
+                existing.setdefault(pick_list.absolute_entry, pick_list)
+        db.session.flush()
+
+        pairs = [(existing[absolute_entry], sap_pick_list) for absolute_entry, sap_pick_list in by_entry.items()]
+
+        lines = allocations = 0
+        if with_lines:
+            lines, allocations = replace_pick_list_lines(pairs)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"❌ Error syncing SAP pick lists: {str(e)}")
+        return {'success': False, 'error': str(e)}
+
+    elapsed_ms = int((time.monotonic() - started) * 1000)
+    logger.info(f"✅ Synced {len(pairs)} pick lists ({len(created)} new, {lines} lines, "
+                f"{allocations} bin allocations) in {elapsed_ms}ms")
+    return {
+        'success': True,
+        'created': len(created),
+        'updated': len(pairs) - len(created),
+        'lines': lines,
+        'allocations': allocations,
+        'elapsed_ms': elapsed_ms,
+    }
@@ -0,0 +1,201 @@
+"""
+QC work queue
+Loads the documents waiting on the QC dashboard one page at a time per document
+type, with their users and lines fetched by selectinload instead of lazily per
+row, and counts every queue plus today's approvals/rejections in one query.
+"Today" is a half-open qc_approved_at range so the timestamp index can be used.
+"""
+
+import math
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import selectinload
+
+from app import db
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 200
+
+
+class QueueSpec:
+    """One QC queue: which documents it holds, how they are ordered and what to eager load.
+
+    A queue that is not ``shown`` on the dashboard is counted but its page is
+    only loaded when asked for by name.
+    """
+
+    def __init__(self, key, template_var, model, status, order_column, reference, options, shown=True):
+        self.key = key
+        self.template_var = template_var
+        self.model = model
+        self.status = status
+        self.order_column = order_column
+        self.reference = reference
+        self.options = options
+        self.shown = shown
+
+    def filter(self):
+        return self.model.status == self.status
+
+
+def queue_specs():
+    from models import (InventoryTransfer, SerialNumberTransfer, SerialNumberTransferItem,
+                        SerialItemTransfer, DirectInventoryTransfer)
+    from modules.grpo.models import GRPODocument
+    from modules.multi_grn_creation.models import MultiGRNBatch, MultiGRNPOLink
+    from modules.sales_delivery.models import DeliveryDocument
+
+    # The serial transfer sections of templates/qc_dashboard.html are commented out
+    return [
+        QueueSpec('grpos', 'pending_grpos', GRPODocument, 'submitted',
+                  GRPODocument.created_at, 'po_number',
+                  [selectinload(GRPODocument.user), selectinload(GRPODocument.items)]),
+        QueueSpec('transfers', 'pending_transfers', InventoryTransfer, 'submitted',
+                  InventoryTransfer.created_at, 'transfer_request_number',
+                  [selectinload(InventoryTransfer.user), selectinload(InventoryTransfer.items)]),
+        QueueSpec('serial_transfers', 'pending_serial_transfers', SerialNumberTransfer, 'submitted',
+                  SerialNumberTransfer.created_at, 'transfer_number',
+                  [selectinload(SerialNumberTransfer.user),
+                   selectinload(SerialNumberTransfer.items).selectinload(SerialNumberTransferItem.serial_numbers)],
+                  shown=False),
+        QueueSpec('serial_item_transfers', 'pending_serial_item_transfers', SerialItemTransfer, 'submitted',
+                  SerialItemTransfer.created_at, 'transfer_number',
+                  [selectinload(SerialItemTransfer.user), selectinload(SerialItemTransfer.items)],
+                  shown=False),
+        QueueSpec('approved_serial_item_transfers', 'qc_approved_serial_item_transfers', SerialItemTransfer, 'qc_approved',
+                  SerialItemTransfer.qc_approved_at, 'transfer_number',
+                  [selectinload(SerialItemTransfer.user), selectinload(SerialItemTransfer.items)],
+                  shown=False),
+        QueueSpec('direct_transfers', 'pending_direct_transfers', DirectInventoryTransfer, 'submitted',
+                  DirectInventoryTransfer.created_at, 'transfer_number',
+                  [selectinload(DirectInventoryTransfer.user), selectinload(DirectInventoryTransfer.items)]),
+        QueueSpec('deliveries', 'pending_deliveries', DeliveryDocument, 'submitted',
+                  DeliveryDocument.created_at, 'so_doc_num',
+                  [selectinload(DeliveryDocument.user), selectinload(DeliveryDocument.items)]),
+        QueueSpec('multi_grn_batches', 'pending_multi_grn_batches', MultiGRNBatch, 'submitted',
+                  MultiGRNBatch.created_at, 'batch_number',
+                  [selectinload(MultiGRNBatch.user),
+                   selectinload(MultiGRNBatch.po_links).selectinload(MultiGRNPOLink.line_selections)]),
+    ]
+
+
+def daily_outcome_sources():
+    """(model, statuses counted as approved) for the approved/rejected today cards"""
+    from models import InventoryTransfer, SerialNumberTransfer, SerialItemTransfer, DirectInventoryTransfer
+    from modules.grpo.models import GRPODocument
+    from modules.multi_grn_creation.models import MultiGRNBatch
+    from modules.sales_delivery.models import DeliveryDocument
+
+    approved = ['qc_approved', 'posted']
+    return [
+        (GRPODocument, approved),
+        (InventoryTransfer, ['qc_approved']),
+        (SerialNumberTransfer, approved),
+        (SerialItemTransfer, approved),
+        (DirectInventoryTransfer, approved),
+        (DeliveryDocument, approved),
+        (MultiGRNBatch, approved),
+    ]
+
+
+def day_range(day=None):
+    """Half-open [start, end) datetime range covering one calendar day"""
+    start = datetime.combine(day or date.today(), time.min)
+    return start, start + timedelta(days=1)
+
+
+def load_queue_counts(specs, day=None):
+    """Queue totals and today's approved/rejected counts in a single SELECT"""
+    start, end = day_range(day)
+    columns = []
+    for spec in specs:
+        columns.append(select(func.count()).select_from(spec.model)
+                       .where(spec.filter()).scalar_subquery().label(f'total_{spec.key}'))
+
+    sources = daily_outcome_sources()
+    for index, (model, approved_statuses) in enumerate(sources):
+        in_range = (model.qc_approved_at >= start, model.qc_approved_at < end)
+        columns.append(select(func.count()).select_from(model)
+                       .where(model.status.in_(approved_statuses), *in_range)
+                       .scalar_subquery().label(f'approved_{index}'))
+        columns.append(select(func.count()).select_from(model)
+                       .where(model.status == 'rejected', *in_range)
+                       .scalar_subquery().label(f'rejected_{index}'))
+
+    row = db.session.execute(select(*columns)).one()._mapping
+    return {
+        'totals': {spec.key: row[f'total_{spec.key}'] or 0 for spec in specs},
+        'approved_today': sum(row[f'approved_{index}'] or 0 for index in range(len(sources))),
+        'rejected_today': sum(row[f'rejected_{index}'] or 0 for index in range(len(sources))),
+    }
+
+
+def page_size(value):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def load_queue_page(spec, total, page=1, per_page=DEFAULT_PAGE_SIZE):
+    """One page of a queue, newest first, with relationships eager loaded"""
+    pages = max(1, math.ceil(total / per_page))
+    page = max(1, min(page, pages))
+    items = []
+    if total:
+        items = (db.session.execute(
+            select(spec.model)
+            .where(spec.filter())
+            .options(*spec.options)
+            .order_by(spec.order_column.desc(), spec.model.id.desc())
+            .limit(per_page)
+            .offset((page - 1) * per_page)
+        ).scalars().all())
+    return {
+        'items': items,
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'pages': pages,
+        'has_prev': page > 1,
+        'has_next': page < pages,
+    }
+
+
+def load_qc_work_queue(pages=None, per_page=DEFAULT_PAGE_SIZE, sections=None):
+    """Counts for every queue plus the requested page of each queue in ``sections``.
+
+    ``pages`` maps a queue key to its page number (default 1). ``sections=None``
+    loads every shown queue; pass an empty list to fetch the counts only.
+    """
+    pages = pages or {}
+    specs = queue_specs()
+    counts = load_queue_counts(specs)
+    queues = {}
+    for spec in specs:
+        requested = spec.key in sections if sections is not None else spec.shown
+        if not requested:
+            continue
+        queues[spec.key] = load_queue_page(spec, counts['totals'][spec.key],
+                                           page=pages.get(spec.key, 1), per_page=per_page)
+    return specs, counts, queues
+
+
+def serialize_queue_item(spec, document):
+    """Summary of a queued document for the JSON refresh endpoint"""
+    user = getattr(document, 'user', None)
+    if spec.key == 'multi_grn_batches':
+        line_count = sum(len(link.line_selections) for link in document.po_links)
+    else:
+        line_count = len(document.items)
+    return {
+        'id': document.id,
+        'reference': getattr(document, spec.reference, None),
+        'status': document.status,
+        'created_by': user.username if user else None,
+        'line_count': line_count,
+        'created_at': document.created_at.isoformat() if document.created_at else None,
+        'qc_approved_at': document.qc_approved_at.isoformat() if document.qc_approved_at else None,
+    }
@@ -0,0 +1,215 @@
+"""
+Bulk QR label rendering
+Renders many QR payloads in one call: the QR version, mask pattern and box size
+are chosen once for the whole batch, so every label comes out at the same pixel
+size without a resampling pass and without re-scoring all eight masks per label.
+Images are written as 1-bit PNGs and large batches are spread over a process pool.
+
+    from qr_label_renderer import render_qr_batch
+    result = render_qr_batch([json.dumps(pack) for pack in packs], size=300)
+    result['images']  # data URIs in payload order, None where a payload failed
+"""
+
+import base64
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import qrcode
+from qrcode.exceptions import DataOverflowError
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BOX_SIZE = 10
+DEFAULT_BORDER = 4
+MAX_PAYLOAD_LENGTH = 500
+MAX_IMAGE_BASE64_LENGTH = 100000
+MAX_BATCH_SIZE = int(os.environ.get('QR_RENDER_MAX_BATCH', '5000'))
+
+# Batches smaller than this render in-process; starting workers costs more than it saves
+PARALLEL_THRESHOLD = int(os.environ.get('QR_RENDER_PARALLEL_MIN', '200'))
+RENDER_WORKERS = int(os.environ.get('QR_RENDER_WORKERS', str(min(4, os.cpu_count() or 1))))
+CHUNK_SIZE = 50
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Shared worker pool, started on first use with 'spawn' so worker processes
+    do not inherit the web server's threads and database connections"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=RENDER_WORKERS,
+                                            mp_context=multiprocessing.get_context('spawn'))
+            logger.info(f"✅ QR label render pool started with {RENDER_WORKERS} workers")
+        return _executor
+
+
+def shutdown_render_pool():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def normalize_payload(data):
+    """Strip and cap a payload the same way single-label generation always has"""
+    if data is None:
+        return None
+    text = str(data).strip()
+    if not text:
+        return None
+    if len(text) > MAX_PAYLOAD_LENGTH:
+        logging.warning(f"⚠️ Barcode data too long ({len(text)} chars), truncating to {MAX_PAYLOAD_LENGTH}")
+        text = text[:MAX_PAYLOAD_LENGTH]
+    return text
+
+
+def fit_symbol(payloads):
+    """(version, mask pattern) for the batch, sized for its longest payload.
+
+    Pack labels of one batch share a layout, so the mask that scores best for
+    the longest payload is reused for all of them.
+    """
+    longest = max((payload for payload in payloads if payload), key=lambda p: len(p.encode('utf-8')), default=None)
+    if longest is None:
+        return 1, 0
+    qr = qrcode.QRCode(version=None, error_correction=qrcode.constants.ERROR_CORRECT_L)
+    qr.add_data(longest)
+    version = qr.best_fit()
+    return version, qr.best_mask_pattern()
+
+
+def modules_for(version, border=DEFAULT_BORDER):
+    """Width of a QR symbol in modules, quiet zone included"""
+    return 17 + 4 * version + 2 * border
+
+
+def _encode_matrix(data, version, mask_pattern, border):
+    qr = qrcode.QRCode(version=version, error_correction=qrcode.constants.ERROR_CORRECT_L,
+                       border=border, mask_pattern=mask_pattern)
+    qr.add_data(data)
+    try:
+        qr.make(fit=False)
+    except DataOverflowError:
+        # Payload mixes character modes differently from the longest one; fit it individually
+        qr = qrcode.QRCode(version=None, error_correction=qrcode.constants.ERROR_CORRECT_L, border=border)
+        qr.add_data(data)
+        qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def render_image(data, version, mask_pattern, box_size, border=DEFAULT_BORDER, size=None):
+    """Encode one payload as a 1-bit PIL image of box_size pixels per module"""
+    matrix = _encode_matrix(data, version, mask_pattern, border)
+    width = len(matrix)
+
+    pixels = bytes(0 if cell else 255 for row in matrix for cell in row)
+    img = Image.frombytes('L', (width, width), pixels).convert('1')
+    if box_size > 1:
+        # Integer scale factor: every module becomes an exact box_size square
+        img = img.resize((width * box_size, width * box_size), Image.Resampling.NEAREST)
+    if size and img.width < size:
+        canvas = Image.new('1', (size, size), 1)
+        offset = (size - img.width) // 2
+        canvas.paste(img, (offset, offset))
+        img = canvas
+    return img
+
+
+def render_png(data, version, mask_pattern, box_size, border=DEFAULT_BORDER, size=None):
+    """Encode one payload as a base64 1-bit PNG"""
+    img = render_image(data, version, mask_pattern, box_size, border, size)
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def box_size_for(size, version, border=DEFAULT_BORDER):
+    """Largest whole number of pixels per module that fits the symbol in ``size``"""
+    return max(1, size // modules_for(version, border))
+
+
+def _render_chunk(payloads, version, mask_pattern, box_size, border, size):
+    images = []
+    for data in payloads:
+        if data is None:
+            images.append(None)
+            continue
+        try:
+            images.append(render_png(data, version, mask_pattern, box_size, border, size))
+        except Exception as e:
+            logging.error(f"❌ Error generating barcode for data '{data[:50]}...': {str(e)}")
+            images.append(None)
+    return images
+
+
+def render_qr_batch(payloads, size=None, box_size=None, border=DEFAULT_BORDER, data_uri=True, parallel=None):
+    """
+    Render a list of QR payloads in one call
+
+    Args:
+        payloads (list): Strings (or values converted with str()) to encode
+        size (int): Target width/height in pixels; the box size is derived from it
+            and the symbol is centred on a white canvas of exactly this size
+        box_size (int): Pixels per module when no size is given (default: 10)
+        border (int): Quiet zone in modules (default: 4)
+        data_uri (bool): Return "data:image/png;base64,..." instead of bare base64
+        parallel (bool): Force or forbid the process pool (default: by batch size)
+
+    Returns:
+        dict: {'success', 'images', 'version', 'box_size', 'rendered', 'failed', 'elapsed_ms'}
+    """
+    started = time.monotonic()
+    texts = [normalize_payload(data) for data in payloads]
+    version, mask_pattern = fit_symbol(texts)
+    if size:
+        box_size = box_size_for(size, version, border)
+    box_size = box_size or DEFAULT_BOX_SIZE
+
+    if parallel is None:
+        parallel = RENDER_WORKERS > 1 and len(texts) >= PARALLEL_THRESHOLD
+
+    images = None
+    if parallel:
+        try:
+            executor = _get_executor()
+            chunks = [texts[i:i + CHUNK_SIZE] for i in range(0, len(texts), CHUNK_SIZE)]
+            futures = [executor.submit(_render_chunk, chunk, version, mask_pattern,
+                                       box_size, border, size) for chunk in chunks]
+            images = [image for future in futures for image in future.result()]
+        except Exception as e:
+            logger.warning(f"⚠️ QR render pool unavailable, rendering in-process: {str(e)}")
+            shutdown_render_pool()
+            images = None
+    if images is None:
+        images = _render_chunk(texts, version, mask_pattern, box_size, border, size)
+
+    for index, image in enumerate(images):
+        if image is not None and len(image) > MAX_IMAGE_BASE64_LENGTH:
+            logging.warning(f"⚠️ Generated barcode too large ({len(image)} bytes), skipping")
+            images[index] = None
+    if data_uri:
+        images = [f"data:image/png;base64,{image}" if image else None for image in images]
+
+    failed = sum(1 for image in images if image is None)
+    elapsed_ms = int((time.monotonic() - started) * 1000)
+    logger.info(f"✅ Rendered {len(images) - failed}/{len(images)} QR labels in {elapsed_ms}ms "
+                f"(version={version}, box_size={box_size}, parallel={bool(parallel)})")
+    return {
+        'success': True,
+        'images': images,
+        'version': version,
+        'box_size': box_size,
+        'rendered': len(images) - failed,
+        'failed': failed,
+        'elapsed_ms': elapsed_ms,
+    }
@@ -0,0 +1,296 @@
+"""
+Per-request performance instrumentation with a Prometheus text /metrics endpoint
+Every request records its wall time, the number and total time of its SQL
+statements (SQLAlchemy engine events) and the number of SAP Service Layer calls
+it made. Every SAP call is also recorded on its own, by logical operation,
+method and HTTP status. Everything is kept in in-process histograms and served
+at /metrics in the Prometheus text exposition format:
+
+    from request_metrics import init_request_metrics, sap_operation
+    init_request_metrics(app)
+
+    with sap_operation('get_bin_items.crossjoin'):
+        rows = list(sap.iter_rows('$crossjoin(...)', params=params))
+
+SAP calls made outside a sap_operation block are named after the Service
+Layer resource they hit, e.g. "PickLists" or "SQLQueries.Series_Validation".
+/metrics answers only requests with "Authorization: Bearer <METRICS_TOKEN>";
+without METRICS_TOKEN it is closed (403). REQUEST_METRICS_ENABLED=false switches
+the instrumentation off.
+"""
+
+import contextlib
+import contextvars
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+from flask import Response, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# Statistics of the request being served and the logical SAP operation in progress.
+# Worker threads started on behalf of a request re-bind both with bind_context().
+_current_request = contextvars.ContextVar('wms_request_metrics', default=None)
+_current_operation = contextvars.ContextVar('wms_sap_operation', default=None)
+
+
+class Histogram:
+    """Cumulative histogram per label set, rendered as Prometheus _bucket/_sum/_count series"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            snapshot = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        for labels, counts, total, count in sorted(snapshot):
+            pairs = list(zip(self.label_names, labels))
+            for bound, bucket_count in zip(self.buckets, counts):
+                yield f'{self.name}_bucket', pairs + [('le', _format_value(bound))], bucket_count
+            yield f'{self.name}_bucket', pairs + [('le', '+Inf')], count
+            yield f'{self.name}_sum', pairs, total
+            yield f'{self.name}_count', pairs, count
+
+
+class Counter:
+    """Monotonic counter per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            snapshot = sorted(self._series.items())
+        for labels, value in snapshot:
+            yield self.name, list(zip(self.label_names, labels)), value
+
+
+class Gauge:
+    """Last set value per label set"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._series[label_values] = value
+
+    def samples(self):
+        with self._lock:
+            snapshot = sorted(self._series.items())
+        for labels, value in snapshot:
+            yield self.name, list(zip(self.label_names, labels)), value
+
+
+REQUEST_DURATION = Histogram('wms_http_request_duration_seconds', 'Wall time of HTTP requests',
+                             ('endpoint', 'method', 'status'), DURATION_BUCKETS)
+REQUEST_SQL_QUERIES = Histogram('wms_http_request_sql_queries', 'SQL statements executed per HTTP request',
+                                ('endpoint',), COUNT_BUCKETS)
+REQUEST_SQL_SECONDS = Histogram('wms_http_request_sql_seconds', 'Time spent in SQL statements per HTTP request',
+                                ('endpoint',), DURATION_BUCKETS)
+REQUEST_SAP_CALLS = Histogram('wms_http_request_sap_calls', 'SAP Service Layer calls per HTTP request',
+                              ('endpoint',), COUNT_BUCKETS)
+SAP_CALL_DURATION = Histogram('wms_sap_call_duration_seconds', 'Latency of SAP Service Layer calls',
+                              ('operation', 'method'), DURATION_BUCKETS)
+SAP_CALLS = Counter('wms_sap_calls_total', 'SAP Service Layer calls by response status',
+                    ('operation', 'method', 'status'))
+
+MYSQL_REPLICATION_BACKLOG = Gauge('wms_mysql_replication_backlog', 'Changes in the MySQL mirror outbox by status',
+                                  ('status',))
+MYSQL_REPLICATION_LAG = Gauge('wms_mysql_replication_lag_seconds',
+                              'Age of the oldest change not yet replayed on the MySQL mirror', ())
+MYSQL_REPLICATED_EVENTS = Counter('wms_mysql_replicated_events_total', 'Changes replayed on the MySQL mirror',
+                                  ('table', 'operation'))
+MYSQL_REPLICATION_ERRORS = Counter('wms_mysql_replication_errors_total',
+                                   'Failed MySQL mirror batches (connection or statement errors)', ('kind',))
+
+METRICS = [REQUEST_DURATION, REQUEST_SQL_QUERIES, REQUEST_SQL_SECONDS, REQUEST_SAP_CALLS,
+           SAP_CALL_DURATION, SAP_CALLS, MYSQL_REPLICATION_BACKLOG, MYSQL_REPLICATION_LAG,
+           MYSQL_REPLICATED_EVENTS, MYSQL_REPLICATION_ERRORS]
+
+
+class _RequestStats:
+    __slots__ = ('started', 'sql_queries', 'sql_seconds', 'sap_calls', 'lock')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_queries = 0
+        self.sql_seconds = 0.0
+        self.sap_calls = 0
+        self.lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def sap_operation(name):
+    """Name the SAP calls made inside the block (e.g. 'get_bin_items.crossjoin')"""
+    token = _current_operation.set(name)
+    try:
+        yield
+    finally:
+        _current_operation.reset(token)
+
+
+def bind_context(func):
+    """Wrap ``func`` so that, on whatever thread it runs, its SQL and SAP calls are
+    attributed to the caller's request and SAP operation"""
+    stats, operation = _current_request.get(), _current_operation.get()
+
+    def run(*args, **kwargs):
+        stats_token = _current_request.set(stats)
+        operation_token = _current_operation.set(operation)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current_operation.reset(operation_token)
+            _current_request.reset(stats_token)
+    return run
+
+
+def sap_resource_name(url):
+    """Service Layer resource of a URL: 'PickLists(12)' -> 'PickLists', SQLQueries('X')/List -> 'SQLQueries.X'"""
+    path = urlsplit(url).path
+    _, found, resource = path.partition('/b1s/v1/')
+    segment = (resource if found else path).strip('/').split('/')[0]
+    name, _, key = segment.partition('(')
+    if name == 'SQLQueries' and key:
+        return f"SQLQueries.{key.rstrip(')').strip(chr(39))}"
+    return name or 'root'
+
+
+def observe_sap_call(method, url, status, seconds):
+    """Record one SAP Service Layer call (status is the HTTP status or 'error')"""
+    operation = _current_operation.get() or sap_resource_name(url)
+    SAP_CALL_DURATION.observe(seconds, operation, method)
+    SAP_CALLS.inc(operation, method, str(status))
+    stats = _current_request.get()
+    if stats is not None:
+        with stats.lock:
+            stats.sap_calls += 1
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_request.get() is not None and context is not None:
+        context._wms_metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_request.get()
+    started = getattr(context, '_wms_metrics_started', None)
+    if stats is None or started is None:
+        return
+    with stats.lock:
+        stats.sql_queries += 1
+        stats.sql_seconds += time.perf_counter() - started
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value) if value != int(value) else f'{value:.1f}'
+    return str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for metric in METRICS:
+        lines.append(f'# HELP {metric.name} {metric.help_text}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for name, labels, value in metric.samples():
+            label_text = ','.join(f'{key}="{_escape(label)}"' for key, label in labels)
+            lines.append(f'{name}{{{label_text}}} {_format_value(value)}' if label_text
+                         else f'{name} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def init_request_metrics(app):
+    """Install the request hooks, the SQLAlchemy engine listeners and the /metrics endpoint"""
+    if os.environ.get('REQUEST_METRICS_ENABLED', 'true').lower() in ('0', 'false', 'no'):
+        logger.info("ℹ️ Request metrics disabled (REQUEST_METRICS_ENABLED=false)")
+        return False
+
+    # Engine class listeners cover the main database and the MySQL mirror engine alike
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def _start_request_metrics():
+        g._wms_metrics_token = _current_request.set(_RequestStats())
+
+    @app.teardown_request
+    def _finish_request_metrics(exc):
+        token = g.pop('_wms_metrics_token', None)
+        stats = _current_request.get()
+        if token is None or stats is None:
+            return
+        _current_request.reset(token)
+        endpoint = request.endpoint or 'unmatched'
+        status = getattr(g, '_wms_metrics_status', 500 if exc is not None else 200)
+        REQUEST_DURATION.observe(time.perf_counter() - stats.started, endpoint, request.method, str(status))
+        REQUEST_SQL_QUERIES.observe(stats.sql_queries, endpoint)
+        REQUEST_SQL_SECONDS.observe(stats.sql_seconds, endpoint)
+        REQUEST_SAP_CALLS.observe(stats.sap_calls, endpoint)
+
+    @app.after_request
+    def _record_response_status(response):
+        g._wms_metrics_status = response.status_code
+        return response
+
+    def metrics():
+        token = os.environ.get('METRICS_TOKEN')
+        if not token:
+            # Route latencies, SAP call counts and queue depths are not public
+            return Response('Forbidden - set METRICS_TOKEN to enable /metrics\n', status=403, mimetype='text/plain')
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
+    logger.info("✅ Request metrics enabled - Prometheus text format at /metrics")
+    return True
@@ -10,10 +10,18 @@ from app import app, db, login_manager
 from models import User, InventoryTransfer, InventoryTransferItem, PickList, PickListItem, \
     InventoryCount, InventoryCountItem, SAPInventoryCount, SAPInventoryCountLine, BarcodeLabel, BinScanningLog, \
     DocumentNumberSeries, QRCodeLabel, PickListLine, \
-    DirectInventoryTransfer, DirectInventoryTransferItem, TransferScanState, InventoryTransferRequestLine
+    DirectInventoryTransferItem, TransferScanState, InventoryTransferRequestLine, \
+    SAPPostingJob
 from modules.grpo.models import GRPODocument, GRPOItem, GRPOSerialNumber, GRPOBatchNumber, PurchaseDeliveryNote
 from modules.multi_grn_creation.models import MultiGRNBatch
 from sap_integration import SAPIntegration
+from master_data_cache import master_data_cache
+from sap_posting_queue import enqueue_posting_job, job_response
+from dashboard_stats import get_dashboard_data, STAT_KEYS as DASHBOARD_STAT_KEYS
+from qc_work_queue import queue_specs, load_qc_work_queue, page_size, serialize_queue_item
+from qr_label_renderer import MAX_BATCH_SIZE
+from inventory_counting_sync import (LINE_KEYS as COUNTING_LINE_KEYS, counting_lines, sync_counting_lines,
+                                     diff_submitted_lines, apply_submitted_lines)
 from sqlalchemy import or_
 
 # BinScanningLog is now imported above
@@ -26,16 +34,26 @@ def get_warehouses():
     try:
         sap = SAPIntegration()
         
+        found, warehouses = master_data_cache.get('warehouses', (sap.company_db, 'full'))
+        if found:
+            return jsonify({
+                'success': True,
+                'warehouses': warehouses
+            })
+        
         # Try to get warehouses from SAP B1
         if sap.ensure_logged_in():
             try:
                 url = f"{sap.base_url}/b1s/v1/Warehouses"
-                response = sap.session.get(url, timeout=10)
+                headers = {"Prefer": "odata.maxpagesize=0"}
+                response = sap.session.get(url, headers=headers, timeout=10)
                 
                 if response.status_code == 200:
                     data = response.json()
                     warehouses = data.get('value', [])
                     logging.info(f"Retrieved {len(warehouses)} warehouses from SAP B1")
+                    if warehouses:
+                        master_data_cache.set('warehouses', (sap.company_db, 'full'), warehouses)
                     return jsonify({
                         'success': True,
                         'warehouses': warehouses
@@ -415,9 +433,6 @@ def get_invcnt_details():
                     local_doc.counter_id = invcnt_data.get('CounterID')
                     local_doc.multiple_counter_role = invcnt_data.get('MultipleCounterRole')
                     local_doc.last_updated_at = datetime.utcnow()
-                    
-                    # Delete existing lines and recreate them
-                    SAPInventoryCountLine.query.filter_by(count_id=local_doc.id).delete()
                 else:
                     # Create new document
                     local_doc = SAPInventoryCount(
@@ -441,46 +456,12 @@ def get_invcnt_details():
                     db.session.add(local_doc)
                     db.session.flush()
                 
-                # Save document lines
-                lines = invcnt_data.get('InventoryCountLines', [])
-                for line in lines:
-                    in_whs_qty = float(line.get('InWarehouseQuantity', 0))
-                    uom_counted_qty = float(line.get('UoMCountedQuantity', 0))
-                    variance = uom_counted_qty - in_whs_qty
-                    
-                    local_line = SAPInventoryCountLine(
-                        count_id=local_doc.id,
-                        line_number=line.get('LineNumber'),
-                        item_code=line.get('ItemCode'),
-                        item_description=line.get('ItemDescription'),
-                        warehouse_code=line.get('WarehouseCode'),
-                        bin_entry=line.get('BinEntry'),
-                        in_warehouse_quantity=in_whs_qty,
-                        counted=line.get('Counted', 'tNO'),
-                        uom_code=line.get('UoMCode'),
-                        bar_code=line.get('BarCode'),
-                        #uom_counted_quantity=uom_counted_qty,
-                        items_per_unit=line.get('ItemsPerUnit', 1),
-                        counter_type=line.get('CounterType'),
-                        counter_id=line.get('CounterID'),
-                        multiple_counter_role=line.get('MultipleCounterRole'),
-                        line_status=line.get('LineStatus'),
-                        project_code=line.get('ProjectCode'),
-                        manufacturer=line.get('Manufacturer'),
-                        supplier_catalog_no=line.get('SupplierCatalogNo'),
-                        preferred_vendor=line.get('PreferredVendor'),
-                        cost_code=line.get('CostCode'),
-                        u_floor=line.get('U_Floor'),
-                        u_rack=line.get('U_Rack'),
-                        u_level=line.get('U_Level'),
-                        freeze=line.get('Freeze', 'tNO'),
-                        u_invcount=line.get('U_InvCount'),
-                        variance=variance
-                    )
-                    db.session.add(local_line)
+                # Write only the lines that are new, changed or gone since the last open
+                inserted, updated, deleted = sync_counting_lines(local_doc.id, counting_lines(invcnt_data))
                 
                 db.session.commit()
-                logging.info(f"✅ Saved SAP counting document {doc_entry} to local database")
+                logging.info(f"✅ Saved SAP counting document {doc_entry} to local database "
+                             f"({inserted} lines added, {updated} updated, {deleted} removed)")
                 
             except Exception as e:
                 db.session.rollback()
@@ -521,98 +502,29 @@ def update_inventory_counting():
         # Initialize SAP integration
         sap = SAPIntegration()
         
+        # Only the lines whose values differ from the stored ones go to SAP
+        local_doc = SAPInventoryCount.query.filter_by(doc_entry=int(doc_entry)).first()
+        lines = counting_lines(document)
+        diff = diff_submitted_lines(local_doc.id if local_doc else None, lines)
+        header = {key: value for key, value in document.items() if key not in COUNTING_LINE_KEYS}
+        if diff['lines']:
+            header['InventoryCountingLines'] = diff['lines']
+        logging.info(f"📋 Counting {doc_entry}: {len(diff['lines'])} of {len(lines)} lines changed")
+        
         # Call the PATCH method
-        result = sap.update_inventory_counting(doc_entry, document)
+        result = sap.update_inventory_counting(doc_entry, header)
         
         if result.get('success'):
             # Update local database after successful PATCH
             try:
-                # Helper to safely convert to float with default
-                def safe_float(value, default=0):
-                    if value is None or value == '':
-                        return default
-                    try:
-                        return float(value)
-                    except (ValueError, TypeError):
-                        return default
-                
-                local_doc = SAPInventoryCount.query.filter_by(doc_entry=int(doc_entry)).first()
-                
-                # Get lines from document - try both key names for compatibility
-                lines = document.get('InventoryCountingLines', []) or document.get('InventoryCountLines', [])
-                
                 if local_doc:
                     # Update document header
                     local_doc.last_updated_at = datetime.utcnow()
                     local_doc.document_status = document.get('DocumentStatus', local_doc.document_status)
                     local_doc.remarks = document.get('Remarks', local_doc.remarks)
                     
-                    # Update counting lines based on submitted data
-                    for line_data in lines:
-                        line_number = line_data.get('LineNumber')
-                        local_line = SAPInventoryCountLine.query.filter_by(
-                            count_id=local_doc.id,
-                            line_number=line_number
-                        ).first()
-                        
-                        if local_line:
-                            # Update all relevant fields from SAP payload
-                            local_line.item_code = line_data.get('ItemCode', local_line.item_code)
-                            local_line.item_description = line_data.get('ItemDescription', local_line.item_description)
-                            local_line.warehouse_code = line_data.get('WarehouseCode', local_line.warehouse_code)
-                            local_line.bin_entry = line_data.get('BinEntry', local_line.bin_entry)
-                            local_line.in_warehouse_quantity = safe_float(line_data.get('InWarehouseQuantity'), local_line.in_warehouse_quantity or 0)
-                            local_line.uom_code = line_data.get('UoMCode', local_line.uom_code)
-                            local_line.bar_code = line_data.get('BarCode', local_line.bar_code)
-                            local_line.items_per_unit = safe_float(line_data.get('ItemsPerUnit'), local_line.items_per_unit or 1)
-                            local_line.counter_type = line_data.get('CounterType', local_line.counter_type)
-                            local_line.counter_id = line_data.get('CounterID', local_line.counter_id)
-                            local_line.line_status = line_data.get('LineStatus', local_line.line_status)
-                            local_line.u_floor = line_data.get('U_Floor', local_line.u_floor)
-                            local_line.u_rack = line_data.get('U_Rack', local_line.u_rack)
-                            local_line.u_level = line_data.get('U_Level', local_line.u_level)
-                            # Update counted quantity and status
-                            #local_line.uom_counted_quantity = safe_float(line_data.get('UoMCountedQuantity'), 0)
-                            local_line.counted = line_data.get('Counted', 'tNO')
-                            # Calculate variance from quantities if not provided by SAP
-                            if line_data.get('Variance') is not None:
-                                local_line.variance = safe_float(line_data.get('Variance'), 0)
-                            else:
-                                local_line.variance = local_line.uom_counted_quantity - (local_line.in_warehouse_quantity or 0)
-                            local_line.updated_at = datetime.utcnow()
-                        else:
-                            # Create new line if it doesn't exist locally
-                            in_wh_qty = safe_float(line_data.get('InWarehouseQuantity'), 0)
-                            counted_qty = safe_float(line_data.get('UoMCountedQuantity'), 0)
-                            # Calculate variance if not provided
-                            variance_val = line_data.get('Variance')
-                            if variance_val is None:
-                                variance_val = counted_qty - in_wh_qty
-                            else:
-                                variance_val = safe_float(variance_val, 0)
-                            
-                            new_line = SAPInventoryCountLine(
-                                count_id=local_doc.id,
-                                line_number=line_number,
-                                item_code=line_data.get('ItemCode', ''),
-                                item_description=line_data.get('ItemDescription', ''),
-                                warehouse_code=line_data.get('WarehouseCode', ''),
-                                bin_entry=line_data.get('BinEntry'),
-                                in_warehouse_quantity=in_wh_qty,
-                                counted=line_data.get('Counted', 'tNO'),
-                                uom_code=line_data.get('UoMCode', ''),
-                                bar_code=line_data.get('BarCode', ''),
-                                #uom_counted_quantity=counted_qty,
-                                items_per_unit=safe_float(line_data.get('ItemsPerUnit'), 1),
-                                variance=variance_val,
-                                counter_type=line_data.get('CounterType', ''),
-                                counter_id=line_data.get('CounterID'),
-                                line_status=line_data.get('LineStatus', ''),
-                                u_floor=line_data.get('U_Floor', ''),
-                                u_rack=line_data.get('U_Rack', ''),
-                                u_level=line_data.get('U_Level', '')
-                            )
-                            db.session.add(new_line)
+                    # Update only the changed counting lines, in bulk
+                    apply_submitted_lines(local_doc.id, diff)
                     
                     db.session.commit()
                     logging.info(f"✅ Updated local counting document {doc_entry} after PATCH")
@@ -643,38 +555,7 @@ def update_inventory_counting():
                     db.session.flush()  # Get the ID for the document
                     
                     # Add all line items
-                    for line_data in lines:
-                        in_wh_qty = safe_float(line_data.get('InWarehouseQuantity'), 0)
-                        counted_qty = safe_float(line_data.get('UoMCountedQuantity'), 0)
-                        # Calculate variance if not provided
-                        variance_val = line_data.get('Variance')
-                        if variance_val is None:
-                            variance_val = counted_qty - in_wh_qty
-                        else:
-                            variance_val = safe_float(variance_val, 0)
-                        
-                        new_line = SAPInventoryCountLine(
-                            count_id=local_doc.id,
-                            line_number=line_data.get('LineNumber', 0),
-                            item_code=line_data.get('ItemCode', ''),
-                            item_description=line_data.get('ItemDescription', ''),
-                            warehouse_code=line_data.get('WarehouseCode', ''),
-                            bin_entry=line_data.get('BinEntry'),
-                            in_warehouse_quantity=in_wh_qty,
-                            counted=line_data.get('Counted', 'tNO'),
-                            uom_code=line_data.get('UoMCode', ''),
-                            bar_code=line_data.get('BarCode', ''),
-                            #uom_counted_quantity=counted_qty,
-                            items_per_unit=safe_float(line_data.get('ItemsPerUnit'), 1),
-                            variance=variance_val,
-                            counter_type=line_data.get('CounterType', ''),
-                            counter_id=line_data.get('CounterID'),
-                            line_status=line_data.get('LineStatus', ''),
-                            u_floor=line_data.get('U_Floor', ''),
-                            u_rack=line_data.get('U_Rack', ''),
-                            u_level=line_data.get('U_Level', '')
-                        )
-                        db.session.add(new_line)
+                    apply_submitted_lines(local_doc.id, diff)
                     
                     db.session.commit()
                     logging.info(f"✅ Created local counting document {doc_entry} with {len(lines)} lines after PATCH")
@@ -688,6 +569,7 @@ def update_inventory_counting():
                 'success': True,
                 'message': result.get('message'),
                 'doc_entry': doc_entry,
+                'lines_sent': result.get('lines_sent', len(diff['lines'])),
                 'sap_response': result.get('sap_response')
             })
         else:
@@ -1144,146 +1026,15 @@ def logout():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    from datetime import datetime
     try:
-        # Get dashboard statistics
-        grpo_count = GRPODocument.query.filter_by(user_id=current_user.id).count()
-        transfer_count = InventoryTransfer.query.filter_by(user_id=current_user.id).count()
-        pick_list_count = PickList.query.filter_by(user_id=current_user.id).count()
-        count_tasks = InventoryCount.query.filter_by(user_id=current_user.id).count()
-        multi_grn_count = MultiGRNBatch.query.filter_by(user_id=current_user.id).count()
-        direct_inventory_transfer_count = DirectInventoryTransfer.query.filter_by(user_id=current_user.id).count()
-        sap_inventory_count = SAPInventoryCount.query.filter_by(user_id=current_user.id).count()
-
-        stats = {
-            'grpo_count': grpo_count,
-            'transfer_count': transfer_count,
-            'pick_list_count': pick_list_count,
-            'count_tasks': count_tasks,
-            'multi_grn_count': multi_grn_count,
-            'direct_inventory_transfer_count': direct_inventory_transfer_count,
-            'sap_inventory_count': sap_inventory_count
-        }
-
-        from datetime import datetime
-
-        def normalize_datetime(value):
-            """Convert created_at to datetime object safely."""
-            if isinstance(value, datetime):
-                return value
-            if not value:
-                return datetime.min
-            try:
-                # Example input: "Mon, 08 Dec 2025 01:27:26 GMT"
-                return datetime.strptime(value.replace(" GMT", ""), "%a, %d %b %Y %H:%M:%S")
-            except:
-                try:
-                    # ISO format fallback
-                    return datetime.fromisoformat(value.replace("Z", ""))
-                except:
-                    return datetime.min
-
-        # ==========================
-        #   RECENT ACTIVITIES
-        # ==========================
-        recent_activities = []
-
-        # GRPO
-        recent_grpos = GRPODocument.query.filter_by(user_id=current_user.id).order_by(
-            GRPODocument.created_at.desc()).limit(5).all()
-
-        for grpo in recent_grpos:
-            recent_activities.append({
-                'type': 'GRPO Created',
-                'description': f"PO: {grpo.po_number}",
-                'created_at': normalize_datetime(grpo.created_at),
-                'status': grpo.status
-            })
-
-        # Inventory Transfers
-        recent_transfers = InventoryTransfer.query.filter_by(user_id=current_user.id).order_by(
-            InventoryTransfer.created_at.desc()).limit(5).all()
-
-        for transfer in recent_transfers:
-            recent_activities.append({
-                'type': 'Inventory Transfer',
-                'description': f"Request: {transfer.transfer_request_number}",
-                'created_at': normalize_datetime(transfer.created_at),
-                'status': transfer.status
-            })
-
-        # Pick List
-        recent_picklists = PickList.query.filter_by(user_id=current_user.id).order_by(
-            PickList.created_at.desc()).limit(5).all()
-
-        for picklist in recent_picklists:
-            recent_activities.append({
-                'type': 'Pick List',
-                'description': f"List: {picklist.pick_list_number}",
-                'created_at': normalize_datetime(picklist.created_at),
-                'status': picklist.status
-            })
-
-        # Inventory Count
-        recent_counts = InventoryCount.query.filter_by(user_id=current_user.id).order_by(
-            InventoryCount.created_at.desc()).limit(5).all()
-
-        for count in recent_counts:
-            recent_activities.append({
-                'type': 'Inventory Count',
-                'description': f"Count: {count.count_number}",
-                'created_at': normalize_datetime(count.created_at),
-                'status': getattr(count, 'status', 'active')
-            })
-
-        # SAP Inventory Count
-        recent_sap_counts = SAPInventoryCount.query.filter_by(user_id=current_user.id).order_by(
-            SAPInventoryCount.loaded_at.desc()).limit(5).all()
-
-        for sap_count in recent_sap_counts:
-            recent_activities.append({
-                'type': 'SAP Inventory Count',
-                'description': f"Doc: {sap_count.doc_number} (DocEntry: {sap_count.doc_entry})",
-                'created_at': normalize_datetime(sap_count.loaded_at),
-                'status': sap_count.document_status or 'Open'
-            })
-
-        # Multi GRN
-        recent_multi_grns = MultiGRNBatch.query.filter_by(user_id=current_user.id).order_by(
-            MultiGRNBatch.created_at.desc()).limit(5).all()
-
-        for batch in recent_multi_grns:
-            recent_activities.append({
-                'type': 'Multi GRN Batch',
-                'description': f"Batch #{batch.id} - {batch.customer_name}",
-                'created_at': normalize_datetime(batch.created_at),
-                'status': batch.status
-            })
-
-        # Direct Inventory Transfer
-        recent_direct_transfers = DirectInventoryTransfer.query.filter_by(user_id=current_user.id).order_by(
-            DirectInventoryTransfer.created_at.desc()).limit(5).all()
-
-        for transfer in recent_direct_transfers:
-            recent_activities.append({
-                'type': 'Direct Inventory Transfer',
-                'description': f"Transfer: {transfer.transfer_number}",
-                'created_at': normalize_datetime(transfer.created_at),
-                'status': transfer.status
-            })
-
-        # Sort top 10 - all created_at values are now datetime objects
-        recent_activities = sorted(
-            recent_activities, key=lambda x: x['created_at'] if isinstance(x['created_at'], datetime) else datetime.min, reverse=True
-        )[:10]
+        # Counts and recent activity come from two aggregate queries, cached per user
+        dashboard_data = get_dashboard_data(current_user.id)
+        stats = dashboard_data['stats']
+        recent_activities = dashboard_data['recent_activities']
 
     except Exception as e:
         logging.error(f"Database error in dashboard: {e}")
-        stats = {key: 0 for key in [
-            'grpo_count', 'transfer_count', 'pick_list_count',
-            'count_tasks', 'multi_grn_count',
-            'direct_inventory_transfer_count', 'sap_inventory_count'
-        ]}
+        stats = {key: 0 for key in DASHBOARD_STAT_KEYS}
         recent_activities = []
 
     # ============================================================
@@ -1801,55 +1552,16 @@ def approve_grpo(grpo_id):
         for item in grpo_doc.items:
             item.qc_status = 'approved'
         
-        # Always post to SAP B1 when using approve button
-        logging.info("=" * 100)
-        logging.info("🚀 POSTING GRPO TO SAP B1 - PURCHASE DELIVERY NOTE CREATION")
-        logging.info("=" * 100)
-        logging.info(f"📋 GRPO ID: {grpo_doc.id}")
-        logging.info(f"📄 PO Number: {grpo_doc.po_number}")
-        logging.info(f"👤 User: {current_user.username}")
-        logging.info(f"🏢 Branch: {current_user.branch_id}")
+        # GRPO counts as approved while it waits for the posting worker
+        grpo_doc.status = 'approved'
+        job = enqueue_posting_job('grpo', grpo_doc.id, created_by=current_user.id)
         
-        sap = SAPIntegration()
-        result = sap.post_grpo_to_sap(grpo_doc)
+        logging.info(f"📥 GRPO {grpo_doc.id} (PO {grpo_doc.po_number}) approved by {current_user.username}, SAP posting job {job.id} queued")
         
-        if result.get('success'):
-            grpo_doc.status = 'posted'
-            grpo_doc.sap_document_number = result.get('sap_document_number')
-            db.session.commit()
-            
-            logging.info("=" * 100)
-            logging.info("✅ SUCCESS: GRPO POSTED TO SAP B1")
-            logging.info(f"📄 SAP Document Number: {result.get('sap_document_number')}")
-            logging.info("=" * 100)
-            
-            success_message = f'GRPO approved and posted to SAP B1 successfully! SAP Document Number: {result.get("sap_document_number")}'
-            
-            if request.headers.get('Content-Type') == 'application/json' or request.is_json:
-                return jsonify({
-                    'success': True, 
-                    'message': success_message,
-                    'sap_document_number': result.get('sap_document_number')
-                })
-            flash(success_message, 'success')
-        else:
-            grpo_doc.status = 'approved'  # Keep as approved even if SAP posting fails
-            db.session.commit()
-            
-            logging.error("=" * 100)
-            logging.error("❌ FAILED: GRPO POSTING TO SAP B1 FAILED")
-            logging.error(f"🚫 Error: {result.get('error')}")
-            logging.error("=" * 100)
-            
-            error_message = f'GRPO approved but failed to post to SAP B1: {result.get("error")}'
-            
-            if request.headers.get('Content-Type') == 'application/json' or request.is_json:
-                return jsonify({
-                    'success': False,
-                    'error': error_message,
-                    'grpo_approved': True
-                })
-            flash(error_message, 'warning')
+        queued_message = 'GRPO approved. Posting to SAP B1 has been queued.'
+        if request.headers.get('Content-Type') == 'application/json' or request.is_json:
+            return jsonify(job_response(job, queued_message)), 202
+        flash(queued_message, 'success')
     
     except Exception as e:
         logging.error(f"Error approving GRPO: {str(e)}")
@@ -2960,7 +2672,7 @@ def submit_transfer(transfer_id):
 @app.route('/inventory_transfer/<int:transfer_id>/qc_approve', methods=['POST'])
 @login_required
 def qc_approve_transfer(transfer_id):
-    """QC approve inventory transfer and post to SAP B1"""
+    """QC approve inventory transfer and queue it for posting to SAP B1"""
     try:
         transfer = InventoryTransfer.query.get_or_404(transfer_id)
         transfers = InventoryTransferItem.query.get_or_404(transfer_id)
@@ -2978,29 +2690,17 @@ def qc_approve_transfer(transfer_id):
         # Mark individual items as approved
         for item in transfer.items:
             item.qc_status = 'approved'
-            
-        # Submit to SAP B1 using the correct method
-        sap = SAPIntegration()
-        result = sap.post_inventory_transfer_to_sap(transfer)
         
-        if result.get('success'):
-            # Update transfer status and SAP document number
-            transfer.status = 'qc_approved'
-            transfer.qc_approver_id = current_user.id
-            transfer.qc_approved_at = datetime.utcnow()
-            transfer.qc_notes = qc_notes
-            transfer.sap_document_number = result.get('document_number')
-            db.session.commit()
-            
-            logging.info(f"✅ Inventory Transfer {transfer_id} QC approved and posted to SAP B1 as document {result.get('document_number')}")
-            return jsonify({
-                'success': True, 
-                'message': f'Transfer QC approved and posted to SAP B1 as document {result.get("document_number")}',
-                'sap_document_number': result.get('document_number')
-            })
-        else:
-            logging.error(f"❌ Failed to post transfer {transfer_id} to SAP B1: {result.get('error')}")
-            return jsonify({'success': False, 'error': result.get('error')}), 500
+        transfer.status = 'qc_approved'
+        transfer.qc_approver_id = current_user.id
+        transfer.qc_approved_at = datetime.utcnow()
+        transfer.qc_notes = qc_notes
+        
+        # Submit to SAP B1 through the posting queue
+        job = enqueue_posting_job('inventory_transfer', transfer.id, created_by=current_user.id)
+        
+        logging.info(f"✅ Inventory Transfer {transfer_id} QC approved, SAP posting job {job.id} queued")
+        return jsonify(job_response(job, 'Transfer QC approved. Posting to SAP B1 has been queued.')), 202
         
     except Exception as e:
         logging.error(f"Error QC approving transfer: {str(e)}")
@@ -3136,122 +2836,20 @@ def qc_dashboard():
         flash('Access denied - QC permissions required', 'error')
         return redirect(url_for('dashboard'))
     
-    # Get pending transfers for QC approval
-    pending_transfers = InventoryTransfer.query.filter_by(status='submitted').order_by(InventoryTransfer.created_at.desc()).all()
-    
-    # Get pending GRPOs for QC approval
-    pending_grpos = GRPODocument.query.filter_by(status='submitted').order_by(GRPODocument.created_at.desc()).all()
-    
-    # Get pending Serial Number Transfers for QC approval
-    from models import SerialNumberTransfer, SerialItemTransfer
-    pending_serial_transfers = SerialNumberTransfer.query.filter_by(status='submitted').order_by(SerialNumberTransfer.created_at.desc()).all()
-    
-    # Get pending Serial Item Transfers for QC approval
-    pending_serial_item_transfers = SerialItemTransfer.query.filter_by(status='submitted').order_by(SerialItemTransfer.created_at.desc()).all()
-    
-    # Get QC approved Serial Item Transfers ready for SAP posting
-    qc_approved_serial_item_transfers = SerialItemTransfer.query.filter_by(status='qc_approved').order_by(SerialItemTransfer.qc_approved_at.desc()).all()
-    
-    # Get pending Direct Inventory Transfers for QC approval
-    from models import DirectInventoryTransfer
-    pending_direct_transfers = DirectInventoryTransfer.query.filter_by(status='submitted').order_by(DirectInventoryTransfer.created_at.desc()).all()
-    
-    # Get pending Sales Deliveries for QC approval
-    from modules.sales_delivery.models import DeliveryDocument
-    pending_deliveries = DeliveryDocument.query.filter_by(status='submitted').order_by(DeliveryDocument.created_at.desc()).all()
-    
-    # Get pending Multi GRN batches for QC approval
-    pending_multi_grn_batches = MultiGRNBatch.query.filter_by(status='submitted').order_by(MultiGRNBatch.created_at.desc()).all()
-    
-    # Calculate metrics for today
-    from datetime import datetime, date
-    today = date.today()
-    
-    # Count approved today (both GRPO and transfers)
-    approved_grpos_today = GRPODocument.query.filter(
-        GRPODocument.status.in_(['qc_approved', 'posted']),
-        db.func.date(GRPODocument.qc_approved_at) == today
-    ).count()
-    
-    approved_transfers_today = InventoryTransfer.query.filter(
-        InventoryTransfer.status == 'qc_approved',
-        db.func.date(InventoryTransfer.qc_approved_at) == today
-    ).count()
-    
-    # Count approved serial number transfers today
-    approved_serial_transfers_today = SerialNumberTransfer.query.filter(
-        SerialNumberTransfer.status.in_(['qc_approved', 'posted']),
-        db.func.date(SerialNumberTransfer.qc_approved_at) == today
-    ).count()
-    
-    # Count approved serial item transfers today
-    approved_serial_item_transfers_today = SerialItemTransfer.query.filter(
-        SerialItemTransfer.status.in_(['qc_approved', 'posted']),
-        db.func.date(SerialItemTransfer.qc_approved_at) == today
-    ).count()
-    
-    # Count approved direct inventory transfers today
-    approved_direct_transfers_today = DirectInventoryTransfer.query.filter(
-        DirectInventoryTransfer.status.in_(['qc_approved', 'posted']),
-        db.func.date(DirectInventoryTransfer.qc_approved_at) == today
-    ).count()
-    
-    # Count approved sales deliveries today
-    approved_deliveries_today = DeliveryDocument.query.filter(
-        DeliveryDocument.status.in_(['qc_approved', 'posted']),
-        db.func.date(DeliveryDocument.qc_approved_at) == today
-    ).count()
-    
-    # Count approved Multi GRN batches today
-    approved_multi_grn_today = MultiGRNBatch.query.filter(
-        MultiGRNBatch.status.in_(['qc_approved', 'posted']),
-        db.func.date(MultiGRNBatch.qc_approved_at) == today
-    ).count()
-    
-    approved_today = approved_grpos_today + approved_transfers_today + approved_serial_transfers_today + approved_serial_item_transfers_today + approved_direct_transfers_today + approved_deliveries_today + approved_multi_grn_today
-    
-    # Count rejected today
-    rejected_grpos_today = GRPODocument.query.filter(
-        GRPODocument.status == 'rejected',
-        db.func.date(GRPODocument.qc_approved_at) == today
-    ).count()
-    
-    rejected_transfers_today = InventoryTransfer.query.filter(
-        InventoryTransfer.status == 'rejected',
-        db.func.date(InventoryTransfer.qc_approved_at) == today
-    ).count()
-    
-    # Count rejected serial number transfers today  
-    rejected_serial_transfers_today = SerialNumberTransfer.query.filter(
-        SerialNumberTransfer.status == 'rejected',
-        db.func.date(SerialNumberTransfer.qc_approved_at) == today
-    ).count()
-    
-    # Count rejected serial item transfers today
-    rejected_serial_item_transfers_today = SerialItemTransfer.query.filter(
-        SerialItemTransfer.status == 'rejected',
-        db.func.date(SerialItemTransfer.qc_approved_at) == today
-    ).count()
-    
-    # Count rejected direct inventory transfers today
-    rejected_direct_transfers_today = DirectInventoryTransfer.query.filter(
-        DirectInventoryTransfer.status == 'rejected',
-        db.func.date(DirectInventoryTransfer.qc_approved_at) == today
-    ).count()
-    
-    # Count rejected sales deliveries today
-    rejected_deliveries_today = DeliveryDocument.query.filter(
-        DeliveryDocument.status == 'rejected',
-        db.func.date(DeliveryDocument.qc_approved_at) == today
-    ).count()
-    
-    # Count rejected Multi GRN batches today
-    rejected_multi_grn_today = MultiGRNBatch.query.filter(
-        MultiGRNBatch.status == 'rejected',
-        db.func.date(MultiGRNBatch.qc_approved_at) == today
-    ).count()
-    
-    rejected_today = rejected_grpos_today + rejected_transfers_today + rejected_serial_transfers_today + rejected_serial_item_transfers_today + rejected_direct_transfers_today + rejected_deliveries_today + rejected_multi_grn_today
+    # Counts for every queue and one eager-loaded page per document type
+    per_page = page_size(request.args.get('per_page'))
+    pages = {}
+    for spec in queue_specs():
+        pages[spec.key] = request.args.get(f'{spec.key}_page', 1, type=int)
+    sections = None
+    if request.args.get('sections') is not None:
+        sections = [key for key in request.args.get('sections').split(',') if key]
+    specs, counts, queues = load_qc_work_queue(pages=pages, per_page=per_page, sections=sections)
+
+    pending_count = sum(total for key, total in counts['totals'].items()
+                        if key != 'approved_serial_item_transfers')
+    approved_today = counts['approved_today']
+    rejected_today = counts['rejected_today']
     
     # Calculate average processing time
     from sqlalchemy import text
@@ -3347,19 +2945,41 @@ def qc_dashboard():
     else:
         avg_processing_time = "N/A"
     
-    return render_template('qc_dashboard.html', 
-                         pending_transfers=pending_transfers,
-                         pending_grpos=pending_grpos,
-                         pending_serial_transfers=pending_serial_transfers,
-                         pending_serial_item_transfers=pending_serial_item_transfers,
-                         pending_direct_transfers=pending_direct_transfers,
-                         pending_deliveries=pending_deliveries,
-                         pending_multi_grn_batches=pending_multi_grn_batches,
-                         qc_approved_serial_item_transfers=qc_approved_serial_item_transfers,
-                         pending_count=len(pending_transfers) + len(pending_grpos) + len(pending_serial_transfers) + len(pending_serial_item_transfers) + len(pending_direct_transfers) + len(pending_deliveries) + len(pending_multi_grn_batches),
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'success': True,
+            'pending_count': pending_count,
+            'approved_today': approved_today,
+            'rejected_today': rejected_today,
+            'avg_processing_time': avg_processing_time,
+            'totals': counts['totals'],
+            'queues': {
+                spec.key: {
+                    **{key: value for key, value in queues[spec.key].items() if key != 'items'},
+                    'items': [serialize_queue_item(spec, document) for document in queues[spec.key]['items']],
+                }
+                for spec in specs if spec.key in queues
+            },
+        })
+
+    # Page links keep the other queues on their current page
+    for key, queue in queues.items():
+        args = request.args.to_dict()
+        args.pop('format', None)
+        args[f'{key}_page'] = queue['page'] - 1
+        queue['prev_url'] = url_for('qc_dashboard', **args) if queue['has_prev'] else None
+        args[f'{key}_page'] = queue['page'] + 1
+        queue['next_url'] = url_for('qc_dashboard', **args) if queue['has_next'] else None
+
+    return render_template('qc_dashboard.html',
+                         qc_queues=queues,
+                         queue_state={key: [document.id for document in queue['items']]
+                                      for key, queue in queues.items()},
+                         pending_count=pending_count,
                          approved_today=approved_today,
                          rejected_today=rejected_today,
-                         avg_processing_time=avg_processing_time)
+                         avg_processing_time=avg_processing_time,
+                         **{spec.template_var: queues.get(spec.key, {}).get('items', []) for spec in specs})
 
 @app.route('/serial_item_transfer/<int:transfer_id>/qc_approve', methods=['POST'])
 @login_required
@@ -3855,7 +3475,7 @@ def reject_multi_grn_qc(batch_id):
 @app.route('/serial_item_transfer/<int:transfer_id>/post_to_sap', methods=['POST'])
 @login_required
 def post_serial_item_transfer_to_sap(transfer_id):
-    """Post Serial Item Transfer to SAP B1 from QC Dashboard"""
+    """Queue Serial Item Transfer for posting to SAP B1 from QC Dashboard"""
     try:
         from models import SerialItemTransfer
         transfer = SerialItemTransfer.query.get_or_404(transfer_id)
@@ -3867,51 +3487,13 @@ def post_serial_item_transfer_to_sap(transfer_id):
         if transfer.status != 'qc_approved':
             return jsonify({'success': False, 'error': 'Only QC approved transfers can be posted'}), 400
         
-        # Initialize SAP integration
-        sap = SAPIntegration()
+        # Post to SAP B1 through the posting queue; the document stays QC approved until it succeeds
+        job = enqueue_posting_job('serial_item_transfer', transfer.id, created_by=current_user.id)
         
-        # Ensure SAP connection
-        if not sap.ensure_logged_in():
-            return jsonify({
-                'success': False,
-                'error': 'SAP B1 connection failed. Please try again.'
-            }), 500
-        
-        # Post to SAP B1
-        try:
-            sap_result = sap.create_serial_item_stock_transfer(transfer)
-        except Exception as api_error:
-            logging.error(f"SAP B1 API error for transfer {transfer_id}: {str(api_error)}")
-            return jsonify({
-                'success': False,
-                'error': f'SAP B1 connection error: {str(api_error)}'
-            }), 500
-        
-        if sap_result.get('success'):
-            # Update transfer status and SAP document info
-            transfer.status = 'posted'
-            transfer.sap_document_number = sap_result.get('document_number')
-            transfer.updated_at = datetime.utcnow()
-            
-            db.session.commit()
-            
-            logging.info(f"📤 Serial Item Transfer {transfer_id} posted to SAP B1: {sap_result.get('document_number')}")
-            return jsonify({
-                'success': True,
-                'message': f'Transfer posted to SAP B1 successfully. Document Number: {sap_result.get("document_number")}',
-                'sap_document_number': sap_result.get('document_number'),
-                'doc_entry': sap_result.get('doc_entry'),
-                'status': 'posted'
-            })
-        else:
-            # Keep document in QC approved status for retry
-            logging.error(f"SAP B1 posting failed for transfer {transfer_id}: {sap_result.get('error')}")
-            return jsonify({
-                'success': False,
-                'error': f'SAP B1 posting failed: {sap_result.get("error", "Unknown error")}',
-                'retry_available': True,
-                'status': transfer.status  # Keep current status
-            }), 500
+        logging.info(f"📥 Serial Item Transfer {transfer_id} SAP posting job {job.id} queued")
+        response = job_response(job, 'Posting to SAP B1 has been queued.')
+        response['status'] = transfer.status
+        return jsonify(response), 202
         
     except Exception as e:
         logging.error(f"Error posting serial item transfer to SAP: {str(e)}")
@@ -4157,69 +3739,29 @@ def sync_sap_pick_lists():
         sap = SAPIntegration()
         
         # Get pick lists from SAP B1
-        sap_result = sap.get_pick_lists(limit=100)
+        sap_result = sap.get_pick_lists(limit=request.args.get('limit', 500, type=int))
         if not sap_result.get('success'):
             return jsonify({
                 'success': False, 
                 'error': sap_result.get('error', 'Failed to fetch from SAP B1')
             })
         
-        sap_pick_lists = sap_result.get('pick_lists', [])
-        synced_count = 0
-        updated_count = 0
-        
-        for sap_pick_list in sap_pick_lists:
-            absolute_entry = sap_pick_list.get('Absoluteentry')
-            if not absolute_entry:
-                continue
-            
-            # Check if pick list exists locally
-            existing_pick_list = PickList.query.filter_by(absolute_entry=absolute_entry).first()
-            
-            if existing_pick_list:
-                # Update existing record
-                existing_pick_list.status = sap_pick_list.get('Status', existing_pick_list.status)
-                existing_pick_list.remarks = sap_pick_list.get('Remarks', existing_pick_list.remarks)
-                if sap_pick_list.get('PickDate'):
-                    try:
-                        existing_pick_list.pick_date = datetime.strptime(
-                            sap_pick_list['PickDate'][:19], '%Y-%m-%dT%H:%M:%S'
-                        )
-                    except:
-                        pass
-                updated_count += 1
-            else:
-                # Create new record
-                pick_list = PickList(
-                    absolute_entry=absolute_entry,
-                    name=sap_pick_list.get('Name', f'SAP-{absolute_entry}'),
-                    owner_code=sap_pick_list.get('OwnerCode'),
-                    owner_name=sap_pick_list.get('OwnerName'),
-                    remarks=sap_pick_list.get('Remarks'),
-                    status=sap_pick_list.get('Status', 'ps_Open'),
-                    object_type=sap_pick_list.get('ObjectType', '156'),
-                    use_base_units=sap_pick_list.get('UseBaseUnits', 'tNO'),
-                    user_id=current_user.id
-                )
-                
-                if sap_pick_list.get('PickDate'):
-                    try:
-                        pick_list.pick_date = datetime.strptime(
-                            sap_pick_list['PickDate'][:19], '%Y-%m-%dT%H:%M:%S'
-                        )
-                    except:
-                        pass
-                
-                db.session.add(pick_list)
-                synced_count += 1
-        
-        db.session.commit()
+        # One IN query for the local pick lists, one $batch for missing Sales Orders,
+        # bulk writes for headers, lines and bin allocations
+        from pick_list_sync import sync_pick_lists
+        result = sync_pick_lists(sap, sap_result.get('pick_lists', []), user_id=current_user.id)
+        if not result.get('success'):
+            return jsonify({'success': False, 'error': result.get('error')}), 500
+
+        synced_count = result['created']
+        updated_count = result['updated']
         
         return jsonify({
             'success': True,
             'message': f'Synced {synced_count} new pick lists, updated {updated_count} existing ones',
             'synced_count': synced_count,
-            'updated_count': updated_count
+            'updated_count': updated_count,
+            'lines_synced': result['lines']
         })
         
     except Exception as e:
@@ -4235,7 +3777,7 @@ def import_sap_pick_list(absolute_entry):
     
     try:
         from sap_integration import SAPIntegration
-        from models import PickListLine, PickListBinAllocation
+        from pick_list_sync import parse_pick_date, replace_pick_list_lines
         
         sap = SAPIntegration()
         
@@ -4256,11 +3798,6 @@ def import_sap_pick_list(absolute_entry):
         
         if existing_pick_list:
             pick_list = existing_pick_list
-            # Clear existing lines and allocations
-            PickListBinAllocation.query.join(PickListLine).filter(
-                PickListLine.pick_list_id == pick_list.id
-            ).delete()
-            PickListLine.query.filter_by(pick_list_id=pick_list.id).delete()
         else:
             # Extract sales order info from first line if available
             first_line = sap_pick_list.get('PickListsLines', [{}])[0] if sap_pick_list.get('PickListsLines') else {}
@@ -4281,13 +3818,7 @@ def import_sap_pick_list(absolute_entry):
                 user_id=current_user.id
             )
             
-            if sap_pick_list.get('PickDate'):
-                try:
-                    pick_list.pick_date = datetime.strptime(
-                        sap_pick_list['PickDate'][:19], '%Y-%m-%dT%H:%M:%S'
-                    )
-                except:
-                    pass
+            pick_list.pick_date = parse_pick_date(sap_pick_list.get('PickDate'))
             
             db.session.add(pick_list)
         
@@ -4297,46 +3828,12 @@ def import_sap_pick_list(absolute_entry):
         
         db.session.flush()  # Get the pick_list.id
         
-        # Import pick list lines
-        lines_imported = 0
-        allocations_imported = 0
+        # Sales Order item data for every line: one $batch for missing orders, one query for their lines
+        sap_pick_list['PickListsLines'] = sap.enhance_picklist_with_sales_order_data(
+            sap_pick_list.get('PickListsLines', []))
         
-        for sap_line in sap_pick_list.get('PickListsLines', []):
-            pick_list_line = PickListLine(
-                pick_list_id=pick_list.id,
-                absolute_entry=sap_line.get('AbsoluteEntry'),
-                line_number=sap_line.get('LineNumber'),
-                order_entry=sap_line.get('OrderEntry'),
-                order_row_id=sap_line.get('OrderRowID', 0),
-                picked_quantity=sap_line.get('PickedQuantity', 0.0),
-                pick_status=sap_line.get('PickStatus', 'ps_Open'),
-                released_quantity=sap_line.get('ReleasedQuantity', 0.0),
-                previously_released_quantity=sap_line.get('PreviouslyReleasedQuantity', 0.0),
-                base_object_type=sap_line.get('BaseObjectType')
-            )
-            
-            db.session.add(pick_list_line)
-            db.session.flush()  # Get the line id
-            lines_imported += 1
-            
-            # Import bin allocations for this line
-            for sap_allocation in sap_line.get('DocumentLinesBinAllocations', []):
-                bin_allocation = PickListBinAllocation(
-                    pick_list_line_id=pick_list_line.id,
-                    bin_abs_entry=sap_allocation.get('BinAbsEntry'),
-                    quantity=sap_allocation.get('Quantity', 0.0),
-                    allow_negative_quantity=sap_allocation.get('AllowNegativeQuantity', 'tNO'),
-                    serial_and_batch_numbers_base_line=sap_allocation.get('SerialAndBatchNumbersBaseLine', 0),
-                    base_line_number=sap_allocation.get('BaseLineNumber')
-                )
-                
-                db.session.add(bin_allocation)
-                allocations_imported += 1
-        
-        # Update pick list totals
-        pick_list.total_items = lines_imported
-        pick_list.picked_items = len([line for line in sap_pick_list.get('PickListsLines', []) 
-                                    if line.get('PickStatus') == 'ps_Closed'])
+        # Replace lines and bin allocations (closed lines included) with bulk statements
+        lines_imported, allocations_imported = replace_pick_list_lines([(pick_list, sap_pick_list)], skip_closed=False)
         
         db.session.commit()
         
@@ -4704,6 +4201,30 @@ def generate_qr_code():
         logging.error(f"Error generating QR code: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/generate-qr/bulk', methods=['POST'])
+@login_required
+def generate_qr_codes_bulk():
+    """Generate QR codes for a list of payloads (e.g. every pack label of a pallet)"""
+    try:
+        data = request.get_json() or {}
+        payloads = data.get('payloads')
+
+        if not isinstance(payloads, list) or not payloads:
+            return jsonify({'success': False, 'error': 'payloads must be a non-empty list'}), 400
+        if len(payloads) > MAX_BATCH_SIZE:
+            return jsonify({'success': False, 'error': f'At most {MAX_BATCH_SIZE} payloads per request'}), 400
+
+        # Objects are encoded the way pack labels store them
+        payloads = [json.dumps(payload) if isinstance(payload, (dict, list)) else payload for payload in payloads]
+
+        generator = BarcodeGenerator()
+        result = generator.generate_qr_codes(payloads, size=data.get('size', 300), margin=data.get('margin'))
+        return jsonify(result)
+
+    except Exception as e:
+        logging.error(f"Error generating QR codes in bulk: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/parse-qr', methods=['POST'])
 @login_required
 def parse_qr_code():
@@ -6017,7 +5538,8 @@ def sync_sap_data():
     
     from sap_integration import SAPIntegration
     sap_integration = SAPIntegration()
-    results = sap_integration.sync_all_master_data()
+    full = request.form.get('full', 'false').lower() in ('1', 'true', 'yes')
+    results = sap_integration.sync_all_master_data(full=full)
     
     success_count = sum(1 for result in results.values() if result)
     total_count = len(results)
@@ -6031,6 +5553,57 @@ def sync_sap_data():
     
     return redirect(url_for('dashboard'))
 
+@app.route('/api/admin/master-data-cache', methods=['GET', 'DELETE'])
+@login_required
+def master_data_cache_admin():
+    """Show hit/miss statistics of the SAP master data cache, or invalidate it (DELETE)"""
+    if current_user.role not in ['admin', 'manager']:
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+    
+    if request.method == 'DELETE':
+        namespace = request.args.get('namespace') or None
+        removed = master_data_cache.invalidate(namespace)
+        return jsonify({'success': True, 'namespace': namespace or 'all', 'removed': removed})
+    
+    return jsonify({'success': True, 'cache': master_data_cache.get_stats()})
+
+@app.route('/api/admin/master-data-sync', methods=['GET'])
+@login_required
+def master_data_sync_status():
+    """High-water mark, mode, row count and duration of the last master data sync per entity"""
+    if current_user.role not in ['admin', 'manager']:
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+    
+    from master_data_sync import sync_states
+    return jsonify({'success': True, 'entities': sync_states()})
+
+@app.route('/api/sap-posting-jobs/<int:job_id>', methods=['GET'])
+@login_required
+def sap_posting_job_status(job_id):
+    """Status of a queued SAP posting - polled by the UI after an approval"""
+    job = SAPPostingJob.query.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Posting job not found'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/api/sap-posting-jobs', methods=['GET'])
+@login_required
+def sap_posting_jobs_for_document():
+    """Latest SAP posting jobs, optionally for one document (?job_type=&document_id=)"""
+    query = SAPPostingJob.query
+    job_type = request.args.get('job_type')
+    document_id = request.args.get('document_id', type=int)
+    status = request.args.get('status')
+    if job_type:
+        query = query.filter(SAPPostingJob.job_type == job_type)
+    if document_id is not None:
+        query = query.filter(SAPPostingJob.document_id == document_id)
+    if status:
+        query = query.filter(SAPPostingJob.status == status)
+    limit = min(request.args.get('limit', 50, type=int), 200)
+    jobs = query.order_by(SAPPostingJob.id.desc()).limit(limit).all()
+    return jsonify({'success': True, 'jobs': [job.to_dict() for job in jobs]})
+
 # Duplicate route removed - using the one defined earlier
 
 # Default admin user is created in app.py during initialization
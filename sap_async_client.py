@@ -0,0 +1,223 @@
+"""
+Asyncio client for SAP B1 Service Layer reads
+Lets a Flask view start many independent SAP lookups at once (PO lines of
+several POs, batch details or warehouses of many items) and wait for all of
+them together, so the view waits about as long as the slowest call instead of
+the sum of all calls.
+
+Calls go through the process-wide SAP session pool (sap_session_pool). They
+share its authenticated sessions and keep-alive connections, and they are
+still recorded (sap_recorder) and counted in /metrics. Each blocking pool call
+runs on a shared worker thread. A process-wide semaphore per SAP host caps the
+number of calls in flight across all requests and clients
+(SAP_ASYNC_HOST_CONCURRENCY, default: the session pool size).
+Every call has a total deadline (SAP_ASYNC_TIMEOUT seconds, default 30).
+
+    from sap_async_client import fan_out, run_sync
+    purchase_orders = fan_out('get_purchase_order_by_doc_entry', doc_entries)   # {doc_entry: PO or None}
+
+    items, bins = run_sync(lambda client: client.gather(
+        client.get_item_master(item_code), client.get_warehouse_bins(warehouse_code)))
+"""
+
+import asyncio
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from sap_session_pool import get_sap_session_pool
+
+logger = logging.getLogger(__name__)
+
+SAP_ASYNC_TIMEOUT = float(os.environ.get('SAP_ASYNC_TIMEOUT', '30'))
+SAP_ASYNC_HOST_CONCURRENCY = int(os.environ.get('SAP_ASYNC_HOST_CONCURRENCY', '0'))
+SAP_ASYNC_MAX_WORKERS = int(os.environ.get('SAP_ASYNC_MAX_WORKERS', '16'))
+
+# SQL queries returning the warehouses of an item, by item type (see SAPIntegration.get_*_item_warehouses)
+ITEM_WAREHOUSE_QUERIES = {
+    'serial': 'GetSerialManagedItemWH',
+    'batch': 'GetBatchManagedItemWH',
+    'non_managed': 'GetNonSerialNonBatchManagedItemWH',
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Per-host limits are threading semaphores taken on the worker thread: every
+# run_sync call has its own event loop, and asyncio semaphores cannot be shared
+# between loops
+_host_limits = {}
+_host_limits_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=SAP_ASYNC_MAX_WORKERS, thread_name_prefix='sap-async')
+        return _executor
+
+
+def _host_limit(host, size):
+    with _host_limits_lock:
+        limit = _host_limits.get(host)
+        if limit is None:
+            limit = _host_limits[host] = threading.BoundedSemaphore(size)
+        return limit
+
+
+class AsyncSAPClient:
+    """Async mirror of the common SAPIntegration / SAPMultiGRNService read methods.
+
+    Read methods return the same values as their blocking counterparts, including
+    None / [] / {'success': False} when SAP is unavailable. A client belongs to
+    the event loop it is first used in; run_sync creates one per call.
+    """
+
+    def __init__(self, timeout=SAP_ASYNC_TIMEOUT):
+        self.base_url = os.environ.get('SAP_B1_SERVER', '').rstrip('/')
+        self.company_db = os.environ.get('SAP_B1_COMPANY_DB', '')
+        self.session_pool = get_sap_session_pool(self.base_url, os.environ.get('SAP_B1_USERNAME', ''),
+                                                 os.environ.get('SAP_B1_PASSWORD', ''), self.company_db)
+        self.timeout = timeout
+        self.session_id = None
+        self._login_lock = asyncio.Lock()
+
+    def _limited_request(self, method, url, **kwargs):
+        """Blocking pool request on a worker thread, once a slot of the host's process-wide limit is free"""
+        limit = _host_limit(urlsplit(url).netloc, SAP_ASYNC_HOST_CONCURRENCY or self.session_pool.size)
+        if not limit.acquire(timeout=self.timeout):
+            raise asyncio.TimeoutError(f'No SAP connection slot free for {url} within {self.timeout}s')
+        try:
+            return self.session_pool.request(method, url, **kwargs)
+        finally:
+            limit.release()
+
+    async def _to_thread(self, func, *args, **kwargs):
+        """Run a blocking call on the shared worker threads, keeping the caller's request metrics context"""
+        call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), call)
+
+    async def ensure_logged_in(self):
+        async with self._login_lock:
+            if not self.session_id:
+                self.session_id = await self._to_thread(self.session_pool.ensure_logged_in)
+        return bool(self.session_id)
+
+    async def request(self, method, path, **kwargs):
+        """Send one Service Layer request (path relative to /b1s/v1/ or an absolute URL).
+
+        Raises asyncio.TimeoutError when SAP does not answer within the client timeout.
+        """
+        url = path if path.startswith('http') else f"{self.base_url}/b1s/v1/{path}"
+        kwargs.setdefault('timeout', self.timeout)
+        return await asyncio.wait_for(self._to_thread(self._limited_request, method, url, **kwargs),
+                                      timeout=self.timeout)
+
+    async def gather(self, *calls):
+        """Await several calls (or one iterable of calls) concurrently; a call that raised yields None"""
+        if len(calls) == 1 and not inspect.isawaitable(calls[0]):
+            calls = tuple(calls[0])
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.error(f"❌ Concurrent SAP call failed: {result!r}")
+        return [None if isinstance(result, BaseException) else result for result in results]
+
+    async def get_json(self, path, params=None, headers=None):
+        """Body of a GET, or None when SAP is unavailable or answers with an error"""
+        if not await self.ensure_logged_in():
+            return None
+        try:
+            response = await self.request('GET', path, params=params, headers=headers)
+        except Exception as e:
+            logger.error(f"❌ SAP GET {path} failed: {e!r}")
+            return None
+        if response.status_code != 200:
+            logger.warning(f"⚠️ SAP GET {path} failed: {response.status_code}")
+            return None
+        return response.json()
+
+    async def sql_query(self, query_code, param_list):
+        """Rows of a stored SQLQueries('<code>')/List call, or None on failure"""
+        if not await self.ensure_logged_in():
+            return None
+        path = f"SQLQueries('{query_code}')/List"
+        try:
+            response = await self.request('POST', path, json={'ParamList': param_list})
+        except Exception as e:
+            logger.error(f"❌ SAP query {query_code} failed: {e!r}")
+            return None
+        if response.status_code != 200:
+            logger.warning(f"⚠️ SAP query {query_code} failed: {response.status_code}")
+            return None
+        return response.json().get('value', [])
+
+    async def get_purchase_order_by_doc_entry(self, doc_entry):
+        data = await self.get_json(f"PurchaseOrders?$filter=DocEntry eq {doc_entry}")
+        return data['value'][0] if data and data.get('value') else None
+
+    async def fetch_po_lines_by_docentry(self, doc_entry):
+        """PO header and lines via $crossjoin, same result shape as SAPMultiGRNService"""
+        from modules.multi_grn_creation.services import SAPMultiGRNService
+        data = await self.get_json(SAPMultiGRNService._po_lines_crossjoin_path(doc_entry))
+        if data is None:
+            return {'success': False, 'error': f'Could not fetch PO lines for DocEntry {doc_entry}'}
+        return SAPMultiGRNService._parse_po_lines_crossjoin(doc_entry, data.get('value', []))
+
+    async def get_item_master(self, item_code):
+        return await self.get_json(f"Items('{item_code}')")
+
+    async def get_warehouse_bins(self, warehouse_code):
+        data = await self.get_json(f"BinLocations?$filter=WhsCode eq '{warehouse_code}'")
+        return data.get('value', []) if data else []
+
+    async def get_item_batch_details(self, item_code):
+        data = await self.get_json(f"BatchNumberDetails?$filter=ItemCode eq '{item_code}'")
+        return data.get('value', []) if data else []
+
+    async def get_item_warehouses(self, item_code, item_type):
+        """Warehouses of a serial, batch or non_managed item (SAPIntegration.get_*_item_warehouses)"""
+        rows = await self.sql_query(ITEM_WAREHOUSE_QUERIES[item_type], f"itemCode='{item_code}'")
+        if rows is None:
+            return {'success': False, 'error': 'SAP B1 API call failed'}
+        return {'success': True, 'item_code': item_code, 'item_type': item_type, 'warehouses': rows}
+
+
+def run_sync(work, **client_kwargs):
+    """Run ``work(client)`` to completion from blocking code and return its result.
+
+    ``work`` receives a fresh AsyncSAPClient and returns an awaitable. Safe to
+    call from Flask views and worker threads. From inside a running event loop
+    it runs on a helper thread.
+    """
+    async def main():
+        return await work(AsyncSAPClient(**client_kwargs))
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(main())
+    with ThreadPoolExecutor(max_workers=1) as helper:
+        return helper.submit(contextvars.copy_context().run, asyncio.run, main()).result()
+
+
+def fan_out(method, arguments, **client_kwargs):
+    """Call one AsyncSAPClient read method for every argument concurrently.
+
+    Returns {argument: result} (duplicates are fetched once).
+    """
+    arguments = list(dict.fromkeys(arguments))
+    if not arguments:
+        return {}
+
+    async def work(client):
+        read = getattr(client, method)
+        return dict(zip(arguments, await client.gather(read(argument) for argument in arguments)))
+
+    return run_sync(work, **client_kwargs)
@@ -7,9 +7,18 @@ import urllib.parse
 import urllib3
 
 from models import InventoryTransferItem
+from sap_session_pool import get_sap_session_pool, PooledSAPSession
+from sap_odata_batch import execute_batch
+from sap_odata_pager import DEFAULT_PAGE_SIZE, ODataPageError, iter_pages, iter_rows
+from master_data_cache import master_data_cache
+from request_metrics import bind_context, sap_operation
+from sap_query_manager import BATCH_SERIES_VALIDATION_SIZE
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Lines per InventoryCountings PATCH; larger counting saves are split into several requests
+INVENTORY_COUNTING_PATCH_LINES = int(os.environ.get('INVENTORY_COUNTING_PATCH_LINES', '200'))
+
 
 class SAPIntegration:
 
@@ -20,8 +29,10 @@ class SAPIntegration:
         self.password = os.environ.get('SAP_B1_PASSWORD', '')
         self.company_db = os.environ.get('SAP_B1_COMPANY_DB', '')
         self.session_id = None
-        self.session = requests.Session()
-        self.session.verify = False  # For development, in production use proper SSL
+        # All instances share the process-wide pool of authenticated Service Layer sessions
+        self.session_pool = get_sap_session_pool(self.base_url, self.username,
+                                                 self.password, self.company_db)
+        self.session = PooledSAPSession(self.session_pool)
         self.is_offline = False
 
         # Cache for frequently accessed data
@@ -33,38 +44,19 @@ class SAPIntegration:
         self._batch_cache = {}
 
     def login(self):
-        """Login to SAP B1 Service Layer"""
+        """Login to SAP B1 Service Layer (through the shared session pool)"""
         # Check if SAP configuration exists
         if not self.base_url or not self.username or not self.password or not self.company_db:
             logging.warning(
                 "SAP B1 configuration not complete. Running in offline mode.")
             return False
 
-        login_url = f"{self.base_url}/b1s/v1/Login"
-        login_data = {
-            "UserName": self.username,
-            "Password": self.password,
-            "CompanyDB": self.company_db
-        }
-
-        try:
-            response = self.session.post(login_url,
-                                         json=login_data,
-                                         timeout=30)
-            if response.status_code == 200:
-                self.session_id = response.json().get('SessionId')
-                logging.info("Successfully logged in to SAP B1")
-                return True
-            else:
-                logging.warning(
-                    f"SAP B1 login failed: {response.text}. Running in offline mode."
-                )
-                return False
-        except Exception as e:
-            logging.warning(
-                f"SAP B1 login error: {str(e)}. Running in offline mode.")
-            self.is_offline = True
-            return False
+        self.session_id = self.session_pool.ensure_logged_in()
+        self.is_offline = self.session_pool.is_offline
+        if self.session_id:
+            return True
+        logging.warning("SAP B1 login failed. Running in offline mode.")
+        return False
 
     def ensure_logged_in(self):
         """Ensure we have a valid session"""
@@ -72,7 +64,38 @@ class SAPIntegration:
             return self.login()
         return True
 
+    def execute_batch(self, operations, chunk_size=50):
+        """Send many independent Service Layer requests as OData $batch calls.
+
+        See sap_odata_batch for the operation format. Returns one result dict per
+        operation, or None when SAP B1 is not available.
+        """
+        if not self.ensure_logged_in():
+            logging.warning("SAP B1 not available, cannot execute $batch request")
+            return None
+        return execute_batch(self.session, self.base_url, operations, chunk_size=chunk_size)
+
+    def iter_pages(self, path, params=None, page_size=DEFAULT_PAGE_SIZE, prefetch=False):
+        """Yield a Service Layer collection one page (list of rows) at a time.
+
+        Follows odata.nextLink with ``page_size`` rows per page; with prefetch=True
+        the next page downloads while the caller works on the current one. See
+        sap_odata_pager (raises ODataPageError on a non-200 response).
+        """
+        return iter_pages(self.session, self.base_url, path, params=params,
+                          page_size=page_size, prefetch=prefetch)
+
+    def iter_rows(self, path, params=None, page_size=DEFAULT_PAGE_SIZE, prefetch=False):
+        """Yield the rows of a Service Layer collection one by one (see iter_pages)"""
+        return iter_rows(self.session, self.base_url, path, params=params,
+                         page_size=page_size, prefetch=prefetch)
+
     def validate_item_code(self, item_code):
+        """Validate ItemCode (batch/serial/manage-method flags), cached process-wide"""
+        return master_data_cache.get_or_load('item_flags', (self.company_db, 'wms', item_code),
+                                             lambda: self._fetch_item_validation(item_code))
+
+    def _fetch_item_validation(self, item_code):
         """Validate ItemCode and get BatchNum, SerialNum, and NonBatch_NonSerialMethod from SAP B1"""
         if not self.ensure_logged_in():
             logging.warning("SAP B1 not available, returning default validation for ItemCode")
@@ -270,6 +293,11 @@ class SAPIntegration:
             return []
 
     def get_bin_locations_list(self, warehouse_code):
+        """Get bin locations for a warehouse (GetBinCodeByWHCode), cached process-wide"""
+        return master_data_cache.get_or_load('bins', (self.company_db, 'sql', warehouse_code),
+                                             lambda: self._fetch_bin_locations_list(warehouse_code))
+
+    def _fetch_bin_locations_list(self, warehouse_code):
         """Get bin locations for a specific warehouse using SQL Query"""
         if not self.ensure_logged_in():
             logging.warning("SAP B1 not available, returning empty bin list")
@@ -336,6 +364,11 @@ class SAPIntegration:
             }
 
     def get_po_series(self):
+        """Get PO series from SAP B1, cached process-wide"""
+        return master_data_cache.get_or_load('series', (self.company_db, 'po'),
+                                             self._fetch_po_series)
+
+    def _fetch_po_series(self):
         """Get PO series from SAP B1 using SQLQueries"""
         if not self.ensure_logged_in():
             logging.warning("SAP B1 not available, returning empty series list")
@@ -484,6 +517,11 @@ class SAPIntegration:
         return []
 
     def get_so_series(self):
+        """Get Sales Order series from SAP B1, cached process-wide"""
+        return master_data_cache.get_or_load('series', (self.company_db, 'so'),
+                                             self._fetch_so_series)
+
+    def _fetch_so_series(self):
         """Get Sales Order series from SAP B1 - tries SQL query first, falls back to OData endpoints"""
         if not self.ensure_logged_in():
             logging.warning("SAP B1 not available, returning empty series list")
@@ -777,6 +815,11 @@ class SAPIntegration:
             }
 
     def get_invt_series(self):
+        """Get Inventory Transfer series from SAP B1, cached process-wide"""
+        return master_data_cache.get_or_load('series', (self.company_db, 'invt'),
+                                             self._fetch_invt_series)
+
+    def _fetch_invt_series(self):
         """Get Inventory Transfer series from SAP B1 using SQLQueries"""
         if not self.ensure_logged_in():
             logging.warning("SAP B1 not available, returning empty series list")
@@ -860,6 +903,11 @@ class SAPIntegration:
             return None
 
     def get_invcnt_series(self):
+        """Get Inventory Counting series from SAP B1, cached process-wide"""
+        return master_data_cache.get_or_load('series', (self.company_db, 'invcnt'),
+                                             self._fetch_invcnt_series)
+
+    def _fetch_invcnt_series(self):
         """Get Inventory Counting series from SAP B1 using SQLQueries"""
         if not self.ensure_logged_in():
             logging.warning("SAP B1 not available, returning empty series list")
@@ -1094,47 +1142,54 @@ class SAPIntegration:
                     business_place_id = warehouse_data[0].get('BusinessPlaceID', 0)
                     logging.info(f"✅ Warehouse {warehouse_code} BusinessPlaceID: {business_place_id}")
 
-            # Step 3: Get warehouse items using your exact crossjoin API pattern
-            crossjoin_url = (f"{self.base_url}/b1s/v1/$crossjoin(Items,Items/ItemWarehouseInfoCollection)?"
-                           f"$expand=Items($select=ItemCode,ItemName,QuantityOnStock),"
-                           f"Items/ItemWarehouseInfoCollection($select=InStock,Ordered,StandardAveragePrice)&"
-                           f"$filter=Items/ItemCode eq Items/ItemWarehouseInfoCollection/ItemCode and "
-                           f"Items/ItemWarehouseInfoCollection/WarehouseCode eq '{warehouse_code}'")
-
-            logging.debug(f"[DEBUG] Calling URL: {crossjoin_url}")
-            headers = {"Prefer": "odata.maxpagesize=0"}
-            crossjoin_response = self.session.get(crossjoin_url,headers=headers)
-            logging.debug(f"[DEBUG] Status code: {crossjoin_response.status_code}")
-            logging.debug(f"[DEBUG] Response text: {crossjoin_response.text[:0]}")
+            # Step 3: Get warehouse items using your exact crossjoin API pattern, streamed page by page
+            crossjoin_params = {
+                '$expand': ("Items($select=ItemCode,ItemName,QuantityOnStock),"
+                            "Items/ItemWarehouseInfoCollection($select=InStock,Ordered,StandardAveragePrice)"),
+                '$filter': ("Items/ItemCode eq Items/ItemWarehouseInfoCollection/ItemCode and "
+                            f"Items/ItemWarehouseInfoCollection/WarehouseCode eq '{warehouse_code}' and "
+                            "Items/ItemWarehouseInfoCollection/InStock gt 0"),
+            }
+            logging.debug(f"[DEBUG] Streaming $crossjoin(Items,Items/ItemWarehouseInfoCollection): {crossjoin_params}")
 
-            if crossjoin_response.status_code != 200:
-                logging.error(f"❌ Failed to get warehouse items: {crossjoin_response.status_code}")
+            # Step 4: Process crossjoin results as they arrive, keeping only in-stock rows
+            formatted_items = []
+            in_stock_rows = []
+            crossjoin_count = 0
+            try:
+                with sap_operation('get_bin_items.crossjoin'):
+                    for item_data in self.iter_rows('$crossjoin(Items,Items/ItemWarehouseInfoCollection)',
+                                                    params=crossjoin_params, prefetch=True):
+                        crossjoin_count += 1
+                        item_info = item_data.get('Items', {})
+                        warehouse_info = item_data.get('Items/ItemWarehouseInfoCollection', {})
+                        item_code = item_info.get('ItemCode', '')
+                        if not item_code:
+                            continue
+                        try:
+                            in_stock_qty = float(warehouse_info.get('InStock', 0) or 0)
+                        except (TypeError, ValueError):
+                            in_stock_qty = 0
+                        # Skip items with zero InStock quantity before fetching any batch details
+                        if in_stock_qty <= 0:
+                            logging.debug(f"⏭️ Skipping item {item_code} - InStock quantity is {in_stock_qty}")
+                            continue
+                        in_stock_rows.append((item_code, item_info, warehouse_info, in_stock_qty))
+            except ODataPageError as e:
+                logging.error(f"❌ Failed to get warehouse items: {e.status_code}")
                 return []
 
-            # Step 4: Process crossjoin results and enhance with batch details
-            formatted_items = []
-            crossjoin_data = crossjoin_response.json().get('value', [])
-            
-            logging.info(f"📦 Found {len(crossjoin_data)} items in warehouse {warehouse_code}")
+            logging.info(f"📦 Found {crossjoin_count} items in warehouse {warehouse_code}")
 
-            for item_data in crossjoin_data:
+            # Step 5: Get batch details for all remaining items in chunked, parallel calls
+            with sap_operation('get_bin_items.batch_details'):
+                batch_details_by_item = self._get_items_batch_details_bulk(
+                    [row[0] for row in in_stock_rows])
+
+            for item_code, item_info, warehouse_info, in_stock_qty in in_stock_rows:
                 try:
-                    item_info = item_data.get('Items', {})
-                    warehouse_info = item_data.get('Items/ItemWarehouseInfoCollection', {})
-                    
-                    item_code = item_info.get('ItemCode', '')
-                    if not item_code:
-                        continue
+                    batch_details = batch_details_by_item.get(item_code, [])
 
-                    # Step 5: Get batch details for this item using your exact API pattern
-                    batch_details = self._get_item_batch_details(item_code)
-                    
-                    # Skip items with zero InStock quantity
-                    in_stock_qty = float(warehouse_info.get('InStock', 0))
-                    if in_stock_qty <= 0:
-                        logging.debug(f"⏭️ Skipping item {item_code} - InStock quantity is {in_stock_qty}")
-                        continue
-                    
                     # Create enhanced item record with all details
                     enhanced_item = {
                         'ItemCode': item_code,
@@ -1219,6 +1274,50 @@ class SAPIntegration:
             logging.error(f"❌ Error getting batch details for {item_code}: {str(e)}")
             return []
 
+    def _get_items_batch_details_bulk(self, item_codes, chunk_size=40, max_workers=4):
+        """Get BatchNumberDetails for many items at once.
+
+        Item codes are grouped into chunks of ``ItemCode eq ... or ...`` filters and
+        the chunks are fetched in parallel over the pooled SAP sessions. Returns a
+        dict of item code -> list of batch records in SAP order (same records as
+        _get_item_batch_details).
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        unique_codes = list(dict.fromkeys(code for code in item_codes if code))
+        results = {code: [] for code in unique_codes}
+        if not unique_codes:
+            return results
+
+        chunks = [unique_codes[i:i + chunk_size] for i in range(0, len(unique_codes), chunk_size)]
+
+        def fetch_chunk(chunk):
+            filter_query = ' or '.join(
+                f"ItemCode eq '{code.replace(chr(39), chr(39) * 2)}'" for code in chunk)
+            batch_url = f"{self.base_url}/b1s/v1/BatchNumberDetails"
+            try:
+                response = self.session.get(batch_url,
+                                            params={'$filter': filter_query},
+                                            headers={'Prefer': 'odata.maxpagesize=0'},
+                                            timeout=60)
+                if response.status_code == 200:
+                    return response.json().get('value', [])
+                logging.warning(f"⚠️ Batch details chunk failed ({len(chunk)} items): {response.status_code}")
+            except Exception as e:
+                logging.error(f"❌ Error getting batch details for chunk of {len(chunk)} items: {str(e)}")
+            return []
+
+        workers = max(1, min(max_workers, len(chunks)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for batch_rows in executor.map(bind_context(fetch_chunk), chunks):
+                for batch in batch_rows:
+                    code = batch.get('ItemCode')
+                    if code in results:
+                        results[code].append(batch)
+
+        logging.info(f"✅ Fetched batch details for {len(unique_codes)} items in {len(chunks)} chunked calls")
+        return results
+
     def _get_mock_bin_items(self, bin_code):
         """Mock data for offline mode with enhanced structure matching your API responses"""
         # Only return items with InStock > 0 to match the filtering logic
@@ -1802,7 +1901,7 @@ class SAPIntegration:
     #         logging.error(
     #             f"❌ Error creating stock transfer in SAP B1: {str(e)}")
     #         return {'success': False, 'error': str(e)}
-    def create_inventory_transfer(self, transfer_document):
+    def create_inventory_transfer(self, transfer_document, journal_memo=None):
         """Create Stock Transfer in SAP B1 with correct JSON structure"""
 
         if not self.ensure_logged_in():
@@ -1978,6 +2077,8 @@ class SAPIntegration:
             "ToWarehouse": transfer_document.to_warehouse,
             "StockTransferLines": stock_transfer_lines
         }
+        if journal_memo:
+            transfer_data["JournalMemo"] = journal_memo
 
         logging.info("📤 Final Payload Sent to SAP:")
         logging.info(json.dumps(transfer_data, indent=2))
@@ -1991,6 +2092,7 @@ class SAPIntegration:
 
             if response.status_code == 201:
                 result = response.json()
+                self.invalidate_serial_locations(transfer_data)
                 return {'success': True, 'document_number': result.get("DocNum")}
 
             return {'success': False, 'error': response.text}
@@ -1998,7 +2100,7 @@ class SAPIntegration:
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
-    def create_serial_item_stock_transfer(self, transfer_document):
+    def create_serial_item_stock_transfer(self, transfer_document, journal_memo=None):
         """Create Stock Transfer in SAP B1 for Serial Item Transfer"""
         if not self.ensure_logged_in():
             logging.warning(
@@ -2048,6 +2150,8 @@ class SAPIntegration:
             "ToWarehouse": transfer_document.to_warehouse,
             "StockTransferLines": stock_transfer_lines
         }
+        if journal_memo:
+            transfer_data["JournalMemo"] = journal_memo
 
         # Log the JSON payload for debugging
         logging.info(f"📤 Sending serial item stock transfer to SAP B1:")
@@ -2059,6 +2163,7 @@ class SAPIntegration:
 
             if response.status_code == 201:
                 result = response.json()
+                self.invalidate_serial_locations(transfer_data)
                 logging.info(
                     f"✅ Serial item stock transfer created successfully: {result.get('DocNum')}"
                 )
@@ -2184,43 +2289,42 @@ class SAPIntegration:
             
             filter_clause = " and ".join(filters) if filters else ""
             
-            # Construct URL with OData parameters
-            url = f"{self.base_url}/b1s/v1/PickLists"
-            if filter_clause:
-                url += f"?$filter={filter_clause}"
-            
-            logging.info(f"🔍 Fetching pick lists from SAP B1 (avoiding ps_closed): {url}")
-            response = self.session.get(url)
-            
-            if response.status_code == 200:
-                data = response.json()
-                pick_lists = data.get('value', [])
-                
-                # Additional filtering for ps_released line items
-                filtered_pick_lists = []
-                for pick_list in pick_lists:
+            params = {'$filter': filter_clause} if filter_clause else None
+
+            logging.info(f"🔍 Fetching pick lists from SAP B1 (avoiding ps_closed): PickLists {filter_clause}")
+
+            # Stream the collection page by page and stop as soon as the requested
+            # window is filled; the next page downloads while this one is filtered
+            filtered_pick_lists = []
+            scanned = 0
+            wanted = offset + limit if limit else None
+            pick_list_rows = self.iter_rows('PickLists', params=params, prefetch=True)
+            try:
+                for pick_list in pick_list_rows:
+                    scanned += 1
                     # Check if pick list has ps_released line items
-                    has_released_items = False
                     pick_list_lines = pick_list.get('PickListsLines', [])
-                    for line in pick_list_lines:
-                        if line.get('PickStatus') == 'ps_Released':
-                            has_released_items = True
-                            break
-                    
+                    has_released_items = any(line.get('PickStatus') == 'ps_Released' for line in pick_list_lines)
+
                     # Only include pick lists that have ps_released items
                     if has_released_items or not pick_list_lines:  # Include empty pick lists too
                         filtered_pick_lists.append(pick_list)
-                
-                logging.info(f"✅ Found {len(filtered_pick_lists)} pick lists with ps_released items (filtered from {len(pick_lists)} total)")
-                return {
-                    'success': True,
-                    'pick_lists': filtered_pick_lists,
-                    'total_count': len(filtered_pick_lists)
-                }
-            else:
-                logging.error(f"❌ Error fetching pick lists: {response.status_code} - {response.text}")
-                return {'success': False, 'error': f'HTTP {response.status_code}'}
-                
+                        if wanted and len(filtered_pick_lists) >= wanted:
+                            break
+            finally:
+                pick_list_rows.close()
+
+            filtered_pick_lists = filtered_pick_lists[offset:]
+            logging.info(f"✅ Found {len(filtered_pick_lists)} pick lists with ps_released items (scanned {scanned})")
+            return {
+                'success': True,
+                'pick_lists': filtered_pick_lists,
+                'total_count': len(filtered_pick_lists)
+            }
+
+        except ODataPageError as e:
+            logging.error(f"❌ Error fetching pick lists: {e.status_code} - {e.text}")
+            return {'success': False, 'error': f'HTTP {e.status_code}'}
         except Exception as e:
             logging.error(f"Error getting pick lists from SAP B1: {str(e)}")
             return {'success': False, 'error': str(e)}
@@ -2327,77 +2431,17 @@ class SAPIntegration:
     def sync_pick_list_to_local_db(self, sap_pick_list, local_pick_list):
         """Sync SAP B1 pick list line items and bin allocations to local database"""
         from app import db
-        from models import PickListLine, PickListBinAllocation
-        import json
-        
+        from pick_list_sync import replace_pick_list_lines
+
         try:
-            # Clear existing lines and bin allocations - Fix for SQLAlchemy join delete issue
-            # First get the IDs of bin allocations to delete
-            pick_list_line_ids = [line.id for line in PickListLine.query.filter_by(pick_list_id=local_pick_list.id).all()]
-            
-            if pick_list_line_ids:
-                # Delete bin allocations first (foreign key dependency)
-                PickListBinAllocation.query.filter(PickListBinAllocation.pick_list_line_id.in_(pick_list_line_ids)).delete(synchronize_session=False)
-                
-                # Then delete pick list lines
-                PickListLine.query.filter_by(pick_list_id=local_pick_list.id).delete(synchronize_session=False)
-            
-            # Sync PickListsLines from SAP B1 - Focus on ps_released, avoid ps_closed
-            sap_lines = sap_pick_list.get('PickListsLines', [])
-            for sap_line in sap_lines:
-                pick_status = sap_line.get('PickStatus', 'ps_Open')
-                
-                # Skip ps_closed items - only sync ps_released and other active statuses
-                if pick_status == 'ps_Closed':
-                    logging.info(f"⏭️ Skipping ps_Closed line item {sap_line.get('LineNumber', 0)}")
-                    continue
-                
-                # Prefer ps_released items
-                if pick_status == 'ps_Released':
-                    logging.info(f"✅ Syncing ps_Released line item {sap_line.get('LineNumber', 0)}")
-                
-                # Create PickListLine
-                pick_list_line = PickListLine(
-                    pick_list_id=local_pick_list.id,
-                    absolute_entry=sap_line.get('AbsoluteEntry'),
-                    line_number=sap_line.get('LineNumber', 0),
-                    order_entry=sap_line.get('OrderEntry'),
-                    order_row_id=sap_line.get('OrderRowID'),
-                    picked_quantity=float(sap_line.get('PickedQuantity', 0)),
-                    pick_status=pick_status,
-                    released_quantity=float(sap_line.get('ReleasedQuantity', 0)),
-                    previously_released_quantity=float(sap_line.get('PreviouslyReleasedQuantity', 0)),
-                    base_object_type=sap_line.get('BaseObjectType', 17),
-                    serial_numbers=json.dumps(sap_line.get('SerialNumbers', [])),
-                    batch_numbers=json.dumps(sap_line.get('BatchNumbers', []))
-                )
-                db.session.add(pick_list_line)
-                db.session.flush()  # Get the ID
-                
-                # Sync DocumentLinesBinAllocations
-                bin_allocations = sap_line.get('DocumentLinesBinAllocations', [])
-                for bin_allocation in bin_allocations:
-                    pick_list_bin_allocation = PickListBinAllocation(
-                        pick_list_line_id=pick_list_line.id,
-                        bin_abs_entry=bin_allocation.get('BinAbsEntry'),
-                        quantity=float(bin_allocation.get('Quantity', 0)),
-                        allow_negative_quantity=bin_allocation.get('AllowNegativeQuantity', 'tNO'),
-                        serial_and_batch_numbers_base_line=bin_allocation.get('SerialAndBatchNumbersBaseLine', 0),
-                        base_line_number=bin_allocation.get('BaseLineNumber')
-                    )
-                    db.session.add(pick_list_bin_allocation)
-            
-            # Update pick list totals
-            total_lines = len(sap_lines)
-            picked_lines = len([line for line in sap_lines if line.get('PickStatus') == 'ps_Closed'])
-            
-            local_pick_list.total_items = total_lines
-            local_pick_list.picked_items = picked_lines
-            
+            # Replace lines and bin allocations - ps_Closed lines are skipped, ps_Released preferred
+            lines, allocations = replace_pick_list_lines([(local_pick_list, sap_pick_list)])
             db.session.commit()
-            logging.info(f"✅ Synced {total_lines} lines and bin allocations for pick list {local_pick_list.absolute_entry}")
+            total_lines = local_pick_list.total_items
+            logging.info(f"✅ Synced {total_lines} lines ({lines} open, {allocations} bin allocations) "
+                         f"for pick list {local_pick_list.absolute_entry}")
             return {'success': True, 'synced_lines': total_lines}
-            
+
         except Exception as e:
             db.session.rollback()
             logging.error(f"❌ Error syncing pick list to local DB: {str(e)}")
@@ -2412,359 +2456,35 @@ class SAPIntegration:
             }
         }
 
-    def sync_warehouses(self):
+    def sync_warehouses(self, full=False):
         """Sync warehouses from SAP B1 to local database"""
         if not self.ensure_logged_in():
             logging.warning("Cannot sync warehouses - SAP B1 not available")
             return False
 
-        try:
-            url = f"{self.base_url}/b1s/v1/Warehouses"
-            response = self.session.get(url)
-
-            if response.status_code == 200:
-                warehouses = response.json().get('value', [])
-
-                from app import db
-
-                # Clear cache and update database
-                self._warehouse_cache = {}
-
-                for wh in warehouses:
-                    # Check if warehouse exists in branches table
-                    existing = db.session.execute(
-                        db.text("SELECT id FROM branches WHERE id = :id"), {
-                            "id": wh.get('WarehouseCode')
-                        }).fetchone()
-
-                    if not existing:
-                        # Insert new warehouse as branch - use compatible SQL
-                        import os
-                        # Removed circular import
-                        db_uri = os.environ.get('DATABASE_URL', '')
-
-                        if 'postgresql' in db_uri.lower(
-                        ) or 'mysql' in db_uri.lower():
-                            insert_sql = """
-                                INSERT INTO branches (id, name, address, is_active, created_at, updated_at)
-                                VALUES (:id, :name, :address, :is_active, NOW(), NOW())
-                            """
-                        else:
-                            insert_sql = """
-                                INSERT INTO branches (id, name, address, is_active, created_at, updated_at)
-                                VALUES (:id, :name, :address, :is_active, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                            """
-
-                        db.session.execute(
-                            db.text(insert_sql), {
-                                "id": wh.get('WarehouseCode'),
-                                "name": wh.get('WarehouseName', ''),
-                                "address": wh.get('Street', ''),
-                                "is_active": wh.get('Inactive') != 'Y'
-                            })
-                    else:
-                        # Update existing warehouse - use compatible SQL
-                        import os
-                        # Removed circular import
-                        db_uri = os.environ.get('DATABASE_URL', '')
-
-                        if 'postgresql' in db_uri.lower(
-                        ) or 'mysql' in db_uri.lower():
-                            update_sql = """
-                                UPDATE branches SET 
-                                    name = :name, 
-                                    address = :address, 
-                                    is_active = :is_active,
-                                    updated_at = NOW()
-                                WHERE id = :id
-                            """
-                        else:
-                            update_sql = """
-                                UPDATE branches SET 
-                                    name = :name, 
-                                    address = :address, 
-                                    is_active = :is_active,
-                                    updated_at = CURRENT_TIMESTAMP
-                                WHERE id = :id
-                            """
-
-                        db.session.execute(
-                            db.text(update_sql), {
-                                "id": wh.get('WarehouseCode'),
-                                "name": wh.get('WarehouseName', ''),
-                                "address": wh.get('Street', ''),
-                                "is_active": wh.get('Inactive') != 'Y'
-                            })
-
-                    # Cache warehouse data
-                    self._warehouse_cache[wh.get('WarehouseCode')] = {
-                        'WarehouseCode': wh.get('WarehouseCode'),
-                        'WarehouseName': wh.get('WarehouseName'),
-                        'Address': wh.get('Street'),
-                        'Active': wh.get('Inactive') != 'Y'
-                    }
-
-                db.session.commit()
-                logging.info(
-                    f"Synced {len(warehouses)} warehouses from SAP B1")
-                return True
-
-        except Exception as e:
-            logging.error(f"Error syncing warehouses: {str(e)}")
-            return False
+        from master_data_sync import sync_entity
+        return sync_entity(self, 'warehouses', full=full)['success']
 
-    def sync_bins(self, warehouse_code=None):
+    def sync_bins(self, warehouse_code=None, full=False):
         """Sync bin locations from SAP B1"""
         if not self.ensure_logged_in():
             logging.warning("Cannot sync bins - SAP B1 not available")
             return False
 
-        try:
-            # Get bins for specific warehouse or all warehouses
-            if warehouse_code:
-                url = f"{self.base_url}/b1s/v1/BinLocations?$filter=Warehouse eq '{warehouse_code}'"
-            else:
-                url = f"{self.base_url}/b1s/v1/BinLocations"
-
-            response = self.session.get(url)
+        from master_data_sync import sync_entity
+        # Get bins for specific warehouse or all warehouses
+        extra_filter = f"Warehouse eq '{warehouse_code}'" if warehouse_code else None
+        return sync_entity(self, 'bins', full=full, extra_filter=extra_filter)['success']
 
-            if response.status_code == 200:
-                bins = response.json().get('value', [])
-
-                # Create bins table if not exists - use compatible SQL
-                from app import db, app
-                import os
-
-                db_uri = os.environ.get('DATABASE_URL', '')
-
-                if 'postgresql' in db_uri.lower():
-                    create_table_sql = """
-                        CREATE TABLE IF NOT EXISTS bin_locations (
-                            id SERIAL PRIMARY KEY,
-                            bin_code VARCHAR(50) NOT NULL,
-                            warehouse_code VARCHAR(10) NOT NULL,
-                            bin_name VARCHAR(100),
-                            is_active BOOLEAN DEFAULT TRUE,
-                            created_at TIMESTAMP DEFAULT NOW(),
-                            updated_at TIMESTAMP DEFAULT NOW(),
-                            UNIQUE(bin_code, warehouse_code)
-                        )
-                    """
-                elif 'mysql' in db_uri.lower():
-                    create_table_sql = """
-                        CREATE TABLE IF NOT EXISTS bin_locations (
-                            id INT AUTO_INCREMENT PRIMARY KEY,
-                            bin_code VARCHAR(50) NOT NULL,
-                            warehouse_code VARCHAR(10) NOT NULL,
-                            bin_name VARCHAR(100),
-                            is_active BOOLEAN DEFAULT TRUE,
-                            created_at TIMESTAMP DEFAULT NOW(),
-                            updated_at TIMESTAMP DEFAULT NOW() ON UPDATE NOW(),
-                            UNIQUE KEY unique_bin_warehouse (bin_code, warehouse_code)
-                        )
-                    """
-                else:
-                    create_table_sql = """
-                        CREATE TABLE IF NOT EXISTS bin_locations (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            bin_code VARCHAR(50) NOT NULL,
-                            warehouse_code VARCHAR(10) NOT NULL,
-                            bin_name VARCHAR(100),
-                            is_active BOOLEAN DEFAULT 1,
-                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            UNIQUE(bin_code, warehouse_code)
-                        )
-                    """
-
-                db.session.execute(db.text(create_table_sql))
-
-                # Clear cache
-                self._bin_cache = {}
-
-                for bin_data in bins:
-                    bin_code = bin_data.get('BinCode')
-                    wh_code = bin_data.get(
-                        'Warehouse')  # Use 'Warehouse' not 'WarehouseCode'
-
-                    if bin_code and wh_code:
-                        # Upsert bin location - use database-specific syntax
-                        if 'postgresql' in db_uri.lower():
-                            upsert_sql = """
-                                INSERT INTO bin_locations (bin_code, warehouse_code, bin_name, is_active, created_at, updated_at)
-                                VALUES (:bin_code, :warehouse_code, :bin_name, :is_active, NOW(), NOW())
-                                ON CONFLICT (bin_code, warehouse_code) 
-                                DO UPDATE SET 
-                                    bin_name = EXCLUDED.bin_name,
-                                    is_active = EXCLUDED.is_active,
-                                    updated_at = NOW()
-                            """
-                        elif 'mysql' in db_uri.lower():
-                            upsert_sql = """
-                                INSERT INTO bin_locations (bin_code, warehouse_code, bin_name, is_active, created_at, updated_at)
-                                VALUES (:bin_code, :warehouse_code, :bin_name, :is_active, NOW(), NOW())
-                                ON DUPLICATE KEY UPDATE 
-                                    bin_name = VALUES(bin_name),
-                                    is_active = VALUES(is_active),
-                                    updated_at = NOW()
-                            """
-                        else:
-                            # SQLite - use INSERT OR REPLACE
-                            upsert_sql = """
-                                INSERT OR REPLACE INTO bin_locations (bin_code, warehouse_code, bin_name, is_active, created_at, updated_at)
-                                VALUES (:bin_code, :warehouse_code, :bin_name, :is_active, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                            """
-
-                        db.session.execute(
-                            db.text(upsert_sql), {
-                                "bin_code": bin_code,
-                                "warehouse_code": wh_code,
-                                "bin_name": bin_data.get('Description', ''),
-                                "is_active": bin_data.get('Inactive') != 'Y'
-                            })
-
-                        # Cache bin data
-                        cache_key = f"{wh_code}:{bin_code}"
-                        self._bin_cache[cache_key] = {
-                            'BinCode': bin_code,
-                            'WarehouseCode': wh_code,
-                            'Description': bin_data.get('Description', ''),
-                            'Active': bin_data.get('Inactive') != 'Y'
-                        }
-
-                db.session.commit()
-                logging.info(f"Synced {len(bins)} bin locations from SAP B1")
-                return True
-
-        except Exception as e:
-            logging.error(f"Error syncing bins: {str(e)}")
-            return False
-
-    def sync_business_partners(self):
-        """Sync business partners (suppliers/customers) from SAP B1"""
+    def sync_business_partners(self, full=False):
+        """Sync business partners (suppliers/customers) from SAP B1 - changes since the last sync unless full"""
         if not self.ensure_logged_in():
             logging.warning(
                 "Cannot sync business partners - SAP B1 not available")
             return False
 
-        try:
-            # Get suppliers and customers
-            url = f"{self.base_url}/b1s/v1/BusinessPartners?$filter=CardType eq 'cSupplier' or CardType eq 'cCustomer'"
-            response = self.session.get(url)
-
-            if response.status_code == 200:
-                partners = response.json().get('value', [])
-
-                from app import db, app
-
-                # Create business_partners table if not exists - use database-specific syntax
-                db_uri = os.environ.get('DATABASE_URL', '')
-
-                if 'postgresql' in db_uri.lower():
-                    create_table_sql = """
-                        CREATE TABLE IF NOT EXISTS business_partners (
-                            id SERIAL PRIMARY KEY,
-                            card_code VARCHAR(50) UNIQUE NOT NULL,
-                            card_name VARCHAR(200) NOT NULL,
-                            card_type VARCHAR(20) NOT NULL,
-                            phone VARCHAR(50),
-                            email VARCHAR(100),
-                            address TEXT,
-                            is_active BOOLEAN DEFAULT TRUE,
-                            created_at TIMESTAMP DEFAULT NOW(),
-                            updated_at TIMESTAMP DEFAULT NOW()
-                        )
-                    """
-                elif 'mysql' in db_uri.lower():
-                    create_table_sql = """
-                        CREATE TABLE IF NOT EXISTS business_partners (
-                            id INT AUTO_INCREMENT PRIMARY KEY,
-                            card_code VARCHAR(50) UNIQUE NOT NULL,
-                            card_name VARCHAR(200) NOT NULL,
-                            card_type VARCHAR(20) NOT NULL,
-                            phone VARCHAR(50),
-                            email VARCHAR(100),
-                            address TEXT,
-                            is_active BOOLEAN DEFAULT TRUE,
-                            created_at TIMESTAMP DEFAULT NOW(),
-                            updated_at TIMESTAMP DEFAULT NOW() ON UPDATE NOW()
-                        )
-                    """
-                else:
-                    create_table_sql = """
-                        CREATE TABLE IF NOT EXISTS business_partners (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            card_code VARCHAR(50) UNIQUE NOT NULL,
-                            card_name VARCHAR(200) NOT NULL,
-                            card_type VARCHAR(20) NOT NULL,
-                            phone VARCHAR(50),
-                            email VARCHAR(100),
-                            address TEXT,
-                            is_active BOOLEAN DEFAULT 1,
-                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                        )
-                    """
-
-                db.session.execute(db.text(create_table_sql))
-
-                for partner in partners:
-                    card_code = partner.get('CardCode')
-                    if card_code:
-                        # Use database-specific upsert syntax
-                        if 'postgresql' in db_uri.lower():
-                            upsert_sql = """
-                                INSERT INTO business_partners (card_code, card_name, card_type, phone, email, address, is_active, created_at, updated_at)
-                                VALUES (:card_code, :card_name, :card_type, :phone, :email, :address, :is_active, NOW(), NOW())
-                                ON CONFLICT (card_code) 
-                                DO UPDATE SET 
-                                    card_name = EXCLUDED.card_name,
-                                    card_type = EXCLUDED.card_type,
-                                    phone = EXCLUDED.phone,
-                                    email = EXCLUDED.email,
-                                    address = EXCLUDED.address,
-                                    is_active = EXCLUDED.is_active,
-                                    updated_at = NOW()
-                            """
-                        elif 'mysql' in db_uri.lower():
-                            upsert_sql = """
-                                INSERT INTO business_partners (card_code, card_name, card_type, phone, email, address, is_active, created_at, updated_at)
-                                VALUES (:card_code, :card_name, :card_type, :phone, :email, :address, :is_active, NOW(), NOW())
-                                ON DUPLICATE KEY UPDATE 
-                                    card_name = VALUES(card_name),
-                                    card_type = VALUES(card_type),
-                                    phone = VALUES(phone),
-                                    email = VALUES(email),
-                                    address = VALUES(address),
-                                    is_active = VALUES(is_active),
-                                    updated_at = NOW()
-                            """
-                        else:
-                            # SQLite - use INSERT OR REPLACE
-                            upsert_sql = """
-                                INSERT OR REPLACE INTO business_partners (card_code, card_name, card_type, phone, email, address, is_active, created_at, updated_at)
-                                VALUES (:card_code, :card_name, :card_type, :phone, :email, :address, :is_active, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                            """
-
-                        db.session.execute(
-                            db.text(upsert_sql), {
-                                "card_code": card_code,
-                                "card_name": partner.get('CardName', ''),
-                                "card_type": partner.get('CardType', ''),
-                                "phone": partner.get('Phone1', ''),
-                                "email": partner.get('EmailAddress', ''),
-                                "address": partner.get('Address', ''),
-                                "is_active": partner.get('Valid') == 'Y'
-                            })
-
-                db.session.commit()
-                logging.info(
-                    f"Synced {len(partners)} business partners from SAP B1")
-                return True
-
-        except Exception as e:
-            logging.error(f"Error syncing business partners: {str(e)}")
-            return False
+        from master_data_sync import sync_entity
+        return sync_entity(self, 'business_partners', full=full)['success']
 
     def update_pick_list_status_to_picked(self, absolute_entry, pick_list_data):
         """Update pick list status to 'ps_Picked' in SAP B1 via PATCH API"""
@@ -2956,8 +2676,14 @@ class SAPIntegration:
                 'error': error_msg
             }
 
-    def update_inventory_counting(self, doc_entry, counting_document):
-        """Update inventory counting document in SAP B1 via PATCH API"""
+    def update_inventory_counting(self, doc_entry, counting_document, chunk_size=INVENTORY_COUNTING_PATCH_LINES):
+        """Update inventory counting document in SAP B1 via PATCH API
+
+        InventoryCountingLines are sent ``chunk_size`` lines per PATCH, the header
+        fields with the first one. SAP keeps the lines a PATCH does not mention, so
+        only changed lines need to be sent; if a later request fails, the lines of
+        the earlier ones are already saved and sending them again is harmless.
+        """
         if not self.ensure_logged_in():
             # Return success for offline mode with mock response
             return {
@@ -2969,32 +2695,43 @@ class SAPIntegration:
         try:
             # Build the PATCH URL with the document entry
             url = f"{self.base_url}/b1s/v1/InventoryCountings({doc_entry})"
-            
-            # Prepare the JSON payload - use the exact structure provided by the user
-            payload = counting_document
-            
-            # Execute PATCH request to SAP B1
-            logging.info(f"Sending PATCH request to {url}")
-            logging.info(f"Payload: {json.dumps(payload, indent=2)}")
-            
-            response = self.session.patch(url, json=payload, timeout=30)
-            
-            if response.status_code == 204:
-                # SAP B1 returns 204 No Content for successful PATCH
-                logging.info(f"Successfully updated inventory counting {doc_entry} in SAP B1")
-                return {
-                    'success': True,
-                    'message': f'Inventory counting {doc_entry} updated successfully',
-                    'sap_response': {'DocumentEntry': doc_entry}
-                }
-            else:
-                error_msg = f"SAP B1 PATCH failed with status {response.status_code}: {response.text}"
-                logging.error(error_msg)
-                return {
-                    'success': False,
-                    'error': error_msg,
-                    'sap_response': response.text
-                }
+
+            lines = counting_document.get('InventoryCountingLines') or []
+            header = {key: value for key, value in counting_document.items() if key != 'InventoryCountingLines'}
+            payloads = [dict(header if start == 0 else {}, InventoryCountingLines=lines[start:start + chunk_size])
+                        for start in range(0, len(lines), chunk_size)] or [header]
+
+            lines_sent = 0
+            for number, payload in enumerate(payloads, 1):
+                chunk_lines = len(payload.get('InventoryCountingLines', []))
+                logging.info(f"Sending PATCH request {number}/{len(payloads)} to {url} ({chunk_lines} lines)")
+                logging.debug(f"Payload: {json.dumps(payload, indent=2)}")
+
+                response = self.session.patch(url, json=payload, timeout=30)
+
+                if response.status_code != 204:
+                    # SAP B1 returns 204 No Content for successful PATCH
+                    error_msg = f"SAP B1 PATCH failed with status {response.status_code}: {response.text}"
+                    if lines_sent:
+                        error_msg += f" ({lines_sent} of {len(lines)} lines were saved by earlier requests)"
+                    logging.error(error_msg)
+                    return {
+                        'success': False,
+                        'error': error_msg,
+                        'sap_response': response.text,
+                        'lines_sent': lines_sent
+                    }
+                lines_sent += chunk_lines
+
+            logging.info(f"Successfully updated inventory counting {doc_entry} in SAP B1 "
+                         f"({lines_sent} lines in {len(payloads)} requests)")
+            return {
+                'success': True,
+                'message': f'Inventory counting {doc_entry} updated successfully',
+                'sap_response': {'DocumentEntry': doc_entry},
+                'lines_sent': lines_sent,
+                'requests': len(payloads)
+            }
                 
         except Exception as e:
             error_msg = f"Error updating inventory counting in SAP B1: {str(e)}"
@@ -3033,53 +2770,11 @@ class SAPIntegration:
         """Generate unique external reference number for Purchase Delivery Note"""
         from datetime import datetime
 
-        # Get current date in YYYYMMDD format
-        date_str = datetime.now().strftime('%Y%m%d')
-
-        # Get sequence number for today
         try:
-            from app import db
-
-            # Create sequence table if not exists
-            create_sequence_table = """
-                CREATE TABLE IF NOT EXISTS pdn_sequence (
-                    date_key VARCHAR(8) PRIMARY KEY,
-                    sequence_number INTEGER DEFAULT 0
-                )
-            """
-            db.session.execute(db.text(create_sequence_table))
-
-            # Get or create sequence for today
-            result = db.session.execute(
-                db.text(
-                    "SELECT sequence_number FROM pdn_sequence WHERE date_key = :date_key"
-                ), {
-                    "date_key": date_str
-                }).fetchone()
-
-            if result:
-                sequence_num = result[0] + 1
-                db.session.execute(
-                    db.text(
-                        "UPDATE pdn_sequence SET sequence_number = :seq WHERE date_key = :date_key"
-                    ), {
-                        "seq": sequence_num,
-                        "date_key": date_str
-                    })
-            else:
-                sequence_num = 1
-                db.session.execute(
-                    db.text(
-                        "INSERT INTO pdn_sequence (date_key, sequence_number) VALUES (:date_key, :seq)"
-                    ), {
-                        "date_key": date_str,
-                        "seq": sequence_num
-                    })
-
-            db.session.commit()
+            from document_numbers import next_daily_number
 
-            # Format: EXT-REF-YYYYMMDD-XXX
-            return f"EXT-REF-{date_str}-{sequence_num:03d}"
+            # Format: EXT-REF-YYYYMMDD-XXX, numbered per day
+            return next_daily_number('EXT-REF', width=3)
 
         except Exception as e:
             logging.error(
@@ -3088,7 +2783,7 @@ class SAPIntegration:
             timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
             return f"EXT-REF-{timestamp}"
 
-    def create_purchase_delivery_note(self, grpo_document):
+    def create_purchase_delivery_note(self, grpo_document, external_ref=None):
         """Create Purchase Delivery Note in SAP B1 with exact JSON structure specified"""
         if not self.ensure_logged_in():
             # Return success for offline mode
@@ -3129,8 +2824,9 @@ class SAPIntegration:
                 'error': 'Missing CardCode or PO DocEntry from SAP B1'
             }
 
-        # Generate unique external reference number
-        external_ref = self.generate_external_reference_number(grpo_document)
+        # Generate unique external reference number unless the caller already reserved one
+        if not external_ref:
+            external_ref = self.generate_external_reference_number(grpo_document)
 
         # Get first warehouse code from PO DocumentLines to determine BusinessPlaceID
         first_warehouse_code = None
@@ -3349,7 +3045,7 @@ class SAPIntegration:
             logging.error(error_msg)
             return {'success': False, 'error': error_msg}
 
-    def post_grpo_to_sap(self, grpo_document):
+    def post_grpo_to_sap(self, grpo_document, external_ref=None):
         """Post approved GRPO to SAP B1 as Purchase Delivery Note"""
         if not self.ensure_logged_in():
             logging.warning("Cannot post GRPO - SAP B1 not available")
@@ -3357,7 +3053,7 @@ class SAPIntegration:
 
         try:
             # Create Purchase Delivery Note to close PO
-            result = self.create_purchase_delivery_note(grpo_document)
+            result = self.create_purchase_delivery_note(grpo_document, external_ref=external_ref)
 
             if result.get('success'):
                 # Update WMS record with SAP document number
@@ -3388,16 +3084,21 @@ class SAPIntegration:
             logging.error(f"Error posting GRPO to SAP: {str(e)}")
             return {'success': False, 'error': str(e)}
 
-    def sync_all_master_data(self):
-        """Sync all master data from SAP B1"""
-        logging.info("Starting full SAP B1 master data synchronization...")
+    def sync_all_master_data(self, full=False):
+        """Sync all master data from SAP B1 (incremental where SAP supports it, unless full)"""
+        logging.info(f"Starting {'full' if full else 'incremental'} SAP B1 master data synchronization...")
 
         results = {
-            'warehouses': self.sync_warehouses(),
-            'bins': self.sync_bins(),
-            'business_partners': self.sync_business_partners()
+            'warehouses': self.sync_warehouses(full=full),
+            'bins': self.sync_bins(full=full),
+            'business_partners': self.sync_business_partners(full=full)
         }
 
+        # A full sync is the explicit "master data changed" signal - drop everything cached.
+        # Incremental syncs leave the cache to its TTLs
+        if full:
+            master_data_cache.invalidate()
+
         success_count = sum(1 for result in results.values() if result)
         logging.info(
             f"Master data sync completed: {success_count}/{len(results)} successful"
@@ -3450,109 +3151,87 @@ class SAPIntegration:
 
     def sync_sales_order_to_local_db(self, order_data):
         """Sync Sales Order data to local database"""
+        from app import db
+        from pick_list_sync import sync_sales_orders
+
         try:
-            from app import db
-            from models import SalesOrder, SalesOrderLine
-            from datetime import datetime
-            
             doc_entry = order_data.get('DocEntry')
             if not doc_entry:
                 return {'success': False, 'error': 'Missing DocEntry'}
-            
-            # Check if Sales Order already exists
-            sales_order = SalesOrder.query.filter_by(doc_entry=doc_entry).first()
-            
-            if not sales_order:
-                sales_order = SalesOrder()
-                db.session.add(sales_order)
-            
-            # Update Sales Order fields
-            sales_order.doc_entry = doc_entry
-            sales_order.doc_num = order_data.get('DocNum')
-            sales_order.doc_type = order_data.get('DocType')
-            
-            # Parse dates
-            doc_date = order_data.get('DocDate')
-            if doc_date:
-                if isinstance(doc_date, str):
-                    sales_order.doc_date = datetime.fromisoformat(doc_date.replace('Z', '+00:00'))
-                else:
-                    sales_order.doc_date = doc_date
-            
-            doc_due_date = order_data.get('DocDueDate')
-            if doc_due_date:
-                if isinstance(doc_due_date, str):
-                    sales_order.doc_due_date = datetime.fromisoformat(doc_due_date.replace('Z', '+00:00'))
-                else:
-                    sales_order.doc_due_date = doc_due_date
-            
-            sales_order.card_code = order_data.get('CardCode')
-            sales_order.card_name = order_data.get('CardName')
-            sales_order.address = order_data.get('Address')
-            sales_order.doc_total = order_data.get('DocTotal')
-            sales_order.doc_currency = order_data.get('DocCurrency')
-            sales_order.comments = order_data.get('Comments')
-            sales_order.document_status = order_data.get('DocumentStatus')
-            sales_order.last_sap_sync = datetime.utcnow()
-            
-            db.session.flush()  # Get the ID
-            
-            # Sync Sales Order Lines
-            lines_synced = 0
-            document_lines = order_data.get('DocumentLines', [])
-            
-            for line_data in document_lines:
-                line_num = line_data.get('LineNum')
-                if line_num is None:
-                    continue
-                    
-                # Check if line already exists
-                order_line = SalesOrderLine.query.filter_by(
-                    sales_order_id=sales_order.id,
-                    line_num=line_num
-                ).first()
-                
-                if not order_line:
-                    order_line = SalesOrderLine()
-                    order_line.sales_order_id = sales_order.id
-                    db.session.add(order_line)
-                
-                # Update line fields
-                order_line.line_num = line_num
-                order_line.item_code = line_data.get('ItemCode')
-                order_line.item_description = line_data.get('ItemDescription') or line_data.get('Dscription')
-                order_line.quantity = line_data.get('Quantity')
-                order_line.open_quantity = line_data.get('OpenQuantity')
-                order_line.delivered_quantity = line_data.get('DeliveredQuantity')
-                order_line.unit_price = line_data.get('UnitPrice')
-                order_line.line_total = line_data.get('LineTotal')
-                order_line.warehouse_code = line_data.get('WarehouseCode')
-                order_line.unit_of_measure = line_data.get('UoMCode')
-                order_line.line_status = line_data.get('LineStatus')
-                
-                lines_synced += 1
-            
+
+            sales_order, lines_synced = sync_sales_orders([order_data])[doc_entry]
             db.session.commit()
-            
+
             logging.info(f"✅ Synced Sales Order {doc_entry} with {lines_synced} lines")
             return {
                 'success': True,
                 'sales_order_id': sales_order.id,
                 'lines_synced': lines_synced
             }
-            
+
         except Exception as e:
             db.session.rollback()
             logging.error(f"Error syncing Sales Order to local DB: {str(e)}")
             return {'success': False, 'error': str(e)}
 
+    def fetch_and_sync_sales_orders(self, doc_entries):
+        """Fetch several Sales Orders with one $batch request and sync them to the local database"""
+        from app import db
+        from pick_list_sync import sync_sales_orders
+
+        operations = [{'method': 'GET', 'path': f"Orders({int(doc_entry)})"} for doc_entry in doc_entries]
+        batch_results = self.execute_batch(operations)
+        if batch_results is None:
+            return 0
+        
+        orders_data = []
+        for doc_entry, part in zip(doc_entries, batch_results):
+            if part['success'] and isinstance(part['body'], dict):
+                orders_data.append(part['body'])
+            else:
+                logging.warning(f"⚠️ Could not fetch Sales Order {doc_entry}: {part['error']}")
+
+        try:
+            synced = len(sync_sales_orders(orders_data))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error syncing Sales Orders to local DB: {str(e)}")
+            return 0
+        
+        logging.info(f"✅ Synced {synced}/{len(doc_entries)} Sales Orders from one $batch request")
+        return synced
+
     def enhance_picklist_with_sales_order_data(self, picklist_lines):
         """Enhance picklist lines with Sales Order item details"""
         enhanced_lines = []
         
         try:
             from app import db
-            from models import SalesOrder, SalesOrderLine
+            from models import SalesOrder
+            from pick_list_sync import load_sales_order_lines
+            
+            # Fetch every Sales Order that is not yet stored locally in one $batch request
+            order_entries = {
+                line.get('OrderEntry') for line in picklist_lines
+                if line.get('OrderEntry') and line.get('OrderRowID') is not None
+            }
+            local_entries = set()
+            if order_entries:
+                local_entries = {
+                    row.doc_entry for row in
+                    db.session.query(SalesOrder.doc_entry).filter(SalesOrder.doc_entry.in_(order_entries)).all()
+                }
+                missing_entries = sorted(order_entries - local_entries)
+                if missing_entries:
+                    self.fetch_and_sync_sales_orders(missing_entries)
+
+            # Every referenced Sales Order line in one query
+            order_lines = load_sales_order_lines(
+                (line.get('OrderEntry'), line.get('OrderRowID')) for line in picklist_lines
+                if line.get('OrderEntry') and line.get('OrderRowID') is not None
+            )
+            synced_entries = {doc_entry for doc_entry, _ in order_lines}
             
             for line in picklist_lines:
                 enhanced_line = line.copy()
@@ -3561,43 +3240,28 @@ class SAPIntegration:
                 order_row_id = line.get('OrderRowID')
                 
                 if order_entry and order_row_id is not None:
-                    # First try to get from local database
-                    sales_order = SalesOrder.query.filter_by(doc_entry=order_entry).first()
-                    
-                    if not sales_order:
-                        # Fetch from SAP B1 and sync to local
-                        sap_result = self.get_sales_order_by_doc_entry(order_entry)
-                        if sap_result.get('success'):
-                            sync_result = self.sync_sales_order_to_local_db(sap_result['sales_order'])
-                            if sync_result.get('success'):
-                                sales_order = SalesOrder.query.filter_by(doc_entry=order_entry).first()
-                    
-                    if sales_order:
-                        # Get the specific line based on OrderRowID (which corresponds to LineNum)
-                        order_line = SalesOrderLine.query.filter_by(
-                            sales_order_id=sales_order.id,
-                            line_num=order_row_id
-                        ).first()
+                    # OrderRowID corresponds to the Sales Order LineNum
+                    sales_order, order_line = order_lines.get((order_entry, order_row_id), (None, None))
+
+                    if order_line:
+                        # Enhance the picklist line with Sales Order data directly on the line object
+                        enhanced_line.update({
+                            'ItemCode': order_line.item_code,
+                            'ItemDescription': order_line.item_description,
+                            'SalesOrderDocNum': sales_order.doc_num,
+                            'CustomerCode': sales_order.card_code,
+                            'CustomerName': sales_order.card_name,
+                            'OrderQuantity': order_line.quantity,
+                            'OpenQuantity': order_line.open_quantity,
+                            'UnitOfMeasure': order_line.unit_of_measure,
+                            'WarehouseCode': order_line.warehouse_code,
+                            'UnitPrice': order_line.unit_price,
+                            'LineTotal': order_line.line_total
+                        })
                         
-                        if order_line:
-                            # Enhance the picklist line with Sales Order data directly on the line object
-                            enhanced_line.update({
-                                'ItemCode': order_line.item_code,
-                                'ItemDescription': order_line.item_description,
-                                'SalesOrderDocNum': sales_order.doc_num,
-                                'CustomerCode': sales_order.card_code,
-                                'CustomerName': sales_order.card_name,
-                                'OrderQuantity': order_line.quantity,
-                                'OpenQuantity': order_line.open_quantity,
-                                'UnitOfMeasure': order_line.unit_of_measure,
-                                'WarehouseCode': order_line.warehouse_code,
-                                'UnitPrice': order_line.unit_price,
-                                'LineTotal': order_line.line_total
-                            })
-                            
-                            logging.info(f"✅ Enhanced picklist line {line.get('LineNumber')} with Sales Order data: {order_line.item_code}")
-                        else:
-                            logging.warning(f"⚠️ Sales Order line not found: OrderEntry={order_entry}, OrderRowID={order_row_id}")
+                        logging.debug(f"✅ Enhanced picklist line {line.get('LineNumber')} with Sales Order data: {order_line.item_code}")
+                    elif order_entry in local_entries or order_entry in synced_entries:
+                        logging.warning(f"⚠️ Sales Order line not found: OrderEntry={order_entry}, OrderRowID={order_row_id}")
                     else:
                         logging.warning(f"⚠️ Could not sync Sales Order: OrderEntry={order_entry}")
                 else:
@@ -3685,114 +3349,122 @@ class SAPIntegration:
                 'error': f'Validation error: {str(e)}'
             }
 
-    def validate_batch_series_with_warehouse(self, serial_numbers, item_code, warehouse_code, batch_size=100):
+    def validate_batch_series_with_warehouse(self, serial_numbers, item_code, warehouse_code,
+                                             batch_size=BATCH_SERIES_VALIDATION_SIZE, max_workers=4):
         """Batch validate multiple series against SAP B1 API for improved performance
-        
+
+        Warehouse locations come from the short-lived 'serial_locations' cache where
+        possible; the remaining serials are looked up with the registered
+        Batch_Series_Validation query, one call per chunk of ``batch_size`` serials,
+        with the chunks run in parallel over the pooled SAP sessions.
+
+        Parameter values are pasted into the '&'-joined ParamList as-is, so a serial
+        containing ' or & would corrupt the call for its whole chunk. Such serials
+        are not batched; they get a 'batch_unsupported' result and are left to
+        per-serial validation.
+
         Args:
             serial_numbers: List of serial numbers to validate
             item_code: The item code to check against
             warehouse_code: Warehouse code to check series availability
-            batch_size: Number of serials to process in each batch (default 100)
-            
+            batch_size: Number of serials per SAP call (at most BATCH_SERIES_VALIDATION_SIZE)
+            max_workers: Number of chunks validated concurrently
+
         Returns:
             Dict with validation results for each serial number
         """
-        if not self.ensure_logged_in():
-            logging.warning("SAP B1 not available, cannot validate batch series")
-            return {serial: {'valid': False, 'error': 'SAP B1 not available'} for serial in serial_numbers}
-        
+        from concurrent.futures import ThreadPoolExecutor
+
         if not serial_numbers:
             return {}
-            
+
+        if not self.ensure_logged_in():
+            logging.warning("SAP B1 not available, cannot validate batch series")
+            return {serial: {'valid': False, 'error': 'SAP B1 not available', 'validation_type': 'batch_unavailable'}
+                    for serial in serial_numbers}
+
+        unique_serials = list(dict.fromkeys(serial_numbers))
+        batch_size = max(1, min(batch_size, BATCH_SERIES_VALIDATION_SIZE))
         results = {}
-        total_serials = len(serial_numbers)
-        
+        pending = []
+        for serial in unique_serials:
+            if not self._param_list_safe(serial) or not self._param_list_safe(item_code):
+                results[serial] = {'valid': False, 'error': f'Series {serial} cannot be validated in a batch',
+                                   'validation_type': 'batch_unsupported'}
+                continue
+            found, location = master_data_cache.get('serial_locations', (self.company_db, item_code, serial))
+            if found:
+                results[serial] = self._serial_location_result(serial, location, warehouse_code)
+            else:
+                pending.append(serial)
+
         try:
-            # Process serials in batches to avoid API limits and improve performance
-            for i in range(0, total_serials, batch_size):
-                batch = serial_numbers[i:i+batch_size]
-                batch_results = self._validate_batch_chunk(batch, item_code, warehouse_code)
-                results.update(batch_results)
-                
-                # Log progress for large batches
-                if total_serials > 100:
-                    processed = min(i + batch_size, total_serials)
-                    logging.info(f"📊 Batch validation progress: {processed}/{total_serials} serial numbers processed")
-            
-            logging.info(f"✅ Completed batch validation for {total_serials} serial numbers")
+            chunks = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+            if chunks:
+                workers = max(1, min(max_workers, len(chunks)))
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    for batch_results in executor.map(bind_context(
+                            lambda chunk: self._validate_batch_chunk(chunk, item_code, warehouse_code)), chunks):
+                        results.update(batch_results)
+
+            logging.info(f"✅ Completed batch validation for {len(unique_serials)} serial numbers "
+                         f"({len(unique_serials) - len(pending)} cached, {len(chunks)} SAP calls)")
             return results
-            
+
         except Exception as e:
             logging.error(f"❌ Error in batch series validation: {str(e)}")
             # Return error for all serials if batch fails
-            return {serial: {'valid': False, 'error': f'Batch validation error: {str(e)}'} for serial in serial_numbers}
-    
+            return {serial: {'valid': False, 'error': f'Batch validation error: {str(e)}',
+                             'validation_type': 'batch_exception'} for serial in serial_numbers}
+
+    @staticmethod
+    def _param_list_safe(value):
+        """True if value can be sent as a quoted SQLQueries ParamList value without escaping"""
+        value = str(value or '')
+        return "'" not in value and '&' not in value
+
     def _validate_batch_chunk(self, serial_batch, item_code, warehouse_code):
-        """Validate a chunk of serial numbers using SAP B1 bulk query
-        
+        """Validate a chunk of serial numbers with one Batch_Series_Validation call
+
         Args:
-            serial_batch: List of serial numbers in this chunk
-            item_code: The item code to check against  
+            serial_batch: List of at most BATCH_SERIES_VALIDATION_SIZE serial numbers
+            item_code: The item code to check against
             warehouse_code: Warehouse code to check series availability
-            
+
         Returns:
             Dict with validation results for each serial in the batch
         """
         results = {}
-        
+
         try:
-            # Create SQL query for batch validation
-            serial_list = "','".join(serial_batch)
-            sql_query = f"""
-            SELECT 
-                SN.DistNumber as SerialNumber,
-                SN.ItemCode,
-                SN.WhsCode,
-                CASE WHEN SN.WhsCode = '{warehouse_code}' THEN 1 ELSE 0 END as AvailableInWarehouse
-            FROM OSRN SN 
-            WHERE SN.DistNumber IN ('{serial_list}')
-            AND SN.ItemCode = '{item_code}'
-            """
-            
-            # Use custom SQL query endpoint
             api_url = f"{self.base_url}/b1s/v1/SQLQueries('Batch_Series_Validation')/List"
-            
+
+            # Unused serial slots repeat the last serial, which does not change the result
+            slots = list(serial_batch) + [serial_batch[-1]] * (BATCH_SERIES_VALIDATION_SIZE - len(serial_batch))
+            params = [f"itemCode='{item_code}'"] + [f"s{index}='{serial}'" for index, serial in enumerate(slots, 1)]
             payload = {
-                "ParamList": f"sqlQuery={sql_query}"
+                "ParamList": '&'.join(params)
             }
-            
+
             response = self.session.post(api_url, json=payload, timeout=60)
-            
+
             if response.status_code == 200:
-                data = response.json()
-                found_serials = {item.get('SerialNumber'): item for item in data.get('value', [])}
-                
-                # Process each serial in the batch
+                locations = {}
+                for row in response.json().get('value', []):
+                    location = locations.setdefault(row.get('DistNumber'), {
+                        'DistNumber': row.get('DistNumber'),
+                        'ItemCode': row.get('ItemCode'),
+                        'warehouses': [],
+                    })
+                    # WhsCode is NULL for a serial that exists but has no stock anywhere
+                    if row.get('WhsCode'):
+                        location['warehouses'].append(row['WhsCode'])
+
                 for serial in serial_batch:
-                    if serial in found_serials:
-                        series_data = found_serials[serial]
-                        available_in_warehouse = bool(series_data.get('AvailableInWarehouse', 0))
-                        
-                        results[serial] = {
-                            'valid': True,
-                            'DistNumber': series_data.get('SerialNumber'),
-                            'ItemCode': series_data.get('ItemCode'),
-                            'WhsCode': series_data.get('WhsCode'),
-                            'available_in_warehouse': available_in_warehouse,
-                            'validation_type': 'batch_warehouse_specific' if available_in_warehouse else 'batch_warehouse_unavailable',
-                            'message': f'Series {serial} validated in batch'
-                        }
-                        
-                        if not available_in_warehouse:
-                            results[serial]['warning'] = f'Series {serial} is not available in warehouse {warehouse_code}'
-                    else:
-                        # Serial not found in SAP
-                        results[serial] = {
-                            'valid': False,
-                            'error': f'Series {serial} not found in SAP system',
-                            'available_in_warehouse': False,
-                            'validation_type': 'batch_not_found'
-                        }
+                    location = locations.get(serial)
+                    if location is not None:
+                        master_data_cache.set('serial_locations', (self.company_db, item_code, serial), location)
+                    results[serial] = self._serial_location_result(serial, location, warehouse_code)
             else:
                 # API error - mark all serials as failed
                 error_msg = f'SAP API error: {response.status_code} - {response.text}'
@@ -3802,7 +3474,7 @@ class SAPIntegration:
                         'error': error_msg,
                         'validation_type': 'batch_api_error'
                     }
-                
+
         except Exception as e:
             logging.error(f"❌ Error in batch chunk validation: {str(e)}")
             # Mark all serials in chunk as failed
@@ -3813,9 +3485,42 @@ class SAPIntegration:
                     'error': error_msg,
                     'validation_type': 'batch_exception'
                 }
-        
+
         return results
 
+    @staticmethod
+    def _serial_location_result(serial, location, warehouse_code):
+        """Batch validation result of one serial from its cached or freshly read location"""
+        if location is None:
+            # Serial not found in SAP
+            return {
+                'valid': False,
+                'error': f'Series {serial} not found in SAP system',
+                'available_in_warehouse': False,
+                'validation_type': 'batch_not_found'
+            }
+
+        available_in_warehouse = warehouse_code in location['warehouses']
+        result = {
+            'valid': True,
+            'DistNumber': location['DistNumber'],
+            'ItemCode': location['ItemCode'],
+            'WhsCode': warehouse_code if available_in_warehouse else next(iter(location['warehouses']), None),
+            'available_in_warehouse': available_in_warehouse,
+            'validation_type': 'batch_warehouse_specific' if available_in_warehouse else 'batch_warehouse_unavailable',
+            'message': f'Series {serial} validated in batch'
+        }
+        if not available_in_warehouse:
+            result['warning'] = f'Series {serial} is not available in warehouse {warehouse_code}'
+        return result
+
+    def invalidate_serial_locations(self, stock_transfer):
+        """Forget the cached warehouse of every serial moved by a posted StockTransfers payload"""
+        master_data_cache.invalidate_keys('serial_locations', [
+            (self.company_db, line.get('ItemCode'), serial.get('InternalSerialNumber'))
+            for line in stock_transfer.get('StockTransferLines', [])
+            for serial in line.get('SerialNumbers') or []
+        ])
 
     def create_serial_number_stock_transfer(self, serial_transfer_document):
         """Create Stock Transfer in SAP B1 for Serial Number Transfer
@@ -3923,6 +3628,7 @@ class SAPIntegration:
             
             if response.status_code == 201:
                 result = response.json()
+                self.invalidate_serial_locations(transfer_data)
                 doc_num = result.get('DocNum')
                 logging.info(f"✅ Successfully created Serial Number Stock Transfer {doc_num}")
                 
@@ -3942,13 +3648,13 @@ class SAPIntegration:
             logging.error(error_msg)
             return {'success': False, 'error': error_msg}
 
-    def post_inventory_transfer_to_sap(self, transfer_document):
+    def post_inventory_transfer_to_sap(self, transfer_document, journal_memo=None):
         """Post inventory transfer to SAP B1 as Stock Transfer"""
         try:
             logging.info(f"🚀 Posting Inventory Transfer {transfer_document.id} to SAP B1...")
             
             # Use the existing create_inventory_transfer function
-            result = self.create_inventory_transfer(transfer_document)
+            result = self.create_inventory_transfer(transfer_document, journal_memo=journal_memo)
             
             if result.get('success'):
                 logging.info(f"✅ Inventory Transfer {transfer_document.id} posted successfully to SAP B1")
@@ -4067,6 +3773,11 @@ class SAPIntegration:
         return f'Item {item_code}'
 
     def get_warehouses(self):
+        """Get warehouse list from SAP B1, cached process-wide"""
+        return master_data_cache.get_or_load('warehouses', (self.company_db, 'list'),
+                                             self._fetch_warehouses)
+
+    def _fetch_warehouses(self):
         """Get warehouse list from SAP B1"""
         try:
             if not self.ensure_logged_in():
@@ -4150,7 +3861,7 @@ class SAPIntegration:
                 'error': f'Error validating item: {str(e)}'
             }
 
-    def post_direct_inventory_transfer_to_sap(self, transfer):
+    def post_direct_inventory_transfer_to_sap(self, transfer, journal_memo=None):
         """
         Post Direct Inventory Transfer to SAP B1 as StockTransfer
         Handles both serial and batch managed items
@@ -4202,12 +3913,15 @@ class SAPIntegration:
                 'ToWarehouse': transfer.to_warehouse,
                 'StockTransferLines': stock_transfer_lines
             }
+            if journal_memo:
+                payload['JournalMemo'] = journal_memo
             
             url = f"{self.base_url}/b1s/v1/StockTransfers"
             response = self.session.post(url, json=payload, timeout=30)
             
             if response.status_code in [200, 201]:
                 data = response.json()
+                self.invalidate_serial_locations(payload)
                 doc_num = data.get('DocNum')
                 doc_entry = data.get('DocEntry')
                 
@@ -4576,6 +4290,7 @@ class SAPIntegration:
             
             if response.status_code == 201:
                 result = response.json()
+                self.invalidate_serial_locations(stock_transfer_data)
                 doc_num = result.get('DocNum')
                 doc_entry = result.get('DocEntry')
                 
@@ -4613,15 +4328,14 @@ class SAPIntegration:
             }
 
     def logout(self):
-        """Logout from SAP B1"""
+        """Release this instance's hold on the SAP B1 session.
+
+        Sessions are shared process-wide through the pool, so this no longer
+        ends the Service Layer session; use the pool's close() for that.
+        """
         if self.session_id:
-            try:
-                logout_url = f"{self.base_url}/b1s/v1/Logout"
-                self.session.post(logout_url)
-                self.session_id = None
-                logging.info("Logged out from SAP B1")
-            except Exception as e:
-                logging.error(f"Error logging out from SAP B1: {str(e)}")
+            self.session_id = None
+            logging.info("Released SAP B1 pooled session")
 
 
 # Create global SAP integration instance for backward compatibility
@@ -0,0 +1,228 @@
+"""
+SAP B1 Service Layer OData $batch support
+Packs many independent Service Layer requests into one multipart/mixed
+POST /b1s/v1/$batch call and parses the per-part responses.
+
+Operations are plain dicts:
+    {'method': 'GET', 'path': "Orders(123)"}
+    {'method': 'PATCH', 'path': "Items('A1')", 'body': {...}}
+Write operations that must succeed or fail together are wrapped in a changeset:
+    {'changeset': [op, op, ...]}
+"""
+
+import json
+import logging
+import urllib.parse
+import uuid
+
+SERVICE_ROOT = '/b1s/v1/'
+
+# Characters that Service Layer accepts unescaped in a $batch request line
+_REQUEST_LINE_SAFE = "/$()',=&?:*;@+"
+
+
+def _request_path(path):
+    path = path.lstrip('/')
+    if path.startswith('b1s/v1/'):
+        path = path[len('b1s/v1/'):]
+    return SERVICE_ROOT + urllib.parse.quote(path, safe=_REQUEST_LINE_SAFE)
+
+
+def _encode_operation(operation, content_id=None):
+    method = operation.get('method', 'GET').upper()
+    lines = [
+        'Content-Type: application/http',
+        'Content-Transfer-Encoding: binary',
+    ]
+    if content_id is not None:
+        lines.append(f'Content-ID: {content_id}')
+    lines.append('')
+    lines.append(f"{method} {_request_path(operation['path'])}")
+
+    body = operation.get('body')
+    if body is not None:
+        lines.append('Content-Type: application/json')
+        lines.append('')
+        lines.append(body if isinstance(body, str) else json.dumps(body))
+    else:
+        lines.append('')
+    lines.append('')
+    return '\r\n'.join(lines)
+
+
+def build_batch_request(operations):
+    """Encode operations as a multipart/mixed $batch body.
+
+    Returns (content_type, body, expected_part_count).
+    """
+    batch_boundary = f'batch_{uuid.uuid4().hex}'
+    chunks = []
+    part_count = 0
+
+    for operation in operations:
+        if 'changeset' in operation:
+            changeset_boundary = f'changeset_{uuid.uuid4().hex}'
+            inner = []
+            for index, write_op in enumerate(operation['changeset'], start=1):
+                inner.append(f'--{changeset_boundary}\r\n' + _encode_operation(write_op, content_id=index))
+                part_count += 1
+            inner.append(f'--{changeset_boundary}--\r\n')
+            chunks.append(
+                f'--{batch_boundary}\r\n'
+                f'Content-Type: multipart/mixed;boundary={changeset_boundary}\r\n'
+                f'\r\n' + ''.join(inner)
+            )
+        else:
+            chunks.append(f'--{batch_boundary}\r\n' + _encode_operation(operation))
+            part_count += 1
+
+    chunks.append(f'--{batch_boundary}--\r\n')
+    return f'multipart/mixed;boundary={batch_boundary}', ''.join(chunks), part_count
+
+
+def _boundary_from_content_type(content_type):
+    for param in (content_type or '').split(';')[1:]:
+        key, _, value = param.strip().partition('=')
+        if key.lower() == 'boundary':
+            return value.strip('"')
+    return None
+
+
+def _split_headers(text):
+    head, _, rest = text.partition('\n\n')
+    headers = {}
+    for line in head.split('\n'):
+        key, sep, value = line.partition(':')
+        if sep:
+            headers[key.strip().lower()] = value.strip()
+    return headers, rest
+
+
+def _parse_http_part(text):
+    status_line, _, rest = text.lstrip('\n').partition('\n')
+    try:
+        status_code = int(status_line.split(' ')[1])
+    except (IndexError, ValueError):
+        status_code = 0
+    headers, body = _split_headers(rest)
+    body = body.strip()
+
+    parsed = None
+    if body:
+        try:
+            parsed = json.loads(body)
+        except ValueError:
+            parsed = body
+
+    error = None
+    if status_code >= 400:
+        error = body or f'HTTP {status_code}'
+        if isinstance(parsed, dict) and isinstance(parsed.get('error'), dict):
+            message = parsed['error'].get('message')
+            if isinstance(message, dict):
+                error = message.get('value') or error
+            elif message:
+                error = message
+
+    return {
+        'status_code': status_code,
+        'success': 200 <= status_code < 300,
+        'headers': headers,
+        'body': parsed,
+        'error': error,
+    }
+
+
+def _parse_multipart(text, boundary):
+    """Top-level parts in order: a result dict per operation, a list of result
+    dicts per changeset"""
+    delimiter = f'--{boundary}'
+    responses = []
+    for chunk in text.split(delimiter)[1:]:
+        if chunk.startswith('--'):
+            break
+        mime_headers, content = _split_headers(chunk.lstrip('\n'))
+        content_type = mime_headers.get('content-type', '')
+        if content_type.lower().startswith('multipart/mixed'):
+            responses.append(_parse_multipart(content, _boundary_from_content_type(content_type)))
+        else:
+            responses.append(_parse_http_part(content))
+    return responses
+
+
+def _parse_batch_parts(content_type, body):
+    boundary = _boundary_from_content_type(content_type)
+    if not boundary:
+        raise ValueError(f'$batch response has no multipart boundary: {content_type}')
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', errors='replace')
+    return _parse_multipart(body.replace('\r\n', '\n'), boundary)
+
+
+def parse_batch_response(content_type, body):
+    """Parse a $batch multipart/mixed response into a flat list of part results"""
+    results = []
+    for part in _parse_batch_parts(content_type, body):
+        results.extend(part if isinstance(part, list) else [part])
+    return results
+
+
+def _failed_parts(count, error):
+    return [{'status_code': 0, 'success': False, 'headers': {}, 'body': None, 'error': error}
+            for _ in range(count)]
+
+
+def _align_parts(operations, parts):
+    """One result per operation of ``operations``, changesets flattened in order.
+
+    A changeset that fails is answered with a single error part (bare or in its
+    own multipart) instead of one response per operation; that part is copied
+    to each of the changeset's operations, so the results after it stay in place.
+    """
+    results = []
+    for index, operation in enumerate(operations):
+        count = len(operation['changeset']) if 'changeset' in operation else 1
+        part = parts[index] if index < len(parts) else None
+        if part is None:
+            results.extend(_failed_parts(count, 'Missing $batch part'))
+            continue
+        if not isinstance(part, list):
+            part = [part]
+        if len(part) == count:
+            results.extend(part)
+        elif part:
+            results.extend(dict(part[-1]) for _ in range(count))
+        else:
+            results.extend(_failed_parts(count, 'Missing $batch part'))
+    return results
+
+
+def execute_batch(session, base_url, operations, chunk_size=50, timeout=120):
+    """Send operations through ``session`` as one or more $batch calls.
+
+    Returns one result dict per operation (changesets are flattened in order):
+    {'status_code', 'success', 'headers', 'body', 'error'}. A transport failure
+    marks every part of the affected chunk as failed instead of raising.
+    """
+    results = []
+    batch_url = f"{base_url.rstrip('/')}/b1s/v1/$batch"
+
+    for start in range(0, len(operations), chunk_size):
+        chunk = operations[start:start + chunk_size]
+        content_type, payload, part_count = build_batch_request(chunk)
+        try:
+            response = session.post(batch_url, data=payload.encode('utf-8'),
+                                    headers={'Content-Type': content_type}, timeout=timeout)
+            if response.status_code not in (200, 202):
+                logging.error(f"❌ SAP $batch failed: {response.status_code} - {response.text[:500]}")
+                results.extend(_failed_parts(part_count, f'SAP $batch error: {response.status_code}'))
+                continue
+
+            parts = _parse_batch_parts(response.headers.get('Content-Type', ''), response.content)
+            results.extend(_align_parts(chunk, parts))
+            logging.debug(f"SAP $batch: {part_count} operations in one request")
+        except Exception as e:
+            logging.error(f"❌ Error executing SAP $batch: {str(e)}")
+            results.extend(_failed_parts(part_count, str(e)))
+
+    return results
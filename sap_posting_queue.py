@@ -0,0 +1,405 @@
+"""
+Durable SAP B1 posting queue
+QC approvals enqueue a SAPPostingJob row instead of posting inside the HTTP request;
+worker threads claim due jobs from the database, post them to SAP with bounded
+concurrency and exponential backoff, and write the DocEntry/DocNum or error back.
+
+Run the worker inside the web process (default) or as a separate process:
+    SAP_POSTING_IN_PROCESS_WORKER=false   # on the web servers
+    python sap_posting_queue.py           # dedicated worker process
+"""
+
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+from sqlalchemy import update
+
+from sap_session_pool import capture_transport_errors
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+ACTIVE_STATUSES = (JOB_QUEUED, JOB_RUNNING)
+
+DEFAULT_MAX_ATTEMPTS = int(os.environ.get('SAP_POSTING_MAX_ATTEMPTS', '5'))
+BACKOFF_BASE_SECONDS = float(os.environ.get('SAP_POSTING_BACKOFF_BASE', '15'))
+BACKOFF_MAX_SECONDS = float(os.environ.get('SAP_POSTING_BACKOFF_MAX', '900'))
+
+# job_type -> (post function, on_failure callback)
+POSTING_HANDLERS = {}
+
+
+def posting_handler(job_type, on_failure=None):
+    """Register ``func(job)`` as the SAP posting function for ``job_type``.
+
+    The function loads the document, posts it and writes the SAP result back on
+    success; it returns ``{'success', 'doc_entry', 'doc_num', 'error'}`` and may
+    set ``'retryable'`` to override the error classification. ``on_failure(job, error)``
+    runs once the job has given up so the document can record the error.
+
+    Before posting, the function stores the reference it sends to SAP with
+    ``set_job_reference`` and calls ``find_earlier_posting`` so a retry picks up
+    the document an earlier attempt may already have created.
+    """
+    def decorator(func):
+        POSTING_HANDLERS[job_type] = (func, on_failure)
+        return func
+    return decorator
+
+
+def is_retryable_exception(error):
+    """Only failures where the request never reached SAP are retried.
+
+    A read timeout is not: SAP may have committed the document before the
+    response was lost, so reposting it would create a duplicate.
+    """
+    if isinstance(error, requests.exceptions.ReadTimeout):
+        return False
+    return isinstance(error, (requests.exceptions.ConnectionError,
+                              requests.exceptions.ConnectTimeout))
+
+
+def set_job_reference(job, reference):
+    """Commit the reference (NumAtCard / JournalMemo) sent to SAP before posting it"""
+    from app import db
+
+    if job.sap_reference != reference:
+        job.sap_reference = reference
+        db.session.commit()
+    return reference
+
+
+def find_earlier_posting(job, sap, entity, field):
+    """On a retry, look up the document an earlier attempt of this job may have created.
+
+    Returns a successful handler result for the SAP document whose ``field`` equals
+    the job's reference, or None when there is none (or this is the first attempt).
+    Raises when SAP cannot be checked, so the job is never re-posted blind.
+    """
+    if job.attempts <= 1 or not job.sap_reference:
+        return None
+
+    reference = job.sap_reference.replace("'", "''")
+    response = sap.session.get(
+        f"{sap.base_url}/b1s/v1/{entity}",
+        params={
+            '$filter': f"{field} eq '{reference}'",
+            '$select': 'DocEntry,DocNum',
+            '$orderby': 'DocEntry desc',
+            '$top': 1,
+        },
+        timeout=30,
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f'Could not check SAP {entity} for {field} {job.sap_reference}: '
+                           f'{response.status_code} - {response.text}')
+
+    rows = response.json().get('value', [])
+    if not rows:
+        return None
+    logger.warning(f"⚠️ SAP posting job {job.id}: {entity} {rows[0].get('DocNum')} already exists "
+                   f"for {field} {job.sap_reference} - not posting again")
+    return {'success': True, 'doc_entry': rows[0].get('DocEntry'), 'doc_num': rows[0].get('DocNum')}
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter for the given number of attempts so far"""
+    delay = min(BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), BACKOFF_MAX_SECONDS)
+    return delay + random.uniform(0, delay * 0.1)
+
+
+def find_active_job(job_type, document_id):
+    from models import SAPPostingJob
+    return (SAPPostingJob.query
+            .filter(SAPPostingJob.job_type == job_type,
+                    SAPPostingJob.document_id == document_id,
+                    SAPPostingJob.status.in_(ACTIVE_STATUSES))
+            .order_by(SAPPostingJob.id.desc())
+            .first())
+
+
+def enqueue_posting_job(job_type, document_id, created_by=None, max_attempts=None):
+    """Queue a posting job and commit it together with pending document changes.
+
+    Returns the already-active job for the same document instead of queueing a
+    second posting of it.
+    """
+    from app import db
+    from models import SAPPostingJob
+
+    if job_type not in POSTING_HANDLERS:
+        raise ValueError(f'No SAP posting handler registered for {job_type}')
+
+    job = find_active_job(job_type, document_id)
+    if job is None:
+        job = SAPPostingJob(
+            job_type=job_type,
+            document_id=document_id,
+            status=JOB_QUEUED,
+            max_attempts=max_attempts or DEFAULT_MAX_ATTEMPTS,
+            next_attempt_at=datetime.utcnow(),
+            created_by=created_by,
+        )
+        db.session.add(job)
+    db.session.commit()
+
+    logger.info(f"📥 SAP posting job {job.id} queued: {job_type} #{document_id}")
+    sap_posting_worker.notify()
+    return job
+
+
+def job_response(job, message):
+    """JSON body returned by approval endpoints after queueing a posting"""
+    return {
+        'success': True,
+        'queued': True,
+        'job_id': job.id,
+        'job_status': job.status,
+        'status_url': f'/api/sap-posting-jobs/{job.id}',
+        'message': message,
+    }
+
+
+def _as_int(value):
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class SAPPostingWorker:
+    """Dispatcher thread plus a bounded pool of posting threads"""
+
+    def __init__(self, concurrency=2, poll_interval=2.0, lock_timeout=900):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lock_timeout = lock_timeout
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self._app = None
+        self._executor = None
+        self._dispatcher = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._dispatcher is not None and self._dispatcher.is_alive()
+
+    def start(self, app):
+        with self._lock:
+            if self.running:
+                return
+            self._app = app
+            self._stopping.clear()
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency,
+                                                thread_name_prefix='sap-posting')
+            self._dispatcher = threading.Thread(target=self._dispatch_loop,
+                                                name='sap-posting-dispatcher', daemon=True)
+            self._dispatcher.start()
+        logger.info(f"✅ SAP posting worker started ({self.worker_id}, concurrency={self.concurrency})")
+
+    def stop(self, wait=True):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._dispatcher:
+            self._dispatcher.join(timeout=self.poll_interval * 2)
+        if self._executor:
+            self._executor.shutdown(wait=wait)
+        self._dispatcher = None
+        self._executor = None
+
+    def notify(self):
+        self._wakeup.set()
+
+    def _free_slots(self):
+        with self._lock:
+            return self.concurrency - self._in_flight
+
+    def _dispatch_loop(self):
+        while not self._stopping.is_set():
+            try:
+                with self._app.app_context():
+                    self._fail_stale_jobs()
+                    for job_id in self._claim_due_jobs(self._free_slots()):
+                        with self._lock:
+                            self._in_flight += 1
+                        self._executor.submit(self._run_job, job_id)
+            except Exception as e:
+                logger.error(f"❌ SAP posting dispatcher error: {str(e)}")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _claim_due_jobs(self, limit):
+        from app import db
+        from models import SAPPostingJob
+
+        if limit <= 0:
+            return []
+        now = datetime.utcnow()
+        candidates = [row.id for row in (SAPPostingJob.query
+                                         .with_entities(SAPPostingJob.id)
+                                         .filter(SAPPostingJob.status == JOB_QUEUED,
+                                                 SAPPostingJob.next_attempt_at <= now)
+                                         .order_by(SAPPostingJob.next_attempt_at)
+                                         .limit(limit)
+                                         .all())]
+        claimed = []
+        for job_id in candidates:
+            # Conditional update so only one worker (thread or process) wins each job
+            result = db.session.execute(
+                update(SAPPostingJob)
+                .where(SAPPostingJob.id == job_id, SAPPostingJob.status == JOB_QUEUED)
+                .values(status=JOB_RUNNING, attempts=SAPPostingJob.attempts + 1,
+                        locked_by=self.worker_id, locked_at=now, updated_at=now)
+            )
+            db.session.commit()
+            if result.rowcount == 1:
+                claimed.append(job_id)
+        return claimed
+
+    def _fail_stale_jobs(self):
+        """Jobs left running by a crashed worker are failed rather than re-posted blind"""
+        from models import SAPPostingJob
+
+        cutoff = datetime.utcnow() - timedelta(seconds=self.lock_timeout)
+        stale = (SAPPostingJob.query
+                 .filter(SAPPostingJob.status == JOB_RUNNING, SAPPostingJob.locked_at < cutoff)
+                 .all())
+        for job in stale:
+            logger.warning(f"⚠️ SAP posting job {job.id} abandoned by {job.locked_by}")
+            self._give_up(job, 'Posting worker stopped while posting to SAP B1. '
+                               'Check SAP for the document before retrying.')
+
+    def _run_job(self, job_id):
+        try:
+            with self._app.app_context():
+                self._process(job_id)
+        except Exception as e:
+            logger.error(f"❌ SAP posting job {job_id} crashed: {str(e)}")
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._wakeup.set()
+
+    def _process(self, job_id):
+        from app import db
+        from models import SAPPostingJob
+
+        job = db.session.get(SAPPostingJob, job_id)
+        if job is None or job.status != JOB_RUNNING:
+            return
+
+        handler, _ = POSTING_HANDLERS.get(job.job_type, (None, None))
+        if handler is None:
+            self._give_up(job, f'No SAP posting handler registered for {job.job_type}')
+            return
+
+        logger.info(f"📤 SAP posting job {job.id}: {job.job_type} #{job.document_id} (attempt {job.attempts}/{job.max_attempts})")
+        started = time.monotonic()
+        # SAP clients turn transport exceptions into error strings; capture the exceptions
+        # themselves so the failure is classified by type, not by message text
+        with capture_transport_errors() as outcomes:
+            try:
+                result = handler(job) or {}
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"❌ SAP posting job {job.id} raised: {str(e)}")
+                result = {'success': False, 'error': str(e)}
+                outcomes.append(e)
+
+        if not result.get('success'):
+            # Drop partial document changes; on_failure records the error explicitly
+            db.session.rollback()
+        job = db.session.get(SAPPostingJob, job_id)
+        elapsed = time.monotonic() - started
+
+        if result.get('success'):
+            job.status = JOB_SUCCEEDED
+            job.sap_doc_entry = _as_int(result.get('doc_entry'))
+            job.sap_doc_num = str(result['doc_num']) if result.get('doc_num') is not None else None
+            job.last_error = None
+            job.completed_at = datetime.utcnow()
+            job.locked_by = None
+            db.session.commit()
+            logger.info(f"✅ SAP posting job {job.id} succeeded in {elapsed:.1f}s: DocNum={job.sap_doc_num}")
+            return
+
+        error = result.get('error') or 'Unknown SAP error'
+        retryable = result.get('retryable')
+        if retryable is None:
+            # The last SAP call decides: a connection that never opened is safe to retry
+            retryable = bool(outcomes) and is_retryable_exception(outcomes[-1])
+
+        if retryable and job.attempts < job.max_attempts:
+            delay = retry_delay(job.attempts)
+            job.status = JOB_QUEUED
+            job.last_error = error
+            job.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+            job.locked_by = None
+            db.session.commit()
+            logger.warning(f"⚠️ SAP posting job {job.id} failed after {elapsed:.1f}s, retrying in {delay:.0f}s: {error}")
+        else:
+            self._give_up(job, error)
+
+    def _give_up(self, job, error):
+        from app import db
+
+        job.status = JOB_FAILED
+        job.last_error = error
+        job.completed_at = datetime.utcnow()
+        job.locked_by = None
+        db.session.commit()
+        logger.error(f"❌ SAP posting job {job.id} failed: {error}")
+
+        _, on_failure = POSTING_HANDLERS.get(job.job_type, (None, None))
+        if on_failure:
+            try:
+                on_failure(job, error)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"❌ Failure callback for SAP posting job {job.id} raised: {str(e)}")
+
+
+sap_posting_worker = SAPPostingWorker(
+    concurrency=int(os.environ.get('SAP_POSTING_WORKERS', '2')),
+    poll_interval=float(os.environ.get('SAP_POSTING_POLL_INTERVAL', '2')),
+    lock_timeout=int(os.environ.get('SAP_POSTING_LOCK_TIMEOUT', '900')),
+)
+
+
+def start_sap_posting_worker(app):
+    if multiprocessing.parent_process() is not None:
+        # Helper processes (e.g. the QR render pool) re-import the app; only the server posts
+        return
+    if os.environ.get('SAP_POSTING_IN_PROCESS_WORKER', 'true').lower() in ('false', '0', 'no'):
+        logger.info("💡 In-process SAP posting worker disabled - run 'python sap_posting_queue.py'")
+        return
+    sap_posting_worker.start(app)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    from app import app as flask_app
+    # Handlers register against the imported module, not this __main__ copy
+    import sap_posting_queue
+    worker = sap_posting_queue.sap_posting_worker
+    worker.start(flask_app)
+    try:
+        while worker.running:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        worker.stop()
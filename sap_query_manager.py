@@ -3,6 +3,8 @@ SAP B1 SQL Query Manager
 Validates and creates required SQL queries in SAP B1 database on application startup
 """
 
+import hashlib
+import json
 import logging
 import requests
 import urllib3
@@ -10,6 +12,9 @@ import urllib3
 # Disable SSL warnings for SAP B1 connections
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Serials looked up per Batch_Series_Validation call (parameters :s1 .. :sN)
+BATCH_SERIES_VALIDATION_SIZE = 50
+
 class SAPQueryManager:
     """Manages SAP B1 SQL Queries - validates existence and creates if missing"""
     
@@ -117,6 +122,12 @@ class SAPQueryManager:
                 "SqlName": "Seriel_Validation",
                 "SqlText": "SELECT T0.[ItemCode], T0.[DistNumber], T1.[WhsCode] FROM [OSRN] T0  INNER JOIN [OSRQ] T1 ON T0.[AbsEntry] =T1.[MdAbsEntry] WHERE  T1.[Quantity] >'0'AND T1.[ItemCode] =:itemCode AND T0.[DistNumber]=:series AND T1.[WhsCode]=:whsCode"
             },
+            {
+                "SqlCode": "Batch_Series_Validation",
+                "SqlName": "Batch_Series_Validation",
+                "SqlText": "SELECT T0.[ItemCode], T0.[DistNumber], T1.[WhsCode] FROM [OSRN] T0 LEFT JOIN [OSRQ] T1 ON T0.[AbsEntry] = T1.[MdAbsEntry] AND T1.[Quantity] > '0' WHERE T0.[ItemCode] = :itemCode AND T0.[DistNumber] IN ("
+                           + ", ".join(f":s{index}" for index in range(1, BATCH_SERIES_VALIDATION_SIZE + 1)) + ")"
+            },
             {
                 "SqlCode": "Quantity_Check",
                 "SqlName": "Quantity_Check",
@@ -129,6 +140,11 @@ class SAPQueryManager:
             }
         ]
     
+    def queries_hash(self):
+        """Short hash of the required query definitions, so adding or changing one re-runs validation"""
+        definitions = json.dumps(self.required_queries, sort_keys=True)
+        return hashlib.md5(definitions.encode()).hexdigest()[:8]
+    
     def login(self):
         """Login to SAP B1 and get session ID"""
         try:
@@ -278,19 +294,25 @@ def validate_sap_queries(app, force=None):
         company_db = app.config.get('SAP_B1_COMPANY_DB')
         
         current_db_hash = hashlib.md5(f"{company_db}".encode()).hexdigest()[:8] if company_db else "none"
+        manager = SAPQueryManager(server or '', username, password, company_db)
+        current_queries_hash = manager.queries_hash()
         
         if not force and os.path.exists(flag_file):
             with open(flag_file, 'r') as f:
                 flag_content = f.read()
             
             previous_db_hash = None
+            previous_queries_hash = None
             for line in flag_content.split('\n'):
                 if line.startswith('Database:'):
                     previous_db_hash = line.split(':', 1)[1].strip()
-                    break
+                elif line.startswith('Queries:'):
+                    previous_queries_hash = line.split(':', 1)[1].strip()
             
             if previous_db_hash and previous_db_hash != current_db_hash:
                 logging.info("🔄 Database changed - re-running SQL query validation for new database")
+            elif previous_queries_hash != current_queries_hash:
+                logging.info("🔄 Required SQL queries changed - re-running SQL query validation")
             else:
                 logging.info("✅ SQL query validation already attempted on initial startup - skipping")
                 logging.info(f"💡 Flag file details: {flag_content.strip()}")
@@ -301,26 +323,28 @@ def validate_sap_queries(app, force=None):
             with open(flag_file, 'w') as f:
                 f.write(f"Status: skipped - SAP B1 credentials not configured\n")
                 f.write(f"Database: {current_db_hash}\n")
+                f.write(f"Queries: {current_queries_hash}\n")
                 f.write(f"Timestamp: {datetime.now().isoformat()}\n")
             logging.warning("⚠️ SAP B1 credentials not configured - skipping SQL query validation")
             logging.info("✅ Flag file created - will skip on future restarts")
             return False
         
         logging.info("🔄 Running SQL query validation (initial startup attempt)...")
-        manager = SAPQueryManager(server, username, password, company_db)
         result = manager.validate_and_create_queries()
         
         with open(flag_file, 'w') as f:
             if result:
                 f.write(f"Status: completed successfully\n")
                 f.write(f"Database: {current_db_hash}\n")
+                f.write(f"Queries: {current_queries_hash}\n")
                 f.write(f"Timestamp: {datetime.now().isoformat()}\n")
                 logging.info("✅ SQL query validation completed - flag file created, will skip on future restarts")
             else:
                 f.write(f"Status: attempted but failed (SAP connection issue)\n")
                 f.write(f"Database: {current_db_hash}\n")
+                f.write(f"Queries: {current_queries_hash}\n")
                 f.write(f"Timestamp: {datetime.now().isoformat()}\n")
-                f.write(f"Note: Validation was attempted once. Will not retry on restarts unless database changes.\n")
+                f.write(f"Note: Validation was attempted once. Will not retry on restarts unless database or required queries change.\n")
                 logging.warning("⚠️ SQL query validation failed (likely SAP connection unavailable)")
                 logging.info("✅ Flag file created - will skip retry on future restarts to avoid repeated failures")
         
@@ -332,6 +356,8 @@ def validate_sap_queries(app, force=None):
             with open(flag_file, 'w') as f:
                 f.write(f"Status: error during validation\n")
                 f.write(f"Database: {current_db_hash}\n")
+                if 'current_queries_hash' in locals():
+                    f.write(f"Queries: {current_queries_hash}\n")
                 f.write(f"Timestamp: {datetime.now().isoformat()}\n")
                 f.write(f"Error: {str(e)}\n")
         except:
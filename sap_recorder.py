@@ -0,0 +1,121 @@
+"""
+SAP B1 Service Layer call recorder
+With SAP_RECORD_DIR set, every request sent through the SAP session pool is
+appended, together with SAP's response, to <SAP_RECORD_DIR>/sap_calls.jsonl.
+sap_replay_server.py serves those recordings back as a stand-in Service Layer
+for offline load testing:
+
+    SAP_RECORD_DIR=recordings/bin_scan python main.py      # use the WMS against the real SAP
+    python sap_replay_server.py recordings/bin_scan --port 50001
+    SAP_B1_SERVER=http://127.0.0.1:50001 python main.py    # same flows, no network
+
+Secrets are stripped before anything is written: login passwords, session ids
+and cookies never reach the file, and request headers other than Prefer
+(which controls OData paging) are not recorded.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+RECORD_FILE_NAME = 'sap_calls.jsonl'
+SERVICE_ROOT = '/b1s/v1/'
+REDACTED = '***'
+SECRET_FIELDS = {'Password', 'password', 'SessionId', 'B1SESSION', 'ROUTEID'}
+
+_lock = threading.Lock()
+
+
+def record_dir():
+    return os.environ.get('SAP_RECORD_DIR', '').strip()
+
+
+def is_recording():
+    return bool(record_dir())
+
+
+def canonical_path(url, params=None):
+    """'/b1s/v1/Items?$filter=...' relative to the service root, query options sorted"""
+    prepared = requests.Request('GET', url, params=params).prepare().url
+    parts = urlsplit(prepared)
+    path = parts.path
+    if SERVICE_ROOT in path:
+        path = path.split(SERVICE_ROOT, 1)[1]
+    query = sorted(parse_qsl(parts.query, keep_blank_values=True))
+    return path.lstrip('/') + (f'?{urlencode(query)}' if query else '')
+
+
+def redact(value):
+    """Copy of a JSON value with every secret field replaced"""
+    if isinstance(value, dict):
+        return {key: REDACTED if key in SECRET_FIELDS else redact(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
+
+
+def _request_body(kwargs):
+    if kwargs.get('json') is not None:
+        return redact(kwargs['json'])
+    data = kwargs.get('data')
+    if isinstance(data, bytes):
+        data = data.decode('utf-8', errors='replace')
+    if isinstance(data, str):
+        try:
+            return redact(json.loads(data))
+        except ValueError:
+            return data
+    return data
+
+
+def _response_body(response):
+    try:
+        return redact(response.json())
+    except ValueError:
+        return response.text
+
+
+def record(method, url, kwargs, response, elapsed):
+    """Append one request/response pair to the recording file"""
+    directory = record_dir()
+    if not directory:
+        return
+    entry = {
+        'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'method': method.upper(),
+        'path': canonical_path(url, kwargs.get('params')),
+        'prefer': (kwargs.get('headers') or {}).get('Prefer'),
+        'body': _request_body(kwargs),
+        'status': response.status_code,
+        'content_type': response.headers.get('Content-Type', 'application/json'),
+        'response': _response_body(response) if response.content else None,
+        'elapsed_ms': int(elapsed * 1000),
+    }
+    try:
+        os.makedirs(directory, exist_ok=True)
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with _lock, open(os.path.join(directory, RECORD_FILE_NAME), 'a', encoding='utf-8') as handle:
+            handle.write(line + '\n')
+    except Exception as e:
+        logger.warning(f"⚠️ Could not record SAP call {method} {entry['path']}: {e}")
+
+
+def load_recordings(directory):
+    """Every recorded call in ``directory`` (all *.jsonl files), oldest first"""
+    entries = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.jsonl'):
+            continue
+        with open(os.path.join(directory, name), encoding='utf-8') as handle:
+            for line in handle:
+                line = line.strip()
+                if line:
+                    entries.append(json.loads(line))
+    return entries
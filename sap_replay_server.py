@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Stand-in SAP B1 Service Layer that replays calls captured by sap_recorder.py
+Point the WMS at it to benchmark get_bin_items, multi-GRN posting or pick list
+import repeatably, on a laptop with no network:
+
+    python sap_replay_server.py recordings/bin_scan --port 50001 --latency-ms 120 --jitter-ms 40 --error-rate 0.02
+    SAP_B1_SERVER=http://127.0.0.1:50001 python main.py
+
+Requests are matched on method, path with sorted query options and JSON body.
+When no recording has the same body (e.g. a document POST with new
+quantities), method and path alone are used. Several recordings of the same
+call are replayed in turn. Login and Logout always succeed. Unknown calls get
+a Service Layer style 404, and --error-rate makes that share of calls fail with
+a 503.
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+
+from flask import Flask, Response, request
+
+from sap_recorder import SERVICE_ROOT, canonical_path, load_recordings
+
+logger = logging.getLogger(__name__)
+
+
+def _body_key(body):
+    return json.dumps(body, sort_keys=True) if body is not None else None
+
+
+class ReplayStore:
+    """Recorded responses keyed by (method, path, body) and by (method, path)"""
+
+    def __init__(self, entries):
+        exact, by_path = {}, {}
+        for entry in entries:
+            exact.setdefault((entry['method'], entry['path'], _body_key(entry.get('body'))), []).append(entry)
+            by_path.setdefault((entry['method'], entry['path']), []).append(entry)
+        self._exact = {key: itertools.cycle(values) for key, values in exact.items()}
+        self._by_path = {key: itertools.cycle(values) for key, values in by_path.items()}
+        self._lock = threading.Lock()
+        self.size = len(entries)
+
+    def match(self, method, path, body):
+        with self._lock:
+            responses = self._exact.get((method, path, _body_key(body))) or self._by_path.get((method, path))
+            return next(responses) if responses else None
+
+
+def _sap_error(status, message):
+    payload = {'error': {'code': status, 'message': {'lang': 'en-us', 'value': message}}}
+    return Response(json.dumps(payload), status=status, content_type='application/json')
+
+
+def create_replay_app(recordings_dir, latency_ms=0, jitter_ms=0, error_rate=0.0, seed=None):
+    """Flask app serving the recordings in ``recordings_dir`` under /b1s/v1/"""
+    store = ReplayStore(load_recordings(recordings_dir))
+    rng = random.Random(seed)
+    app = Flask(__name__)
+    app.config['REPLAY_STATS'] = stats = {'served': 0, 'missing': 0, 'injected_errors': 0}
+
+    def wait():
+        delay = latency_ms + (rng.uniform(-jitter_ms, jitter_ms) if jitter_ms else 0)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+    @app.route(f'{SERVICE_ROOT}Login', methods=['POST'])
+    def login():
+        wait()
+        session_id = str(uuid.uuid4())
+        response = Response(json.dumps({'SessionId': session_id, 'Version': 'replay', 'SessionTimeout': 30}),
+                            content_type='application/json')
+        response.set_cookie('B1SESSION', session_id)
+        return response
+
+    @app.route(f'{SERVICE_ROOT}Logout', methods=['POST'])
+    def logout():
+        return Response(status=204)
+
+    @app.route(f'{SERVICE_ROOT}<path:resource>', methods=['GET', 'POST', 'PATCH', 'PUT', 'DELETE'])
+    def replay(resource):
+        wait()
+        if error_rate and rng.random() < error_rate:
+            stats['injected_errors'] += 1
+            return _sap_error(503, 'Injected replay error')
+
+        path = canonical_path(request.url)
+        body = request.get_json(silent=True) if request.data else None
+        entry = store.match(request.method, path, body)
+        if entry is None:
+            stats['missing'] += 1
+            logger.warning(f"⚠️ No recording for {request.method} {path}")
+            return _sap_error(404, f'No recording for {request.method} {path}')
+
+        stats['served'] += 1
+        if entry.get('response') is None:
+            return Response(status=entry['status'])
+        content = entry['response']
+        if not isinstance(content, str):
+            content = json.dumps(content)
+        return Response(content, status=entry['status'], content_type=entry.get('content_type') or 'application/json')
+
+    logger.info(f"✅ SAP replay server loaded {store.size} recorded calls from {recordings_dir}")
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded SAP B1 Service Layer calls')
+    parser.add_argument('recordings', help='Directory with sap_recorder *.jsonl files')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('SAP_REPLAY_PORT', '50001')))
+    parser.add_argument('--latency-ms', type=float, default=float(os.environ.get('SAP_REPLAY_LATENCY_MS', '0')))
+    parser.add_argument('--jitter-ms', type=float, default=float(os.environ.get('SAP_REPLAY_JITTER_MS', '0')))
+    parser.add_argument('--error-rate', type=float, default=float(os.environ.get('SAP_REPLAY_ERROR_RATE', '0')))
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for repeatable jitter and errors')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    app = create_replay_app(args.recordings, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                            error_rate=args.error_rate, seed=args.seed)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
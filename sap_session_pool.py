@@ -0,0 +1,304 @@
+"""
+SAP B1 Service Layer Session Pool
+Keeps a small set of authenticated Service Layer sessions alive for the whole
+process so that SAPIntegration / SAPMultiGRNService instances created per
+request do not have to run a full /Login round trip before every call.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+import urllib3
+
+from request_metrics import observe_sap_call
+import sap_recorder
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+logger = logging.getLogger(__name__)
+
+# SAP B1 default Service Layer session timeout (minutes) if Login does not report one
+DEFAULT_SESSION_TIMEOUT_MINUTES = 30
+
+_capture = threading.local()
+
+
+@contextmanager
+def capture_transport_errors():
+    """Record the outcome of every pooled SAP call this thread makes inside the block.
+
+    Yields a list that receives ``None`` for each call that got an HTTP response and
+    the ``requests`` exception for each call (or login) that did not. SAP clients
+    swallow these exceptions into error strings; the posting queue uses the list to
+    classify failures by exception type.
+    """
+    outcomes = []
+    previous = getattr(_capture, 'outcomes', None)
+    _capture.outcomes = outcomes
+    try:
+        yield outcomes
+    finally:
+        _capture.outcomes = previous
+
+
+def _note_outcome(error):
+    outcomes = getattr(_capture, 'outcomes', None)
+    if outcomes is not None:
+        outcomes.append(error)
+
+
+class _PooledSession:
+    """One authenticated Service Layer session with its own keep-alive connection pool"""
+
+    def __init__(self, index, verify, connections):
+        self.index = index
+        self.http = requests.Session()
+        self.http.verify = verify
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=connections)
+        self.http.mount('https://', adapter)
+        self.http.mount('http://', adapter)
+        self.session_id = None
+        self.expires_at = 0.0
+        self.timeout_seconds = DEFAULT_SESSION_TIMEOUT_MINUTES * 60
+
+    def is_valid(self, refresh_margin):
+        return bool(self.session_id) and time.monotonic() < self.expires_at - refresh_margin
+
+    def touch(self):
+        """Service Layer timeouts are sliding - every successful call extends the session"""
+        self.expires_at = time.monotonic() + self.timeout_seconds
+
+    def reset(self):
+        self.session_id = None
+        self.expires_at = 0.0
+        self.http.cookies.clear()
+
+
+class SAPSessionPool:
+    """Process-wide pool of authenticated SAP B1 Service Layer sessions.
+
+    Each HTTP call checks out one session, refreshes it if it is about to time
+    out, sends the request and transparently re-logs in and retries once on 401.
+    """
+
+    def __init__(self, base_url, username, password, company_db, size=4,
+                 refresh_margin=60, verify=False, login_timeout=30, acquire_timeout=60):
+        self.base_url = (base_url or '').rstrip('/')
+        self.username = username
+        self.password = password
+        self.company_db = company_db
+        self.size = max(1, int(size))
+        self.refresh_margin = refresh_margin
+        self.login_timeout = login_timeout
+        self.acquire_timeout = acquire_timeout
+        self.is_offline = False
+
+        self._sessions = [_PooledSession(i, verify, connections=4) for i in range(self.size)]
+        self._available = queue.LifoQueue()
+        for pooled in self._sessions:
+            self._available.put(pooled)
+
+        self.stats = {'logins': 0, 'login_failures': 0, 'relogins_on_401': 0, 'requests': 0}
+        self._stats_lock = threading.Lock()
+
+    @property
+    def is_configured(self):
+        return all([self.base_url, self.username, self.password, self.company_db])
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _login(self, pooled):
+        """Authenticate one pooled session. Caller must hold the checkout."""
+        pooled.reset()
+        login_url = f"{self.base_url}/b1s/v1/Login"
+        login_data = {
+            "UserName": self.username,
+            "Password": self.password,
+            "CompanyDB": self.company_db
+        }
+        try:
+            response = pooled.http.post(login_url, json=login_data, timeout=self.login_timeout)
+        except Exception as e:
+            if isinstance(e, requests.exceptions.RequestException):
+                _note_outcome(e)
+            logger.warning(f"SAP B1 login error (pool session {pooled.index}): {e}")
+            self.is_offline = True
+            self._count('login_failures')
+            return False
+
+        if response.status_code != 200:
+            logger.warning(f"SAP B1 login failed (pool session {pooled.index}): "
+                           f"{response.status_code} - {response.text}")
+            self._count('login_failures')
+            return False
+
+        body = response.json()
+        pooled.session_id = body.get('SessionId') or response.cookies.get('B1SESSION')
+        timeout_minutes = body.get('SessionTimeout') or DEFAULT_SESSION_TIMEOUT_MINUTES
+        pooled.timeout_seconds = int(timeout_minutes) * 60
+        pooled.touch()
+        self.is_offline = False
+        self._count('logins')
+        logger.info(f"✅ SAP B1 pool session {pooled.index} logged in "
+                    f"(timeout {timeout_minutes} min)")
+        return True
+
+    def _checkout(self):
+        try:
+            return self._available.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise requests.exceptions.ConnectionError(
+                f"Timed out after {self.acquire_timeout}s waiting for a pooled SAP B1 session")
+
+    def _checkin(self, pooled):
+        self._available.put(pooled)
+
+    def _ensure_session(self, pooled):
+        if pooled.is_valid(self.refresh_margin):
+            return True
+        return self._login(pooled)
+
+    def ensure_logged_in(self):
+        """Make sure at least one pooled session is authenticated. Returns the SessionId or None."""
+        if not self.is_configured:
+            logger.warning("SAP B1 configuration not complete. Running in offline mode.")
+            return None
+        pooled = self._checkout()
+        try:
+            if self._ensure_session(pooled):
+                return pooled.session_id
+            return None
+        finally:
+            self._checkin(pooled)
+
+    def request(self, method, url, **kwargs):
+        """Send a Service Layer request over a pooled, authenticated session"""
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            try:
+                response = self._request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                _note_outcome(e)
+                raise
+            _note_outcome(None)
+            status = response.status_code
+            if sap_recorder.is_recording():
+                sap_recorder.record(method, url, kwargs, response, time.perf_counter() - started)
+            return response
+        finally:
+            observe_sap_call(method, url, status, time.perf_counter() - started)
+
+    def _request(self, method, url, **kwargs):
+        pooled = self._checkout()
+        try:
+            if self.is_configured and not self._ensure_session(pooled):
+                # Let the caller see SAP's own 401 rather than an opaque exception
+                return pooled.http.request(method, url, **kwargs)
+
+            self._count('requests')
+            response = pooled.http.request(method, url, **kwargs)
+
+            if response.status_code == 401 and self.is_configured:
+                self._count('relogins_on_401')
+                logger.info(f"🔄 SAP B1 pool session {pooled.index} expired - re-logging in")
+                if self._login(pooled):
+                    response = pooled.http.request(method, url, **kwargs)
+
+            if response.status_code != 401:
+                pooled.touch()
+            return response
+        finally:
+            self._checkin(pooled)
+
+    def invalidate(self):
+        """Drop all pooled sessions; they will log in again lazily"""
+        for pooled in self._sessions:
+            pooled.reset()
+
+    def close(self):
+        """Logout every authenticated session and close its connection pool"""
+        for pooled in self._sessions:
+            if pooled.session_id:
+                try:
+                    pooled.http.post(f"{self.base_url}/b1s/v1/Logout", timeout=10)
+                except Exception as e:
+                    logger.debug(f"SAP B1 pool logout error: {e}")
+            pooled.reset()
+            pooled.http.close()
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['size'] = self.size
+        stats['authenticated'] = sum(1 for p in self._sessions if p.session_id)
+        stats['available'] = self._available.qsize()
+        return stats
+
+
+class PooledSAPSession:
+    """Drop-in replacement for the requests.Session that SAP client classes expose
+    as ``self.session``; every verb is routed through the shared SAPSessionPool."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.verify = False
+
+    def request(self, method, url, **kwargs):
+        return self.pool.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('PATCH', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_sap_session_pool(base_url=None, username=None, password=None, company_db=None):
+    """Return the process-wide session pool for the given SAP credentials
+    (defaults to the SAP_B1_* environment variables)."""
+    base_url = (base_url if base_url is not None else os.environ.get('SAP_B1_SERVER', '')).rstrip('/')
+    username = username if username is not None else os.environ.get('SAP_B1_USERNAME', '')
+    password = password if password is not None else os.environ.get('SAP_B1_PASSWORD', '')
+    company_db = company_db if company_db is not None else os.environ.get('SAP_B1_COMPANY_DB', '')
+
+    key = (base_url, username, password, company_db)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = SAPSessionPool(
+                base_url, username, password, company_db,
+                size=int(os.environ.get('SAP_SESSION_POOL_SIZE', '4')),
+                refresh_margin=int(os.environ.get('SAP_SESSION_REFRESH_MARGIN', '60')),
+            )
+            _pools[key] = pool
+        return pool
+
+
+def reset_sap_session_pools():
+    """Close and forget every pool (used after credential changes and in tests)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
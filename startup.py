@@ -0,0 +1,213 @@
+"""
+Staged application startup
+app.py runs its import-time work as named stages and logs how long each took.
+The report is kept in app.config['STARTUP_REPORT']. Work that a worker does not
+need before it can serve is moved out of the import:
+- schema creation and the default branch / admin user: a one-time command,
+
+      flask --app main init-db
+
+  An empty database (no users table) is still initialised on first start, and
+  AUTO_INIT_DB=true runs the full initialisation on every start.
+- MySQL mirror probing and SAP query validation: a background thread started
+  once the app is configured (STARTUP_WARMUP=false switches it off).
+
+    from startup import StartupReport
+    startup = StartupReport()
+    with startup.stage('blueprints'):
+        app.register_blueprint(transfer_bp)
+    startup.finish(app)
+"""
+
+import contextlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _enabled(name, default):
+    return os.environ.get(name, default).lower() not in ('0', 'false', 'no')
+
+
+class StartupReport:
+    """Wall time of each startup stage, in the order they ran"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.ready_ms = None
+        self.stages = {}
+        self.warmup = {}
+
+    @contextlib.contextmanager
+    def stage(self, name, background=False):
+        timings = self.warmup if background else self.stages
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    def as_dict(self):
+        return {'ready_ms': self.ready_ms, 'stages': dict(self.stages), 'warmup': dict(self.warmup)}
+
+    @staticmethod
+    def summary(timings):
+        return ', '.join(f'{name} {ms:.0f}ms' for name, ms in timings.items())
+
+    def finish(self, app):
+        """Log the stage timings and publish them in app.config['STARTUP_REPORT']"""
+        self.ready_ms = round((time.perf_counter() - self.started) * 1000, 1)
+        logger.info(f"⏱️ Application ready in {self.ready_ms:.0f}ms ({self.summary(self.stages)})")
+        app.config['STARTUP_REPORT'] = self
+
+
+def _create_default_data(db):
+    from werkzeug.security import generate_password_hash
+    from models import User
+    from models_extensions import Branch
+
+    default_branch = Branch.query.filter_by(id='BR001').first()
+    if not default_branch:
+        default_branch = Branch()
+        default_branch.id = 'BR001'
+        default_branch.name = 'Main Branch'
+        default_branch.branch_code = 'BR001'  # Required field
+        default_branch.branch_name = 'Main Branch'  # Required field
+        default_branch.description = 'Main Office Branch'
+        default_branch.address = 'Main Office'
+        default_branch.phone = '123-456-7890'
+        default_branch.email = 'main@company.com'
+        default_branch.manager_name = 'Branch Manager'
+        default_branch.is_active = True
+        default_branch.is_default = True
+        db.session.add(default_branch)
+        logger.info("Default branch created")
+
+    admin = User.query.filter_by(username='admin').first()
+    if not admin:
+        admin = User()
+        admin.username = 'admin'
+        admin.email = 'admin@company.com'
+        admin.password_hash = generate_password_hash('admin123')
+        admin.first_name = 'System'
+        admin.last_name = 'Administrator'
+        admin.role = 'admin'
+        admin.branch_id = 'BR001'
+        admin.branch_name = 'Main Branch'
+        admin.default_branch_id = 'BR001'
+        admin.is_active = True
+        admin.must_change_password = False
+        db.session.add(admin)
+        logger.info("Default admin user created")
+
+    db.session.commit()
+
+
+def _drop_unique_serial_constraint(db):
+    """Allow duplicate serial numbers per transfer item on MySQL"""
+    from sqlalchemy import text
+    with db.engine.connect() as conn:
+        result = conn.execute(text("""
+            SELECT CONSTRAINT_NAME
+            FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS
+            WHERE TABLE_SCHEMA = DATABASE()
+            AND TABLE_NAME = 'serial_number_transfer_serials'
+            AND CONSTRAINT_NAME = 'unique_serial_per_item'
+        """))
+        if result.fetchone():
+            conn.execute(text("ALTER TABLE serial_number_transfer_serials DROP INDEX unique_serial_per_item"))
+            conn.commit()
+            logger.info("✅ Dropped unique_serial_per_item constraint to allow duplicate serial numbers")
+        else:
+            logger.info("ℹ️ unique_serial_per_item constraint not found, skipping")
+
+
+def init_database(app, db):
+    """Create missing tables and the default branch and admin user (safe to run again)"""
+    with app.app_context():
+        db.create_all()
+        logger.info("Database tables created")
+
+        if db.engine.dialect.name == 'mysql':
+            try:
+                _drop_unique_serial_constraint(db)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not drop unique constraint: {e}")
+
+        try:
+            _create_default_data(db)
+            logger.info("✅ Default data initialization completed")
+        except Exception as e:
+            logger.error(f"Error initializing default data: {e}")
+            db.session.rollback()
+
+
+def check_database(app, db):
+    """Fail fast when the database is unreachable; initialise it when it is still empty.
+
+    Uses the application's own engine, so the connection opened here is reused
+    by the first request.
+    """
+    from sqlalchemy import inspect
+    with app.app_context():
+        try:
+            with db.engine.connect() as conn:
+                has_schema = inspect(conn).has_table('users')
+        except Exception as e:
+            raise RuntimeError(f"Database connection failed: {e}")
+        logger.info(f"✅ Database connection successful ({db.engine.dialect.name})")
+
+    if _enabled('AUTO_INIT_DB', 'false'):
+        init_database(app, db)
+    elif not has_schema:
+        logger.warning("📦 Empty database - creating tables and default data "
+                       "(run 'flask --app main init-db' once to do this ahead of startup)")
+        init_database(app, db)
+
+
+def register_cli_commands(app, db):
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create the database tables and the default branch and admin user."""
+        init_database(app, db)
+        print("✅ Database initialised")
+
+
+def _warm_up(app, report):
+    with report.stage('mysql_probe', background=True):
+        try:
+            from db_dual_support import init_dual_database
+            app.config['DUAL_DB'] = init_dual_database(app)
+            logger.info("✅ Dual database support initialized for MySQL sync")
+        except Exception as e:
+            logger.warning(f"⚠️ Dual database support not available: {e}")
+            app.config['DUAL_DB'] = None
+            logger.info("💡 MySQL sync disabled, using single database mode")
+
+    with report.stage('sap_query_validation', background=True):
+        try:
+            from sap_query_manager import validate_sap_queries
+            validate_sap_queries(app)
+        except Exception as e:
+            logger.warning(f"⚠️ SAP query validation skipped: {e}")
+            logger.info("💡 Application will continue without SAP query validation")
+
+    logger.info(f"⏱️ Background warm-up finished ({report.summary(report.warmup)})")
+
+
+def start_background_warmup(app, report):
+    """Probe the MySQL mirror and validate the SAP queries on a daemon thread"""
+    app.config.setdefault('DUAL_DB', None)
+    if multiprocessing.parent_process() is not None:
+        # Helper processes (e.g. the QR render pool) re-import the app; only the server warms up
+        return None
+    if not _enabled('STARTUP_WARMUP', 'true'):
+        logger.info("💡 Background warm-up disabled (STARTUP_WARMUP=false)")
+        return None
+    thread = threading.Thread(target=_warm_up, args=(app, report), name='wms-startup-warmup', daemon=True)
+    thread.start()
+    return thread
@@ -305,6 +305,62 @@ function generateUUID() {
     });
 }
 
+// Poll a queued SAP posting job until it has succeeded or failed
+function pollSAPPostingJob(jobId, options = {}) {
+    const interval = options.interval || 2000;
+    const timeout = options.timeout || 300000;
+    const started = Date.now();
+
+    return new Promise((resolve, reject) => {
+        const check = () => {
+            fetch(`/api/sap-posting-jobs/${jobId}`)
+                .then(response => response.json())
+                .then(data => {
+                    if (!data.success) {
+                        reject(new Error(data.error || 'Posting job not found'));
+                        return;
+                    }
+                    const job = data.job;
+                    if (options.onUpdate) {
+                        options.onUpdate(job);
+                    }
+                    if (job.status === 'succeeded' || job.status === 'failed' || Date.now() - started > timeout) {
+                        resolve(job);
+                        return;
+                    }
+                    setTimeout(check, interval);
+                })
+                .catch(() => setTimeout(check, interval));
+        };
+        check();
+    });
+}
+
+// Turn an approval response that queued a SAP posting into the final posting result
+function waitForSAPPosting(data, onUpdate) {
+    if (!data || !data.success || !data.job_id) {
+        return Promise.resolve(data);
+    }
+    return pollSAPPostingJob(data.job_id, { onUpdate: onUpdate }).then(job => {
+        if (job.status === 'succeeded') {
+            return {
+                success: true,
+                message: 'Approved and posted to SAP B1',
+                sap_document_number: job.sap_doc_num,
+                job: job
+            };
+        }
+        if (job.status === 'failed') {
+            return { success: false, error: `SAP B1 posting failed: ${job.error}`, job: job };
+        }
+        return {
+            success: true,
+            message: 'Approved. SAP B1 posting is still in progress - refresh the page to see the result.',
+            job: job
+        };
+    });
+}
+
 // Keyboard shortcuts
 document.addEventListener('keydown', (e) => {
     // Ctrl+Alt+S for scan
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the WMS hot paths
+
+Seeds a realistic dataset, starts the SAP replay server on a free local port
+with the canned responses in benchmarks/sap_recordings, then times QR scan
+verification, inventory transfer scanning, pack label rendering, the dashboard
+and QC dashboard, the REST list endpoints and the multi-GRN posting job:
+
+    python -m pytest -q test_benchmarks.py
+    BENCHMARK_SAVE_BASELINE=1 python -m pytest -q test_benchmarks.py   # new baseline for a release
+
+Every benchmark records wall time (min/median/mean/p95/max) and the SQL
+statements sent per round. Results go to benchmarks/results/<dialect>.json next
+to their baseline in benchmarks/baselines/<dialect>.json. A benchmark fails when
+it sends more SQL statements than its baseline; timings are only compared when
+BENCHMARK_MAX_SLOWDOWN is set (e.g. 1.5 fails anything 50% slower than the
+baseline median), as they depend on the machine.
+
+By default the module gets its own throwaway SQLite database (conftest.py).
+Set BENCHMARK_DATABASE_URL to a scratch PostgreSQL database to measure the
+production backend, BENCHMARK_ROUNDS to change the number of timed rounds,
+BENCHMARK_LABEL_PACKS the number of pack labels rendered per round and
+BENCHMARK_SAP_LATENCY_MS the simulated SAP latency.
+"""
+
+import itertools
+import json
+import math
+import os
+import platform
+import statistics
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import delete, event, select
+from werkzeug.serving import make_server
+
+from app import app, db
+from models import User, InventoryTransfer, TransferScanState, PickList, InventoryCount
+from modules.grpo.models import GRPODocument
+from modules.multi_grn_creation.models import (MultiGRNBatch, MultiGRNPOLink, MultiGRNLineSelection,
+                                               MultiGRNBatchDetails, MultiGRNBatchDetailsLabel)
+from modules.multi_grn_creation.routes import post_batch_to_sap, render_pack_label_barcodes
+from dashboard_stats import invalidate_dashboard
+from sap_replay_server import create_replay_app
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks')
+ROUNDS = int(os.environ.get('BENCHMARK_ROUNDS', '10'))
+WARMUP_ROUNDS = 1
+LABEL_PACKS = int(os.environ.get('BENCHMARK_LABEL_PACKS', '100'))
+SCAN_BATCH_SIZE = 50
+SEED_DOCUMENTS = 200
+STATUSES = ['draft', 'submitted', 'qc_approved', 'posted', 'rejected']
+
+# conftest.py's database fixture uses this scratch database instead of a throwaway SQLite file
+DATABASE_URL_ENV = 'BENCHMARK_DATABASE_URL'
+
+DOCUMENT_MODELS = [GRPODocument, InventoryTransfer, PickList, InventoryCount, MultiGRNBatch]
+
+REST_LIST_ENDPOINTS = ['/api/rest/inventory-transfers', '/api/rest/grpo-documents', '/api/rest/pick-lists',
+                       '/api/rest/inventory-counts', '/api/rest/multi-grn-batches']
+
+
+def _pack_qr(grn_number, item_code, pack, qty):
+    return json.dumps({'id': grn_number, 'item': item_code, 'batch': f'B-{grn_number}', 'qty': qty,
+                       'pack': pack, 'grn_date': '2026-01-01'})
+
+
+@pytest.fixture(scope='module')
+def seeded(database, seed):
+    """Seed documents, one multi-GRN batch ready for posting with pack labels to scan
+    and one inventory transfer with scan history; return the ids the benchmarks use"""
+    with app.app_context():
+        stamp = f'{datetime.utcnow():%H%M%S%f}'
+        user_ids = seed(User, 3, username=lambda i: f'bench-user-{stamp}-{i}',
+                        email=lambda i: f'bench-{stamp}-{i}@wms.local', role=lambda i: 'admin' if i == 0 else 'user')
+        user_id = user_ids[0]
+        ids = {'user_id': user_id}
+        for model in DOCUMENT_MODELS:
+            extra = {'absolute_entry': lambda i: 500000 + i} if model is PickList else {}
+            ids[model.__tablename__] = seed(model, SEED_DOCUMENTS, user_id=lambda i: user_ids[i % len(user_ids)],
+                                            status=lambda i: STATUSES[i % len(STATUSES)], **extra)
+
+        # A QC approved batch: 3 purchase orders x 10 batch managed lines x 2 batches,
+        # every batch split into packs, one pack label per scan round
+        batch_id = seed(MultiGRNBatch, 1, user_id=user_id, status='qc_approved',
+                        batch_number=f'MGRN-BENCH-{stamp}')[0]
+        po_link_ids = seed(MultiGRNPOLink, 3, batch_id=batch_id, po_doc_entry=lambda i: 9000 + i,
+                           po_doc_num=lambda i: f'PO-{9000 + i}', po_card_code='V-BENCH', status='selected')
+        line_ids = seed(MultiGRNLineSelection, 30, po_link_id=lambda i: po_link_ids[i // 10],
+                        po_line_num=lambda i: i % 10, item_code=lambda i: f'ITEM-{i % 10}',
+                        selected_quantity=100, warehouse_code='WH01', bin_location=lambda i: str(100 + i % 5),
+                        batch_required='Y', manage_method='A')
+        detail_ids = seed(MultiGRNBatchDetails, 60, line_selection_id=lambda i: line_ids[i // 2],
+                          batch_number=lambda i: f'BATCH-{stamp}-{i}', quantity=50,
+                          grn_number=lambda i: f'MGN-{batch_id}-{i}', status='pending')
+        label_count = ROUNDS + WARMUP_ROUNDS
+        seed(MultiGRNBatchDetailsLabel, label_count, batch_detail_id=lambda i: detail_ids[i % len(detail_ids)],
+             pack_number=lambda i: i // len(detail_ids) + 1, qty_in_pack=10,
+             grn_number=lambda i: f'MGN-{batch_id}-{i % len(detail_ids)}-{i // len(detail_ids) + 1}-{stamp}',
+             status='pending')
+        ids['multi_grn_batch_id'] = batch_id
+        ids['pack_grn_numbers'] = db.session.execute(
+            select(MultiGRNBatchDetailsLabel.grn_number)
+            .where(MultiGRNBatchDetailsLabel.batch_detail_id.in_(detail_ids))
+            .order_by(MultiGRNBatchDetailsLabel.id)).scalars().all()
+
+        transfer_id = seed(InventoryTransfer, 1, user_id=user_id, status='draft',
+                           transfer_request_number=f'TR-{stamp}'[:20])[0]
+        seed(TransferScanState, 250, transfer_id=transfer_id, user_id=user_id,
+             item_code=lambda i: f'ITEM-{i % 5}', requested_qty=10000, qty=10,
+             grn_id=lambda i: f'MGN-SEED-{i // 5}', pack_key=lambda i: f'MGN-SEED-{i // 5}|{i % 5 + 1} of 5',
+             pack_label=lambda i: f'{i % 5 + 1} of 5', transfer_status='pending')
+        ids['transfer_id'] = transfer_id
+
+        db.session.commit()
+        yield ids
+
+
+@pytest.fixture(scope='module')
+def sap_stub():
+    """The SAP replay server on a free local port, with the SAP_B1_* settings pointing at it"""
+    replay_app = create_replay_app(os.path.join(BENCHMARK_DIR, 'sap_recordings'),
+                                   latency_ms=float(os.environ.get('BENCHMARK_SAP_LATENCY_MS', '0')))
+    server = make_server('127.0.0.1', 0, replay_app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    settings = {'SAP_B1_SERVER': f'http://127.0.0.1:{server.server_port}', 'SAP_B1_USERNAME': 'benchmark',
+                'SAP_B1_PASSWORD': 'benchmark', 'SAP_B1_COMPANY_DB': 'BENCHMARK'}
+    previous = {key: os.environ.get(key) for key in settings}
+    os.environ.update(settings)
+    try:
+        yield replay_app.config['REPLAY_STATS']
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        server.shutdown()
+        thread.join()
+
+
+@pytest.fixture(scope='module')
+def client(seeded):
+    test_client = app.test_client()
+    with test_client.session_transaction() as session:
+        session['_user_id'] = str(seeded['user_id'])
+        session['_fresh'] = True
+    return test_client
+
+
+def _baseline_path(dialect):
+    return os.path.join(BENCHMARK_DIR, 'baselines', f'{dialect}.json')
+
+
+def _load_json(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as handle:
+        return json.load(handle)
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as handle:
+        json.dump(data, handle, indent=2, sort_keys=True)
+        handle.write('\n')
+
+
+@pytest.fixture(scope='module')
+def results(database):
+    """Collects every benchmark of the run; written to benchmarks/results (and the baseline) at the end"""
+    with app.app_context():
+        dialect = db.engine.dialect.name
+    collected = {}
+    yield collected
+    if not collected:
+        return
+    report = {
+        'dialect': dialect,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'recorded_at': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'rounds': ROUNDS,
+        'benchmarks': collected,
+    }
+    _write_json(os.path.join(BENCHMARK_DIR, 'results', f'{dialect}.json'), report)
+    if os.environ.get('BENCHMARK_SAVE_BASELINE', '').lower() in ('1', 'true', 'yes'):
+        baseline = _load_json(_baseline_path(dialect))
+        report['benchmarks'] = dict(baseline.get('benchmarks', {}), **collected)
+        _write_json(_baseline_path(dialect), report)
+
+
+def _summary(durations, statements):
+    ordered = sorted(durations)
+    p95 = ordered[min(len(ordered) - 1, math.ceil(len(ordered) * 0.95) - 1)]
+    return {
+        'rounds': len(ordered),
+        'min_ms': round(ordered[0] * 1000, 3),
+        'median_ms': round(statistics.median(ordered) * 1000, 3),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+        'p95_ms': round(p95 * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+        'sql_statements': int(statistics.median(statements)),
+    }
+
+
+def _benchmark(results, name, run, setup=None, rounds=ROUNDS):
+    """Time ``run()`` for ``rounds`` rounds after a warm-up round, counting its SQL statements.
+
+    ``setup()`` runs untimed before every round. Fails if the benchmark sends
+    more SQL statements than its baseline, or is slower than
+    BENCHMARK_MAX_SLOWDOWN times the baseline median.
+    """
+    counter = [0]
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        counter[0] += 1
+
+    durations, statements = [], []
+    event.listen(db.engine, 'before_cursor_execute', count_statement)
+    try:
+        for round_number in range(WARMUP_ROUNDS + rounds):
+            if setup is not None:
+                setup()
+            counter[0] = 0
+            started = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - started
+            if round_number >= WARMUP_ROUNDS:
+                durations.append(elapsed)
+                statements.append(counter[0])
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count_statement)
+
+    summary = results[name] = _summary(durations, statements)
+    baseline = _load_json(_baseline_path(db.engine.dialect.name)).get('benchmarks', {}).get(name)
+    if not baseline:
+        return summary
+    assert summary['sql_statements'] <= baseline['sql_statements'], (
+        f"{name} sends {summary['sql_statements']} SQL statements per round, "
+        f"baseline {baseline['sql_statements']}")
+    max_slowdown = float(os.environ.get('BENCHMARK_MAX_SLOWDOWN') or 0)
+    if max_slowdown:
+        assert summary['median_ms'] <= baseline['median_ms'] * max_slowdown, (
+            f"{name} median {summary['median_ms']}ms, baseline {baseline['median_ms']}ms")
+    return summary
+
+
+def _check(response, status=200):
+    assert response.status_code == status, response.get_data(as_text=True)[:500]
+    return response
+
+
+def test_scan_qr_code(seeded, client, results):
+    """Multi-GRN pack verification, one new pack per round"""
+    packs = iter(seeded['pack_grn_numbers'])
+
+    def scan():
+        payload = {'qr_data': json.dumps({'id': next(packs), 'qty': 10})}
+        assert _check(client.post('/multi-grn/api/scan-qr-code', json=payload)).get_json()['success']
+
+    with app.app_context():
+        _benchmark(results, 'scan_qr_code', scan)
+
+
+def test_inventory_transfer_scan_batch(seeded, client, results):
+    """A buffered scanner batch of new packs against a transfer with scan history"""
+    transfer_id = seeded['transfer_id']
+    batches = itertools.count()
+
+    def reset():
+        db.session.execute(delete(TransferScanState).where(TransferScanState.transfer_id == transfer_id,
+                                                           TransferScanState.grn_id.like('MGN-SCAN-%')))
+        db.session.commit()
+
+    def scan():
+        batch = next(batches)
+        labels = [_pack_qr(f'MGN-SCAN-{batch}-{i // 5}', f'ITEM-{i % 5}', f'{i % 5 + 1} of 5', 10)
+                  for i in range(SCAN_BATCH_SIZE)]
+        data = _check(client.post('/inventory_transfer/api/scan-qr-labels',
+                                  json={'transfer_id': transfer_id, 'qr_labels': labels})).get_json()
+        assert data['accepted'] == SCAN_BATCH_SIZE, data
+
+    with app.app_context():
+        _benchmark(results, 'inventory_transfer_scan_batch', scan, setup=reset)
+
+
+def test_inventory_transfer_scan_label(seeded, client, results):
+    """A single pack scan against a transfer with scan history"""
+    transfer_id = seeded['transfer_id']
+    scans = itertools.count()
+
+    def scan():
+        payload = {'transfer_id': transfer_id, 'requested_qty': 10000,
+                   'qr_data': _pack_qr(f'MGN-SINGLE-{next(scans)}', 'ITEM-0', '1 of 1', 10)}
+        assert _check(client.post('/inventory_transfer/api/scan-qr-label', json=payload)).get_json()['success']
+
+    with app.app_context():
+        _benchmark(results, 'inventory_transfer_scan_label', scan)
+
+
+def test_render_pack_labels(results):
+    """QR images for LABEL_PACKS pack labels, rendered the way new pack labels are"""
+    def render():
+        labels = [SimpleNamespace(qr_data=_pack_qr(f'MGN-LABEL-{i}', 'ITEM-0', f'{i + 1} of {LABEL_PACKS}', 10),
+                                  barcode=None) for i in range(LABEL_PACKS)]
+        render_pack_label_barcodes(labels)
+        assert all(label.barcode for label in labels)
+
+    with app.app_context():
+        _benchmark(results, f'render_pack_labels_{LABEL_PACKS}', render)
+
+
+def test_dashboard(seeded, client, results):
+    """Dashboard HTML with the per-user cache cleared before every round"""
+    with app.app_context():
+        _benchmark(results, 'dashboard', lambda: _check(client.get('/dashboard')),
+                   setup=lambda: invalidate_dashboard(seeded['user_id']))
+
+
+def test_qc_dashboard(seeded, client, results):
+    with app.app_context():
+        _benchmark(results, 'qc_dashboard', lambda: _check(client.get('/qc_dashboard')))
+
+
+@pytest.mark.parametrize('endpoint', REST_LIST_ENDPOINTS)
+def test_rest_list(seeded, client, results, endpoint):
+    name = 'rest_' + endpoint.rsplit('/', 1)[-1].replace('-', '_')
+    with app.app_context():
+        _benchmark(results, name, lambda: _check(client.get(f'{endpoint}?limit=50')))
+
+
+def test_multi_grn_posting(seeded, sap_stub, results):
+    """Build the consolidated GRN of a 30 line batch and post it to the stubbed SAP"""
+    batch_id = seeded['multi_grn_batch_id']
+    job = SimpleNamespace(id=0, document_id=batch_id, attempts=1, sap_reference=None)
+
+    def reopen():
+        db.session.get(MultiGRNBatch, batch_id).status = 'qc_approved'
+        db.session.commit()
+
+    def post():
+        result = post_batch_to_sap(job)
+        assert result['success'], result
+
+    with app.app_context():
+        _benchmark(results, 'multi_grn_posting', post, setup=reopen)
+    assert sap_stub['missing'] == 0
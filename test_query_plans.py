@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Query plan regression tests for the scan, verification and document list hot paths
+
+Seeds a database, runs every hot query while capturing the SQL it sends, then
+EXPLAINs each captured SELECT and fails if the plan reads a whole table.
+
+    python -m pytest -q test_query_plans.py
+
+By default the module gets its own throwaway SQLite database (conftest.py).
+Set QUERY_PLAN_DATABASE_URL to a scratch PostgreSQL or MySQL database to check
+the production planner; the seed rows are added to it. On PostgreSQL
+enable_seqscan is switched off for the EXPLAIN, so a Seq Scan in the plan
+means no usable index exists at all.
+"""
+
+import json
+import re
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event, select, text
+
+from app import app, db
+from models import (User, InventoryTransfer, TransferScanState, PickList, PickListLine, InventoryCount, SAPInventoryCount,
+                    SAPInventoryCountLine, MySQLReplicationEvent,
+                    SalesOrder, SalesOrderLine,
+                    SerialNumberTransfer, SerialNumberTransferItem, SerialNumberTransferSerial,
+                    SerialItemTransfer, SerialItemTransferItem, DirectInventoryTransfer)
+from modules.grpo.models import GRPODocument
+from modules.inventory_transfer.routes import _evaluate_scan_batch
+from modules.multi_grn_creation.models import (MultiGRNBatch, MultiGRNPOLink, MultiGRNLineSelection,
+                                               MultiGRNBatchDetails, MultiGRNSerialDetails)
+from modules.multi_grn_creation.routes import batch_verification_summaries
+from modules.sales_delivery.models import DeliveryDocument
+from dashboard_stats import load_document_counts, load_recent_activities
+from qc_work_queue import load_qc_work_queue
+from pick_list_sync import load_sales_order_lines
+from inventory_counting_sync import load_counting_lines
+from mysql_replication import EVENT_PENDING
+
+# conftest.py's database fixture uses this scratch database instead of a throwaway SQLite file
+DATABASE_URL_ENV = 'QUERY_PLAN_DATABASE_URL'
+
+SEED_DOCUMENTS = 300
+STATUSES = ['draft', 'submitted', 'qc_approved', 'posted', 'rejected']
+
+DOCUMENT_MODELS = [GRPODocument, InventoryTransfer, PickList, InventoryCount, SerialNumberTransfer,
+                   SerialItemTransfer, DirectInventoryTransfer, MultiGRNBatch, DeliveryDocument]
+
+
+@pytest.fixture(scope='module')
+def seeded(database, seed):
+    """Seed every hot table and return the ids the hot queries look up"""
+    with app.app_context():
+        user_ids = seed(User, 5, username=lambda i: f'plan-user-{datetime.utcnow():%H%M%S%f}-{i}',
+                        email=lambda i: f'plan-{datetime.utcnow():%H%M%S%f}-{i}@wms.local', role='user')
+        user_id = user_ids[0]
+        document_user = lambda i: user_ids[i % len(user_ids)]
+        document_status = lambda i: STATUSES[i % len(STATUSES)]
+
+        ids = {'user_id': user_id}
+        for model in DOCUMENT_MODELS:
+            extra = {'absolute_entry': lambda i: 100 + i} if model is PickList else {}
+            ids[model.__tablename__] = seed(model, SEED_DOCUMENTS, user_id=document_user, status=document_status,
+                                            **extra)
+        count_ids = seed(SAPInventoryCount, SEED_DOCUMENTS, user_id=document_user,
+                         doc_entry=lambda i: 900000 + i, loaded_at=lambda i: f'2026-01-01 00:{i % 60:02d}:00')
+        seed(SAPInventoryCountLine, SEED_DOCUMENTS * 5, count_id=lambda i: count_ids[i // 5], line_number=lambda i: i % 5)
+        ids['sap_inventory_count_id'] = count_ids[0]
+        seed(MySQLReplicationEvent, SEED_DOCUMENTS * 5, table_name='users', operation='UPDATE',
+             status=lambda i: EVENT_PENDING if i % 10 == 0 else 'failed')
+
+        transfer_ids = ids['inventory_transfers']
+        seed(TransferScanState, SEED_DOCUMENTS * 5, user_id=user_id,
+             transfer_id=lambda i: transfer_ids[i % len(transfer_ids)],
+             item_code=lambda i: f'ITEM-{i % 7}', grn_id=lambda i: f'MGN-{i % 50}',
+             pack_key=lambda i: f'MGN-{i % 50}|{i} of {SEED_DOCUMENTS * 5}',
+             transfer_status=lambda i: 'verified' if i % 2 else 'pending')
+
+        batch_ids = ids['multi_grn_document']
+        po_link_ids = seed(MultiGRNPOLink, len(batch_ids), batch_id=lambda i: batch_ids[i])
+        line_ids = seed(MultiGRNLineSelection, len(po_link_ids) * 3, po_link_id=lambda i: po_link_ids[i // 3])
+        seed(MultiGRNBatchDetails, len(line_ids) * 2, line_selection_id=lambda i: line_ids[i // 2],
+             status=lambda i: 'verified' if i % 3 else 'pending')
+        seed(MultiGRNSerialDetails, len(line_ids) * 2, line_selection_id=lambda i: line_ids[i // 2],
+             status=lambda i: 'verified' if i % 3 else 'pending')
+        ids['line_selection_id'] = line_ids[0]
+
+        serial_number_transfer_ids = ids['serial_number_transfers']
+        transfer_item_ids = seed(SerialNumberTransferItem, SEED_DOCUMENTS * 2,
+                                 serial_transfer_id=lambda i: serial_number_transfer_ids[i // 2])
+        seed(SerialNumberTransferSerial, len(transfer_item_ids) * 2,
+             transfer_item_id=lambda i: transfer_item_ids[i // 2])
+        ids['serial_number_transfer_item_id'] = transfer_item_ids[0]
+
+        serial_transfer_ids = ids['serial_item_transfers']
+        seed(SerialItemTransferItem, SEED_DOCUMENTS * 5,
+             serial_item_transfer_id=lambda i: serial_transfer_ids[i % len(serial_transfer_ids)],
+             serial_number=lambda i: f'SN{i:08d}')
+
+        pick_list_ids = ids['pick_lists']
+        seed(PickListLine, SEED_DOCUMENTS * 3, pick_list_id=lambda i: pick_list_ids[i // 3], line_number=lambda i: i % 3)
+        order_ids = seed(SalesOrder, SEED_DOCUMENTS, doc_entry=lambda i: 700000 + i)
+        seed(SalesOrderLine, SEED_DOCUMENTS * 3, sales_order_id=lambda i: order_ids[i // 3], line_num=lambda i: i % 3)
+
+        db.session.commit()
+        if db.engine.dialect.name in ('postgresql', 'mysql'):
+            with db.engine.begin() as conn:
+                for table in db.metadata.sorted_tables:
+                    conn.execute(text(f'ANALYZE {"TABLE " if db.engine.dialect.name == "mysql" else ""}{table.name}'))
+        else:
+            db.session.execute(text('ANALYZE'))
+            db.session.commit()
+        yield ids
+
+
+def _hot_queries():
+    """name -> callable(ids) running one hot path the way the application does"""
+    queries = {
+        'transfer_scan_grn_already_transferred': lambda ids: TransferScanState.query.filter_by(
+            transfer_id=ids['inventory_transfers'][0], grn_id='MGN-1', transfer_status='verified').first(),
+        'transfer_scan_pack_already_scanned': lambda ids: TransferScanState.query.filter_by(
+            transfer_id=ids['inventory_transfers'][0], item_code='ITEM-1', pack_key='MGN-1|1 of 1',
+            transfer_status='verified').first(),
+        'transfer_scan_item_packs': lambda ids: TransferScanState.query.filter_by(
+            transfer_id=ids['inventory_transfers'][0], item_code='ITEM-1').all(),
+        # A pack that is already stored, so the batch is rejected without writing
+        'transfer_scan_batch_state': lambda ids: _evaluate_scan_batch(
+            ids['inventory_transfers'][0],
+            [{'id': 'MGN-0', 'item': 'ITEM-0', 'pack': f'0 of {SEED_DOCUMENTS * 5}', 'qty': 1}], 0, {}, ''),
+        'multi_grn_batch_details_of_line': lambda ids: MultiGRNBatchDetails.query.filter_by(
+            line_selection_id=ids['line_selection_id']).all(),
+        'multi_grn_serial_details_of_line': lambda ids: MultiGRNSerialDetails.query.filter_by(
+            line_selection_id=ids['line_selection_id']).all(),
+        'multi_grn_verification_summary': lambda ids: batch_verification_summaries(ids['multi_grn_document'][:3]),
+        'serial_item_transfer_duplicate_serial': lambda ids: db.session.scalars(
+            select(SerialItemTransferItem.serial_number).where(
+                SerialItemTransferItem.serial_item_transfer_id == ids['serial_item_transfers'][0],
+                SerialItemTransferItem.serial_number.in_(['SN00000001', 'SN00000301', 'SN99999999']))).all(),
+        'serial_number_transfer_existing_serials': lambda ids: db.session.scalars(
+            select(SerialNumberTransferSerial.serial_number).where(
+                SerialNumberTransferSerial.transfer_item_id == ids['serial_number_transfer_item_id'],
+                SerialNumberTransferSerial.serial_number.in_(['SN1', 'SN2']))).all(),
+        'qc_work_queue': lambda ids: load_qc_work_queue(),
+        'dashboard_counts': lambda ids: load_document_counts(ids['user_id']),
+        'dashboard_recent_activities': lambda ids: load_recent_activities(ids['user_id']),
+        'pick_lists_by_absolute_entry': lambda ids: PickList.query.filter(
+            PickList.absolute_entry.in_([101, 102, 103])).all(),
+        'pick_list_lines_of_pick_lists': lambda ids: PickListLine.query.filter(
+            PickListLine.pick_list_id.in_(ids['pick_lists'][:3])).all(),
+        'sales_order_lines_of_orders': lambda ids: load_sales_order_lines([(700001, 0), (700002, 1)]),
+        'sap_inventory_count_lines_of_document': lambda ids: load_counting_lines(ids['sap_inventory_count_id']),
+        'mysql_replication_pending_batch': lambda ids: db.session.scalars(
+            select(MySQLReplicationEvent).where(MySQLReplicationEvent.status == EVENT_PENDING)
+            .order_by(MySQLReplicationEvent.id).limit(500)).all(),
+    }
+    for model in DOCUMENT_MODELS:
+        queries[f'{model.__tablename__}_by_status'] = lambda ids, model=model: db.session.execute(
+            select(model).where(model.status == 'submitted').order_by(model.created_at.desc()).limit(25)).all()
+        queries[f'{model.__tablename__}_by_user'] = lambda ids, model=model: db.session.execute(
+            select(model).where(model.user_id == ids['user_id']).order_by(model.created_at.desc()).limit(25)).all()
+    return queries
+
+
+HOT_QUERIES = _hot_queries()
+
+
+def _capture_selects(run):
+    """Run ``run()`` and return the (statement, parameters) of every SELECT it sent"""
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            captured.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        run()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return captured
+
+
+def _sqlite_full_scans(conn, statement, parameters, tables):
+    plan = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).all()
+    scans = []
+    for row in plan:
+        match = re.match(r'SCAN (\w+)', row[-1])
+        # "SCAN <table>" reads every row (or every index entry); subquery results are not tables
+        if match and match.group(1) in tables:
+            scans.append(row[-1])
+    return scans
+
+
+def _postgresql_full_scans(conn, statement, parameters, tables):
+    conn.exec_driver_sql('SET LOCAL enable_seqscan = off')
+    plan = conn.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {statement}', parameters).scalar()
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    scans = []
+    nodes = [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        if node['Node Type'] == 'Seq Scan':
+            scans.append(f"Seq Scan on {node['Relation Name']}")
+        nodes.extend(node.get('Plans', []))
+    return scans
+
+
+def _mysql_full_scans(conn, statement, parameters, tables):
+    result = conn.exec_driver_sql(f'EXPLAIN {statement}', parameters)
+    return [f"ALL on {row['table']}" for row in result.mappings()
+            if row['type'] == 'ALL' and row['table'] in tables]
+
+
+PLAN_CHECKS = {
+    'sqlite': _sqlite_full_scans,
+    'postgresql': _postgresql_full_scans,
+    'mysql': _mysql_full_scans,
+}
+
+
+@pytest.mark.parametrize('name', list(HOT_QUERIES))
+def test_hot_query_uses_indexes(seeded, name):
+    with app.app_context():
+        check = PLAN_CHECKS.get(db.engine.dialect.name)
+        if check is None:
+            pytest.skip(f'No plan check for {db.engine.dialect.name}')
+
+        statements = _capture_selects(lambda: HOT_QUERIES[name](seeded))
+        db.session.rollback()
+        assert statements, f'{name} did not run any SELECT'
+
+        tables = set(db.metadata.tables)
+        problems = []
+        with db.engine.connect() as conn:
+            for statement, parameters in statements:
+                with conn.begin():
+                    for scan in check(conn, statement, parameters, tables):
+                        problems.append(f'{scan}\n    in: {" ".join(statement.split())[:300]}')
+        assert not problems, f'{name} reads whole tables:\n' + '\n'.join(problems)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Tests for the SAP B1 Service Layer $batch encoder and response parser
+
+    python -m pytest -q test_sap_odata_batch.py
+"""
+
+import json
+from types import SimpleNamespace
+
+from sap_odata_batch import build_batch_request, execute_batch, parse_batch_response
+
+BOUNDARY = 'batchresponse_1'
+
+
+def _http_part(status, reason, body=None):
+    lines = ['Content-Type: application/http', 'Content-Transfer-Encoding: binary', '',
+             f'HTTP/1.1 {status} {reason}']
+    if body is not None:
+        lines += ['Content-Type: application/json;odata.metadata=minimal', '', json.dumps(body)]
+    else:
+        lines += ['']
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def _changeset(boundary, *parts):
+    return (f'Content-Type: multipart/mixed;boundary={boundary}\r\n\r\n'
+            + ''.join(f'--{boundary}\r\n{part}' for part in parts)
+            + f'--{boundary}--\r\n')
+
+
+def _batch_response(*parts):
+    body = ''.join(f'--{BOUNDARY}\r\n{part}' for part in parts) + f'--{BOUNDARY}--\r\n'
+    return SimpleNamespace(status_code=202, text=body, content=body.encode('utf-8'),
+                           headers={'Content-Type': f'multipart/mixed;boundary={BOUNDARY}'})
+
+
+class FakeSession:
+    def __init__(self, response):
+        self.response = response
+        self.requests = []
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        self.requests.append((url, data, headers))
+        return self.response
+
+
+OPERATIONS = [
+    {'changeset': [{'method': 'PATCH', 'path': 'A(1)', 'body': {'x': 1}},
+                   {'method': 'PATCH', 'path': 'A(2)', 'body': {'x': 2}}]},
+    {'method': 'GET', 'path': 'B(1)'},
+]
+
+
+def test_build_batch_request_counts_changeset_operations():
+    content_type, body, part_count = build_batch_request(OPERATIONS)
+
+    assert content_type.startswith('multipart/mixed;boundary=batch_')
+    assert part_count == 3
+    assert 'PATCH /b1s/v1/A(1)' in body and 'PATCH /b1s/v1/A(2)' in body
+    assert 'GET /b1s/v1/B(1)' in body
+
+
+def test_successful_changeset_and_operation_keep_their_positions():
+    session = FakeSession(_batch_response(
+        _changeset('changesetresponse_1', _http_part(204, 'No Content'), _http_part(204, 'No Content')),
+        _http_part(200, 'OK', {'Code': 'B1'})))
+
+    results = execute_batch(session, 'https://sap.example:50000', OPERATIONS)
+
+    assert [result['status_code'] for result in results] == [204, 204, 200]
+    assert results[2]['body'] == {'Code': 'B1'}
+
+
+def test_failed_changeset_error_covers_its_operations_only():
+    error = {'error': {'code': -5002, 'message': {'lang': 'en-us', 'value': 'Item A(2) is locked'}}}
+    session = FakeSession(_batch_response(
+        _http_part(400, 'Bad Request', error),
+        _http_part(200, 'OK', {'Code': 'B1'})))
+
+    results = execute_batch(session, 'https://sap.example:50000', OPERATIONS)
+
+    assert len(results) == 3
+    for result in results[:2]:
+        assert result['status_code'] == 400
+        assert not result['success']
+        assert result['error'] == 'Item A(2) is locked'
+    assert results[2]['status_code'] == 200
+    assert results[2]['success']
+    assert results[2]['body'] == {'Code': 'B1'}
+
+
+def test_failed_changeset_error_inside_its_own_multipart():
+    error = {'error': {'code': -5002, 'message': 'Item A(2) is locked'}}
+    session = FakeSession(_batch_response(
+        _changeset('changesetresponse_1', _http_part(400, 'Bad Request', error)),
+        _http_part(200, 'OK', {'Code': 'B1'})))
+
+    results = execute_batch(session, 'https://sap.example:50000', OPERATIONS)
+
+    assert [result['status_code'] for result in results] == [400, 400, 200]
+    assert results[1]['error'] == 'Item A(2) is locked'
+
+
+def test_missing_parts_are_reported_as_failed():
+    session = FakeSession(_batch_response(
+        _changeset('changesetresponse_1', _http_part(204, 'No Content'), _http_part(204, 'No Content'))))
+
+    results = execute_batch(session, 'https://sap.example:50000', OPERATIONS)
+
+    assert [result['status_code'] for result in results] == [204, 204, 0]
+    assert results[2]['error'] == 'Missing $batch part'
+
+
+def test_parse_batch_response_flattens_changesets():
+    response = _batch_response(
+        _changeset('changesetresponse_1', _http_part(204, 'No Content'), _http_part(204, 'No Content')),
+        _http_part(404, 'Not Found'))
+
+    parts = parse_batch_response(response.headers['Content-Type'], response.content)
+
+    assert [part['status_code'] for part in parts] == [204, 204, 404]
+    assert parts[2]['error'] == 'HTTP 404'